@@ -9,6 +9,7 @@ namespace cpu {
 
 IPEX_DEFINE_DISPATCH(all_reduce_add_kernel_stub);
 IPEX_DEFINE_DISPATCH(allgather_kernel_stub);
+IPEX_DEFINE_DISPATCH(reduce_scatter_add_kernel_stub);
 
 at::Tensor all_reduce_add(at::Tensor t_in) {
   RECORD_FUNCTION("ipex::all_reduce_add", c10::ArrayRef<c10::IValue>({}));
@@ -23,6 +24,11 @@ at::Tensor allgather(
   return allgather_kernel_stub(kCPU, t_in, cols_per_rank, world_size);
 }
 
+at::Tensor reduce_scatter_add(at::Tensor t_in, int64_t world_size) {
+  RECORD_FUNCTION("ipex::reduce_scatter_add", c10::ArrayRef<c10::IValue>({}));
+  return reduce_scatter_add_kernel_stub(kCPU, t_in, world_size);
+}
+
 } // namespace cpu
 } // namespace torch_ipex
 
@@ -34,6 +40,11 @@ TORCH_LIBRARY_FRAGMENT(torch_ipex, m) {
       "all_reduce_add", c10::DispatchKey::CPU, torch_ipex::cpu::all_reduce_add);
   m.def("allgather(Tensor input, int[] output, int world_size) -> (Tensor)");
   m.impl("allgather", c10::DispatchKey::CPU, torch_ipex::cpu::allgather);
+  m.def("reduce_scatter_add(Tensor input, int world_size) -> (Tensor)");
+  m.impl(
+      "reduce_scatter_add",
+      c10::DispatchKey::CPU,
+      torch_ipex::cpu::reduce_scatter_add);
 }
 } // namespace
 #endif
\ No newline at end of file
@@ -8,6 +8,9 @@ namespace cpu {
 IPEX_DEFINE_DISPATCH(mixtral_moe_tpp_kernel_stub);
 IPEX_DEFINE_DISPATCH(mixtral_moe_woq_kernel_stub);
 IPEX_DEFINE_DISPATCH(mixtral_moe_kernel_stub);
+IPEX_DEFINE_DISPATCH(mixtral_moe_tpp_grouped_kernel_stub);
+IPEX_DEFINE_DISPATCH(mixtral_moe_woq_grouped_kernel_stub);
+IPEX_DEFINE_DISPATCH(mixtral_moe_grouped_kernel_stub);
 
 at::Tensor mixtral_moe_tpp(
     const at::Tensor& hidden_states,
@@ -92,6 +95,88 @@ at::Tensor mixtral_moe_woq(
       routing_weights,
       output);
 }
+
+at::Tensor mixtral_moe_tpp_grouped(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList up_weis,
+    at::TensorList down_weis,
+    bool tpp_fallback,
+    at::Tensor& output) {
+  RECORD_FUNCTION(
+      "ipex::mixtral_moe_tpp_grouped", c10::ArrayRef<c10::IValue>({}));
+
+  if (selected_experts.numel() == 0)
+    return output;
+  return mixtral_moe_tpp_grouped_kernel_stub(
+      kCPU,
+      hidden_states,
+      selected_experts,
+      routing_weights,
+      gate_weis,
+      up_weis,
+      down_weis,
+      tpp_fallback,
+      output);
+}
+
+at::Tensor mixtral_moe_grouped(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList gate_op_ctxs,
+    at::TensorList up_weis,
+    at::TensorList up_op_ctxs,
+    at::TensorList down_weis,
+    at::TensorList down_op_ctxs,
+    bool use_dnnl,
+    at::Tensor& output) {
+  RECORD_FUNCTION(
+      "ipex::mixtral_moe_grouped", c10::ArrayRef<c10::IValue>({}));
+
+  if (selected_experts.numel() == 0)
+    return output;
+  return mixtral_moe_grouped_kernel_stub(
+      kCPU,
+      hidden_states,
+      selected_experts,
+      routing_weights,
+      gate_weis,
+      gate_op_ctxs,
+      up_weis,
+      up_op_ctxs,
+      down_weis,
+      down_op_ctxs,
+      use_dnnl,
+      output);
+}
+
+at::Tensor mixtral_moe_woq_grouped(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList up_weis,
+    at::TensorList down_weis,
+    at::Tensor& output) {
+  RECORD_FUNCTION(
+      "ipex::mixtral_moe_woq_grouped", c10::ArrayRef<c10::IValue>({}));
+
+  if (selected_experts.numel() == 0)
+    return output;
+  return mixtral_moe_woq_grouped_kernel_stub(
+      kCPU,
+      hidden_states,
+      selected_experts,
+      routing_weights,
+      gate_weis,
+      up_weis,
+      down_weis,
+      output);
+}
 } // namespace cpu
 } // namespace torch_ipex
 
@@ -118,5 +203,30 @@ TORCH_LIBRARY_FRAGMENT(torch_ipex, m) {
       "mixtral_moe_woq",
       c10::DispatchKey::CPU,
       torch_ipex::cpu::mixtral_moe_woq);
+  m.def(
+      "mixtral_moe_tpp_grouped(Tensor hidden_states, Tensor selected_experts, \
+      Tensor routing_weights, Tensor[] gate_weis, Tensor[] up_weis, \
+      Tensor[] down_weis, bool tpp_fallback, Tensor output) -> Tensor");
+  m.impl(
+      "mixtral_moe_tpp_grouped",
+      c10::DispatchKey::CPU,
+      torch_ipex::cpu::mixtral_moe_tpp_grouped);
+  m.def(
+      "mixtral_moe_grouped(Tensor hidden_states, Tensor selected_experts, \
+      Tensor routing_weights, Tensor[] gate_weis, Tensor[] gate_op_ctxs, \
+      Tensor[] up_weis, Tensor[] up_op_ctxs, Tensor[] down_weis, \
+      Tensor[] down_op_ctxs, bool use_dnnl, Tensor output) -> Tensor");
+  m.impl(
+      "mixtral_moe_grouped",
+      c10::DispatchKey::CPU,
+      torch_ipex::cpu::mixtral_moe_grouped);
+  m.def(
+      "mixtral_moe_woq_grouped(Tensor hidden_states, Tensor selected_experts, \
+      Tensor routing_weights, Tensor[] gate_weis, Tensor[] up_weis, \
+      Tensor[] down_weis, Tensor output) -> Tensor");
+  m.impl(
+      "mixtral_moe_woq_grouped",
+      c10::DispatchKey::CPU,
+      torch_ipex::cpu::mixtral_moe_woq_grouped);
 }
 } // namespace
\ No newline at end of file
@@ -37,6 +37,35 @@ at::Tensor mixtral_moe(
     bool,
     const at::Tensor&,
     at::Tensor&);
+at::Tensor mixtral_moe_tpp_grouped(
+    const at::Tensor&,
+    const at::Tensor&,
+    const at::Tensor&,
+    at::TensorList,
+    at::TensorList,
+    at::TensorList,
+    bool,
+    at::Tensor&);
+at::Tensor mixtral_moe_woq_grouped(
+    const at::Tensor&,
+    const at::Tensor&,
+    const at::Tensor&,
+    at::TensorList,
+    at::TensorList,
+    at::TensorList,
+    at::Tensor&);
+at::Tensor mixtral_moe_grouped(
+    const at::Tensor&,
+    const at::Tensor&,
+    const at::Tensor&,
+    at::TensorList,
+    at::TensorList,
+    at::TensorList,
+    at::TensorList,
+    at::TensorList,
+    at::TensorList,
+    bool,
+    at::Tensor&);
 using mixtral_moe_tpp_kernel_fn = at::Tensor (*)(
     const at::Tensor& hidden_states,
     const at::Tensor& top_x,
@@ -69,8 +98,46 @@ using mixtral_moe_kernel_fn = at::Tensor (*)(
     bool use_dnnl,
     const at::Tensor& routing_weights,
     at::Tensor& output);
+using mixtral_moe_tpp_grouped_kernel_fn = at::Tensor (*)(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList up_weis,
+    at::TensorList down_weis,
+    bool tpp_fallback,
+    at::Tensor& output);
+using mixtral_moe_woq_grouped_kernel_fn = at::Tensor (*)(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList up_weis,
+    at::TensorList down_weis,
+    at::Tensor& output);
+using mixtral_moe_grouped_kernel_fn = at::Tensor (*)(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList gate_op_ctxs,
+    at::TensorList up_weis,
+    at::TensorList up_op_ctxs,
+    at::TensorList down_weis,
+    at::TensorList down_op_ctxs,
+    bool use_dnnl,
+    at::Tensor& output);
 IPEX_DECLARE_DISPATCH(mixtral_moe_tpp_kernel_fn, mixtral_moe_tpp_kernel_stub);
 IPEX_DECLARE_DISPATCH(mixtral_moe_woq_kernel_fn, mixtral_moe_woq_kernel_stub);
 IPEX_DECLARE_DISPATCH(mixtral_moe_kernel_fn, mixtral_moe_kernel_stub);
+IPEX_DECLARE_DISPATCH(
+    mixtral_moe_tpp_grouped_kernel_fn,
+    mixtral_moe_tpp_grouped_kernel_stub);
+IPEX_DECLARE_DISPATCH(
+    mixtral_moe_woq_grouped_kernel_fn,
+    mixtral_moe_woq_grouped_kernel_stub);
+IPEX_DECLARE_DISPATCH(
+    mixtral_moe_grouped_kernel_fn,
+    mixtral_moe_grouped_kernel_stub);
 } // namespace cpu
 } // namespace torch_ipex
@@ -29,12 +29,30 @@ at::Tensor allgather_kernel_impl(
   return Messenger::getInstance().allgather(t_in, output_tensors);
 }
 
+at::Tensor reduce_scatter_add_kernel_impl(
+    at::Tensor t_in,
+    int64_t world_size) {
+  TORCH_CHECK(
+      t_in.dim() > 0 && t_in.size(0) % world_size == 0,
+      "reduce_scatter_add: the first dim should be divisible by world_size");
+  auto input = t_in.contiguous();
+  auto shape = input.sizes().vec();
+  shape[0] /= world_size;
+  auto output = at::empty(shape, input.options());
+  Messenger::getInstance().reduceScatterAdd(input, output);
+  return output;
+}
+
 } // anonymous namespace
 
 IPEX_REGISTER_DISPATCH(all_reduce_add_kernel_stub, &all_reduce_add_kernel_impl);
 
 IPEX_REGISTER_DISPATCH(allgather_kernel_stub, &allgather_kernel_impl);
 
+IPEX_REGISTER_DISPATCH(
+    reduce_scatter_add_kernel_stub,
+    &reduce_scatter_add_kernel_impl);
+
 } // namespace cpu
 } // namespace torch_ipex
 #endif
\ No newline at end of file
@@ -124,6 +124,147 @@ at::Tensor mixtral_moe_woq_kernl_impl(
 
   return output;
 }
+
+// Groups the (token, expert) pairs by expert with a single sort, runs the MLP
+// of every expert which received tokens on its contiguous slice of the
+// gathered hidden states, and scatters all the results back with a single
+// index_add_. Experts without tokens cost nothing, unlike calling the
+// per-expert ops above for every expert.
+template <typename F>
+at::Tensor mixtral_moe_grouped_impl(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    int64_t num_experts,
+    at::Tensor& output,
+    const F& expert_mlp) {
+  auto top_k = selected_experts.size(-1);
+  auto flat_experts = selected_experts.reshape({-1});
+  // the stable sort keeps the token order inside every expert
+  auto sorted_pairs =
+      std::get<1>(flat_experts.sort(/*stable=*/true, /*dim=*/0, false));
+  auto token_idx = sorted_pairs.div(top_k, "floor");
+  auto expert_counts =
+      at::bincount(flat_experts, /*weights=*/{}, num_experts).to(at::kLong);
+  auto counts = expert_counts.accessor<int64_t, 1>();
+  auto sorted_states = hidden_states.index_select(0, token_idx);
+  auto sorted_routing_w = routing_weights.reshape({-1})
+                              .index_select(0, sorted_pairs)
+                              .unsqueeze(-1);
+  auto sorted_output = at::empty_like(sorted_states);
+  int64_t start = 0;
+  for (int64_t expert = 0; expert < num_experts; expert++) {
+    auto num_tokens = counts[expert];
+    if (num_tokens == 0)
+      continue;
+    auto curr_state = expert_mlp(
+        expert, sorted_states.narrow(0, start, num_tokens).unsqueeze(0));
+    sorted_output.narrow(0, start, num_tokens)
+        .copy_(
+            curr_state.squeeze(0) *
+            sorted_routing_w.narrow(0, start, num_tokens));
+    start += num_tokens;
+  }
+  output.index_add_(0, token_idx, sorted_output);
+
+  return output;
+}
+
+at::Tensor mixtral_moe_tpp_grouped_kernl_impl(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList up_weis,
+    at::TensorList down_weis,
+    bool tpp_fallback,
+    at::Tensor& output) {
+  return mixtral_moe_grouped_impl(
+      hidden_states,
+      selected_experts,
+      routing_weights,
+      gate_weis.size(),
+      output,
+      [&](int64_t expert, const at::Tensor& curr_state) -> at::Tensor {
+        if (tpp_fallback) {
+          return at::linear(
+              at::silu(at::linear(curr_state, gate_weis[expert])) *
+                  at::linear(curr_state, up_weis[expert]),
+              down_weis[expert]);
+        }
+        auto gate_up = tpp_fused_gate_up_proj_forward_cpu(
+            curr_state,
+            gate_weis[expert],
+            at::empty(0, curr_state.options()),
+            up_weis[expert],
+            at::empty(0, curr_state.options()),
+            c10::nullopt);
+        return tpp_linear_nobias_forward_cpu(
+            gate_up, down_weis[expert], c10::nullopt);
+      });
+}
+
+at::Tensor mixtral_moe_grouped_kernl_impl(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList gate_op_ctxs,
+    at::TensorList up_weis,
+    at::TensorList up_op_ctxs,
+    at::TensorList down_weis,
+    at::TensorList down_op_ctxs,
+    bool use_dnnl,
+    at::Tensor& output) {
+  auto linear = use_dnnl ? ipex_linear : mkl_sgemm_forward;
+  return mixtral_moe_grouped_impl(
+      hidden_states,
+      selected_experts,
+      routing_weights,
+      gate_weis.size(),
+      output,
+      [&](int64_t expert, const at::Tensor& curr_state) -> at::Tensor {
+        return linear(
+            at::silu(linear(
+                curr_state,
+                gate_weis[expert],
+                c10::nullopt,
+                gate_op_ctxs[expert],
+                c10::nullopt)) *
+                linear(
+                    curr_state,
+                    up_weis[expert],
+                    c10::nullopt,
+                    up_op_ctxs[expert],
+                    c10::nullopt),
+            down_weis[expert],
+            c10::nullopt,
+            down_op_ctxs[expert],
+            c10::nullopt);
+      });
+}
+
+at::Tensor mixtral_moe_woq_grouped_kernl_impl(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    at::TensorList gate_weis,
+    at::TensorList up_weis,
+    at::TensorList down_weis,
+    at::Tensor& output) {
+  return mixtral_moe_grouped_impl(
+      hidden_states,
+      selected_experts,
+      routing_weights,
+      gate_weis.size(),
+      output,
+      [&](int64_t expert, const at::Tensor& curr_state) -> at::Tensor {
+        return woq_linear_forward(
+            at::silu(woq_linear_forward(curr_state, gate_weis[expert])) *
+                woq_linear_forward(curr_state, up_weis[expert]),
+            down_weis[expert]);
+      });
+}
 } // anonymous namespace
 
 IPEX_REGISTER_DISPATCH(
@@ -133,6 +274,15 @@ IPEX_REGISTER_DISPATCH(
     mixtral_moe_woq_kernel_stub,
     &mixtral_moe_woq_kernl_impl);
 IPEX_REGISTER_DISPATCH(mixtral_moe_kernel_stub, &mixtral_moe_kernl_impl);
+IPEX_REGISTER_DISPATCH(
+    mixtral_moe_tpp_grouped_kernel_stub,
+    &mixtral_moe_tpp_grouped_kernl_impl);
+IPEX_REGISTER_DISPATCH(
+    mixtral_moe_woq_grouped_kernel_stub,
+    &mixtral_moe_woq_grouped_kernl_impl);
+IPEX_REGISTER_DISPATCH(
+    mixtral_moe_grouped_kernel_stub,
+    &mixtral_moe_grouped_kernl_impl);
 
 } // namespace cpu
 } // namespace torch_ipex
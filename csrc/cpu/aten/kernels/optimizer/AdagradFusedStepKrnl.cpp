@@ -20,7 +20,8 @@ void adagrad_fused_step_kernel(
     double learning_rate,
     double weight_decay,
     double lr_decay,
-    double eps) {
+    double eps,
+    double inv_scale) {
   scalar_t* param_data = param.data_ptr<scalar_t>();
   scalar_t* grad_data = grad.data_ptr<scalar_t>();
   scalar_t* state_sum_data = state_sum.data_ptr<scalar_t>();
@@ -46,7 +47,7 @@ void adagrad_fused_step_kernel(
         int64_t d = 0;
         for (; d < size - (size % Vec::size()); d += Vec::size()) {
           Vec param_vec = Vec::loadu(param_ptr + d);
-          Vec grad_vec = Vec::loadu(grad_ptr + d);
+          Vec grad_vec = Vec::loadu(grad_ptr + d) * Vec(scalar_t(inv_scale));
           if (_w_decay)
             grad_vec += param_vec * Vec(scalar_t(weight_decay));
 
@@ -58,7 +59,7 @@ void adagrad_fused_step_kernel(
           param_vec.store(param_ptr + d);
         }
         for (; d < size; d++) {
-          scalar_t grad_val = grad_ptr[d];
+          scalar_t grad_val = grad_ptr[d] * inv_scale;
           if (_w_decay)
             grad_val += param_ptr[d] * weight_decay;
           state_sum_ptr[d] += grad_val * grad_val;
@@ -79,7 +80,8 @@ void adagrad_fused_step_kernel<at::BFloat16, at::BFloat16>(
     double learning_rate,
     double weight_decay,
     double lr_decay,
-    double eps) {
+    double eps,
+    double inv_scale) {
   TORCH_CHECK(
       param.scalar_type() == at::kBFloat16,
       "adagrad_fused_step_kernel: expect param to be at::BFloat16");
@@ -129,6 +131,8 @@ void adagrad_fused_step_kernel<at::BFloat16, at::BFloat16>(
           bVec grad_bvec = bVec::loadu(grad_ptr + d);
           fVec grad_fvec, grad_fvec2;
           std::tie(grad_fvec, grad_fvec2) = convert_bfloat16_float(grad_bvec);
+          grad_fvec = grad_fvec * fVec(float(inv_scale));
+          grad_fvec2 = grad_fvec2 * fVec(float(inv_scale));
 
           if (_w_decay) {
             grad_fvec = grad_fvec + param_fvec * fVec(float(weight_decay));
@@ -155,7 +159,7 @@ void adagrad_fused_step_kernel<at::BFloat16, at::BFloat16>(
         for (; d < size; d++) {
           float param_val =
               at::vec::pack_bfloat16_float(param_ptr[d], param2_ptr[d]);
-          float grad_val = float(grad_ptr[d]);
+          float grad_val = float(grad_ptr[d]) * float(inv_scale);
           if (_w_decay)
             grad_val += param_ptr[d] * weight_decay;
           state_sum_ptr[d] += grad_val * grad_val;
@@ -178,7 +182,8 @@ void adagrad_fused_step_kernel<float, at::BFloat16>(
     double learning_rate,
     double weight_decay,
     double lr_decay,
-    double eps) {
+    double eps,
+    double inv_scale) {
   TORCH_CHECK(
       param.scalar_type() == at::kFloat,
       "adagrad_fused_step_kernel: expect param to be float32");
@@ -225,6 +230,8 @@ void adagrad_fused_step_kernel<float, at::BFloat16>(
           bVec grad_bvec = bVec::loadu(grad_ptr + d);
           fVec grad_fvec, grad_fvec2;
           std::tie(grad_fvec, grad_fvec2) = convert_bfloat16_float(grad_bvec);
+          grad_fvec = grad_fvec * fVec(float(inv_scale));
+          grad_fvec2 = grad_fvec2 * fVec(float(inv_scale));
 
           if (_w_decay) {
             grad_fvec = grad_fvec + param_fvec * fVec(float(weight_decay));
@@ -252,7 +259,7 @@ void adagrad_fused_step_kernel<float, at::BFloat16>(
         for (; d < size; d++) {
           float param_val =
               at::vec::pack_bfloat16_float(param_ptr[d], param2_ptr[d]);
-          float grad_val = float(grad_ptr[d]);
+          float grad_val = float(grad_ptr[d]) * float(inv_scale);
           if (_w_decay)
             grad_val += param_ptr[d] * weight_decay;
           state_sum_ptr[d] += grad_val * grad_val;
@@ -274,7 +281,8 @@ std::tuple<at::Tensor, at::Tensor> adagrad_fused_step_kernel_impl(
     double learning_rate,
     double weight_decay,
     double lr_decay,
-    double eps) {
+    double eps,
+    double inv_scale) {
   auto param = param_.contiguous();
   auto grad = grad_.contiguous();
   auto state_sum = state_sum_.contiguous();
@@ -292,7 +300,8 @@ std::tuple<at::Tensor, at::Tensor> adagrad_fused_step_kernel_impl(
         learning_rate,
         weight_decay,
         lr_decay,
-        eps);
+        eps,
+        inv_scale);
   } else if (at::ScalarType::Double == grad_dtype) {
     adagrad_fused_step_kernel<double, double>(
         param,
@@ -303,7 +312,8 @@ std::tuple<at::Tensor, at::Tensor> adagrad_fused_step_kernel_impl(
         learning_rate,
         weight_decay,
         lr_decay,
-        eps);
+        eps,
+        inv_scale);
   } else if (
       at::ScalarType::BFloat16 == grad_dtype &&
       at::ScalarType::BFloat16 == param_dtype) {
@@ -316,7 +326,8 @@ std::tuple<at::Tensor, at::Tensor> adagrad_fused_step_kernel_impl(
         learning_rate,
         weight_decay,
         lr_decay,
-        eps);
+        eps,
+        inv_scale);
   } else if (
       at::ScalarType::BFloat16 == grad_dtype &&
       at::ScalarType::Float == param_dtype) {
@@ -329,7 +340,8 @@ std::tuple<at::Tensor, at::Tensor> adagrad_fused_step_kernel_impl(
         learning_rate,
         weight_decay,
         lr_decay,
-        eps);
+        eps,
+        inv_scale);
   } else {
     TORCH_CHECK(false, "expect bfloat16 or float or double param");
   }
@@ -24,7 +24,8 @@ void adam_fused_step_kernel(
     double beta2_double,
     double learning_rate_double,
     double weight_decay_double,
-    double eps_double) {
+    double eps_double,
+    double inv_scale_double) {
   scalar_t* param_data = param.data_ptr<scalar_t>();
   scalar_t* exp_avg_data = exp_avg.data_ptr<scalar_t>();
   scalar_t* exp_avg_sq_data = exp_avg_sq.data_ptr<scalar_t>();
@@ -43,6 +44,7 @@ void adam_fused_step_kernel(
   scalar_t learning_rate = scalar_t(learning_rate_double);
   scalar_t weight_decay = scalar_t(weight_decay_double);
   scalar_t eps = scalar_t(eps_double);
+  scalar_t inv_scale = scalar_t(inv_scale_double);
 
   using Vec = at::vec::Vectorized<scalar_t>;
   int64_t grain_size = 512;
@@ -63,8 +65,8 @@ void adam_fused_step_kernel(
         int64_t d = 0;
         for (; d < size - (size % Vec::size()); d += Vec::size()) {
           Vec param_vec = Vec::loadu(param_ptr + d);
-          Vec grad_vec =
-              Vec::loadu(grad_ptr + d) + param_vec * Vec(weight_decay);
+          Vec grad_vec = Vec::loadu(grad_ptr + d) * Vec(inv_scale) +
+              param_vec * Vec(weight_decay);
           Vec exp_avg_vec = Vec::loadu(exp_avg_ptr + d) * Vec(beta1) +
               grad_vec * Vec(exp_avg_grad_coefficient);
           Vec exp_avg_sq_vec = Vec::loadu(exp_avg_sq_ptr + d) * Vec(beta2) +
@@ -88,7 +90,8 @@ void adam_fused_step_kernel(
           param_vec.store(param_ptr + d);
         }
         for (; d < size; d++) {
-          scalar_t grad_val = grad_ptr[d] + param_ptr[d] * weight_decay;
+          scalar_t grad_val =
+              grad_ptr[d] * inv_scale + param_ptr[d] * weight_decay;
           exp_avg_ptr[d] =
               exp_avg_ptr[d] * beta1 + grad_val * exp_avg_grad_coefficient;
           exp_avg_sq_ptr[d] = exp_avg_sq_ptr[d] * beta2 +
@@ -121,7 +124,8 @@ void adam_fused_step_kernel<at::BFloat16, at::BFloat16>(
     double beta2_double,
     double learning_rate_double,
     double weight_decay_double,
-    double eps_double) {
+    double eps_double,
+    double inv_scale_double) {
   TORCH_CHECK(
       param.scalar_type() == at::kBFloat16,
       "adam_fused_step_kernel: expect param to be at::BFloat16");
@@ -160,6 +164,7 @@ void adam_fused_step_kernel<at::BFloat16, at::BFloat16>(
   float learning_rate = float(learning_rate_double);
   float weight_decay = float(weight_decay_double);
   float eps = float(eps_double);
+  float inv_scale = float(inv_scale_double);
 
   using bVec = at::vec::Vectorized<at::BFloat16>;
   using fVec = at::vec::Vectorized<float>;
@@ -184,6 +189,8 @@ void adam_fused_step_kernel<at::BFloat16, at::BFloat16>(
           bVec grad_bvec = bVec::loadu(grad_ptr + d);
           fVec grad_fvec, grad_fvec2;
           std::tie(grad_fvec, grad_fvec2) = convert_bfloat16_float(grad_bvec);
+          grad_fvec = grad_fvec * fVec(inv_scale);
+          grad_fvec2 = grad_fvec2 * fVec(inv_scale);
           // load param vec
           bVec param_bvec = bVec::loadu(param_ptr + d);
           bVec param2_bvec = bVec::loadu(param2_ptr + d);
@@ -241,7 +248,8 @@ void adam_fused_step_kernel<at::BFloat16, at::BFloat16>(
         for (; d < size; d++) {
           float param_val =
               at::vec::pack_bfloat16_float(param_ptr[d], param2_ptr[d]);
-          float grad_val = float(grad_ptr[d]) + param_val * weight_decay;
+          float grad_val =
+              float(grad_ptr[d]) * inv_scale + param_val * weight_decay;
           exp_avg_ptr[d] =
               exp_avg_ptr[d] * beta1 + grad_val * exp_avg_grad_coefficient;
           exp_avg_sq_ptr[d] = exp_avg_sq_ptr[d] * beta2 +
@@ -276,7 +284,8 @@ void adam_fused_step_kernel<float, at::BFloat16>(
     double beta2_double,
     double learning_rate_double,
     double weight_decay_double,
-    double eps_double) {
+    double eps_double,
+    double inv_scale_double) {
   TORCH_CHECK(
       param.scalar_type() == at::kFloat,
       "adam_fused_step_kernel: expect param to be at::Float");
@@ -315,6 +324,7 @@ void adam_fused_step_kernel<float, at::BFloat16>(
   float learning_rate = float(learning_rate_double);
   float weight_decay = float(weight_decay_double);
   float eps = float(eps_double);
+  float inv_scale = float(inv_scale_double);
 
   using bVec = at::vec::Vectorized<at::BFloat16>;
   using fVec = at::vec::Vectorized<float>;
@@ -339,6 +349,8 @@ void adam_fused_step_kernel<float, at::BFloat16>(
           bVec grad_bvec = bVec::loadu(grad_ptr + d);
           fVec grad_fvec, grad_fvec2;
           std::tie(grad_fvec, grad_fvec2) = convert_bfloat16_float(grad_bvec);
+          grad_fvec = grad_fvec * fVec(inv_scale);
+          grad_fvec2 = grad_fvec2 * fVec(inv_scale);
           // load param vec
           fVec param_fvec = fVec::loadu(param_ptr + d);
           fVec param_fvec2 = fVec::loadu(param_ptr + d + fVec::size());
@@ -392,7 +404,8 @@ void adam_fused_step_kernel<float, at::BFloat16>(
           param2_bvec.store(param2_ptr + d);
         }
         for (; d < size; d++) {
-          float grad_val = float(grad_ptr[d]) + param_ptr[d] * weight_decay;
+          float grad_val =
+              float(grad_ptr[d]) * inv_scale + param_ptr[d] * weight_decay;
           exp_avg_ptr[d] =
               exp_avg_ptr[d] * beta1 + grad_val * exp_avg_grad_coefficient;
           exp_avg_sq_ptr[d] = exp_avg_sq_ptr[d] * beta2 +
@@ -425,7 +438,8 @@ void adam_fused_step_kernel_impl(
     double beta2,
     double learning_rate,
     double weight_decay,
-    double eps) {
+    double eps,
+    double inv_scale) {
   auto param = param_.contiguous();
   auto exp_avg = exp_avg_.contiguous();
   auto exp_avg_sq = exp_avg_sq_.contiguous();
@@ -449,7 +463,8 @@ void adam_fused_step_kernel_impl(
         beta2,
         learning_rate,
         weight_decay,
-        eps);
+        eps,
+        inv_scale);
   } else if (at::ScalarType::Double == grad_dtype) {
     adam_fused_step_kernel<double, double>(
         param,
@@ -464,7 +479,8 @@ void adam_fused_step_kernel_impl(
         beta2,
         learning_rate,
         weight_decay,
-        eps);
+        eps,
+        inv_scale);
   } else if (
       at::ScalarType::BFloat16 == grad_dtype &&
       at::ScalarType::BFloat16 == param_dtype) {
@@ -481,7 +497,8 @@ void adam_fused_step_kernel_impl(
         beta2,
         learning_rate,
         weight_decay,
-        eps);
+        eps,
+        inv_scale);
   } else if (
       at::ScalarType::BFloat16 == grad_dtype &&
       at::ScalarType::Float == param_dtype) {
@@ -498,7 +515,8 @@ void adam_fused_step_kernel_impl(
         beta2,
         learning_rate,
         weight_decay,
-        eps);
+        eps,
+        inv_scale);
   } else {
     TORCH_CHECK(false, "expect bfloat16 or float or double param");
   }
@@ -30,7 +30,8 @@ void lamb_fused_step_kernel(
     double beta2,
     double learning_rate,
     double weight_decay,
-    double eps) {
+    double eps,
+    double inv_scale) {
   scalar_t* param_data = param.data_ptr<scalar_t>();
   scalar_t* exp_avg_data = exp_avg.data_ptr<scalar_t>();
   scalar_t* exp_avg_sq_data = exp_avg_sq.data_ptr<scalar_t>();
@@ -71,7 +72,7 @@ void lamb_fused_step_kernel(
 
         int64_t d = 0;
         for (; d < size - (size % Vec::size()); d += Vec::size()) {
-          Vec grad_vec = Vec::loadu(grad_ptr + d);
+          Vec grad_vec = Vec::loadu(grad_ptr + d) * Vec(scalar_t(inv_scale));
           Vec exp_avg_vec = Vec::loadu(exp_avg_ptr + d) * Vec(scalar_t(beta1)) +
               grad_vec * Vec(scalar_t(1 - beta1));
           Vec exp_avg_sq_vec =
@@ -94,9 +95,10 @@ void lamb_fused_step_kernel(
           sum2_vec = sum2_vec + adam_step_vec * adam_step_vec;
         }
         for (; d < size; d++) {
-          exp_avg_ptr[d] = exp_avg_ptr[d] * beta1 + grad_ptr[d] * (1 - beta1);
-          exp_avg_sq_ptr[d] = exp_avg_sq_ptr[d] * beta2 +
-              grad_ptr[d] * grad_ptr[d] * (1 - beta2);
+          scalar_t grad_val = grad_ptr[d] * inv_scale;
+          exp_avg_ptr[d] = exp_avg_ptr[d] * beta1 + grad_val * (1 - beta1);
+          exp_avg_sq_ptr[d] =
+              exp_avg_sq_ptr[d] * beta2 + grad_val * grad_val * (1 - beta2);
           scalar_t adam_step_val = (exp_avg_ptr[d] / bias_correction1) /
               (std::sqrt(exp_avg_sq_ptr[d] / bias_correction2) + eps);
 
@@ -169,7 +171,8 @@ void lamb_fused_step_kernel<at::BFloat16, at::BFloat16>(
     double beta2,
     double learning_rate,
     double weight_decay,
-    double eps) {
+    double eps,
+    double inv_scale) {
   TORCH_CHECK(
       param.scalar_type() == at::kBFloat16,
       "lamb_fused_step_kernel: expect param to be at::BFloat16");
@@ -237,6 +240,8 @@ void lamb_fused_step_kernel<at::BFloat16, at::BFloat16>(
       bVec grad_bvec = bVec::loadu(grad_ptr + d);
       fVec grad_fvec, grad_fvec2;
       std::tie(grad_fvec, grad_fvec2) = convert_bfloat16_float(grad_bvec);
+      grad_fvec = grad_fvec * fVec(float(inv_scale));
+      grad_fvec2 = grad_fvec2 * fVec(float(inv_scale));
 
       fVec exp_avg_fvec = fVec::loadu(exp_avg_ptr + d) * fVec(float(beta1)) +
           grad_fvec * fVec(float(1 - beta1));
@@ -280,7 +285,7 @@ void lamb_fused_step_kernel<at::BFloat16, at::BFloat16>(
       sum2_fvec += adam_step_fvec2 * adam_step_fvec2;
     }
     for (; d < size; d++) {
-      float grad_val = float(grad_ptr[d]);
+      float grad_val = float(grad_ptr[d]) * float(inv_scale);
       exp_avg_ptr[d] = exp_avg_ptr[d] * beta1 + grad_val * (1 - beta1);
       exp_avg_sq_ptr[d] =
           exp_avg_sq_ptr[d] * beta2 + grad_val * grad_val * (1 - beta2);
@@ -364,7 +369,8 @@ void lamb_fused_step_kernel<float, at::BFloat16>(
     double beta2,
     double learning_rate,
     double weight_decay,
-    double eps) {
+    double eps,
+    double inv_scale) {
   TORCH_CHECK(
       param.scalar_type() == at::kFloat,
       "lamb_fused_step_kernel: expect param to be at::Float");
@@ -431,6 +437,8 @@ void lamb_fused_step_kernel<float, at::BFloat16>(
       bVec grad_bvec = bVec::loadu(grad_ptr + d);
       fVec grad_fvec, grad_fvec2;
       std::tie(grad_fvec, grad_fvec2) = convert_bfloat16_float(grad_bvec);
+      grad_fvec = grad_fvec * fVec(float(inv_scale));
+      grad_fvec2 = grad_fvec2 * fVec(float(inv_scale));
 
       fVec exp_avg_fvec = fVec::loadu(exp_avg_ptr + d) * fVec(float(beta1)) +
           grad_fvec * fVec(float(1 - beta1));
@@ -471,7 +479,7 @@ void lamb_fused_step_kernel<float, at::BFloat16>(
       sum2_fvec += adam_step_fvec2 * adam_step_fvec2;
     }
     for (; d < size; d++) {
-      float grad_val = float(grad_ptr[d]);
+      float grad_val = float(grad_ptr[d]) * float(inv_scale);
       exp_avg_ptr[d] = exp_avg_ptr[d] * beta1 + grad_val * (1 - beta1);
       exp_avg_sq_ptr[d] =
           exp_avg_sq_ptr[d] * beta2 + grad_val * grad_val * (1 - beta2);
@@ -550,7 +558,8 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> lamb_fused_step_kernel_impl(
     double beta2,
     double learning_rate,
     double weight_decay,
-    double eps) {
+    double eps,
+    double inv_scale) {
   auto param = param_.contiguous();
   auto exp_avg = exp_avg_.contiguous();
   auto exp_avg_sq = exp_avg_sq_.contiguous();
@@ -571,7 +580,8 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> lamb_fused_step_kernel_impl(
         beta2,
         learning_rate,
         weight_decay,
-        eps);
+        eps,
+        inv_scale);
   } else if (at::ScalarType::Double == grad_dtype) {
     lamb_fused_step_kernel<double, double>(
         param,
@@ -584,7 +594,8 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> lamb_fused_step_kernel_impl(
         beta2,
         learning_rate,
         weight_decay,
-        eps);
+        eps,
+        inv_scale);
   } else if (
       at::ScalarType::BFloat16 == grad_dtype &&
       at::ScalarType::BFloat16 == param_dtype) {
@@ -599,7 +610,8 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> lamb_fused_step_kernel_impl(
         beta2,
         learning_rate,
         weight_decay,
-        eps);
+        eps,
+        inv_scale);
   } else if (
       at::ScalarType::BFloat16 == grad_dtype &&
       at::ScalarType::Float == param_dtype) {
@@ -614,7 +626,8 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> lamb_fused_step_kernel_impl(
         beta2,
         learning_rate,
         weight_decay,
-        eps);
+        eps,
+        inv_scale);
   } else {
     TORCH_CHECK(false, "expect bfloat16 or float or double param");
   }
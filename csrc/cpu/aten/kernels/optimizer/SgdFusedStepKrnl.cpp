@@ -22,7 +22,8 @@ void sgd_fused_step_kernel(
     double weight_decay,
     double dampening,
     bool nesterov,
-    bool momentum_buf_initialized) {
+    bool momentum_buf_initialized,
+    double inv_scale) {
   scalar_t* param_data = param.data_ptr<scalar_t>();
   scalar_t* grad_data = grad.data_ptr<scalar_t>();
   scalar_t* momentum_buf_data =
@@ -35,6 +36,7 @@ void sgd_fused_step_kernel(
   scalar_t weight_decay_val = scalar_t(weight_decay);
   scalar_t momentum_val = scalar_t(momentum);
   scalar_t learning_rate_val = scalar_t(learning_rate);
+  scalar_t inv_scale_val = scalar_t(inv_scale);
   // purely element-wise operations
   at::parallel_for(
       0, param.numel(), grain_size, [&](int64_t begin, int64_t end) {
@@ -47,8 +49,8 @@ void sgd_fused_step_kernel(
         int64_t d = 0;
         for (; d < size - (size % Vec::size()); d += Vec::size()) {
           Vec param_vec = Vec::loadu(param_ptr + d);
-          Vec grad_vec =
-              Vec::loadu(grad_ptr + d) + param_vec * Vec(weight_decay_val);
+          Vec grad_vec = Vec::loadu(grad_ptr + d) * Vec(inv_scale_val) +
+              param_vec * Vec(weight_decay_val);
 
           if (momentum != 0) {
             Vec momentum_vec;
@@ -70,7 +72,8 @@ void sgd_fused_step_kernel(
           param_vec.store(param_ptr + d);
         }
         for (; d < size; d++) {
-          scalar_t grad_val = grad_ptr[d] + param_ptr[d] * weight_decay_val;
+          scalar_t grad_val =
+              grad_ptr[d] * inv_scale_val + param_ptr[d] * weight_decay_val;
           if (momentum != 0) {
             if (!momentum_buf_initialized) {
               momentum_buf_ptr[d] = grad_val;
@@ -100,7 +103,8 @@ void sgd_fused_step_kernel<at::BFloat16, at::BFloat16>(
     double weight_decay,
     double dampening,
     bool nesterov,
-    bool momentum_buf_initialized) {
+    bool momentum_buf_initialized,
+    double inv_scale) {
   TORCH_CHECK(
       param.scalar_type() == at::kBFloat16,
       "sgd_fused_step_kernel: expect param to be at::BFloat16");
@@ -128,6 +132,7 @@ void sgd_fused_step_kernel<at::BFloat16, at::BFloat16>(
   float weight_decay_val = float(weight_decay);
   float momentum_val = float(momentum);
   float learning_rate_val = float(learning_rate);
+  float inv_scale_val = float(inv_scale);
   // purely element-wise operations
   at::parallel_for(
       0, param.numel(), grain_size, [&](int64_t begin, int64_t end) {
@@ -150,8 +155,10 @@ void sgd_fused_step_kernel<at::BFloat16, at::BFloat16>(
           fVec grad_fvec, grad_fvec2;
           std::tie(grad_fvec, grad_fvec2) = convert_bfloat16_float(grad_bvec);
 
-          grad_fvec = grad_fvec + param_fvec * fVec(weight_decay_val);
-          grad_fvec2 = grad_fvec2 + param_fvec2 * fVec(weight_decay_val);
+          grad_fvec = grad_fvec * fVec(inv_scale_val) +
+              param_fvec * fVec(weight_decay_val);
+          grad_fvec2 = grad_fvec2 * fVec(inv_scale_val) +
+              param_fvec2 * fVec(weight_decay_val);
 
           if (momentum != 0) {
             fVec momentum_vec, momentum_vec2;
@@ -188,7 +195,8 @@ void sgd_fused_step_kernel<at::BFloat16, at::BFloat16>(
         for (; d < size; d++) {
           float param_val =
               at::vec::pack_bfloat16_float(param_ptr[d], param2_ptr[d]);
-          float grad_val = float(grad_ptr[d]) + param_val * weight_decay_val;
+          float grad_val =
+              float(grad_ptr[d]) * inv_scale_val + param_val * weight_decay_val;
           if (momentum != 0) {
             if (!momentum_buf_initialized) {
               momentum_buf_ptr[d] = grad_val;
@@ -220,7 +228,8 @@ void sgd_fused_step_kernel<float, at::BFloat16>(
     double weight_decay,
     double dampening,
     bool nesterov,
-    bool momentum_buf_initialized) {
+    bool momentum_buf_initialized,
+    double inv_scale) {
   TORCH_CHECK(
       param.scalar_type() == at::kFloat,
       "sgd_fused_step_kernel: expect param to be at::kFloat");
@@ -248,6 +257,7 @@ void sgd_fused_step_kernel<float, at::BFloat16>(
   float weight_decay_val = float(weight_decay);
   float momentum_val = float(momentum);
   float learning_rate_val = float(learning_rate);
+  float inv_scale_val = float(inv_scale);
   // purely element-wise operations
   at::parallel_for(
       0, param.numel(), grain_size, [&](int64_t begin, int64_t end) {
@@ -266,8 +276,10 @@ void sgd_fused_step_kernel<float, at::BFloat16>(
           fVec grad_fvec, grad_fvec2;
           std::tie(grad_fvec, grad_fvec2) = convert_bfloat16_float(grad_bvec);
 
-          grad_fvec = grad_fvec + param_fvec * fVec(weight_decay_val);
-          grad_fvec2 = grad_fvec2 + param_fvec2 * fVec(weight_decay_val);
+          grad_fvec = grad_fvec * fVec(inv_scale_val) +
+              param_fvec * fVec(weight_decay_val);
+          grad_fvec2 = grad_fvec2 * fVec(inv_scale_val) +
+              param_fvec2 * fVec(weight_decay_val);
 
           if (momentum != 0) {
             fVec momentum_vec, momentum_vec2;
@@ -304,7 +316,8 @@ void sgd_fused_step_kernel<float, at::BFloat16>(
         }
         for (; d < size; d++) {
           float param_val = param_ptr[d];
-          float grad_val = float(grad_ptr[d]) + param_val * weight_decay_val;
+          float grad_val =
+              float(grad_ptr[d]) * inv_scale_val + param_val * weight_decay_val;
           if (momentum != 0) {
             if (!momentum_buf_initialized) {
               momentum_buf_ptr[d] = grad_val;
@@ -334,7 +347,8 @@ c10::optional<at::Tensor> sgd_fused_step_kernel_impl(
     double learning_rate,
     double weight_decay,
     double dampening,
-    bool nesterov) {
+    bool nesterov,
+    double inv_scale) {
   auto param = param_.contiguous();
   auto grad = grad_.contiguous();
   auto param2 = param2_.contiguous();
@@ -366,7 +380,8 @@ c10::optional<at::Tensor> sgd_fused_step_kernel_impl(
         weight_decay,
         dampening,
         nesterov,
-        momentum_buf_initialized);
+        momentum_buf_initialized,
+        inv_scale);
   } else if (at::ScalarType::Double == grad_dtype) {
     sgd_fused_step_kernel<double, double>(
         param,
@@ -378,7 +393,8 @@ c10::optional<at::Tensor> sgd_fused_step_kernel_impl(
         weight_decay,
         dampening,
         nesterov,
-        momentum_buf_initialized);
+        momentum_buf_initialized,
+        inv_scale);
   } else if (
       at::ScalarType::BFloat16 == grad_dtype &&
       at::ScalarType::BFloat16 == param_dtype) {
@@ -392,7 +408,8 @@ c10::optional<at::Tensor> sgd_fused_step_kernel_impl(
         weight_decay,
         dampening,
         nesterov,
-        momentum_buf_initialized);
+        momentum_buf_initialized,
+        inv_scale);
   } else if (
       at::ScalarType::BFloat16 == grad_dtype &&
       at::ScalarType::Float == param_dtype) {
@@ -406,7 +423,8 @@ c10::optional<at::Tensor> sgd_fused_step_kernel_impl(
         weight_decay,
         dampening,
         nesterov,
-        momentum_buf_initialized);
+        momentum_buf_initialized,
+        inv_scale);
   } else {
     TORCH_CHECK(false, "expect bfloat16 or float or double param");
   }
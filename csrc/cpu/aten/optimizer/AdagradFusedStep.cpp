@@ -17,7 +17,8 @@ std::tuple<at::Tensor, at::Tensor> adagrad_fused_step(
     double learning_rate,
     double weight_decay,
     double lr_decay,
-    double eps) {
+    double eps,
+    double inv_scale) {
   RECORD_FUNCTION(
       "torch_ipex::adagrad_fused_step", c10::ArrayRef<c10::IValue>({}));
 
@@ -57,7 +58,8 @@ std::tuple<at::Tensor, at::Tensor> adagrad_fused_step(
       learning_rate,
       weight_decay,
       lr_decay,
-      eps);
+      eps,
+      inv_scale);
   */
   return adagrad_fused_step_kernel_stub(
       kCPU,
@@ -69,7 +71,8 @@ std::tuple<at::Tensor, at::Tensor> adagrad_fused_step(
       learning_rate,
       weight_decay,
       lr_decay,
-      eps);
+      eps,
+      inv_scale);
 }
 
 } // namespace cpu
@@ -81,7 +84,8 @@ TORCH_LIBRARY_FRAGMENT(torch_ipex, m) {
   m.def(
       "adagrad_fused_step(Tensor(a!) param, Tensor grad, Tensor(b!) "
       "state_sum, Tensor trail, float step, float lr, float weight_decay, "
-      "float lr_decay, float eps) -> (Tensor(a!), Tensor(b!))",
+      "float lr_decay, float eps, float inv_scale=1.0) -> (Tensor(a!), "
+      "Tensor(b!))",
       torch_ipex::cpu::adagrad_fused_step);
 }
 
@@ -2,7 +2,6 @@
 
 #include <torch/all.h>
 #include <torch/csrc/autograd/function.h>
-#include "csrc/utils/CustomOperatorRegistration.h"
 
 namespace torch_ipex {
 namespace cpu {
@@ -20,7 +19,8 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> lamb_fused_step(
     double beta2,
     double learning_rate,
     double weight_decay,
-    double eps) {
+    double eps,
+    double inv_scale) {
   RECORD_FUNCTION(
       "torch_ipex::lamb_fused_step", c10::ArrayRef<c10::IValue>({}));
 
@@ -69,7 +69,8 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> lamb_fused_step(
       beta2,
       learning_rate,
       weight_decay,
-      eps);
+      eps,
+      inv_scale);
   */
   return lamb_fused_step_kernel_stub(
       kCPU,
@@ -83,7 +84,8 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> lamb_fused_step(
       beta2,
       learning_rate,
       weight_decay,
-      eps);
+      eps,
+      inv_scale);
 }
 
 } // namespace cpu
@@ -91,11 +93,15 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> lamb_fused_step(
 
 namespace {
 
-IPEX_LIBRARY_FRAGMENT() {
-  IPEX_OP_IPEX_REGISTER_DISPATCH(
-      "lamb_fused_step",
-      torch_ipex::cpu::lamb_fused_step,
-      at::DispatchKey::CPU);
+TORCH_LIBRARY_FRAGMENT(torch_ipex, m) {
+  m.def(
+      torch::schema(
+          "lamb_fused_step(Tensor param, Tensor exp_avg, Tensor exp_avg_sq, "
+          "Tensor grad, Tensor trail, int step, float beta1, float beta2, "
+          "float learning_rate, float weight_decay, float eps, "
+          "float inv_scale=1.0) -> (Tensor, Tensor, Tensor)",
+          c10::AliasAnalysisKind::CONSERVATIVE),
+      torch_ipex::cpu::lamb_fused_step);
 }
 
 } // namespace
@@ -2,7 +2,6 @@
 
 #include <torch/all.h>
 #include <torch/csrc/autograd/function.h>
-#include "csrc/utils/CustomOperatorRegistration.h"
 
 namespace torch_ipex {
 namespace cpu {
@@ -23,6 +22,8 @@ IPEX_DEFINE_DISPATCH(sgd_fused_step_kernel_stub);
  *@param weight_decay Args for regularization to avoid over-fit.
  *@param dampening Attribute for momentum.
  *@param nesterov Attribute for momentum.
+ *@param inv_scale Factor the grad is multiplied by as it is loaded, the
+ *inverse of the loss scale of the grads.
  */
 c10::optional<at::Tensor> sgd_fused_step(
     at::Tensor& param_,
@@ -33,7 +34,8 @@ c10::optional<at::Tensor> sgd_fused_step(
     double learning_rate,
     double weight_decay,
     double dampening,
-    bool nesterov) {
+    bool nesterov,
+    double inv_scale) {
   RECORD_FUNCTION("torch_ipex::sgd_fused_step", c10::ArrayRef<c10::IValue>({}));
 
   TORCH_CHECK(
@@ -69,7 +71,8 @@ c10::optional<at::Tensor> sgd_fused_step(
       learning_rate,
       weight_decay,
       dampening,
-      nesterov);
+      nesterov,
+      inv_scale);
   */
   return sgd_fused_step_kernel_stub(
       kCPU,
@@ -81,15 +84,22 @@ c10::optional<at::Tensor> sgd_fused_step(
       learning_rate,
       weight_decay,
       dampening,
-      nesterov);
+      nesterov,
+      inv_scale);
 }
 
 } // namespace cpu
 } // namespace torch_ipex
 
 namespace {
-IPEX_LIBRARY_FRAGMENT() {
-  IPEX_OP_IPEX_REGISTER_DISPATCH(
-      "sgd_fused_step", torch_ipex::cpu::sgd_fused_step, at::DispatchKey::CPU);
+TORCH_LIBRARY_FRAGMENT(torch_ipex, m) {
+  m.def(
+      torch::schema(
+          "sgd_fused_step(Tensor param, Tensor grad, Tensor? momentum_buf, "
+          "Tensor trail, float momentum, float learning_rate, "
+          "float weight_decay, float dampening, bool nesterov, "
+          "float inv_scale=1.0) -> Tensor?",
+          c10::AliasAnalysisKind::CONSERVATIVE),
+      torch_ipex::cpu::sgd_fused_step);
 }
 } // namespace
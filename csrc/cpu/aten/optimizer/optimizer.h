@@ -18,7 +18,8 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> lamb_fused_step_kernel_impl(
     double beta2,
     double learning_rate,
     double weight_decay,
-    double eps);
+    double eps,
+    double inv_scale);
 
 std::tuple<at::Tensor, at::Tensor> adagrad_fused_step_kernel_impl(
     const at::Tensor& param_,
@@ -29,7 +30,8 @@ std::tuple<at::Tensor, at::Tensor> adagrad_fused_step_kernel_impl(
     double learning_rate,
     double weight_decay,
     double lr_decay,
-    double eps);
+    double eps,
+    double inv_scale);
 
 c10::optional<at::Tensor> sgd_fused_step_kernel_impl(
     at::Tensor& param_,
@@ -40,7 +42,8 @@ c10::optional<at::Tensor> sgd_fused_step_kernel_impl(
     double learning_rate,
     double weight_decay,
     double dampening,
-    bool nesterov);
+    bool nesterov,
+    double inv_scale);
 
 at::Tensor packed_add_kernel_impl(
     at::Tensor& top_half,
@@ -61,7 +64,8 @@ void adam_fused_step_kernel_impl(
     double beta2,
     double learning_rate,
     double weight_decay,
-    double eps);
+    double eps,
+    double inv_scale);
 
 } // namespace
 
@@ -74,6 +78,7 @@ using adagrad_fused_step_kernel_fn = std::tuple<at::Tensor, at::Tensor> (*)(
     double,
     double,
     double,
+    double,
     double);
 IPEX_DECLARE_DISPATCH(
     adagrad_fused_step_kernel_fn,
@@ -91,6 +96,7 @@ using lamb_fused_step_kernel_fn =
         double,
         double,
         double,
+        double,
         double);
 IPEX_DECLARE_DISPATCH(lamb_fused_step_kernel_fn, lamb_fused_step_kernel_stub);
 
@@ -103,7 +109,8 @@ using sgd_fused_step_kernel_fn = c10::optional<at::Tensor> (*)(
     double,
     double,
     double,
-    bool);
+    bool,
+    double);
 IPEX_DECLARE_DISPATCH(sgd_fused_step_kernel_fn, sgd_fused_step_kernel_stub);
 
 using packed_add_kernel_fn =
@@ -123,6 +130,7 @@ using adam_fused_step_kernel_fn = void (*)(
     double,
     double,
     double,
+    double,
     double);
 IPEX_DECLARE_DISPATCH(adam_fused_step_kernel_fn, adam_fused_step_kernel_stub);
 
@@ -204,6 +204,25 @@ class Messenger {
     return at::cat(vec_data_out, -1);
   }
 
+  /**
+   * Sums the input tensors of all ranks and scatters the result: rank i gets
+   * the i-th of the world size equal parts of the flattened sum.
+   *
+   * @param t_in The input tensor, same shape on all ranks.
+   * @param t_out The output tensor of t_in.numel() / world size elements.
+   */
+  void reduceScatterAdd(at::Tensor& t_in, at::Tensor& t_out) {
+    RECORD_FUNCTION("ccl::reduce_scatter", std::vector<c10::IValue>());
+    ccl::reduce_scatter(
+        t_in.data_ptr(),
+        t_out.data_ptr(),
+        (size_t)t_out.numel(),
+        get_ccl_dtype(t_in.scalar_type()),
+        ccl::reduction::sum,
+        *pcomm)
+        .wait();
+  }
+
   void barrier() {
     if (check()) {
       ccl::barrier(*pcomm);
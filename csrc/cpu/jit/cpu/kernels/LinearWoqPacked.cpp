@@ -169,6 +169,38 @@ c10::intrusive_ptr<WoqLinearOpContext> createWoqLinearPrePackOpContextInt4(
       act_quant_mode);
 }
 
+c10::intrusive_ptr<WoqLinearOpContext>
+createWoqLinearPrePackOpContextFromPacked(
+    at::Tensor&& packed_weight,
+    int64_t weight_dtype,
+    std::vector<int64_t>&& weight_shape,
+    at::Tensor&& scales,
+    c10::optional<at::Tensor>&& zero_points,
+    c10::optional<at::Tensor>&& bias,
+    c10::optional<at::Tensor>&& g_idx,
+    int64_t group_size,
+    int64_t lowp_mode,
+    int64_t act_quant_mode) {
+  RECORD_FUNCTION(
+      "ipex_prepack::createWoqLinearPrePackOpContextFromPacked",
+      c10::ArrayRef<c10::IValue>({}));
+  // The weight is bound as is, e.g., to a memory-mapped buffer, without being
+  // packed or copied again.
+  return c10::make_intrusive<IpexWoqLinearOpContext>(
+      c10::nullopt,
+      create_from_packed(
+          packed_weight,
+          weight_dtype,
+          weight_shape,
+          scales,
+          zero_points,
+          bias,
+          g_idx,
+          group_size,
+          lowp_mode,
+          act_quant_mode));
+}
+
 at::Tensor woq_linear_run(
     const at::Tensor& input,
     c10::intrusive_ptr<WoqLinearOpContext> op_context) {
@@ -191,8 +223,6 @@ ContextLinearWoq create(
     int64_t lowp_mode,
     int64_t act_quant_mode) {
   at::Tensor packed_weight;
-  int64_t N = weight_shape[0];
-  int64_t K = weight_shape[1];
   bool is_4bit =
       (weight_dtype == WOQ_DTYPE_INT4 || weight_dtype == WOQ_DTYPE_NF4);
   // GPTQ with act-order
@@ -207,6 +237,33 @@ ContextLinearWoq create(
     packed_weight = woq_linear_pack_weight(
         weight, weight_dtype, weight_shape, group_size, lowp_mode);
   }
+  return create_from_packed(
+      packed_weight,
+      weight_dtype,
+      weight_shape,
+      scales,
+      zero_points,
+      bias,
+      g_idx,
+      group_size,
+      lowp_mode,
+      act_quant_mode);
+}
+
+ContextLinearWoq create_from_packed(
+    at::Tensor& packed_weight,
+    int64_t weight_dtype,
+    std::vector<int64_t>& weight_shape,
+    at::Tensor& scales,
+    c10::optional<at::Tensor>& zero_points,
+    c10::optional<at::Tensor>& bias,
+    c10::optional<at::Tensor>& g_idx,
+    int64_t group_size,
+    int64_t lowp_mode,
+    int64_t act_quant_mode) {
+  int64_t N = weight_shape[0];
+  bool is_4bit =
+      (weight_dtype == WOQ_DTYPE_INT4 || weight_dtype == WOQ_DTYPE_NF4);
   auto packed_shape = packed_weight.sizes();
   // If OC is not a multiple of BLOCK_N, it may be padded.
   bool oc_is_padded = (packed_shape.size() == 4 && is_4bit &&
@@ -34,6 +34,21 @@ c10::intrusive_ptr<WoqLinearOpContext> createWoqLinearPrePackOpContextInt4(
     int64_t lowp_mode,
     int64_t act_quant_mode);
 
+// Creates the op context from a weight packed by woq_linear_pack_weight
+// with the same ISA. Scales, zero points and bias are not padded.
+c10::intrusive_ptr<WoqLinearOpContext>
+createWoqLinearPrePackOpContextFromPacked(
+    at::Tensor&& packed_weight,
+    int64_t weight_dtype,
+    std::vector<int64_t>&& weight_shape,
+    at::Tensor&& scales,
+    c10::optional<at::Tensor>&& zero_points,
+    c10::optional<at::Tensor>&& bias,
+    c10::optional<at::Tensor>&& g_idx,
+    int64_t group_size,
+    int64_t lowp_mode,
+    int64_t act_quant_mode);
+
 at::Tensor woq_linear_run(
     const at::Tensor& input,
     c10::intrusive_ptr<WoqLinearOpContext> op_context);
@@ -51,6 +66,18 @@ ContextLinearWoq create(
     int64_t lowp_mode,
     int64_t act_quant_mode);
 
+ContextLinearWoq create_from_packed(
+    at::Tensor& packed_weight,
+    int64_t weight_dtype,
+    std::vector<int64_t>& weight_shape,
+    at::Tensor& scales,
+    c10::optional<at::Tensor>& zero_points,
+    c10::optional<at::Tensor>& bias,
+    c10::optional<at::Tensor>& g_idx,
+    int64_t group_size,
+    int64_t lowp_mode,
+    int64_t act_quant_mode);
+
 at::Tensor run(ContextLinearWoq& context, const at::Tensor& input);
 
 at::Tensor run_eltwise(
@@ -16,6 +16,7 @@ using detail::linear::createLinearPrePackOpContext;
 using detail::mkl_sgemm::createLinearMKLPrePackOpContext;
 #ifdef USE_LIBXSMM
 using detail::woq_linear::createWoqLinearPrePackOpContext;
+using detail::woq_linear::createWoqLinearPrePackOpContextFromPacked;
 using detail::woq_linear::createWoqLinearPrePackOpContextInt4;
 #endif
 
@@ -186,6 +187,9 @@ TORCH_LIBRARY(ipex_prepack, m) {
   m.def(
       "weight_only_qlinear_prepack_int4(Tensor W, Tensor scales, Tensor zero_points, Tensor? B, Tensor? g_idx, int? batch_size, int group_size, int lowp_mode, int act_quant_mode) "
       "-> __torch__.torch.classes.ipex_prepack.WoqLinearOpContext");
+  m.def(
+      "weight_only_qlinear_prepack_from_packed(Tensor packed_W, int W_dtype, int[] W_shape, Tensor scales, Tensor? zero_points, Tensor? B, Tensor? g_idx, int group_size, int lowp_mode, int act_quant_mode) "
+      "-> __torch__.torch.classes.ipex_prepack.WoqLinearOpContext");
 #endif
 }
 
@@ -206,6 +210,11 @@ TORCH_LIBRARY_IMPL(ipex_prepack, CPU, m) {
       "weight_only_qlinear_prepack_int4",
       TORCH_FN(createWoqLinearPrePackOpContextInt4));
 }
+TORCH_LIBRARY_IMPL(ipex_prepack, CPU, m) {
+  m.impl(
+      "weight_only_qlinear_prepack_from_packed",
+      TORCH_FN(createWoqLinearPrePackOpContextFromPacked));
+}
 #endif
 } // namespace cpu
 } // namespace torch_ipex
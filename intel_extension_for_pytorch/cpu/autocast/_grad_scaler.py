@@ -92,6 +92,11 @@ class GradScaler(object):
             that must occur for the scale to be multiplied by ``growth_factor``.
         enabled (bool, optional, default=True):  If ``False``, disables gradient scaling. :meth:`step` simply
             invokes the underlying ``optimizer.step()``, and other methods become no-ops.
+        fused (bool, optional, default=False):  If ``True``, :meth:`step` passes ``inv_scale`` and ``found_inf``
+            to the fused step of an optimizer returned by ``ipex.optimize`` instead of calling :meth:`unscale_`.
+            The step only reads the grads to look for infs/NaNs, and the SGD, Adam, Adagrad and Lamb update
+            kernels unscale them as they load them, so the grads are left scaled after the step.
+            Ignored for other optimizers, for fp16 master weights and when :meth:`unscale_` was called explicitly.
     """
 
     def __init__(
@@ -101,8 +106,10 @@ class GradScaler(object):
         backoff_factor=0.5,
         growth_interval=2000,
         enabled=True,
+        fused=False,
     ):
         self._enabled = enabled
+        self._fused = fused
 
         if self._enabled:
             assert growth_factor > 1.0, "The growth factor must be > 1.0."
@@ -334,6 +341,26 @@ class GradScaler(object):
             optimizer_state["stage"] = OptState.STEPPED
             return retval
 
+        if (
+            self._fused
+            and optimizer_state["stage"] is OptState.READY
+            and getattr(optimizer, "_step_supports_inv_scale", False)
+            and not hasattr(optimizer, "sync_grad")
+        ):
+            # The fused step checks the grads for infs/NaNs, skips the update if any is found and unscales them
+            # in the update kernels otherwise.
+            assert self._scale is not None
+            inv_scale = self._scale.double().reciprocal().float()
+            found_inf = torch.full(
+                (1,), 0.0, dtype=torch.float32, device=self._scale.device
+            )
+            retval = optimizer.step(
+                *args, **dict(kwargs, inv_scale=inv_scale, found_inf=found_inf)
+            )
+            optimizer_state["found_inf_per_device"] = {found_inf.device: found_inf}
+            optimizer_state["stage"] = OptState.STEPPED
+            return retval
+
         if optimizer_state["stage"] is OptState.READY:
             self.unscale_(optimizer)
 
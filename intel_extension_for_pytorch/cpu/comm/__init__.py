@@ -6,3 +6,4 @@ get_rank = torch_ipex_cpp.get_rank
 barrier = torch_ipex_cpp.barrier
 allreduce_add = torch.ops.torch_ipex.all_reduce_add
 allgather = torch.ops.torch_ipex.allgather
+reduce_scatter_add = torch.ops.torch_ipex.reduce_scatter_add
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import tempfile
+import torch
+import intel_extension_for_pytorch._C as core
+from ..utils._logger import logger, WarningType
+
+# Directory of the graph cache used when no cache_dir is given explicitly
+GRAPH_CACHE_DIR_ENV = "IPEX_GRAPH_CACHE_DIR"
+
+# Number of elements of each weight hashed into the weights fingerprint
+_NUM_FINGERPRINT_SAMPLES = 256
+
+
+def _update_with_tensor(h, tensor):
+    # Returns False if the content of the tensor can't be read
+    h.update(str((tuple(tensor.shape), tensor.dtype, tensor.layout)).encode())
+    if tensor.is_meta or tensor.numel() == 0:
+        return True
+    tensor = tensor.detach()
+    if tensor.is_quantized:
+        tensor = tensor.dequantize()
+    if tensor.layout != torch.strided:
+        # Opaque tensors (e.g., mkldnn) are fingerprinted through a dense copy
+        try:
+            tensor = tensor.to_dense()
+        except RuntimeError:
+            return False
+    try:
+        # Hashing every byte of a LLM checkpoint is slow, so only evenly strided
+        # elements are hashed, together with the sum to catch changes elsewhere.
+        flat = tensor.reshape(-1)
+        step = max(flat.numel() // _NUM_FINGERPRINT_SAMPLES, 1)
+        samples = flat[::step].to(torch.float64)
+        h.update(samples.numpy().tobytes())
+        h.update(str(flat.sum(dtype=torch.float64).item()).encode())
+    except RuntimeError:
+        return False
+    return True
+
+
+def _update_with_inputs(h, obj):
+    if isinstance(obj, torch.Tensor):
+        h.update(
+            str(
+                (torch.Tensor, tuple(obj.shape), obj.dtype, obj.is_contiguous())
+            ).encode()
+        )
+    elif isinstance(obj, (list, tuple)):
+        h.update(str((type(obj), len(obj))).encode())
+        for value in obj:
+            _update_with_inputs(h, value)
+    elif isinstance(obj, dict):
+        h.update(str((dict, len(obj))).encode())
+        for key, value in obj.items():
+            h.update(str(key).encode())
+            _update_with_inputs(h, value)
+    else:
+        h.update(repr(obj).encode())
+
+
+def get_graph_cache_key(model, inputs, dtype, extra=None):
+    r"""
+    Returns the content-addressed key of the graph traced from ``model`` on ``inputs``.
+    The key changes with the model structure, the weights, the dtype, the versions
+    of IPEX and PyTorch, the ISA level of the CPU, and the shapes and dtypes of the
+    inputs. Returns None if a weight can't be read, the graph is not cached then.
+    """
+    from .. import __version__
+
+    h = hashlib.sha256()
+    h.update(
+        str(
+            (
+                __version__,
+                torch.__version__,
+                core._get_current_isa_level(),
+                dtype,
+                extra,
+            )
+        ).encode()
+    )
+    h.update(type(model).__module__.encode())
+    h.update(type(model).__qualname__.encode())
+    h.update(str(model).encode())
+    for name, tensor in model.state_dict(keep_vars=False).items():
+        h.update(name.encode())
+        if isinstance(tensor, torch.Tensor) and not _update_with_tensor(h, tensor):
+            logger.debug(f"bypass the graph cache, fail to read the weight {name}.")
+            return None
+    _update_with_inputs(h, inputs)
+    return h.hexdigest()
+
+
+class GraphCache(object):
+    r"""
+    On-disk cache of frozen TorchScript graphs. Every graph is stored in
+    ``<cache_dir>/<key>.pt`` with ``torch.jit.save``, including the prepacked
+    weights frozen into it. A file which fails to load is removed, so that
+    the graph is traced and saved again.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".pt")
+
+    def load(self, key):
+        if key is None:
+            # the key of a model whose weights can't be read
+            return None
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            graph = torch.jit.load(path)
+            logger.debug(f"load graph from cache {path}.")
+            return graph
+        except Exception as e:
+            logger.warning(
+                f"fail to load the cached graph {path} due to: {e}, it will be traced again",
+                _type=WarningType.NotSupported,
+            )
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def save(self, key, graph):
+        path = self._path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to a temporary file and rename it, so that a concurrent or
+            # killed process never leaves a partial graph under the key.
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            os.close(fd)
+            try:
+                torch.jit.save(graph, tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            logger.debug(f"save graph to cache {path}.")
+        except Exception as e:
+            logger.warning(
+                f"fail to save the graph to cache {path} due to: {e}",
+                _type=WarningType.NotSupported,
+            )
+
+
+def get_graph_cache(cache_dir=None):
+    r"""
+    Returns the GraphCache of ``cache_dir``, or of the ``IPEX_GRAPH_CACHE_DIR``
+    environment variable if ``cache_dir`` is None. Returns None if neither is set.
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get(GRAPH_CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+    return GraphCache(os.path.expanduser(cache_dir))
@@ -1,3 +1,4 @@
+import collections
 import copy
 import torch
 from torch._dynamo.backends.common import fake_tensor_unsupported
@@ -9,6 +10,7 @@ from typing import List
 import functools
 import threading
 import warnings
+from .graph_cache import get_graph_cache, get_graph_cache_key
 from ..utils._logger import logger, WarningType
 
 
@@ -19,14 +21,251 @@ class RunMethods(IntEnum):
     EagerTrain = 4
 
 
+def _map_tensors(fn, obj):
+    if isinstance(obj, torch.Tensor):
+        return fn(obj)
+    if isinstance(obj, (list, tuple)):
+        mapped = [_map_tensors(fn, value) for value in obj]
+        return tuple(mapped) if isinstance(obj, tuple) else mapped
+    if isinstance(obj, dict):
+        return {key: _map_tensors(fn, value) for key, value in obj.items()}
+    return obj
+
+
+def _get_signature(obj):
+    if isinstance(obj, torch.Tensor):
+        return (tuple(obj.shape), obj.dtype, obj.is_contiguous())
+    if isinstance(obj, (list, tuple)):
+        return (type(obj), tuple(_get_signature(value) for value in obj))
+    if isinstance(obj, dict):
+        return (dict, tuple((k, _get_signature(v)) for k, v in obj.items()))
+    return repr(obj)
+
+
+def _get_shapes(obj):
+    shapes = []
+
+    def collect_shape(tensor):
+        shapes.append(tuple(tensor.shape))
+        return tensor
+
+    _map_tensors(collect_shape, obj)
+    return shapes
+
+
+def _pad_tensor(tensor, padded_shape):
+    # Zero pads the tensor at the end of every dim up to padded_shape
+    if tuple(tensor.shape) == padded_shape:
+        return tensor
+    memory_format = (
+        torch.channels_last
+        if tensor.dim() == 4
+        and not tensor.is_contiguous()
+        and tensor.is_contiguous(memory_format=torch.channels_last)
+        else torch.contiguous_format
+    )
+    padded = tensor.new_zeros(padded_shape).contiguous(memory_format=memory_format)
+    view = padded
+    for dim, size in enumerate(tensor.shape):
+        view = view.narrow(dim, 0, size)
+    view.copy_(tensor)
+    return padded
+
+
 class GraphCapture(object):
-    def __init__(self, model, train, dtype, weights_prepack):
+    def __init__(
+        self,
+        model,
+        train,
+        dtype,
+        weights_prepack,
+        cache_dir=None,
+        buckets=None,
+        max_num_graphs=8,
+    ):
         self.model = copy.deepcopy(model)
         self.train = train
         self.dtype = dtype
         self.weights_prepack = weights_prepack
         self.method = None
         self.lock = threading.Lock()
+        # Graphs generated by JIT trace are reused across processes if a cache
+        # directory is given or set by the IPEX_GRAPH_CACHE_DIR environment variable.
+        self.graph_cache = get_graph_cache(cache_dir)
+        # Shape-bucketed capture: the inputs are zero padded along every dim of
+        # buckets up to the next bucket size, and one graph is kept per padded
+        # input signature in a LRU of max_num_graphs graphs.
+        self.buckets = None
+        if buckets is not None:
+            assert isinstance(buckets, dict) and all(
+                isinstance(dim, int) and dim >= 0 and len(sizes) > 0
+                for dim, sizes in buckets.items()
+            ), "buckets must map non-negative input dims to lists of bucket sizes"
+            self.buckets = {dim: sorted(sizes) for dim, sizes in buckets.items()}
+        assert max_num_graphs >= 1, "max_num_graphs must be a positive integer"
+        self.max_num_graphs = max_num_graphs
+        self.graphs = collections.OrderedDict()
+        self.bucket_stats = {"hit": 0, "miss": 0, "eager": 0}
+
+    def get_bucket_stats(self):
+        r"""
+        Returns the counters of the shape-bucketed capture: ``hit`` for the inputs
+        run by a captured graph, ``miss`` for the inputs a graph was captured for,
+        and ``eager`` for the inputs run by the original model, as their shapes are
+        out of the buckets or their graph failed to be captured.
+        """
+        with self.lock:
+            return dict(self.bucket_stats)
+
+    def _bucket_inputs(self, input, kwargs):
+        # Returns the padded inputs, the (size, padded size) of every bucketed dim and
+        # the signature of the padded inputs, or None if the shapes are out of buckets.
+        sizes = {}
+
+        def collect_sizes(tensor):
+            for dim in self.buckets:
+                if tensor.dim() > dim:
+                    sizes.setdefault(dim, set()).add(tensor.size(dim))
+            return tensor
+
+        _map_tensors(collect_sizes, (input, kwargs))
+        pads = {}
+        for dim, dim_sizes in sizes.items():
+            # The inputs need a common size along a bucketed dim to unpad the outputs
+            if len(dim_sizes) != 1:
+                return None
+            size = dim_sizes.pop()
+            padded_size = next((b for b in self.buckets[dim] if b >= size), None)
+            if padded_size is None:
+                return None
+            pads[dim] = (size, padded_size)
+
+        def pad(tensor):
+            padded_shape = tuple(
+                pads[dim][1] if dim in pads else size
+                for dim, size in enumerate(tensor.shape)
+            )
+            return _pad_tensor(tensor, padded_shape)
+
+        padded_input, padded_kwargs = _map_tensors(pad, (input, kwargs))
+        return (
+            padded_input,
+            padded_kwargs,
+            pads,
+            _get_signature((padded_input, padded_kwargs)),
+        )
+
+    def _capture_bucket(self, input, kwargs):
+        cache_key = None
+        if self.graph_cache is not None:
+            cache_key = get_graph_cache_key(
+                self.model,
+                (input, kwargs),
+                self.dtype,
+                extra=(RunMethods.JIT, self.weights_prepack),
+            )
+            graph = self.graph_cache.load(cache_key)
+            if graph is not None:
+                return graph
+        try:
+            with warnings.catch_warnings():
+                warnings.filterwarnings("error", category=TracerWarning)
+                graph = torch.jit.trace(self.model.eval(), input).eval()
+                graph = torch.jit.freeze(graph)
+        except BaseException:
+            logger.warning(
+                "JIT trace failed for a bucket of input shapes, fallback to original model for it.",
+                _type=WarningType.NotSupported,
+            )
+            return None
+        logger.debug("generate graph by JIT trace for a bucket of input shapes.")
+        if cache_key is not None:
+            self.graph_cache.save(cache_key, graph)
+        return graph
+
+    def _get_unpad_dims(self, graph, input, kwargs, pads):
+        # Returns the {output dim: input dim} of every output tensor for its dims which
+        # follow a padded input dim. They are found by running the original model with
+        # one more element along each padded input dim: an output dim follows it if its
+        # size grows from the padded size by one as well. Returns None if an output dim
+        # depends on a padded input dim in another way, the outputs can't be unpadded.
+        shapes = _get_shapes(graph(*input, **kwargs))
+        unpad_dims = [{} for _ in shapes]
+        for dim, (_, padded_size) in pads.items():
+
+            def grow(tensor):
+                if tensor.dim() <= dim:
+                    return tensor
+                shape = list(tensor.shape)
+                shape[dim] += 1
+                return _pad_tensor(tensor, tuple(shape))
+
+            probe_input, probe_kwargs = _map_tensors(grow, (input, kwargs))
+            try:
+                probe_shapes = _get_shapes(self.model(*probe_input, **probe_kwargs))
+            except BaseException:
+                return None
+            if len(probe_shapes) != len(shapes):
+                return None
+            for out_dims, shape, probe_shape in zip(unpad_dims, shapes, probe_shapes):
+                if len(shape) != len(probe_shape):
+                    return None
+                for out_dim, (size, probe_size) in enumerate(zip(shape, probe_shape)):
+                    if size == probe_size:
+                        continue
+                    if (
+                        size != padded_size
+                        or probe_size != padded_size + 1
+                        or out_dim in out_dims
+                    ):
+                        return None
+                    out_dims[out_dim] = dim
+        return unpad_dims
+
+    def _bucketed_forward(self, input, kwargs):
+        bucketed = self._bucket_inputs(input, kwargs)
+        with self.lock:
+            entry = None
+            if bucketed is not None:
+                padded_input, padded_kwargs, pads, signature = bucketed
+                if signature in self.graphs:
+                    entry = self.graphs[signature]
+                    self.graphs.move_to_end(signature)
+                    if entry is not None:
+                        self.bucket_stats["hit"] += 1
+                else:
+                    self.bucket_stats["miss"] += 1
+                    # Graphs are traced in the lock, as the non-bucketed capture does
+                    graph = self._capture_bucket(padded_input, padded_kwargs)
+                    if graph is not None:
+                        unpad_dims = self._get_unpad_dims(
+                            graph, padded_input, padded_kwargs, pads
+                        )
+                        if unpad_dims is None:
+                            logger.warning(
+                                "The outputs of a bucket of input shapes can't be unpadded, "
+                                + "fallback to original model for it.",
+                                _type=WarningType.NotSupported,
+                            )
+                        else:
+                            entry = (graph, unpad_dims)
+                    self.graphs[signature] = entry
+                    if len(self.graphs) > self.max_num_graphs:
+                        self.graphs.popitem(last=False)
+            if entry is None:
+                self.bucket_stats["eager"] += 1
+        if entry is None:
+            return self.model(*input, **kwargs)
+        graph, unpad_dims = entry
+        output = graph(*padded_input, **padded_kwargs)
+        tensor_unpad_dims = iter(unpad_dims)
+
+        def unpad(tensor):
+            for out_dim, dim in next(tensor_unpad_dims).items():
+                tensor = tensor.narrow(out_dim, 0, pads[dim][0])
+            return tensor
+
+        return _map_tensors(unpad, output)
 
     def __call__(self, func):
         @fake_tensor_unsupported
@@ -51,6 +290,8 @@ class GraphCapture(object):
                 enabled=(self.dtype == torch.bfloat16 or self.dtype == torch.half),
                 dtype=self.dtype,
             ):
+                if self.buckets is not None and not self.train:
+                    return self._bucketed_forward(input, kwargs)
                 if self.method:
                     if self.train:
                         return func(*input, **kwargs)
@@ -72,6 +313,21 @@ class GraphCapture(object):
                             self.method = RunMethods.EagerTrain
                             return func(*input, **kwargs)
                         else:
+                            cache_key = None
+                            if self.graph_cache is not None:
+                                cache_key = get_graph_cache_key(
+                                    self.model,
+                                    (input, kwargs),
+                                    self.dtype,
+                                    extra=(RunMethods.JIT, self.weights_prepack),
+                                )
+                                cached_model = self.graph_cache.load(cache_key)
+                                if cached_model is not None:
+                                    output = cached_model(*input, **kwargs)
+                                    self.model = cached_model
+                                    self.method = RunMethods.JIT
+                                    logger.debug("load graph generated by JIT trace.")
+                                    return output
                             try:
                                 # Try JIT trace.
                                 # Tracing only records operations done when the given function is run on the given
@@ -94,6 +350,8 @@ class GraphCapture(object):
                                     self.model = traced_model
                                     self.method = RunMethods.JIT
                                     logger.debug("generate graph by JIT trace.")
+                                    if cache_key is not None:
+                                        self.graph_cache.save(cache_key, traced_model)
                                     return output
                             except BaseException:
                                 try:
@@ -116,4 +374,5 @@ class GraphCapture(object):
                                     torch._dynamo.reset()
                                     return self.model(*input, **kwargs)
 
+        forward.graph_capture = self
         return forward
@@ -10,7 +10,12 @@ from ..strategy import STRATEGIES
 from intel_extension_for_pytorch.cpu.launch import CPUPoolList
 
 # ### tuning ####
-tuning_default = {"strategy": "grid", "max_trials": 100}
+tuning_default = {
+    "strategy": "grid",
+    "max_trials": 100,
+    "early_stopping": 0,
+    "parallel_trials": False,
+}
 
 
 def _valid_strategy(data):
@@ -23,6 +28,8 @@ tuning_schema = Schema(
     {
         Optional("strategy", default="grid"): And(str, Use(_valid_strategy)),
         Optional("max_trials", default=100): int,
+        Optional("early_stopping", default=0): int,
+        Optional("parallel_trials", default=False): bool,
     }
 )
 
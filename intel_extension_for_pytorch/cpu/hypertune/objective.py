@@ -10,11 +10,11 @@ class MultiObjective(object):
         self.program_args = program_args
         self.tune_launcher = tune_launcher
 
-    def evaluate(self, cfg):
+    def evaluate(self, cfg, node=None):
         cmd = ["ipexrun"]
 
         if self.tune_launcher:
-            launcher_args = self.decode_launcer_cfg(cfg)
+            launcher_args = self.decode_launcer_cfg(cfg, node)
             cmd += launcher_args
 
         cmd += [self.program]
@@ -49,7 +49,7 @@ class MultiObjective(object):
             ret = v_new
         return ret
 
-    def decode_launcer_cfg(self, cfg):
+    def decode_launcer_cfg(self, cfg, node=None):
         ncores_per_instance = self.deprecate_config(
             cfg, "ncore_per_instance", "ncores_per_instance", -1
         )
@@ -74,7 +74,7 @@ class MultiObjective(object):
 
         if use_all_nodes is False:
             launcher_args.append("--nodes-list")
-            launcher_args.append("0")
+            launcher_args.append("0" if node is None else str(node))
 
         if use_logical_cores is True:
             launcher_args.append("--use-logical-cores")
@@ -4,7 +4,9 @@ import os
 from abc import abstractmethod
 import csv
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import click
+from intel_extension_for_pytorch.cpu.launch import CPUPoolList
 from ..objective import MultiObjective
 
 STRATEGIES = {}
@@ -28,6 +30,8 @@ class TuneStrategy(object):
         self.usr_objectives = conf.usr_objectives
 
         self.max_trials = conf.execution_conf.tuning.max_trials
+        self.early_stopping = conf.execution_conf.tuning.early_stopping
+        self.parallel_trials = conf.execution_conf.tuning.parallel_trials
 
         # hyperparams #
         self.hyperparam2searchspace = OrderedDict()
@@ -36,6 +40,10 @@ class TuneStrategy(object):
                 self.hyperparam2searchspace[hp] = self.conf.hyperparams[k][hp]
         self.hyperparams = list(self.hyperparam2searchspace.keys())
         tune_launcher = "launcher" in self.conf.hyperparams
+        # trials which do not use all nodes run concurrently, one per node
+        self.nodes = [None]
+        if self.parallel_trials and tune_launcher:
+            self.nodes = sorted(set(c.node for c in CPUPoolList().pool_all))
 
         # objective #
         self.multiobjective = MultiObjective(
@@ -54,6 +62,8 @@ class TuneStrategy(object):
 
         self.best_tune_result = None
         self.best_tune_cfg = None
+        self.tune_history = []
+        self.trials_since_improvement = 0
 
     @abstractmethod
     def next_tune_cfg(self):
@@ -62,31 +72,60 @@ class TuneStrategy(object):
     def traverse(self):
         click.secho("Starting hypertuning...", fg="green")
         trials_count = 0
-
-        for tune_cfg in self.next_tune_cfg():
-            trials_count += 1
-
-            click.secho("\nTune ", fg="green", nl=False)
-            click.secho("{trials_count}", fg="blue", nl=False)
-
-            click.secho("\nCurrent configuration is: ", fg="green", nl=False)
-            click.secho("{tune_cfg}", fg="blue")
-
-            curr_tune_result = self.multiobjective.evaluate(tune_cfg)
-
-            self._update_best_tune_result(curr_tune_result, tune_cfg)
-            self._record_tune_result(curr_tune_result, tune_cfg)
-
-            need_stop = self._stop(trials_count)
-
-            if need_stop:
-                # case 1: accuracy goal is met
-                # case 2: timeout reached (objective goal not met)
-                self._print_best_result()
-                return
+        finished_count = 0
+        need_stop = False
+        free_nodes = list(self.nodes)
+        running = {}
+
+        def finish(futures):
+            nonlocal finished_count, need_stop
+            for future in futures:
+                tune_cfg, node = running.pop(future)
+                if node is not None:
+                    free_nodes.append(node)
+                curr_tune_result = future.result()
+                finished_count += 1
+                self.tune_history.append((tune_cfg, curr_tune_result))
+
+                self._update_best_tune_result(curr_tune_result, tune_cfg)
+                self._record_tune_result(curr_tune_result, tune_cfg)
+
+                need_stop = self._stop(finished_count) or need_stop
+
+        with ThreadPoolExecutor(max_workers=len(self.nodes)) as executor:
+            for tune_cfg in self.next_tune_cfg():
+                if self._use_all_nodes(tune_cfg):
+                    # wait for the running trials
+                    finish(list(running))
+                else:
+                    while len(free_nodes) == 0:
+                        finish(wait(running, return_when=FIRST_COMPLETED).done)
+                if need_stop or trials_count == self.max_trials:
+                    break
+                trials_count += 1
+
+                click.secho("\nTune ", fg="green", nl=False)
+                click.secho(f"{trials_count}", fg="blue", nl=False)
+
+                click.secho("\nCurrent configuration is: ", fg="green", nl=False)
+                click.secho(f"{tune_cfg}", fg="blue")
+
+                node = None if self._use_all_nodes(tune_cfg) else free_nodes.pop(0)
+                future = executor.submit(self.multiobjective.evaluate, tune_cfg, node)
+                running[future] = (tune_cfg, node)
+                if node is None:
+                    finish([future])
+            finish(list(running))
+
+        if need_stop:
+            # case 1: accuracy goal is met
+            # case 2: timeout reached (objective goal not met)
+            # case 3: no improvement in the last early_stopping trials
+            self._print_best_result()
+            return
 
         # finished traversal
-        # case 3: finished traversal (objective goal not met)
+        # case 4: finished traversal (objective goal not met)
         click.secho(
             "\nFinished traversing the entire search space, but didn't find configuration meeting the objective goal",
             fg="red",
@@ -94,6 +133,11 @@ class TuneStrategy(object):
         self._print_best_result()
         return
 
+    def _use_all_nodes(self, tune_cfg):
+        # the launcher runs the trial on node 0 only if use_all_nodes is False,
+        # such trials are moved to a free node instead
+        return len(self.nodes) == 1 or tune_cfg["use_all_nodes"] is not False
+
     def _compare(self, higher_is_better, src, dst):
         if higher_is_better:
             return src > dst
@@ -105,6 +149,8 @@ class TuneStrategy(object):
             # initial baseline
             self.best_tune_result = curr_tune_result
             self.best_tune_cfg = curr_tune_cfg
+            self.trials_since_improvement = 0
+            return
         else:
             # multi objective
             if all(
@@ -122,15 +168,18 @@ class TuneStrategy(object):
             ):
                 self.best_tune_result = curr_tune_result
                 self.best_tune_cfg = curr_tune_cfg
+                self.trials_since_improvement = 0
+                return
+        self.trials_since_improvement += 1
 
     def _record_tune_result(self, curr_tune_result, curr_tune_cfg):
         for objective, val in zip(self.usr_objectives, curr_tune_result):
-            click.secho("{objective['name']}: {val}", fg="blue")
+            click.secho(f"{objective['name']}: {val}", fg="blue")
 
         click.secho("Best configuration is: ", fg="green", nl=False)
-        click.secho("{self.best_tune_cfg}", fg="blue")
+        click.secho(f"{self.best_tune_cfg}", fg="blue")
         for objective, val in zip(self.usr_objectives, self.best_tune_result):
-            click.secho("{objective['name']}: {val}", fg="blue")
+            click.secho(f"{objective['name']}: {val}", fg="blue")
 
         curr_tune_cfg_val = list(_ for _ in curr_tune_cfg.values())
         self.tune_result_record.writerow(curr_tune_cfg_val + curr_tune_result)
@@ -157,10 +206,19 @@ class TuneStrategy(object):
                 fg="red",
             )
             return True
+        elif (
+            self.early_stopping > 0
+            and self.trials_since_improvement >= self.early_stopping
+        ):
+            click.secho(
+                f"\nNo improvement in the last {self.early_stopping} trials, stop early.",
+                fg="red",
+            )
+            return True
         return False
 
     def _print_best_result(self):
         click.secho("Best configuration found is: ", fg="green", nl=False)
-        click.secho("{self.best_tune_cfg}", fg="blue")
+        click.secho(f"{self.best_tune_cfg}", fg="blue")
         for objective, val in zip(self.usr_objectives, self.best_tune_result):
-            click.secho("{objective['name']}: {val}", fg="blue")
+            click.secho(f"{objective['name']}: {val}", fg="blue")
@@ -0,0 +1,112 @@
+import math
+import numpy as np
+from .strategy import strategy_registry, TuneStrategy
+
+# number of random trials before the Parzen estimators are used
+N_STARTUP_TRIALS = 10
+# number of configurations sampled from the good estimator for each suggestion
+N_EI_CANDIDATES = 24
+# fraction of the finished trials used to build the good estimator
+GAMMA = 0.25
+
+
+@strategy_registry
+class TPETuneStrategy(TuneStrategy):
+    r"""
+    Tree-structured Parzen Estimator. The finished trials are split into the best
+    ``GAMMA`` fraction and the rest, and each hyperparameter gets one Parzen estimator
+    per group, l(x) and g(x). The next configuration is the sampled candidate of l(x)
+    which maximizes l(x) / g(x). Integer hyperparameters (e.g., ncores_per_instance)
+    use a Gaussian kernel over their search space since neighbouring values behave
+    alike, the others count the occurrences of each value.
+    """
+
+    def __init__(self, conf):
+        super().__init__(conf)
+        self.search_space_size = math.prod(
+            len(self.hyperparam2searchspace[hp]) for hp in self.hyperparams
+        )
+
+    def _to_tune_cfg(self, cfg_idx):
+        return {
+            hp: self.hyperparam2searchspace[hp][i]
+            for hp, i in zip(self.hyperparams, cfg_idx)
+        }
+
+    def _random_cfg(self, tried):
+        while True:
+            cfg_idx = tuple(
+                np.random.randint(len(self.hyperparam2searchspace[hp]))
+                for hp in self.hyperparams
+            )
+            if cfg_idx not in tried:
+                return cfg_idx
+
+    def _scores(self, results):
+        # sum of the ranks of the trial on every objective, lower is better
+        scores = [0.0] * len(results)
+        for j, objective in enumerate(self.usr_objectives):
+            order = sorted(
+                range(len(results)),
+                key=lambda i: results[i][j]
+                if len(results[i]) > j
+                else (-math.inf if objective["higher_is_better"] else math.inf),
+                reverse=objective["higher_is_better"],
+            )
+            for rank, i in enumerate(order):
+                scores[i] += rank
+        return scores
+
+    def _parzen_estimator(self, hp, tune_cfgs):
+        space = self.hyperparam2searchspace[hp]
+        observed = np.array([space.index(tune_cfg[hp]) for tune_cfg in tune_cfgs])
+        # uniform prior with the weight of one observation
+        density = np.full(len(space), 1.0 / len(space))
+        if len(observed) > 0:
+            if all(isinstance(v, int) and not isinstance(v, bool) for v in space):
+                bandwidth = max(1.0, len(space) / (len(observed) + 1))
+                positions = np.arange(len(space))
+                kernels = np.exp(
+                    -0.5 * ((positions[None, :] - observed[:, None]) / bandwidth) ** 2
+                )
+                density += (kernels / kernels.sum(axis=1, keepdims=True)).sum(axis=0)
+            else:
+                density += np.bincount(observed, minlength=len(space))
+        return density / density.sum()
+
+    def _suggest(self, tried):
+        tune_cfgs = [tune_cfg for tune_cfg, _ in self.tune_history]
+        scores = self._scores([result for _, result in self.tune_history])
+        order = sorted(range(len(tune_cfgs)), key=lambda i: scores[i])
+        n_good = max(1, int(math.ceil(GAMMA * len(tune_cfgs))))
+        good = [tune_cfgs[i] for i in order[:n_good]]
+        bad = [tune_cfgs[i] for i in order[n_good:]]
+        good_density = [self._parzen_estimator(hp, good) for hp in self.hyperparams]
+        bad_density = [self._parzen_estimator(hp, bad) for hp in self.hyperparams]
+
+        best_cfg_idx, best_ratio = None, -math.inf
+        for _ in range(N_EI_CANDIDATES):
+            cfg_idx = tuple(np.random.choice(len(p), p=p) for p in good_density)
+            if cfg_idx in tried:
+                continue
+            ratio = sum(
+                np.log(l_x[i]) - np.log(g_x[i])
+                for l_x, g_x, i in zip(good_density, bad_density, cfg_idx)
+            )
+            if ratio > best_ratio:
+                best_cfg_idx, best_ratio = cfg_idx, ratio
+        if best_cfg_idx is None:
+            # all the candidates were tried already
+            return self._random_cfg(tried)
+        return best_cfg_idx
+
+    def next_tune_cfg(self):
+        tried = set()
+        while len(tried) < self.search_space_size:
+            if len(self.tune_history) < N_STARTUP_TRIALS:
+                cfg_idx = self._random_cfg(tried)
+            else:
+                cfg_idx = self._suggest(tried)
+            tried.add(cfg_idx)
+            yield self._to_tune_cfg(cfg_idx)
+        return
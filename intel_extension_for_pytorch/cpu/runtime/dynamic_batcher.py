@@ -0,0 +1,321 @@
+import asyncio
+import concurrent.futures
+import queue
+import threading
+import time
+import torch
+from typing import Union
+from .cpupool import CPUPool
+from .task import Task
+from .multi_stream import get_default_num_streams
+from ...utils._logger import logger, WarningType
+
+
+class _Request(object):
+    def __init__(self, args, kwargs, batch_size, signature):
+        self.args = args
+        self.kwargs = kwargs
+        self.batch_size = batch_size
+        self.signature = signature
+        self.arrival_time = time.monotonic()
+        self.future = concurrent.futures.Future()
+
+
+def _get_batch_size(obj):
+    # The batch size of a request is the size of dim 0 of its first tensor
+    if isinstance(obj, torch.Tensor):
+        return obj.size(0)
+    values = obj.values() if isinstance(obj, dict) else obj
+    if isinstance(obj, (list, tuple, dict)):
+        for value in values:
+            batch_size = _get_batch_size(value)
+            if batch_size is not None:
+                return batch_size
+    return None
+
+
+def _get_signature(obj):
+    # Requests are batched together only if their tensors match except along dim 0
+    # and their non-tensor arguments are the same.
+    if isinstance(obj, torch.Tensor):
+        return (torch.Tensor, tuple(obj.shape[1:]), obj.dtype)
+    if isinstance(obj, (list, tuple)):
+        return (type(obj), tuple(_get_signature(value) for value in obj))
+    if isinstance(obj, dict):
+        return (dict, tuple((k, _get_signature(v)) for k, v in obj.items()))
+    return obj
+
+
+def _is_same_signature(signature, other):
+    try:
+        return bool(signature == other)
+    except Exception:
+        return False
+
+
+def _concat(objs):
+    # objs holds the same argument of every request of a micro-batch
+    first = objs[0]
+    if isinstance(first, torch.Tensor):
+        return torch.cat(objs, dim=0)
+    if isinstance(first, (list, tuple)):
+        concatenated = [_concat(list(values)) for values in zip(*objs)]
+        return tuple(concatenated) if isinstance(first, tuple) else concatenated
+    if isinstance(first, dict):
+        return {key: _concat([obj[key] for obj in objs]) for key in first}
+    return first
+
+
+def _split(obj, batch_sizes):
+    # Returns the part of obj of every request of a micro-batch
+    if isinstance(obj, torch.Tensor):
+        return obj.split(batch_sizes, dim=0)
+    if isinstance(obj, (list, tuple)):
+        splits = [_split(value, batch_sizes) for value in obj]
+        outputs = [[split[i] for split in splits] for i in range(len(batch_sizes))]
+        return [tuple(o) for o in outputs] if isinstance(obj, tuple) else outputs
+    if isinstance(obj, dict):
+        splits = {key: _split(value, batch_sizes) for key, value in obj.items()}
+        return [
+            {key: split[i] for key, split in splits.items()}
+            for i in range(len(batch_sizes))
+        ]
+    return [obj] * len(batch_sizes)
+
+
+class DynamicBatcher(object):
+    r"""
+    DynamicBatcher serves independent requests with the throughput of multi-stream inference.
+
+    Requests submitted from any number of threads or asyncio coroutines are queued and grouped
+    into micro-batches of at most ``max_batch_size`` samples. A micro-batch is dispatched as
+    soon as it is full or ``max_wait_time`` seconds after its first request arrived, to the
+    first idle stream. As in MultiStreamModule, every stream is a Task pinned to its own
+    disjoint subset of the cores of ``cpu_pool``. The inputs of a micro-batch are concatenated
+    along dim 0, and the output is split back along dim 0 so that every caller gets the output
+    of its own request.
+
+    A request is usually a single sample with a batch size of 1 along dim 0 of its tensors.
+    Requests are batched together only when their tensors match in every dim but dim 0 and
+    their non-tensor arguments are the same. Every tensor of the model output must be batched
+    along dim 0. The model runs under ``torch.no_grad()``.
+
+    Args:
+        model (torch.jit.ScriptModule or torch.nn.Module): The input model.
+        num_streams (Union[int, str]): Number of streams (int) or "AUTO" (str). "AUTO" uses one
+            stream per core as MultiStreamModule.
+        cpu_pool (intel_extension_for_pytorch.cpu.runtime.CPUPool): An
+            intel_extension_for_pytorch.cpu.runtime.CPUPool object, contains
+            all CPU cores used by the streams. Default uses all the cores available
+            for current process.
+        max_batch_size (int): Max number of samples of a micro-batch.
+        max_wait_time (float): Max time in seconds a request waits for other requests
+            to join its micro-batch.
+
+    Returns:
+        intel_extension_for_pytorch.cpu.runtime.DynamicBatcher: Generated
+        intel_extension_for_pytorch.cpu.runtime.DynamicBatcher object.
+
+    Examples:
+        >>> batcher = ipex.cpu.runtime.DynamicBatcher(traced_model, num_streams=4, max_batch_size=16)
+        >>> # in any thread, blocking
+        >>> y = batcher(x)
+        >>> # or without blocking
+        >>> future = batcher.submit(x)
+        >>> # in a coroutine
+        >>> y = await batcher.submit_async(x)
+        >>> batcher.close()
+
+    :meta public:
+    """
+
+    def __init__(
+        self,
+        model,
+        num_streams: Union[int, str] = "AUTO",
+        cpu_pool: CPUPool = None,
+        max_batch_size: int = 32,
+        max_wait_time: float = 0.005,
+    ):
+        cpu_pool = cpu_pool if cpu_pool is not None else CPUPool()
+        assert (
+            type(cpu_pool) is CPUPool
+        ), "Input of cpu_pool must be provided with type of ipex.cpu.runtime.CPUPool"
+        assert max_batch_size >= 1, "max_batch_size must be a positive integer"
+        assert max_wait_time >= 0, "max_wait_time must not be negative"
+        if not isinstance(model, torch.jit.ScriptModule):
+            logger.warning(
+                "Creating DynamicBatcher on an nn.Module. This can be slow due "
+                + "to Python Global Interpreter Lock (GIL). Suggest to use JIT ScriptModule for better performance.",
+                _type=WarningType.WrongArgument,
+            )
+        self.model = model
+        self.cpu_pool = cpu_pool
+        self.core_list = cpu_pool.core_ids
+        if isinstance(num_streams, str):
+            assert (
+                num_streams.upper() == "AUTO"
+            ), 'Input of num_streams must be Number of instances or string "AUTO"'
+            self.num_streams = get_default_num_streams(cpu_pool)
+        else:
+            assert isinstance(
+                num_streams, int
+            ), 'Input of num_streams must be Number of instances or string "AUTO"'
+            self.num_streams = num_streams
+        if self.num_streams > self.core_list.__len__():
+            self.num_streams = self.core_list.__len__()
+            logger.warning(
+                f"The number of streams is larger than number of cores. The number of streams changes to {self.num_streams}.",
+                _type=WarningType.WrongArgument,
+            )
+        self.max_batch_size = max_batch_size
+        self.max_wait_time = max_wait_time
+
+        # The cores are split among the streams as MultiStreamModule does. A single stream
+        # runs the model in its worker thread directly.
+        self.tasks = []
+        if self.num_streams > 1:
+            cores_per_instance = self.core_list.__len__() // self.num_streams
+            num_stream_allocated_extra_core = (
+                self.core_list.__len__() % self.num_streams
+            )
+            start_core_list_idx = 0
+            for j in range(self.num_streams):
+                end_core_list_idx = start_core_list_idx + cores_per_instance
+                if j < num_stream_allocated_extra_core:
+                    end_core_list_idx += 1
+                self.tasks.append(
+                    Task(
+                        model,
+                        CPUPool(self.core_list[start_core_list_idx:end_core_list_idx]),
+                    )
+                )
+                start_core_list_idx = end_core_list_idx
+
+        self._requests = queue.Queue()
+        # Only one idle worker forms a micro-batch at a time, the request which does not
+        # fit into it is kept for the next micro-batch
+        self._batch_lock = threading.Lock()
+        self._pending_request = None
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._worker_loop, args=(stream_id,), daemon=True)
+            for stream_id in range(self.num_streams)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, *args, **kwargs) -> concurrent.futures.Future:
+        r"""
+        Queues a request and returns a concurrent.futures.Future of its output.
+        """
+        if self._closed:
+            raise RuntimeError("Cannot submit a request to a closed DynamicBatcher")
+        batch_size = _get_batch_size((args, kwargs))
+        assert batch_size is not None, "A request must have at least one tensor input"
+        request = _Request(args, kwargs, batch_size, _get_signature((args, kwargs)))
+        self._requests.put(request)
+        return request.future
+
+    async def submit_async(self, *args, **kwargs):
+        r"""
+        Queues a request and awaits its output without blocking the event loop.
+        """
+        return await asyncio.wrap_future(self.submit(*args, **kwargs))
+
+    def __call__(self, *args, **kwargs):
+        return self.submit(*args, **kwargs).result()
+
+    def close(self):
+        r"""
+        Stops the streams once the queued requests are served.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._requests.put(None)
+        for worker in self._workers:
+            worker.join()
+        # Requests which raced with close are not served
+        leftovers = [self._pending_request]
+        self._pending_request = None
+        while not self._requests.empty():
+            leftovers.append(self._requests.get())
+        for request in leftovers:
+            if request is not None and request.future.set_running_or_notify_cancel():
+                request.future.set_exception(
+                    RuntimeError("The DynamicBatcher was closed")
+                )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _next_request(self, timeout=None):
+        if self._pending_request is not None:
+            request, self._pending_request = self._pending_request, None
+            return request
+        request = self._requests.get(timeout=timeout)
+        if request is None:
+            # Leave the stop sign to the other workers
+            self._requests.put(None)
+        return request
+
+    def _get_micro_batch(self):
+        with self._batch_lock:
+            batch = []
+            num_samples = 0
+            deadline = None
+            while True:
+                try:
+                    if deadline is None:
+                        request = self._next_request()
+                    else:
+                        timeout = deadline - time.monotonic()
+                        if timeout <= 0:
+                            break
+                        request = self._next_request(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    break
+                if batch and (
+                    num_samples + request.batch_size > self.max_batch_size
+                    or not _is_same_signature(request.signature, batch[0].signature)
+                ):
+                    # the request is marked running when it joins a micro-batch
+                    self._pending_request = request
+                    break
+                if not request.future.set_running_or_notify_cancel():
+                    # cancelled by its caller
+                    continue
+                batch.append(request)
+                num_samples += request.batch_size
+                if num_samples >= self.max_batch_size:
+                    break
+                if deadline is None:
+                    deadline = request.arrival_time + self.max_wait_time
+            return batch
+
+    def _worker_loop(self, stream_id):
+        while True:
+            batch = self._get_micro_batch()
+            if not batch:
+                return
+            try:
+                args = _concat([request.args for request in batch])
+                kwargs = _concat([request.kwargs for request in batch])
+                with torch.no_grad():
+                    if self.tasks:
+                        output = self.tasks[stream_id](*args, **kwargs).get()
+                    else:
+                        output = self.model(*args, **kwargs)
+                outputs = _split(output, [request.batch_size for request in batch])
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, request_output in zip(batch, outputs):
+                request.future.set_result(request_output)
@@ -4,7 +4,8 @@ from typing import Union
 import intel_extension_for_pytorch._C as core
 from .cpupool import CPUPool
 from .task import Task
-import copy
+import collections
+import time
 from ...utils._logger import logger, WarningType
 
 
@@ -38,6 +39,236 @@ default_multi_stream_module_split_hint = MultiStreamModuleHint(0)
 default_multi_stream_module_concat_hint = MultiStreamModuleHint(0)
 
 
+# Max number of input signatures whose split/concat plan is cached by a MultiStreamModule
+_MAX_NUM_CACHED_PLANS = 32
+
+
+class _MultiStreamPlan(object):
+    # Split/concat plan of MultiStreamModule for one input signature:
+    #   * split_ranges: (start, length) of the input split of each used stream.
+    #   * output_layouts: filled by the first forward of the signature. For each output
+    #       to concat, its (shape, dtype, concat dim, (offset, length) of each stream).
+    def __init__(self, split_ranges):
+        self.split_ranges = split_ranges
+        self.output_layouts = None
+
+
+def _check_hint_type(hint):
+    assert (hint is None) or (type(hint) is int), "Unsupport hint type of:{}".format(
+        type(hint)
+    )
+
+
+def _compile_split_fn(hint):
+    # Returns a function generating the input of a stream from the raw input and the
+    # (start, length) of the stream's split.
+    if isinstance(hint, (list, tuple)):
+        container = type(hint)
+        fns = [_compile_split_fn(h) for h in hint]
+        return lambda obj, start, length: container(
+            [fn(o, start, length) for fn, o in zip(fns, obj)]
+        )
+    if isinstance(hint, dict):
+        fns = [(key, _compile_split_fn(h)) for key, h in hint.items()]
+        return lambda obj, start, length: {
+            key: fn(obj[key], start, length) for key, fn in fns
+        }
+    _check_hint_type(hint)
+    if hint is None:
+        # This object shouldn't be split, just set it as each stream's input
+        return lambda obj, start, length: obj
+    if hint == 0:
+        # Split along dim 0, the slice will not create new tensor
+        return lambda obj, start, length: obj[start : start + length]
+    # Otherwise, we use torch.narrow
+    return lambda obj, start, length: obj.narrow(hint, start, length)
+
+
+def _compile_flatten_fn(hint):
+    # Returns a function appending the objects at the int positions of hint to a list
+    if isinstance(hint, (list, tuple)):
+        fns = [_compile_flatten_fn(h) for h in hint]
+
+        def flatten(obj, leaves):
+            for fn, o in zip(fns, obj):
+                fn(o, leaves)
+
+        return flatten
+    if isinstance(hint, dict):
+        fns = [(key, _compile_flatten_fn(h)) for key, h in hint.items()]
+
+        def flatten(obj, leaves):
+            for key, fn in fns:
+                fn(obj[key], leaves)
+
+        return flatten
+    _check_hint_type(hint)
+    if hint is None:
+        return lambda obj, leaves: None
+    return lambda obj, leaves: leaves.append(obj)
+
+
+def _compile_rebuild_fn(hint):
+    # Returns a function rebuilding obj with the objects at the int positions of hint
+    # taken from an iterator, in the order of _compile_flatten_fn
+    if isinstance(hint, (list, tuple)):
+        container = type(hint)
+        fns = [_compile_rebuild_fn(h) for h in hint]
+        return lambda obj, leaves: container([fn(o, leaves) for fn, o in zip(fns, obj)])
+    if isinstance(hint, dict):
+        fns = [(key, _compile_rebuild_fn(h)) for key, h in hint.items()]
+        return lambda obj, leaves: {key: fn(obj[key], leaves) for key, fn in fns}
+    _check_hint_type(hint)
+    if hint is None:
+        # This object shouldn't be concat, take it from the first stream
+        return lambda obj, leaves: obj
+    return lambda obj, leaves: next(leaves)
+
+
+def _get_hint_dims(hint):
+    # The int values of hint, in the order of _compile_flatten_fn
+    if isinstance(hint, (list, tuple)):
+        return [dim for h in hint for dim in _get_hint_dims(h)]
+    if isinstance(hint, dict):
+        return [dim for h in hint.values() for dim in _get_hint_dims(h)]
+    return [] if hint is None else [hint]
+
+
+def _get_divisors(n):
+    return [i for i in range(1, n + 1) if n % i == 0]
+
+
+class _StreamNumBucket(object):
+    # Tuning state of the number of streams for a batch size bucket:
+    #   * Every candidate runs num_warmup forwards which are not measured, then num_trials
+    #       measured ones, the candidate with the lowest median time per sample is selected.
+    #   * Once selected, an exponential moving average of the time per sample is tracked and
+    #       the bucket is tuned again if it drifts by more than retune_threshold times.
+    def __init__(
+        self, candidates, num_warmup, num_trials, tolerance, retune_threshold, ema_decay
+    ):
+        self.candidates = candidates
+        self.num_warmup = num_warmup
+        self.num_trials = num_trials
+        self.tolerance = tolerance
+        self.retune_threshold = retune_threshold
+        self.ema_decay = ema_decay
+        self.reset()
+
+    def reset(self):
+        self.best_num_streams = None
+        self.best_time = None
+        self.ema_time = None
+        self.candidate_idx = 0
+        self.num_warmup_left = self.num_warmup
+        self.times = {c: [] for c in self.candidates}
+
+    def next_num_streams(self):
+        if self.best_num_streams is not None:
+            return self.best_num_streams
+        return self.candidates[self.candidate_idx]
+
+    def record(self, num_streams, time_per_sample):
+        # Returns True when the selected number of streams changed
+        if self.best_num_streams is not None:
+            self.ema_time = (
+                time_per_sample
+                if self.ema_time is None
+                else self.ema_decay * self.ema_time
+                + (1 - self.ema_decay) * time_per_sample
+            )
+            if (
+                self.ema_time > self.best_time * self.retune_threshold
+                or self.ema_time * self.retune_threshold < self.best_time
+            ):
+                self.reset()
+                return True
+            return False
+        if self.num_warmup_left > 0:
+            self.num_warmup_left -= 1
+            return False
+        self.times[num_streams].append(time_per_sample)
+        if len(self.times[num_streams]) < self.num_trials:
+            return False
+        self.candidate_idx += 1
+        self.num_warmup_left = self.num_warmup
+        if self.candidate_idx < len(self.candidates):
+            return False
+        median_times = {c: sorted(t)[len(t) // 2] for c, t in self.times.items()}
+        best_time = min(median_times.values())
+        # Fewer streams are preferred among the candidates about as fast as the fastest one
+        self.best_num_streams = min(
+            c for c, t in median_times.items() if t <= best_time * (1 + self.tolerance)
+        )
+        self.best_time = median_times[self.best_num_streams]
+        return True
+
+
+class _StreamNumAutotuner(object):
+    # Online tuning of the number of streams of MultiStreamModule(num_streams="AUTOTUNE").
+    # A MultiStreamModule is created for each tried number of streams and released
+    # once no bucket selects or tries it anymore.
+    def __init__(
+        self,
+        create_module,
+        candidates,
+        num_warmup=1,
+        num_trials=3,
+        tolerance=0.05,
+        retune_threshold=1.5,
+        ema_decay=0.9,
+    ):
+        self.create_module = create_module
+        self.candidates = candidates
+        self.num_warmup = num_warmup
+        self.num_trials = num_trials
+        self.tolerance = tolerance
+        self.retune_threshold = retune_threshold
+        self.ema_decay = ema_decay
+        self.modules = {}
+        self.buckets = {}
+        self.last_num_streams = None
+
+    def _get_bucket(self, split_size):
+        bucket_size = (
+            1 if split_size is None else 1 << max(split_size - 1, 0).bit_length()
+        )
+        bucket = self.buckets.get(bucket_size)
+        if bucket is None:
+            # More streams than samples leave streams idle
+            candidates = [c for c in self.candidates if c <= bucket_size]
+            bucket = _StreamNumBucket(
+                candidates,
+                self.num_warmup,
+                self.num_trials,
+                self.tolerance,
+                self.retune_threshold,
+                self.ema_decay,
+            )
+            self.buckets[bucket_size] = bucket
+        return bucket
+
+    def _release_unused_modules(self):
+        if any(b.best_num_streams is None for b in self.buckets.values()):
+            return
+        used = {b.best_num_streams for b in self.buckets.values()}
+        for num_streams in [n for n in self.modules if n not in used]:
+            del self.modules[num_streams]
+
+    def __call__(self, split_size, *args, **kwargs):
+        bucket = self._get_bucket(split_size)
+        num_streams = bucket.next_num_streams()
+        if num_streams not in self.modules:
+            self.modules[num_streams] = self.create_module(num_streams)
+        start = time.perf_counter()
+        output = self.modules[num_streams](*args, **kwargs)
+        time_per_sample = (time.perf_counter() - start) / max(split_size or 1, 1)
+        self.last_num_streams = num_streams
+        if bucket.record(num_streams, time_per_sample):
+            self._release_unused_modules()
+        return output
+
+
 def get_default_num_streams(cpu_pool):
     # One core per stream usually brings better overall throughput than other configurations.
     # Therefore, we heuristically make one core per stream the default here.
@@ -64,12 +295,22 @@ class MultiStreamModule(nn.Module):
     as "AUTO", we suggest to set inputs' batchsize larger than and divisible by
     number of cores.
 
+    The split of the inputs and the layout of the concatenated outputs are planned
+    once per input shapes and cached. Each stream gets views of the inputs, and
+    from the second forward with the same input shapes on, each stream output is
+    copied into a preallocated output as soon as the stream finishes.
+
     Args:
         model (torch.jit.ScriptModule or torch.nn.Module): The input model.
-        num_streams (Union[int, str]): Number of instances (int) or "AUTO" (str). "AUTO" means the stream number
-            will be selected automatically. Although "AUTO" usually provides a
-            reasonable performance, it may still not be optimal for some cases which
-            means manual tuning for number of streams is needed for this case.
+        num_streams (Union[int, str]): Number of instances (int), "AUTO" or "AUTOTUNE" (str).
+            "AUTO" means the stream number will be selected automatically. Although
+            "AUTO" usually provides a reasonable performance, it may still not be
+            optimal for some cases which means manual tuning for number of streams is
+            needed for this case.
+            "AUTOTUNE" tunes the stream number online on the live inputs: for each
+            batch size bucket (next power of 2), the first forwards try every divisor
+            of the core number of ``cpu_pool`` and the fastest per sample is then used.
+            A bucket is tuned again when its latency drifts away from the tuned one.
         cpu_pool (intel_extension_for_pytorch.cpu.runtime.CPUPool): An
             intel_extension_for_pytorch.cpu.runtime.CPUPool object, contains
             all CPU cores used to run multi-stream inference.
@@ -110,12 +351,17 @@ class MultiStreamModule(nn.Module):
             )
         self.cpu_pool = cpu_pool
         self.core_list = cpu_pool.core_ids
+        autotune = False
         if isinstance(num_streams, str):
-            # For str input of num_streams, it must be "auto"
+            # For str input of num_streams, it must be "auto" or "autotune"
             if num_streams.upper() == "AUTO":
                 self.num_streams = get_default_num_streams(
                     cpu_pool
                 )  # The default selected value when auto selection is on.
+            elif num_streams.upper() == "AUTOTUNE":
+                # The streams are created by the autotuner for each tried number of streams
+                autotune = True
+                self.num_streams = 1
             else:
                 AssertionError(
                     False
@@ -162,329 +408,160 @@ class MultiStreamModule(nn.Module):
         self.input_split_hint = input_split_hint
         self.output_concat_hint = output_concat_hint
 
-        # Deep copy the input structure for each stream based on input_split_hint.
-        # Each streams_input will be recursively visited and set to the split value in place.
-        self.args_streams_input = []
-        self.kwargs_streams_input = []
-        for _ in range(self.num_streams):
-            self.args_streams_input.append(copy.deepcopy(self.input_split_hint.args))
-            self.kwargs_streams_input.append(
-                copy.deepcopy(self.input_split_hint.kwargs)
-            )
-
-        # Deep copy the output structure based on output_concat_hint.
-        # self.output will be recursively visited and set to the concat value in place.
-        self.output = copy.deepcopy(self.output_concat_hint)
-
-        # Init status needed for forward
-        self.reset_forward_status()
-
-    def reset_forward_status(self):
-        # Since the input batchsize for each forward invoking may change
-        # Need to reset the status for each forward invoking
-        #   * split_size: will be calculated by input batch size and num_streams.
-        #   * used_num_streams: is the num_streams actually used by this forward invoking.
-        #       It may less than self.num_streams when bs is less than self.num_streams.
-        #   * current_split_start_idx: used to record the split start idx for current stream.
-        #   * current_split_end_idx: used to record the split end idx for current stream.
-        self.split_size = None
-        self.used_num_streams = self.num_streams
-        self.current_split_start_idx = 0
-        self.current_split_end_idx = 0
-
-    def update_split_idx(self, stream_id):
-        # Set current_split_start_idx to last current_split_end_idx
-        self.current_split_start_idx = self.current_split_end_idx
-        # Calculate current_split_end_idx to new value
-        if stream_id < self.instance_need_extra_input:
-            # Tail case, when the input image size larger than num_streams and not divisible,
-            # the first remainder streams will have (mini_batch + 1) input size.
-            self.current_split_end_idx = self.current_split_end_idx + (
-                self.batch_per_instance + 1
-            )
-        else:
-            # Input image size divisible of num_streams or input image size less than num_streams.
-            self.current_split_end_idx = (
-                self.current_split_end_idx + self.batch_per_instance
-            )
-
-    def init_forward_status(self, split_size, stream_id):
-        # This function should be invoke only once at each forward
-        self.split_size = split_size
-        # Ensure each instance has input offload
-        self.batch_per_instance = self.split_size // self.num_streams
-        if self.batch_per_instance >= 1:
-            # The input batchsize larger or equal to num_streams.
-            self.used_num_streams = self.num_streams
-            # If input batchsize larger than num_streams and not divisible,
-            # the first remainder streams will have (mini_batch + 1) input size.
-            self.instance_need_extra_input = self.split_size % self.num_streams
-        else:
-            # The input batchsize less than num_streams,
-            # only the first batchsize stream will have mini_batch(1) input.
-            self.batch_per_instance = 1
-            self.used_num_streams = self.split_size
-            self.instance_need_extra_input = 0
-        self.update_split_idx(stream_id)
-
-    def _do_get_input_for_each_stream(
-        self, hint_object, input_object, stream_input_object, idx_or_key, stream_id
-    ):
-        # * hint_object: input hint to tell whether we need to split corresponding
-        #       input_object at current position.
-        # * input_object: raw input used to split and generate stream_input_object
-        #       at current position.
-        # * stream_input_object: Which will generated in place as the input for
-        #       current stream (marked by stream_id)
-        # * idx_or_key: idx (for list/tuple) and key (for dict) used for recursive
-        #       visit of hint_object/input_object/stream_input_object.
-        # * stream_id: the stream we are visiting now.
-        type_arg = type(hint_object[idx_or_key])
-        if type_arg in [list]:
-            for i in range(hint_object[idx_or_key].__len__()):
-                self._do_get_input_for_each_stream(
-                    hint_object[idx_or_key],
-                    input_object[idx_or_key],
-                    stream_input_object[idx_or_key],
-                    i,
-                    stream_id,
-                )
-        if type_arg in [tuple]:
-            # Tuple doesn't support item change in place
-            # So we change it to list for next recursion and change it back to tuple.
-            temp = list(stream_input_object[idx_or_key])
-            for i in range(hint_object[idx_or_key].__len__()):
-                self._do_get_input_for_each_stream(
-                    hint_object[idx_or_key],
-                    input_object[idx_or_key],
-                    temp,
-                    i,
-                    stream_id,
-                )
-            stream_input_object[idx_or_key] = tuple(temp)
-        elif type_arg in [dict]:
-            for key in hint_object[idx_or_key]:
-                self._do_get_input_for_each_stream(
-                    hint_object[idx_or_key],
-                    input_object[idx_or_key],
-                    stream_input_object[idx_or_key],
-                    key,
-                    stream_id,
-                )
-        elif (type_arg is int) or (hint_object[idx_or_key] is None):
-            if hint_object[idx_or_key] is not None:
-                # If user tells us to split in this object,
-                if self.split_size is None:
-                    # Init the input status for each stream here
-                    # Here the stream_id must be 0
-                    self.init_forward_status(
-                        input_object[idx_or_key].size(hint_object[idx_or_key]),
-                        stream_id,
-                    )
-                # Get the split input for each stream
-                # Here we assume split along the outside dim, otherwise memory copy happens and obviously \
-                # hurt multi stream module's performance.
-                if hint_object[idx_or_key] == 0:
-                    # Split along dim 0, the slice will not create new tensor
-                    stream_input_object[idx_or_key] = input_object[idx_or_key][
-                        self.current_split_start_idx : self.current_split_end_idx
-                    ]
-                else:
-                    # Otherwise, we use torch.narrow
-                    length = self.current_split_end_idx - self.current_split_start_idx
-                    stream_input_object[idx_or_key] = input_object[idx_or_key].narrow(
-                        hint_object[idx_or_key], self.current_split_start_idx, length
-                    )
-            else:
-                # This object shouldn't be split, just set it as each stream's input
-                stream_input_object[idx_or_key] = input_object[idx_or_key]
-        else:
-            AssertionError(
-                False
-            ), "Generate stream input failed, unsupport input hint type of:{}".format(
-                type_arg
-            )
-        return None
-
-    def _get_input_for_each_stream(
-        self, multi_stream_module_split_hint, *args, **kwargs
-    ):
-        # recursive once to init:
-        #   1. Decide the actual self.used_num_streams (it may less than number stream when input bs is small)
-        #   2. Init the current_split_start_idx and current_split_end_idx for inputs split
-        #   3. Decide the actual input for stream_id 0
-        for i in range(multi_stream_module_split_hint.args_len):
-            self._do_get_input_for_each_stream(
-                hint_object=multi_stream_module_split_hint.args,
-                input_object=args,
-                stream_input_object=self.args_streams_input[0],
-                idx_or_key=i,
-                stream_id=0,
-            )
-        for key in multi_stream_module_split_hint.kwargs:
-            self._do_get_input_for_each_stream(
-                hint_object=multi_stream_module_split_hint.kwargs,
-                input_object=kwargs,
-                stream_input_object=self.kwargs_streams_input[0],
-                idx_or_key=key,
-                stream_id=0,
-            )
-        # After we get the self.used_num_streams then we can
-        # decide the inputs for the left of used_num_streams
-        for stream_id in range(1, self.used_num_streams):
-            # Update the split idx for current stream
-            self.update_split_idx(stream_id)
-            # Here we put stream go through as the outer for loop,
-            # Since we assume the multi_stream_module_split_hint is not complicated to be recursive generally.
-            for i in range(multi_stream_module_split_hint.args_len):
-                self._do_get_input_for_each_stream(
-                    hint_object=multi_stream_module_split_hint.args,
-                    input_object=args,
-                    stream_input_object=self.args_streams_input[stream_id],
-                    idx_or_key=i,
-                    stream_id=stream_id,
-                )
-            for key in multi_stream_module_split_hint.kwargs:
-                self._do_get_input_for_each_stream(
-                    hint_object=multi_stream_module_split_hint.kwargs,
-                    input_object=kwargs,
-                    stream_input_object=self.kwargs_streams_input[stream_id],
-                    idx_or_key=key,
-                    stream_id=stream_id,
-                )
-
-    def _do_generate_outputs(
-        self, hint_object, output_object, stream_output_object, idx_or_key, stream_id
-    ):
-        type_arg = type(hint_object[idx_or_key])
-        if type_arg in [list]:
-            for i in range(hint_object[idx_or_key].__len__()):
-                self._do_generate_outputs(
-                    hint_object[idx_or_key],
-                    output_object[idx_or_key],
-                    stream_output_object[idx_or_key],
-                    i,
-                    stream_id,
-                )
-        elif type_arg in [tuple]:
-            # Tuple doesn't support item change in place
-            # So we change it to list for next recursion and change it back to tuple.
-            temp = list(output_object[idx_or_key])
-            for i in range(hint_object[idx_or_key].__len__()):
-                self._do_generate_outputs(
-                    hint_object[idx_or_key],
-                    temp,
-                    stream_output_object[idx_or_key],
-                    i,
-                    stream_id,
-                )
-            output_object[idx_or_key] = tuple(temp)
-        elif type_arg in [dict]:
-            for key in hint_object[idx_or_key]:
-                self._do_generate_outputs(
-                    hint_object[idx_or_key],
-                    output_object[idx_or_key],
-                    stream_output_object[idx_or_key],
-                    key,
-                    stream_id,
-                )
-        elif (type_arg is int) or (hint_object[idx_or_key] is None):
-            if hint_object[idx_or_key] is not None:
-                if stream_id == 0:
-                    output_object[idx_or_key] = []
-                output_object[idx_or_key].append(stream_output_object[idx_or_key])
-            else:
-                # This object shouldn't be concat, just copy once for stream_id = 0
-                if stream_id == 0:
-                    output_object[idx_or_key] = stream_output_object[idx_or_key]
-        else:
-            AssertionError(
-                False
-            ), "Generate outputs failed, unsupport output hint type of:{}".format(
-                type_arg
-            )
-        return None
-
-    def _generate_outputs(self, stream_output_object, stream_id):
-        # For each position, we will push the result generated by each stream into the list
-        # multi_stream_module_split_hint.args_len must be 1, since the module output will be a \
-        # single output or tuple for multi outputs
+        # Compile the hints once into functions which split the inputs and gather/rebuild
+        # the outputs, so that forward does not walk the hint structures again.
+        self._split_args = _compile_split_fn(list(self.input_split_hint.args))
+        self._split_kwargs = _compile_split_fn(self.input_split_hint.kwargs)
+        self._flatten_inputs = _compile_flatten_fn(
+            (list(self.input_split_hint.args), self.input_split_hint.kwargs)
+        )
+        self._input_split_dims = _get_hint_dims(
+            (list(self.input_split_hint.args), self.input_split_hint.kwargs)
+        )
+        # The output of the model is matched against output_concat_hint.args[0]
+        # and/or output_concat_hint.kwargs.
+        output_hints = []
         if self.output_concat_hint.args:
-            self._do_generate_outputs(
-                hint_object=self.output_concat_hint.args,
-                output_object=self.output.args,
-                stream_output_object=stream_output_object,
-                idx_or_key=0,
-                stream_id=stream_id,
-            )
+            output_hints.append(self.output_concat_hint.args[0])
         if self.output_concat_hint.kwargs:
-            for key, value in self.output_concat_hint.kwargs.items():
-                self._do_generate_outputs(
-                    hint_object=self.output_concat_hint.kwargs,
-                    output_object=self.output.kwargs,
-                    stream_output_object=stream_output_object[0],
-                    idx_or_key=key,
-                    stream_id=stream_id,
-                )
+            output_hints.append(self.output_concat_hint.kwargs)
+        self._flatten_output_fns = [_compile_flatten_fn(h) for h in output_hints]
+        self._rebuild_output_fns = [_compile_rebuild_fn(h) for h in output_hints]
+        self._output_concat_dims = _get_hint_dims(output_hints)
+
+        # Split/concat plans cached per input signature
+        self._plans = collections.OrderedDict()
+
+        self._autotuner = None
+        if autotune:
+            self._autotuner = _StreamNumAutotuner(
+                lambda n: MultiStreamModule(
+                    model,
+                    num_streams=n,
+                    cpu_pool=cpu_pool,
+                    concat_output=concat_output,
+                    input_split_hint=input_split_hint,
+                    output_concat_hint=output_concat_hint,
+                ),
+                _get_divisors(self.core_list.__len__()),
+            )
 
-    def _do_concat_output_for_each_stream(self, hint_object, output_object, idx_or_key):
-        type_arg = type(hint_object[idx_or_key])
-        if type_arg in [list]:
-            for i in range(hint_object[idx_or_key].__len__()):
-                self._do_concat_output_for_each_stream(
-                    hint_object[idx_or_key], output_object[idx_or_key], i
-                )
-        if type_arg in [tuple]:
-            # Tuple doesn't support item change in place
-            # So we change it to list for next recursion and change it back to tuple.
-            temp = list(output_object[idx_or_key])
-            for i in range(hint_object[idx_or_key].__len__()):
-                self._do_concat_output_for_each_stream(hint_object[idx_or_key], temp, i)
-            output_object[idx_or_key] = tuple(temp)
-        elif type_arg in [dict]:
-            for key in hint_object[idx_or_key]:
-                self._do_concat_output_for_each_stream(
-                    hint_object[idx_or_key], output_object[idx_or_key], key
-                )
-        elif (type_arg is int) or (hint_object[idx_or_key] is None):
-            if hint_object[idx_or_key] is not None:
-                output_object[idx_or_key] = torch.cat(
-                    output_object[idx_or_key], dim=hint_object[idx_or_key]
-                )
+    def _get_split_ranges(self, split_size):
+        # If input batchsize larger than num_streams and not divisible, the first remainder
+        # streams will have (mini_batch + 1) input size. If the input batchsize is less than
+        # num_streams, only the first batchsize streams will have mini_batch(1) input.
+        if split_size is None:
+            # Nothing to split, every stream runs the same input
+            return [(0, 0)] * self.num_streams
+        batch_per_instance = split_size // self.num_streams
+        if batch_per_instance >= 1:
+            used_num_streams = self.num_streams
+            instance_need_extra_input = split_size % self.num_streams
         else:
-            AssertionError(
-                False
-            ), "Concat output failed, unsupport output hint type of:{}".format(type_arg)
-        return None
-
-    def _concat_output_for_each_stream(self):
-        # Concat the output, when here each position is already a List of tensors to be concat.
-        if self.output_concat_hint.args:
-            self._do_concat_output_for_each_stream(
-                self.output_concat_hint.args, self.output.args, 0
+            batch_per_instance = 1
+            used_num_streams = split_size
+            instance_need_extra_input = 0
+        split_ranges = []
+        start = 0
+        for stream_id in range(used_num_streams):
+            length = batch_per_instance + (
+                1 if stream_id < instance_need_extra_input else 0
             )
-
-        return_obj = dict()
-        if self.output_concat_hint.kwargs:
-            for key, value in self.output_concat_hint.kwargs.items():
-                self._do_concat_output_for_each_stream(
-                    self.output_concat_hint.kwargs, self.output.kwargs, key
-                )
-                return_obj[key] = self.output.kwargs[key]
-
+            split_ranges.append((start, length))
+            start += length
+        return split_ranges
+
+    def _get_plan(self, args, kwargs):
+        split_leaves = []
+        self._flatten_inputs((args, kwargs), split_leaves)
+        signature = tuple(tuple(leaf.shape) for leaf in split_leaves)
+        plan = self._plans.get(signature)
+        if plan is not None:
+            self._plans.move_to_end(signature)
+            return plan
+        split_size = (
+            split_leaves[0].size(self._input_split_dims[0]) if split_leaves else None
+        )
+        plan = _MultiStreamPlan(self._get_split_ranges(split_size))
+        self._plans[signature] = plan
+        if len(self._plans) > _MAX_NUM_CACHED_PLANS:
+            self._plans.popitem(last=False)
+        return plan
+
+    def _flatten_output(self, output):
+        leaves = []
+        for flatten_fn in self._flatten_output_fns:
+            flatten_fn(output, leaves)
+        return leaves
+
+    def _rebuild_output(self, output, leaves):
+        leaves = iter(leaves)
+        results = [
+            rebuild_fn(output, leaves) for rebuild_fn in self._rebuild_output_fns
+        ]
         # If the output hint has both the args and kwargs, then we return them as a tuple.
         # Otherwise, return them as it is.
-        if self.output_concat_hint.args and self.output_concat_hint.kwargs:
-            return self.output.args[0], return_obj
-        elif self.output_concat_hint.args:
-            return self.output.args[0]
-        else:
-            return return_obj
+        if len(results) == 2:
+            return results[0], results[1]
+        return results[0] if results else dict()
+
+    def _concat_outputs_with_cat(self, plan, outputs):
+        # Concatenate the outputs and record their layout for the next forwards of the signature
+        leaves_per_stream = [self._flatten_output(output) for output in outputs]
+        concat_leaves = []
+        output_layouts = []
+        for i, dim in enumerate(self._output_concat_dims):
+            parts = [leaves[i] for leaves in leaves_per_stream]
+            concat_leaf = torch.cat(parts, dim=dim)
+            stream_ranges = []
+            offset = 0
+            for part in parts:
+                stream_ranges.append((offset, part.size(dim)))
+                offset += part.size(dim)
+            concat_leaves.append(concat_leaf)
+            output_layouts.append(
+                (concat_leaf.shape, concat_leaf.dtype, dim, stream_ranges)
+            )
+        plan.output_layouts = output_layouts
+        return self._rebuild_output(outputs[0], concat_leaves)
+
+    def _concat_outputs(self, plan, futures):
+        if plan.output_layouts is None:
+            return self._concat_outputs_with_cat(plan, [f.get() for f in futures])
+        # The output buffers are allocated upfront from the plan and every stream output
+        # is copied into its view as soon as the stream finishes, while the other streams
+        # are still running, instead of a torch.cat after all streams finished.
+        buffers = [
+            torch.empty(shape, dtype=dtype)
+            for shape, dtype, _, _ in plan.output_layouts
+        ]
+        outputs = []
+        for stream_id, future in enumerate(futures):
+            output = future.get()
+            outputs.append(output)
+            for buffer, leaf, (_, dtype, dim, stream_ranges) in zip(
+                buffers, self._flatten_output(output), plan.output_layouts
+            ):
+                offset, length = stream_ranges[stream_id]
+                view = buffer.narrow(dim, offset, length)
+                if view.shape != leaf.shape or leaf.dtype != dtype:
+                    # The output shapes depend on more than the input shapes,
+                    # drop the layout and fall back to torch.cat.
+                    outputs += [f.get() for f in futures[stream_id + 1 :]]
+                    return self._concat_outputs_with_cat(plan, outputs)
+                view.copy_(leaf)
+        return self._rebuild_output(outputs[0], buffers)
 
     def forward(self, *args, **kwargs):
-        # Reset the forward status to default value which mainly contains information
-        # to split inputs. They will init afterwards for each forward call.
-        self.reset_forward_status()
+        if self._autotuner is not None:
+            split_leaves = []
+            self._flatten_inputs((args, kwargs), split_leaves)
+            split_size = (
+                split_leaves[0].size(self._input_split_dims[0])
+                if split_leaves
+                else None
+            )
+            return self._autotuner(split_size, *args, **kwargs)
         if self.num_streams == 1:
             # Sync execution path if num_stream is 1
             if not core.is_same_core_affinity_setting(self.core_list):
@@ -493,39 +570,40 @@ class MultiStreamModule(nn.Module):
             results_raw = self.model(*args, **kwargs)
             return results_raw if self.concat_output else [results_raw]
 
-        # Split the raw input to generate input for each stream
-        self._get_input_for_each_stream(self.input_split_hint, *args, **kwargs)
-
-        results_raw_future = []
-        results_raw = []
-        for stream_id in range(self.used_num_streams):
-            results_raw_future.append(
+        plan = self._get_plan(args, kwargs)
+        # Split the raw input into views for each stream and submit
+        futures = []
+        for stream_id, (start, length) in enumerate(plan.split_ranges):
+            futures.append(
                 self.tasks[stream_id](
-                    *(self.args_streams_input[stream_id]),
-                    **(self.kwargs_streams_input[stream_id]),
+                    *self._split_args(args, start, length),
+                    **self._split_kwargs(kwargs, start, length),
                 )
             )
-
-        for stream_id in range(self.used_num_streams):
-            # If we need to concat the output, for each position, we will push the result generated \
-            # by each stream into a list for concat later.
-            # For self._generate_outputs: here we put results_raw_future[stream_id].get() into a \
-            # [results_raw_future[stream_id].get()]
-            # to align the multi_stream_module_concat_hint structure.
-            self._generate_outputs(
-                [results_raw_future[stream_id].get()], stream_id
-            ) if self.concat_output else results_raw.append(
-                results_raw_future[stream_id].get()
-            )
-        # If we need to concat the output, for each position, we will concat the result in the list \
-        # (generate in self._generate_outputs).
-        return (
-            self._concat_output_for_each_stream() if self.concat_output else results_raw
-        )
+        if not self.concat_output:
+            return [future.get() for future in futures]
+        return self._concat_outputs(plan, futures)
 
     def get_stream_number(self):
+        if self._autotuner is not None and self._autotuner.last_num_streams is not None:
+            # The number of streams used by the latest forward
+            return self._autotuner.last_num_streams
         return self.num_streams
 
+    def get_tuned_stream_numbers(self):
+        r"""
+        Returns the number of streams selected for each batch size bucket with
+        ``num_streams="AUTOTUNE"``, None for the buckets which are still tuned.
+        The bucket of a batch size is the next power of 2.
+        """
+        assert (
+            self._autotuner is not None
+        ), 'get_tuned_stream_numbers needs num_streams="AUTOTUNE"'
+        return {
+            bucket_size: bucket.best_num_streams
+            for bucket_size, bucket in self._autotuner.buckets.items()
+        }
+
 
 class _MultiStreamBenchmarkModule(nn.Module):
     # Here is an internal Module for weight sharing benchmark
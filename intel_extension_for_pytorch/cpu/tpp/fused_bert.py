@@ -1202,7 +1202,9 @@ def block(model):
             m.maybe_block_params()
 
 
-def fast_bert(model, dtype=torch.float, optimizer=None, unpad=False):
+def fast_bert(
+    model, dtype=torch.float, optimizer=None, unpad=False, state_compression=None
+):
     r"""
     Use TPP to speedup training/inference. fast_bert API is still a prototype
     feature and now only optimized for bert model.
@@ -1216,6 +1218,9 @@ def fast_bert(model, dtype=torch.float, optimizer=None, unpad=False):
         unpad(bool): Unpad the squence to reduce the sparsity.
         seed(string): The seed used for the libxsmm kernel. In general it should be same
             to the torch.seed
+        state_compression(str): Store the AdamW moments compressed, ``"bf16"`` or
+            ``"int8"``, see :class:`intel_extension_for_pytorch.cpu.tpp.optim.AdamW`.
+            The default value is ``None``, meaning full precision moments.
 
     .. note::
 
@@ -1362,11 +1367,18 @@ def fast_bert(model, dtype=torch.float, optimizer=None, unpad=False):
             _type=WarningType.NotSupported,
         )
         new_optimizer = optimizer
+    elif state_compression is not None:
+        if PT_OPTIMIZER_TO_TPP_OPTIMIZER[type(optimizer)] is not AdamW:
+            raise ValueError("fast_bert only supports state_compression for AdamW")
+        new_optimizer = AdamW([{"params": []}], state_compression=state_compression)
     else:
         new_optimizer = PT_OPTIMIZER_TO_TPP_OPTIMIZER[type(optimizer)]([{"params": []}])
     new_optimizer.state = optimizer.state
     new_optimizer.param_groups = optimizer.param_groups
     for group in new_optimizer.param_groups:
+        # the groups of the user optimizer lack the options of the tpp optimizer
+        for key, value in new_optimizer.defaults.items():
+            group.setdefault(key, value)
         for i, p in enumerate(group["params"]):
             if p in param_pair:
                 new_param = param_pair[p]
@@ -1,10 +1,268 @@
 import math
-from typing import Callable, Iterable, Tuple
+from functools import lru_cache
+from typing import Callable, Iterable, Optional, Tuple
 import torch
+import torch.nn.functional as F
 from torch.optim import Optimizer
 from torch.optim.optimizer import required
 import intel_extension_for_pytorch._C as ipex_cpp
 
+STATE_COMPRESSIONS = ("bf16", "int8")
+# Keys of the compressed Adam moments and of their per-block scales
+_MOMENT_KEYS = ("exp_avg", "exp_avg_sq", "exp_avg_absmax", "exp_avg_sq_absmax")
+# Number of elements dequantized at a time by the compressed optimizer steps
+_CHUNK_NUMEL = 1 << 16
+
+
+@lru_cache(maxsize=None)
+def _dynamic_code(signed):
+    r"""
+    The 256 values an 8-bit moment can take, sorted, relative to the absmax of its
+    block. Their magnitudes are geometrically spaced from 1e-7 to 1, so small
+    moments keep a bounded relative error.
+    """
+    if signed:
+        negative = -torch.logspace(0, -7, 127)
+        return torch.cat([negative, torch.zeros(1), torch.logspace(-7, 0, 128)])
+    return torch.cat([torch.zeros(1), torch.logspace(-7, 0, 255)])
+
+
+def _quantize_blockwise(x, codes, absmax, signed, block_size):
+    r"""
+    Quantize the fp32 tensor ``x`` to the uint8 ``codes`` with one scale per block of
+    ``block_size`` elements, written to ``absmax``.
+    """
+    code = _dynamic_code(signed)
+    n = x.numel()
+    blocks = F.pad(x, (0, -n % block_size)).view(-1, block_size)
+    scale = blocks.abs().amax(dim=1)
+    normed = blocks / scale.clamp(min=torch.finfo(torch.float).tiny).unsqueeze(1)
+    normed = normed.view(-1)[:n]
+    index = torch.searchsorted(code, normed).clamp_(1, code.numel() - 1)
+    lower = code[index - 1]
+    upper = code[index]
+    index -= (normed - lower < upper - normed).to(index.dtype)
+    codes.copy_(index)
+    absmax.copy_(scale)
+
+
+def _dequantize_blockwise(codes, absmax, signed, block_size):
+    code = _dynamic_code(signed)
+    n = codes.numel()
+    values = F.pad(code[codes.long()], (0, -n % block_size))
+    return (values.view(-1, block_size) * absmax.unsqueeze(1)).view(-1)[:n]
+
+
+def _to_bf16_stochastic(x):
+    r"""
+    Round the fp32 tensor ``x`` to bf16 stochastically, so that small moment updates
+    are not lost to round-to-nearest over many steps.
+    """
+    noise = torch.randint(0, 1 << 16, x.shape, dtype=torch.int32)
+    bits = x.view(torch.int32) + noise
+    return bits.bitwise_and_(-(1 << 16)).view(torch.float).to(torch.bfloat16)
+
+
+def _split_to_float(hi, lo):
+    r"""The fp32 master weight of a bf16 param and its ``low_bits`` state."""
+    hi = hi.view(torch.int16).to(torch.int32).bitwise_left_shift_(16)
+    lo = lo.view(torch.int16).to(torch.int32).bitwise_and_(0xFFFF)
+    return hi.bitwise_or_(lo).view(torch.float)
+
+
+def _float_to_split(x, hi, lo):
+    bits = x.view(torch.int32)
+    hi.view(torch.int16).copy_(bits.bitwise_right_shift(16))
+    lo.view(torch.int16).copy_(bits.bitwise_left_shift(16).bitwise_right_shift_(16))
+
+
+def _check_state_compression(state_compression, state_block_size):
+    if state_compression is not None and state_compression not in STATE_COMPRESSIONS:
+        raise ValueError(
+            "Invalid state_compression: {} - should be None or one of {}".format(
+                state_compression, STATE_COMPRESSIONS
+            )
+        )
+    if state_block_size <= 0:
+        raise ValueError("Invalid state_block_size: {}".format(state_block_size))
+
+
+def _init_moments(state, numel, compression, block_size):
+    r"""
+    Allocate the compressed Adam moments of a param, or compress the full precision
+    moments loaded from a checkpoint of an optimizer without state compression.
+    """
+    for key, signed in (("exp_avg", True), ("exp_avg_sq", False)):
+        value = state.get(key)
+        if compression == "bf16":
+            if value is None:
+                state[key] = torch.zeros(numel, dtype=torch.bfloat16)
+            elif value.dtype != torch.bfloat16:
+                state[key] = value.reshape(-1).to(torch.bfloat16)
+        elif value is None or value.dtype != torch.uint8:
+            codes = torch.zeros(numel, dtype=torch.uint8)
+            absmax = torch.zeros((numel + block_size - 1) // block_size)
+            if value is not None:
+                value = value.reshape(-1).float()
+                _quantize_blockwise(value, codes, absmax, signed, block_size)
+            state[key] = codes
+            state[key + "_absmax"] = absmax
+
+
+def _read_moment(state, key, start, end, compression, block_size):
+    if compression == "bf16":
+        return state[key][start:end].float()
+    absmax = state[key + "_absmax"][start // block_size : -(-end // block_size)]
+    return _dequantize_blockwise(
+        state[key][start:end], absmax, key == "exp_avg", block_size
+    )
+
+
+def _write_moment(state, key, start, end, value, compression, block_size):
+    if compression == "bf16":
+        state[key][start:end] = _to_bf16_stochastic(value)
+    else:
+        absmax = state[key + "_absmax"][start // block_size : -(-end // block_size)]
+        _quantize_blockwise(
+            value, state[key][start:end], absmax, key == "exp_avg", block_size
+        )
+
+
+def _chunks(numel, block_size):
+    chunk = max(1, _CHUNK_NUMEL // block_size) * block_size
+    for start in range(0, numel, chunk):
+        yield start, min(start + chunk, numel)
+
+
+def _master_chunk(p, state, start, end):
+    if p.dtype == torch.bfloat16:
+        return _split_to_float(
+            p.data.view(-1)[start:end], state["low_bits"].view(-1)[start:end]
+        )
+    return p.data.view(-1)[start:end]
+
+
+def _update_master_chunk(p, state, start, end, data):
+    if p.dtype == torch.bfloat16:
+        _float_to_split(
+            data, p.data.view(-1)[start:end], state["low_bits"].view(-1)[start:end]
+        )
+
+
+def _compressed_adamw_step(p, grad, state, group, step_size):
+    r"""
+    AdamW step of a fp32 or bf16 param with compressed moments. Each chunk of the
+    moments (and of the fp32 master weight of a bf16 param) is dequantized, updated
+    in place by the fused TPP AdamW kernel and compressed back, so the full
+    precision moments never exist for the whole param.
+    """
+    compression = group["state_compression"]
+    block_size = group["state_block_size"]
+    beta1, beta2 = group["betas"]
+    grad = grad.contiguous().view(-1)
+    for start, end in _chunks(p.numel(), block_size):
+        data = _master_chunk(p, state, start, end)
+        exp_avg = _read_moment(state, "exp_avg", start, end, compression, block_size)
+        exp_avg_sq = _read_moment(
+            state, "exp_avg_sq", start, end, compression, block_size
+        )
+        ipex_cpp.tpp_fused_adamw(
+            data,
+            grad[start:end].float(),
+            exp_avg,
+            exp_avg_sq,
+            beta1,
+            beta2,
+            step_size,
+            group["lr"],
+            group["weight_decay"],
+            group["eps"],
+        )
+        _write_moment(state, "exp_avg", start, end, exp_avg, compression, block_size)
+        _write_moment(
+            state, "exp_avg_sq", start, end, exp_avg_sq, compression, block_size
+        )
+        _update_master_chunk(p, state, start, end, data)
+
+
+def _compressed_lamb_step(p, grad, state, group):
+    r"""
+    Lamb step of a fp32 or bf16 param with compressed moments, returning the new
+    weight norm. The trust ratio needs the norm of the whole Adam update, so the
+    chunks are visited twice: the first pass updates the moments and accumulates the
+    norms, the second one applies the update computed from the stored moments.
+    """
+    compression = group["state_compression"]
+    block_size = group["state_block_size"]
+    beta1, beta2 = group["betas"]
+    eps = group["eps"]
+    weight_decay = group["weight_decay"]
+    grad = grad.contiguous().view(-1)
+
+    def adam_step(data, exp_avg, exp_avg_sq):
+        update = exp_avg / exp_avg_sq.sqrt().add_(eps)
+        if weight_decay > 0.0:
+            update.add_(data, alpha=weight_decay)
+        return update
+
+    weight_norm = state["weight_norm"]
+    weight_norm_sq = 0.0
+    adam_norm_sq = 0.0
+    for start, end in _chunks(p.numel(), block_size):
+        data = _master_chunk(p, state, start, end)
+        g = grad[start:end].float()
+        exp_avg = _read_moment(state, "exp_avg", start, end, compression, block_size)
+        exp_avg_sq = _read_moment(
+            state, "exp_avg_sq", start, end, compression, block_size
+        )
+        exp_avg.mul_(beta1).add_(g, alpha=1.0 - beta1)
+        exp_avg_sq.mul_(beta2).addcmul_(g, g, value=1.0 - beta2)
+        _write_moment(state, "exp_avg", start, end, exp_avg, compression, block_size)
+        _write_moment(
+            state, "exp_avg_sq", start, end, exp_avg_sq, compression, block_size
+        )
+        adam_norm_sq += adam_step(data, exp_avg, exp_avg_sq).square().sum().item()
+        if weight_norm == -1.0:
+            weight_norm_sq += data.square().sum().item()
+    if weight_norm == -1.0:
+        weight_norm = math.sqrt(weight_norm_sq)
+    adam_norm = math.sqrt(adam_norm_sq)
+    trust_ratio = 1.0
+    if weight_norm != 0 and adam_norm != 0:
+        trust_ratio = weight_norm / adam_norm
+
+    new_weight_norm_sq = 0.0
+    for start, end in _chunks(p.numel(), block_size):
+        data = _master_chunk(p, state, start, end)
+        exp_avg = _read_moment(state, "exp_avg", start, end, compression, block_size)
+        exp_avg_sq = _read_moment(
+            state, "exp_avg_sq", start, end, compression, block_size
+        )
+        update = adam_step(data, exp_avg, exp_avg_sq)
+        data.add_(update, alpha=-group["lr"] * trust_ratio)
+        new_weight_norm_sq += data.square().sum().item()
+        _update_master_chunk(p, state, start, end, data)
+    return min(math.sqrt(new_weight_norm_sq), 10.0)
+
+
+def _restore_compressed_states(optimizer, state_dict):
+    r"""
+    ``Optimizer.load_state_dict`` casts the floating point states to the dtype of
+    their params, which widens the bf16 moments of fp32 params and rounds the fp32
+    block scales of bf16 params. Restore the saved dtypes of the compressed states.
+    """
+    saved_groups = state_dict["param_groups"]
+    for saved_group, group in zip(saved_groups, optimizer.param_groups):
+        if group.get("state_compression") is None:
+            continue
+        for saved_id, p in zip(saved_group["params"], group["params"]):
+            saved = state_dict["state"].get(saved_id, {})
+            state = optimizer.state[p]
+            for key in _MOMENT_KEYS:
+                value = saved.get(key)
+                if torch.is_tensor(value) and value.dtype != state[key].dtype:
+                    state[key] = value.to(device=p.device, copy=True)
+
 
 class SGD(Optimizer):
     r"""Implements low precision stochastic gradient descent with extra state."""
@@ -117,6 +375,13 @@ class AdamW(Optimizer):
             Decoupled weight decay to apply.
         correct_bias (:obj:`bool`, `optional`, defaults to `True`):
             Whether ot not to correct bias in Adam (for instance, in Bert TF repository they use :obj:`False`).
+        state_compression (:obj:`str`, `optional`, defaults to :obj:`None`):
+            Store the moments of fp32 and bf16 params compressed: ``"bf16"`` keeps
+            them in bf16 updated with stochastic rounding, ``"int8"`` quantizes them
+            to 8 bits with one fp32 scale per block. The moments are dequantized
+            chunk by chunk inside the step.
+        state_block_size (:obj:`int`, `optional`, defaults to 256):
+            Number of elements sharing a scale with ``state_compression="int8"``.
     """
 
     def __init__(
@@ -127,6 +392,8 @@ class AdamW(Optimizer):
         eps: float = 1e-6,
         weight_decay: float = 0.0,
         correct_bias: bool = True,
+        state_compression: Optional[str] = None,
+        state_block_size: int = 256,
     ):
         if lr < 0.0:
             raise ValueError("Invalid learning rate: {} - should be >= 0.0".format(lr))
@@ -140,15 +407,22 @@ class AdamW(Optimizer):
             )
         if not 0.0 <= eps:
             raise ValueError("Invalid epsilon value: {} - should be >= 0.0".format(eps))
+        _check_state_compression(state_compression, state_block_size)
         defaults = dict(
             lr=lr,
             betas=betas,
             eps=eps,
             weight_decay=weight_decay,
             correct_bias=correct_bias,
+            state_compression=state_compression,
+            state_block_size=state_block_size,
         )
         super().__init__(params, defaults)
 
+    def load_state_dict(self, state_dict):
+        super().load_state_dict(state_dict)
+        _restore_compressed_states(self, state_dict)
+
     def step(self, closure: Callable = None):
         """
         Performs a single optimization step.
@@ -170,6 +444,30 @@ class AdamW(Optimizer):
                     raise RuntimeError(
                         "Adam does not support sparse gradients, please consider SparseAdam instead"
                     )
+                compression = group.get("state_compression")
+                if compression is not None:
+                    if p.dtype not in (torch.float, torch.bfloat16):
+                        raise ValueError(
+                            "state_compression only supports fp32 and bf16 params"
+                        )
+                    state = self.state[p]
+                    state.setdefault("step", 0)
+                    if p.dtype == torch.bfloat16 and "low_bits" not in state:
+                        state["low_bits"] = torch.zeros_like(p.data)
+                    _init_moments(
+                        state, p.numel(), compression, group["state_block_size"]
+                    )
+                    state["step"] += 1
+                    beta1, beta2 = group["betas"]
+                    step_size = group["lr"]
+                    if group["correct_bias"]:
+                        bias_correction1 = 1.0 - beta1 ** state["step"]
+                        bias_correction2 = 1.0 - beta2 ** state["step"]
+                        step_size = (
+                            step_size * math.sqrt(bias_correction2) / bias_correction1
+                        )
+                    _compressed_adamw_step(p, grad, state, group, step_size)
+                    continue
                 if hasattr(torch, "bfloat8") and p.data.dtype == torch.bfloat8:
                     data = data.to(torch.float)
                     grad = grad.to(torch.float)
@@ -324,6 +622,11 @@ class Lamb(Optimizer):
         weight_decay (float, optional): weight decay (L2 penalty) (default: 0)
         adam (bool, optional): always use trust ratio = 1, which turns this into
             Adam. Useful for comparison purposes.
+        state_compression (str, optional): store the moments of fp32 and bf16
+            params in ``"bf16"`` with stochastic rounding or in ``"int8"`` with one
+            fp32 scale per block (default: None)
+        state_block_size (int, optional): number of elements sharing a scale with
+            ``state_compression="int8"`` (default: 256)
 
     .. _Large Batch Optimization for Deep Learning: Training BERT in 76 minutes:
         https://arxiv.org/abs/1904.00962
@@ -338,6 +641,8 @@ class Lamb(Optimizer):
         weight_decay: float = 0.0,
         adam: bool = False,
         correct_bias: bool = True,
+        state_compression: Optional[str] = None,
+        state_block_size: int = 256,
     ):
         if not 0.0 <= lr:
             raise ValueError("Invalid learning rate: {}".format(lr))
@@ -347,16 +652,23 @@ class Lamb(Optimizer):
             raise ValueError("Invalid beta parameter at index 0: {}".format(betas[0]))
         if not 0.0 <= betas[1] < 1.0:
             raise ValueError("Invalid beta parameter at index 1: {}".format(betas[1]))
+        _check_state_compression(state_compression, state_block_size)
         defaults = dict(
             lr=lr,
             betas=betas,
             eps=eps,
             weight_decay=weight_decay,
             correct_bias=correct_bias,
+            state_compression=state_compression,
+            state_block_size=state_block_size,
         )
         self.adam = adam
         super(Lamb, self).__init__(params, defaults)
 
+    def load_state_dict(self, state_dict):
+        super(Lamb, self).load_state_dict(state_dict)
+        _restore_compressed_states(self, state_dict)
+
     def step(self, closure=None):
         """Performs a single optimization step.
 
@@ -380,6 +692,23 @@ class Lamb(Optimizer):
                     )
 
                 state = self.state[p]
+                compression = group.get("state_compression")
+                if compression is not None:
+                    if p.dtype not in (torch.float, torch.bfloat16):
+                        raise ValueError(
+                            "state_compression only supports fp32 and bf16 params"
+                        )
+                    state.setdefault("step", 0)
+                    state.setdefault("weight_norm", -1.0)
+                    if p.dtype == torch.bfloat16 and "low_bits" not in state:
+                        state["low_bits"] = torch.zeros_like(p.data)
+                    _init_moments(
+                        state, p.numel(), compression, group["state_block_size"]
+                    )
+                    state["step"] += 1
+                    state["weight_norm"] = _compressed_lamb_step(p, grad, state, group)
+                    continue
+
                 # State initialization
                 if len(state) == 0:
                     state["step"] = 0
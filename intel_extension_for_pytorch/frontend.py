@@ -183,6 +183,8 @@ def optimize(
     sample_input=None,
     graph_mode=None,
     concat_linear=None,
+    graph_mode_buckets=None,
+    flat_update_buffers=False,
 ):
     r"""
     Apply optimizations at Python frontend to the given model (nn.Module), as
@@ -274,6 +276,27 @@ def optimize(
         concat_linear (bool): Whether to perform ``concat_linear``. It only
             works for inference model. The default value is ``None``. Explicitly
             setting this knob overwrites the configuration set by ``level`` knob.
+        graph_mode_buckets (dict) [prototype]: Shape buckets of ``graph_mode`` for
+            inference with variable input shapes, mapping input dims to lists of
+            sizes, e.g., ``{0: [1, 4, 16], 1: [128, 512]}``. The input tensors are
+            zero padded along these dims up to the next bucket size, one graph is
+            captured per bucket and kept in a LRU, and the output tensors are sliced
+            back along their dims which follow the padded input dims. These are found
+            when a bucket is captured, by running the original model with one more
+            element along each padded dim; buckets whose outputs depend on the
+            padded dims otherwise run the original model, as do shapes larger than
+            every bucket. Padding must not change the unpadded part of the output,
+            e.g., for models which process the samples of a batch independently.
+            The default value is ``None``, meaning a single graph captured from the
+            first input.
+        flat_update_buffers (bool) [prototype]: Whether the fused update step
+            coalesces the parameters of the same dtype, with their gradients,
+            master weight trails and optimizer states, into flat buffers updated
+            by a single kernel call, for models with many small parameters. The
+            parameters and states become views of the buffers, ``zero_grad``
+            keeps the gradients as zeroed views. Only applies with
+            ``fuse_update_step`` to SGD, Adam and Lamb on CPU. The default value
+            is ``False``.
 
     Returns:
         Model and optimizer (if given) modified according to the ``level`` knob
@@ -586,6 +609,7 @@ def optimize(
             optimizer is not None,
             dtype,
             opt_properties.weights_prepack,
+            buckets=graph_mode_buckets,
         )
         optimized_model.forward = wrapper(_old_forward)
 
@@ -598,6 +622,7 @@ def optimize(
             optimized_optimizer,
             device_type,
             fuse_update_step,
+            flat_update_buffers,
         )
     return optimized_model, optimized_optimizer
 
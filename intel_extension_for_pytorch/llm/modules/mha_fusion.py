@@ -1,6 +1,6 @@
 import torch
 import torch.nn as nn
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 from .utils import IPEXRuntimeCustomOps, IPEXCustomOpType
 
 
@@ -452,6 +452,16 @@ class PagedAttention:
     - max_context_len (int): The max sequence length.
     - alibi_slopes (torch.Tensor, optinal): which is the alibi slope with the shape of (num_heads).
 
+    [class method]: copy_blocks
+    ipex.llm.modules.PagedAttention.copy_blocks(key_caches, value_caches, block_mapping)
+    This operator copies whole blocks inside the key/value cache buffers of every layer, e.g., for the
+    copy-on-write of a block shared by several sequences through prefix caching.
+    Args:
+    - key_caches (list of torch.Tensor): The key cache buffers of all layers. The shape of every buffer should be
+                                         [num_blocks,  block_size, num_heads, head_size].
+    - value_caches (list of torch.Tensor): The value cache buffers of all layers, in the same layout.
+    - block_mapping (torch.Tensor): The (src, dst) block pairs to copy. The shape should be [num_pairs, 2].
+
     """
 
     runtime_ops: IPEXRuntimeCustomOps = IPEXRuntimeCustomOps()
@@ -500,6 +510,17 @@ class PagedAttention:
             alibi_slopes,
         )
 
+    @classmethod
+    def copy_blocks(
+        cls,
+        key_caches: List[torch.Tensor],
+        value_caches: List[torch.Tensor],
+        block_mapping: torch.Tensor,
+    ):
+        return cls.runtime_ops.get_module_from_device(
+            block_mapping.device.type, IPEXCustomOpType.PAGED_ATTENTION, False
+        ).copy_blocks(key_caches, value_caches, block_mapping)
+
 
 class IndirectAccessKVCache(nn.Module):
     r"""
@@ -0,0 +1,11 @@
+from .prefix_cache import PrefixCache
+from .block_manager import BlockAllocator, BlockManager
+from .scheduler import (
+    SamplingParams,
+    Sequence,
+    SequenceStatus,
+    Scheduler,
+    SchedulerOutput,
+)
+from .model_runner import PagedLlamaModelRunner
+from .engine import LLMEngine
@@ -0,0 +1,297 @@
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import torch
+
+from .prefix_cache import PrefixCache
+
+
+class BlockAllocator:
+    r"""
+    Reference counted free list over the physical KV blocks of a paged KV cache. A physical block is
+    identified by its index along the first (num_blocks) dimension of the key/value cache buffers used by
+    ipex.llm.modules.PagedAttention.
+
+    With prefix caching, a block whose reference count drops to 0 is not returned to the free list if it is
+    indexed by the prefix cache, it becomes evictable instead and is recycled in LRU order only when no free
+    block is left.
+
+    Args:
+    - num_blocks (int): number of physical blocks pre-allocated in the key/value cache buffers.
+    - enable_prefix_caching (bool): index full blocks by their token ids to share them among sequences.
+    """
+
+    def __init__(self, num_blocks: int, enable_prefix_caching: bool = False):
+        self.num_blocks = num_blocks
+        self.free_blocks = deque(range(num_blocks))
+        self.ref_counts = [0] * num_blocks
+        self.prefix_cache = PrefixCache() if enable_prefix_caching else None
+
+    def allocate(self) -> int:
+        if self.free_blocks:
+            block = self.free_blocks.popleft()
+        elif (
+            self.prefix_cache is not None
+            and self.prefix_cache.get_num_evictable_blocks() > 0
+        ):
+            block = self.prefix_cache.evict()
+        else:
+            raise RuntimeError("Out of memory! No free KV cache blocks are available.")
+        self.ref_counts[block] = 1
+        return block
+
+    def incref(self, block: int):
+        if self.ref_counts[block] == 0:
+            self.prefix_cache.remove_evictable(block)
+        self.ref_counts[block] += 1
+
+    def free(self, block: int):
+        assert self.ref_counts[block] > 0, f"double free of KV cache block {block}"
+        self.ref_counts[block] -= 1
+        if self.ref_counts[block] > 0:
+            return
+        if self.prefix_cache is not None and self.prefix_cache.contains_block(block):
+            self.prefix_cache.add_evictable(block)
+        else:
+            self.free_blocks.append(block)
+
+    def get_ref_count(self, block: int) -> int:
+        return self.ref_counts[block]
+
+    def get_num_free_blocks(self) -> int:
+        num_evictable = (
+            self.prefix_cache.get_num_evictable_blocks()
+            if self.prefix_cache is not None
+            else 0
+        )
+        return len(self.free_blocks) + num_evictable
+
+
+class BlockManager:
+    r"""
+    Maps the logical token positions of every running sequence to slots of the paged KV cache, and keeps
+    the `block_tables`/`context_lens` tensors consumed by
+    ipex.llm.modules.PagedAttention.single_query_cached_kv_attention up to date incrementally.
+
+    Every sequence owns one row of the persistent `block_tables` (shape [max_num_seqs, max_blocks_per_seq])
+    and `context_lens` (shape [max_num_seqs]) tensors while it is running. Appending a token only writes the
+    new block id (if a block boundary is crossed) and bumps the context length of that row, so the metadata
+    of a decode batch is a row gather of these tensors instead of being rebuilt from Python lists every step.
+
+    With prefix caching enabled, the full blocks of a new sequence are looked up in the prefix cache and the
+    matching ones are shared (reference counted) instead of being allocated and recomputed. A shared block
+    is never written in place: a sequence which has to write into it gets a private copy first
+    (copy-on-write), the pending (src, dst) copies are returned by `get_blocks_to_copy` and have to be
+    applied to the KV caches (e.g., with ipex.llm.modules.PagedAttention.copy_blocks) before the next forward.
+
+    Args:
+    - num_blocks (int): number of physical blocks in the key/value cache buffers.
+    - block_size (int): number of tokens stored in every block.
+    - max_num_seqs (int): max number of sequences which can be running at the same time.
+    - max_blocks_per_seq (int): max number of blocks a single sequence can own,
+                                i.e. ceil(max_model_len / block_size).
+    - enable_prefix_caching (bool): share the KV blocks of common prompt prefixes among sequences.
+    """
+
+    def __init__(
+        self,
+        num_blocks: int,
+        block_size: int,
+        max_num_seqs: int,
+        max_blocks_per_seq: int,
+        enable_prefix_caching: bool = False,
+    ):
+        self.block_size = block_size
+        self.max_blocks_per_seq = max_blocks_per_seq
+        self.allocator = BlockAllocator(num_blocks, enable_prefix_caching)
+        self.prefix_cache = self.allocator.prefix_cache
+        self.block_tables = torch.zeros(
+            (max_num_seqs, max_blocks_per_seq), dtype=torch.int32
+        )
+        self.context_lens = torch.zeros(max_num_seqs, dtype=torch.int32)
+        self.free_rows = deque(range(max_num_seqs))
+        # seq_id -> physical blocks / row in block_tables / number of cached tokens
+        self.seq_blocks: Dict[int, List[int]] = {}
+        self.seq_rows: Dict[int, int] = {}
+        self.seq_lens: Dict[int, int] = {}
+        # seq_id -> hash of its last full block and token ids of its last partial block,
+        # only tracked with prefix caching
+        self.seq_last_hash: Dict[int, Optional[int]] = {}
+        self.seq_partial_tokens: Dict[int, List[int]] = {}
+        self.blocks_to_copy: List[Tuple[int, int]] = []
+        # full blocks whose key/value states are computed by the next forward, they are only indexed by the
+        # prefix cache after that forward so no other sequence can copy them before they hold valid states
+        self.pending_cached_blocks: List[Tuple[int, int]] = []
+
+    def _num_required_blocks(self, num_tokens: int) -> int:
+        return (num_tokens + self.block_size - 1) // self.block_size
+
+    def get_num_free_blocks(self) -> int:
+        return self.allocator.get_num_free_blocks()
+
+    def get_num_required_free_blocks(self, num_tokens: int) -> int:
+        # Conservative: blocks which may be shared through the prefix cache are not deducted, and one more
+        # block is reserved for the copy-on-write of a fully matched prefix.
+        num_blocks = self._num_required_blocks(num_tokens)
+        return num_blocks + 1 if self.prefix_cache is not None else num_blocks
+
+    def can_allocate(self, num_tokens: int) -> bool:
+        return (
+            len(self.free_rows) > 0
+            and self._num_required_blocks(num_tokens) <= self.max_blocks_per_seq
+            and self.get_num_required_free_blocks(num_tokens)
+            <= self.allocator.get_num_free_blocks()
+        )
+
+    def _match_prefix(self, token_ids: List[int]) -> Tuple[List[int], List[int]]:
+        blocks: List[int] = []
+        block_hashes: List[int] = []
+        block_hash = None
+        for i in range(len(token_ids) // self.block_size):
+            block_hash = PrefixCache.hash_block(
+                block_hash, token_ids[i * self.block_size : (i + 1) * self.block_size]
+            )
+            block = self.prefix_cache.lookup(block_hash)
+            if block is None:
+                break
+            self.allocator.incref(block)
+            blocks.append(block)
+            block_hashes.append(block_hash)
+        return blocks, block_hashes
+
+    def _cow_if_shared(self, blocks: List[int], idx: int, row: int):
+        block = blocks[idx]
+        if self.allocator.get_ref_count(block) > 1:
+            new_block = self.allocator.allocate()
+            self.allocator.free(block)
+            self.blocks_to_copy.append((block, new_block))
+            blocks[idx] = new_block
+            self.block_tables[row, idx] = new_block
+
+    def allocate(self, seq_id: int, token_ids: List[int]) -> Tuple[List[int], int]:
+        r"""
+        Allocates the blocks for the prompt `token_ids` of a new sequence. Returns the slots
+        (block * block_size + offset) of the tokens which need to be computed, which is the slot_mapping used
+        by reshape_and_cache, and the number of leading tokens whose key/value states are reused from the
+        prefix cache. The last token is always computed since its logits are needed.
+        """
+        assert seq_id not in self.seq_rows, f"sequence {seq_id} is already allocated"
+        num_tokens = len(token_ids)
+        assert self.can_allocate(num_tokens), "not enough KV cache blocks"
+        blocks: List[int] = []
+        block_hashes: List[int] = []
+        if self.prefix_cache is not None:
+            blocks, block_hashes = self._match_prefix(token_ids)
+        num_cached_tokens = min(len(blocks) * self.block_size, num_tokens - 1)
+        while len(blocks) < self._num_required_blocks(num_tokens):
+            blocks.append(self.allocator.allocate())
+        row = self.free_rows.popleft()
+        self.seq_blocks[seq_id] = blocks
+        self.seq_rows[seq_id] = row
+        self.seq_lens[seq_id] = num_tokens
+        if blocks:
+            self.block_tables[row, : len(blocks)] = torch.tensor(
+                blocks, dtype=torch.int32
+            )
+        self.context_lens[row] = num_tokens
+        if self.prefix_cache is not None:
+            # the block holding the first token to be computed may be shared (full prefix hit)
+            first_block = num_cached_tokens // self.block_size
+            self._cow_if_shared(blocks, first_block, row)
+            block_hash = block_hashes[first_block - 1] if first_block > 0 else None
+            num_full_blocks = num_tokens // self.block_size
+            for i in range(first_block, num_full_blocks):
+                block_hash = PrefixCache.hash_block(
+                    block_hash,
+                    token_ids[i * self.block_size : (i + 1) * self.block_size],
+                )
+                self.pending_cached_blocks.append((block_hash, blocks[i]))
+            self.seq_last_hash[seq_id] = block_hash
+            self.seq_partial_tokens[seq_id] = list(
+                token_ids[num_full_blocks * self.block_size :]
+            )
+        return [
+            self._slot(blocks, pos) for pos in range(num_cached_tokens, num_tokens)
+        ], num_cached_tokens
+
+    def _slot(self, blocks: List[int], pos: int) -> int:
+        return blocks[pos // self.block_size] * self.block_size + pos % self.block_size
+
+    def can_append_slot(self, seq_id: int) -> bool:
+        seq_len = self.seq_lens[seq_id]
+        if seq_len % self.block_size != 0:
+            return True
+        return (
+            len(self.seq_blocks[seq_id]) < self.max_blocks_per_seq
+            and self.allocator.get_num_free_blocks() > 0
+        )
+
+    def append_slot(self, seq_id: int, token_id: Optional[int] = None) -> int:
+        r"""
+        Reserves the slot for the next token (`token_id`, only needed with prefix caching) of a running
+        sequence, allocating a new block when the last one is full, and returns the slot.
+        """
+        blocks = self.seq_blocks[seq_id]
+        row = self.seq_rows[seq_id]
+        pos = self.seq_lens[seq_id]
+        if pos == len(blocks) * self.block_size:
+            block = self.allocator.allocate()
+            self.block_tables[row, len(blocks)] = block
+            blocks.append(block)
+        self.seq_lens[seq_id] = pos + 1
+        self.context_lens[row] = pos + 1
+        if self.prefix_cache is not None:
+            partial_tokens = self.seq_partial_tokens[seq_id]
+            partial_tokens.append(token_id)
+            if len(partial_tokens) == self.block_size:
+                block_hash = PrefixCache.hash_block(
+                    self.seq_last_hash[seq_id], partial_tokens
+                )
+                self.pending_cached_blocks.append((block_hash, blocks[-1]))
+                self.seq_last_hash[seq_id] = block_hash
+                self.seq_partial_tokens[seq_id] = []
+        return self._slot(blocks, pos)
+
+    def mark_blocks_computed(self):
+        r"""
+        Indexes the full blocks filled by the last forward in the prefix cache. To be called after every
+        forward, before finished sequences are freed.
+        """
+        for block_hash, block in self.pending_cached_blocks:
+            if self.allocator.get_ref_count(block) > 0:
+                self.prefix_cache.insert(block_hash, block)
+        self.pending_cached_blocks = []
+
+    def get_blocks_to_copy(self) -> List[Tuple[int, int]]:
+        r"""
+        Returns and clears the pending copy-on-write (src, dst) block copies.
+        """
+        blocks_to_copy = self.blocks_to_copy
+        self.blocks_to_copy = []
+        return blocks_to_copy
+
+    def free(self, seq_id: int):
+        r"""
+        Releases all blocks and the metadata row of a sequence, e.g., as soon as it hits EOS. Blocks shared
+        with other sequences or indexed by the prefix cache are kept.
+        """
+        if seq_id not in self.seq_rows:
+            return
+        for block in self.seq_blocks.pop(seq_id):
+            self.allocator.free(block)
+        row = self.seq_rows.pop(seq_id)
+        del self.seq_lens[seq_id]
+        self.seq_last_hash.pop(seq_id, None)
+        self.seq_partial_tokens.pop(seq_id, None)
+        self.context_lens[row] = 0
+        self.free_rows.append(row)
+
+    def get_rows(self, seq_ids: List[int]) -> torch.Tensor:
+        return torch.tensor([self.seq_rows[i] for i in seq_ids], dtype=torch.long)
+
+    def get_seq_len(self, seq_id: int) -> int:
+        return self.seq_lens[seq_id]
+
+    def get_slots(self, seq_id: int, start: int, end: int) -> List[int]:
+        blocks = self.seq_blocks[seq_id]
+        return [self._slot(blocks, pos) for pos in range(start, end)]
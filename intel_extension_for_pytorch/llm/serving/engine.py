@@ -0,0 +1,169 @@
+import itertools
+from typing import List, Optional
+
+import torch
+import torch.nn as nn
+
+from .block_manager import BlockManager
+from .model_runner import PagedLlamaModelRunner
+from .scheduler import SamplingParams, Scheduler, Sequence, SequenceStatus
+
+
+def _sample(logits: torch.Tensor, seqs: List[Sequence]) -> List[int]:
+    # logits: [num_seqs, vocab_size]
+    next_tokens = torch.argmax(logits, dim=-1).tolist()
+    for i, seq in enumerate(seqs):
+        params = seq.sampling_params
+        if params.temperature == 0.0:
+            continue
+        scores = logits[i] / params.temperature
+        if params.top_k > 0:
+            kth = torch.topk(scores, min(params.top_k, scores.size(-1))).values[-1]
+            scores = scores.masked_fill(scores < kth, float("-inf"))
+        if params.top_p < 1.0:
+            sorted_scores, sorted_idx = torch.sort(scores, descending=True)
+            cum_probs = sorted_scores.softmax(dim=-1).cumsum(dim=-1)
+            sorted_remove = cum_probs > params.top_p
+            # always keep the most likely token
+            sorted_remove[1:] = sorted_remove[:-1].clone()
+            sorted_remove[0] = False
+            scores = scores.scatter(
+                0, sorted_idx, sorted_scores.masked_fill(sorted_remove, float("-inf"))
+            )
+        next_tokens[i] = int(torch.multinomial(scores.softmax(dim=-1), 1))
+    return next_tokens
+
+
+class LLMEngine:
+    r"""
+    Continuous batching LLM serving engine over the paged KV cache of ipex.llm.modules.PagedAttention.
+
+    Requests are added at any time with `add_request` and every `step` runs one iteration of the running
+    batch: newly admitted requests are prefilled and all other running requests decode one token, in a single
+    packed forward. A request leaves the batch as soon as it hits EOS or its max_new_tokens, and its KV blocks
+    are handed to the next waiting request, so the batch does not wait for its longest sequence as the static
+    batching of model.generate does.
+
+    Args:
+    - model (nn.Module): a LlamaForCausalLM/MistralForCausalLM model.
+    - num_blocks (int): number of KV cache blocks (per layer).
+    - block_size (int): number of tokens per KV cache block. Default: 16.
+    - max_num_seqs (int): max number of sequences in the running batch. Default: 32.
+    - max_num_batched_tokens (int): max number of tokens run in a single step. Default: 2048.
+    - max_model_len (int, optional): max total length (prompt + generated tokens) of a request,
+                                     default is config.max_position_embeddings.
+    - kv_cache_dtype (torch.dtype, optional): dtype of the KV cache, default is the dtype of the model.
+    - enable_prefix_caching (bool): reuse the KV blocks of prompt prefixes shared among requests (e.g., a
+                                    common system prompt) instead of recomputing them. Default: False.
+
+    Examples:
+        >>> engine = ipex.llm.serving.LLMEngine(model, num_blocks=256)
+        >>> engine.add_request([1, 306, 4658], ipex.llm.serving.SamplingParams(max_new_tokens=16))
+        >>> while engine.has_unfinished_requests():
+        >>>     for seq in engine.step():
+        >>>         if seq.is_finished():
+        >>>             print(seq.seq_id, seq.output_token_ids)
+    """
+
+    def __init__(
+        self,
+        model: nn.Module,
+        num_blocks: int,
+        block_size: int = 16,
+        max_num_seqs: int = 32,
+        max_num_batched_tokens: int = 2048,
+        max_model_len: Optional[int] = None,
+        kv_cache_dtype: Optional[torch.dtype] = None,
+        enable_prefix_caching: bool = False,
+    ):
+        max_position_embeddings = model.config.max_position_embeddings
+        self.max_model_len = (
+            max_position_embeddings
+            if max_model_len is None
+            else min(max_model_len, max_position_embeddings)
+        )
+        self.block_size = block_size
+        self.num_blocks = num_blocks
+        max_blocks_per_seq = (self.max_model_len + block_size - 1) // block_size
+        self.block_manager = BlockManager(
+            num_blocks,
+            block_size,
+            max_num_seqs,
+            max_blocks_per_seq,
+            enable_prefix_caching,
+        )
+        self.scheduler = Scheduler(
+            self.block_manager, max_num_seqs, max_num_batched_tokens
+        )
+        self.model_runner = PagedLlamaModelRunner(
+            model, num_blocks, block_size, kv_cache_dtype
+        )
+        self.seq_counter = itertools.count()
+
+    def add_request(
+        self,
+        prompt_token_ids: List[int],
+        sampling_params: Optional[SamplingParams] = None,
+    ) -> Sequence:
+        sampling_params = (
+            sampling_params if sampling_params is not None else SamplingParams()
+        )
+        if len(prompt_token_ids) == 0:
+            raise ValueError("The prompt of a request must not be empty.")
+        max_len = len(prompt_token_ids) + sampling_params.max_new_tokens
+        if len(prompt_token_ids) >= self.max_model_len:
+            raise ValueError(
+                f"The prompt length {len(prompt_token_ids)} must be smaller than max_model_len {self.max_model_len}."
+            )
+        if (
+            self.block_manager.get_num_required_free_blocks(
+                min(max_len, self.max_model_len)
+            )
+            > self.num_blocks
+        ):
+            raise ValueError(
+                f"A request of {max_len} tokens does not fit into the {self.num_blocks} KV cache blocks."
+            )
+        seq = Sequence(next(self.seq_counter), prompt_token_ids, sampling_params)
+        self.scheduler.add_sequence(seq)
+        return seq
+
+    def has_unfinished_requests(self) -> bool:
+        return self.scheduler.has_unfinished_seqs()
+
+    def step(self) -> List[Sequence]:
+        r"""
+        Runs one iteration and returns the sequences which got a new token, finished ones included.
+        """
+        scheduler_output = self.scheduler.schedule()
+        if scheduler_output.is_empty():
+            return []
+        logits = self.model_runner(scheduler_output, self.block_manager)
+        if self.block_manager.prefix_cache is not None:
+            self.block_manager.mark_blocks_computed()
+        seqs = scheduler_output.prefill_seqs + scheduler_output.decode_seqs
+        for seq, token_id in zip(seqs, _sample(logits, seqs)):
+            seq.append_token_id(token_id)
+            params = seq.sampling_params
+            if token_id in params.get_eos_token_ids():
+                self.scheduler.finish_seq(seq, SequenceStatus.FINISHED_STOPPED)
+            elif (
+                len(seq.output_token_ids) >= params.max_new_tokens
+                or seq.get_len() >= self.max_model_len
+            ):
+                self.scheduler.finish_seq(seq, SequenceStatus.FINISHED_LENGTH)
+        return seqs
+
+    def generate(
+        self,
+        prompts: List[List[int]],
+        sampling_params: Optional[SamplingParams] = None,
+    ) -> List[List[int]]:
+        r"""
+        Runs all prompts to completion with continuous batching and returns the generated token ids of every
+        prompt, in the order of the prompts.
+        """
+        seqs = [self.add_request(prompt, sampling_params) for prompt in prompts]
+        while self.has_unfinished_requests():
+            self.step()
+        return [seq.output_token_ids for seq in seqs]
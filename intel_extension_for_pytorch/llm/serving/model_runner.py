@@ -0,0 +1,285 @@
+from typing import List, Optional
+
+import torch
+import torch.nn as nn
+
+from ..modules import PagedAttention, RotaryEmbedding
+from .block_manager import BlockManager
+from .scheduler import SchedulerOutput
+
+
+class PagedLlamaModelRunner(nn.Module):
+    r"""
+    Runs the decoder stack of a LlamaForCausalLM-like model (Llama, Mistral) on a flattened token stream of a
+    continuous batch, storing and reading the key/value states through the paged KV cache of
+    ipex.llm.modules.PagedAttention.
+
+    Prefill and decode tokens of one step are packed into a single stream, so that all linear layers run once
+    per step on every token. The attention of prefill tokens is a causal attention over the tokens of their
+    own sequence, the attention of decode tokens runs the single_query_cached_kv_attention kernel over the
+    block tables of their sequences. Prefill sequences whose prompt prefix hits the prefix cache only run the
+    tokens after the prefix, attending to the cached key/value states of the prefix.
+
+    Args:
+    - model (nn.Module): the LlamaForCausalLM/MistralForCausalLM model, the weights are shared, not copied.
+    - num_blocks (int): number of blocks of the key/value cache of every layer.
+    - block_size (int): number of tokens in every block.
+    - dtype (torch.dtype): dtype of the key/value cache, default is the dtype of the model weights.
+    """
+
+    def __init__(
+        self,
+        model: nn.Module,
+        num_blocks: int,
+        block_size: int,
+        dtype: torch.dtype = None,
+    ):
+        super().__init__()
+        self.model = model
+        config = model.config
+        self.config = config
+        self.block_size = block_size
+        self.num_heads = config.num_attention_heads
+        self.num_kv_heads = getattr(config, "num_key_value_heads", self.num_heads)
+        self.head_dim = config.hidden_size // self.num_heads
+        self.scale = float(1.0 / (self.head_dim**0.5))
+        self.max_position_embeddings = config.max_position_embeddings
+        base = getattr(config, "rope_theta", 10000)
+        inv_freq = 1.0 / (
+            base ** (torch.arange(0, self.head_dim, 2).float() / self.head_dim)
+        )
+        freqs = torch.outer(
+            torch.arange(self.max_position_embeddings, dtype=torch.float), inv_freq
+        )
+        self.register_buffer("sin_cached", freqs.sin(), persistent=False)
+        self.register_buffer("cos_cached", freqs.cos(), persistent=False)
+        self.register_buffer(
+            "head_mapping",
+            torch.repeat_interleave(
+                torch.arange(self.num_kv_heads, dtype=torch.int32),
+                self.num_heads // self.num_kv_heads,
+            ),
+            persistent=False,
+        )
+        dtype = dtype if dtype is not None else model.lm_head.weight.dtype
+        cache_shape = (num_blocks, block_size, self.num_kv_heads, self.head_dim)
+        self.key_caches = [
+            torch.zeros(cache_shape, dtype=dtype) for _ in model.model.layers
+        ]
+        self.value_caches = [
+            torch.zeros(cache_shape, dtype=dtype) for _ in model.model.layers
+        ]
+
+    def _prefill_attention(
+        self,
+        query: torch.Tensor,
+        key: torch.Tensor,
+        value: torch.Tensor,
+        out: torch.Tensor,
+        key_cache: torch.Tensor,
+        value_cache: torch.Tensor,
+        prefill_lens: List[int],
+        prefill_context_slots: List[Optional[torch.Tensor]],
+    ):
+        # query/out: [num_prefill_tokens, num_heads, head_dim]
+        # key/value: [num_prefill_tokens, num_kv_heads, head_dim]
+        num_groups = self.num_heads // self.num_kv_heads
+        start = 0
+        for seq_len, context_slots in zip(prefill_lens, prefill_context_slots):
+            end = start + seq_len
+            q = query[start:end].transpose(0, 1)
+            attn_mask = None
+            if context_slots is None:
+                k = key[start:end]
+                v = value[start:end]
+            else:
+                # The leading tokens are reused from the prefix cache: gather the key/value states of the
+                # whole context (the new tokens are already stored) and attend bottom-right causally.
+                k = key_cache.view(-1, self.num_kv_heads, self.head_dim).index_select(
+                    0, context_slots
+                )
+                v = value_cache.view(-1, self.num_kv_heads, self.head_dim).index_select(
+                    0, context_slots
+                )
+                k = k.to(q.dtype)
+                v = v.to(q.dtype)
+                context_len = context_slots.size(0)
+                attn_mask = torch.arange(context_len).unsqueeze(0) <= (
+                    torch.arange(seq_len) + context_len - seq_len
+                ).unsqueeze(1)
+            k = k.transpose(0, 1)
+            v = v.transpose(0, 1)
+            if num_groups > 1:
+                k = k.repeat_interleave(num_groups, dim=0)
+                v = v.repeat_interleave(num_groups, dim=0)
+            out[start:end] = torch.nn.functional.scaled_dot_product_attention(
+                q,
+                k,
+                v,
+                attn_mask=attn_mask,
+                is_causal=attn_mask is None,
+                scale=self.scale,
+            ).transpose(0, 1)
+            start = end
+
+    def _attention(
+        self,
+        layer_idx: int,
+        attn: nn.Module,
+        hidden_states: torch.Tensor,
+        sin: torch.Tensor,
+        cos: torch.Tensor,
+        slot_mapping: torch.Tensor,
+        prefill_lens: List[int],
+        prefill_context_slots: List[Optional[torch.Tensor]],
+        block_tables: torch.Tensor,
+        context_lens: torch.Tensor,
+        max_context_len: int,
+    ):
+        num_tokens = hidden_states.size(0)
+        query = attn.q_proj(hidden_states).view(
+            num_tokens, self.num_heads, self.head_dim
+        )
+        key = attn.k_proj(hidden_states).view(
+            num_tokens, self.num_kv_heads, self.head_dim
+        )
+        value = attn.v_proj(hidden_states).view(
+            num_tokens, self.num_kv_heads, self.head_dim
+        )
+        query, key = RotaryEmbedding.apply_function(
+            query, key, sin, cos, self.head_dim, True
+        )
+
+        key_cache = self.key_caches[layer_idx]
+        value_cache = self.value_caches[layer_idx]
+        PagedAttention.reshape_and_cache(
+            key.to(key_cache.dtype),
+            value.to(value_cache.dtype),
+            key_cache,
+            value_cache,
+            slot_mapping,
+        )
+
+        out = torch.empty_like(query)
+        num_prefill_tokens = sum(prefill_lens)
+        if num_prefill_tokens > 0:
+            self._prefill_attention(
+                query[:num_prefill_tokens],
+                key[:num_prefill_tokens],
+                value[:num_prefill_tokens],
+                out[:num_prefill_tokens],
+                key_cache,
+                value_cache,
+                prefill_lens,
+                prefill_context_slots,
+            )
+        if num_prefill_tokens < num_tokens:
+            decode_out = torch.empty_like(query[num_prefill_tokens:])
+            PagedAttention.single_query_cached_kv_attention(
+                decode_out,
+                query[num_prefill_tokens:].contiguous(),
+                key_cache,
+                value_cache,
+                self.head_mapping,
+                self.scale,
+                block_tables,
+                context_lens,
+                self.block_size,
+                max_context_len,
+                None,
+            )
+            out[num_prefill_tokens:] = decode_out
+        return attn.o_proj(out.view(num_tokens, self.num_heads * self.head_dim))
+
+    @torch.no_grad()
+    def forward(
+        self, scheduler_output: SchedulerOutput, block_manager: BlockManager
+    ) -> torch.Tensor:
+        r"""
+        Runs one step and returns the next-token logits of every scheduled sequence, prefill sequences first,
+        shape [num_prefill_seqs + num_decode_seqs, vocab_size].
+        """
+        if scheduler_output.blocks_to_copy:
+            PagedAttention.copy_blocks(
+                self.key_caches,
+                self.value_caches,
+                torch.tensor(scheduler_output.blocks_to_copy, dtype=torch.long),
+            )
+
+        input_ids: List[int] = []
+        positions: List[int] = []
+        prefill_lens: List[int] = []
+        prefill_context_slots: List[Optional[torch.Tensor]] = []
+        for seq, num_cached_tokens in zip(
+            scheduler_output.prefill_seqs, scheduler_output.prefill_num_cached_tokens
+        ):
+            token_ids = seq.get_token_ids()
+            input_ids.extend(token_ids[num_cached_tokens:])
+            positions.extend(range(num_cached_tokens, len(token_ids)))
+            prefill_lens.append(len(token_ids) - num_cached_tokens)
+            prefill_context_slots.append(
+                torch.tensor(
+                    block_manager.get_slots(seq.seq_id, 0, len(token_ids)),
+                    dtype=torch.long,
+                )
+                if num_cached_tokens > 0
+                else None
+            )
+        decode_seq_ids = []
+        for seq in scheduler_output.decode_seqs:
+            input_ids.append(seq.get_last_token_id())
+            positions.append(seq.get_len() - 1)
+            decode_seq_ids.append(seq.seq_id)
+        slot_mapping = torch.tensor(
+            scheduler_output.prefill_slot_mapping
+            + scheduler_output.decode_slot_mapping,
+            dtype=torch.int32,
+        )
+        position_ids = torch.tensor(positions, dtype=torch.long)
+        # per-token rotary embedding, so positions of different sequences can be mixed in one stream
+        sin = self.sin_cached.index_select(0, position_ids)
+        cos = self.cos_cached.index_select(0, position_ids)
+
+        block_tables = None
+        context_lens = None
+        max_context_len = 0
+        if decode_seq_ids:
+            rows = block_manager.get_rows(decode_seq_ids)
+            block_tables = block_manager.block_tables.index_select(0, rows)
+            context_lens = block_manager.context_lens.index_select(0, rows)
+            max_context_len = max(block_manager.get_seq_len(i) for i in decode_seq_ids)
+
+        decoder = self.model.model
+        hidden_states = decoder.embed_tokens(torch.tensor(input_ids, dtype=torch.long))
+        for layer_idx, layer in enumerate(decoder.layers):
+            residual = hidden_states
+            hidden_states = layer.input_layernorm(hidden_states)
+            hidden_states = residual + self._attention(
+                layer_idx,
+                layer.self_attn,
+                hidden_states,
+                sin,
+                cos,
+                slot_mapping,
+                prefill_lens,
+                prefill_context_slots,
+                block_tables,
+                context_lens,
+                max_context_len,
+            )
+            residual = hidden_states
+            hidden_states = layer.post_attention_layernorm(hidden_states)
+            hidden_states = residual + layer.mlp(hidden_states)
+
+        # Only the last token of every sequence is needed to predict its next token.
+        last_token_idx = []
+        start = 0
+        for seq_len in prefill_lens:
+            start += seq_len
+            last_token_idx.append(start - 1)
+        last_token_idx.extend(range(start, len(input_ids)))
+        hidden_states = hidden_states.index_select(
+            0, torch.tensor(last_token_idx, dtype=torch.long)
+        )
+        hidden_states = decoder.norm(hidden_states)
+        return self.model.lm_head(hidden_states).float()
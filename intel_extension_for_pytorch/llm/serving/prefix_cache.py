@@ -0,0 +1,59 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+
+class PrefixCache:
+    r"""
+    Hash index over the full KV blocks of the paged KV cache. A full block is identified by the hash of its
+    token ids chained with the hash of the previous block of the sequence, so a hit on block i implies that
+    the whole prefix up to block i matches and its key/value states can be reused instead of being recomputed.
+
+    Cached blocks which are not referenced by any running sequence stay in the cache and are kept in LRU
+    order. They are only recycled (and dropped from the index) when the allocator runs out of free blocks.
+    """
+
+    def __init__(self):
+        # block hash -> physical block, and the reverse mapping
+        self.cached_blocks: Dict[Hashable, int] = {}
+        self.block_hashes: Dict[int, Hashable] = {}
+        # unreferenced cached blocks, least recently used first
+        self.evictor: "OrderedDict[int, None]" = OrderedDict()
+        self.num_hits = 0
+        self.num_queries = 0
+
+    @staticmethod
+    def hash_block(prev_block_hash: Optional[Hashable], token_ids) -> Hashable:
+        return hash((prev_block_hash, tuple(token_ids)))
+
+    def lookup(self, block_hash: Hashable) -> Optional[int]:
+        self.num_queries += 1
+        block = self.cached_blocks.get(block_hash)
+        if block is not None:
+            self.num_hits += 1
+        return block
+
+    def insert(self, block_hash: Hashable, block: int):
+        if block_hash in self.cached_blocks or block in self.block_hashes:
+            return
+        self.cached_blocks[block_hash] = block
+        self.block_hashes[block] = block_hash
+
+    def contains_block(self, block: int) -> bool:
+        return block in self.block_hashes
+
+    def add_evictable(self, block: int):
+        self.evictor[block] = None
+
+    def remove_evictable(self, block: int):
+        self.evictor.pop(block, None)
+
+    def get_num_evictable_blocks(self) -> int:
+        return len(self.evictor)
+
+    def evict(self) -> int:
+        block, _ = self.evictor.popitem(last=False)
+        del self.cached_blocks[self.block_hashes.pop(block)]
+        return block
+
+    def get_hit_rate(self) -> float:
+        return self.num_hits / self.num_queries if self.num_queries > 0 else 0.0
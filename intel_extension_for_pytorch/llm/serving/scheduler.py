@@ -0,0 +1,214 @@
+import dataclasses
+import enum
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from .block_manager import BlockManager
+
+
+@dataclasses.dataclass
+class SamplingParams:
+    r"""
+    Per-request generation settings.
+
+    Args:
+    - max_new_tokens (int): max number of tokens to generate for the request.
+    - temperature (float): 0.0 means greedy search, otherwise the logits are divided by it before sampling.
+    - top_k (int): keep only the top_k most likely tokens when sampling, 0 disables it.
+    - top_p (float): keep the smallest set of tokens whose cumulative probability exceeds top_p when sampling.
+    - eos_token_id (int or list of int, optional): generation of the request stops once one of them is produced.
+    - ignore_eos (bool): keep generating after EOS until max_new_tokens is reached.
+    """
+
+    max_new_tokens: int = 32
+    temperature: float = 0.0
+    top_k: int = 0
+    top_p: float = 1.0
+    eos_token_id: Optional[object] = None
+    ignore_eos: bool = False
+
+    def get_eos_token_ids(self) -> List[int]:
+        if self.eos_token_id is None or self.ignore_eos:
+            return []
+        if isinstance(self.eos_token_id, int):
+            return [self.eos_token_id]
+        return list(self.eos_token_id)
+
+
+class SequenceStatus(enum.Enum):
+    WAITING = 0
+    RUNNING = 1
+    FINISHED_STOPPED = 2
+    FINISHED_LENGTH = 3
+
+
+class Sequence:
+    r"""
+    State of a single generation request: prompt, generated tokens and scheduling status.
+    """
+
+    def __init__(
+        self,
+        seq_id: int,
+        prompt_token_ids: List[int],
+        sampling_params: SamplingParams,
+    ):
+        self.seq_id = seq_id
+        self.prompt_token_ids = list(prompt_token_ids)
+        self.output_token_ids: List[int] = []
+        self.sampling_params = sampling_params
+        self.status = SequenceStatus.WAITING
+
+    def get_len(self) -> int:
+        return len(self.prompt_token_ids) + len(self.output_token_ids)
+
+    def get_token_ids(self) -> List[int]:
+        return self.prompt_token_ids + self.output_token_ids
+
+    def get_last_token_id(self) -> int:
+        if self.output_token_ids:
+            return self.output_token_ids[-1]
+        return self.prompt_token_ids[-1]
+
+    def append_token_id(self, token_id: int):
+        self.output_token_ids.append(token_id)
+
+    def is_finished(self) -> bool:
+        return self.status in (
+            SequenceStatus.FINISHED_STOPPED,
+            SequenceStatus.FINISHED_LENGTH,
+        )
+
+
+@dataclasses.dataclass
+class SchedulerOutput:
+    r"""
+    The work of one engine step. `prefill_seqs` were admitted in this step and need their context (prompt,
+    plus generated tokens for recomputed sequences) to be run, except for the leading
+    `prefill_num_cached_tokens` tokens whose key/value states are reused from the prefix cache.
+    `decode_seqs` feed their last token. The slot mappings hold the KV cache slot of every token to be run,
+    in the same order. `blocks_to_copy` are the (src, dst) copy-on-write block copies to be applied to the KV
+    caches before running the step.
+    """
+
+    prefill_seqs: List[Sequence]
+    prefill_num_cached_tokens: List[int]
+    prefill_slot_mapping: List[int]
+    decode_seqs: List[Sequence]
+    decode_slot_mapping: List[int]
+    preempted_seqs: List[Sequence]
+    blocks_to_copy: List[Tuple[int, int]]
+
+    def is_empty(self) -> bool:
+        return not self.prefill_seqs and not self.decode_seqs
+
+
+class Scheduler:
+    r"""
+    Continuous batching (iteration-level) scheduler. On every step, all running sequences get one more KV
+    cache slot for their next token, and waiting requests are admitted into the running batch as long as
+    the KV cache blocks, `max_num_seqs` and the `max_num_batched_tokens` budget allow it. Sequences leave the
+    batch as soon as they finish so their blocks are reused by the next admitted requests instead of being
+    held until the longest sequence of a static batch completes.
+
+    When the KV cache runs out of blocks, the most recently admitted running sequences are preempted: their
+    blocks are freed and they are put back to the front of the waiting queue, and their context is
+    recomputed by a prefill when they are admitted again.
+
+    Args:
+    - block_manager (BlockManager): the manager of the paged KV cache blocks.
+    - max_num_seqs (int): max number of sequences in the running batch.
+    - max_num_batched_tokens (int): max number of tokens run in one step (prefill tokens plus one token per
+                                    decoding sequence). A single request longer than the budget is still
+                                    admitted when it is the only work of the step.
+    """
+
+    def __init__(
+        self,
+        block_manager: BlockManager,
+        max_num_seqs: int,
+        max_num_batched_tokens: int,
+    ):
+        self.block_manager = block_manager
+        self.max_num_seqs = max_num_seqs
+        self.max_num_batched_tokens = max_num_batched_tokens
+        self.waiting: Deque[Sequence] = deque()
+        self.running: List[Sequence] = []
+
+    def add_sequence(self, seq: Sequence):
+        self.waiting.append(seq)
+
+    def has_unfinished_seqs(self) -> bool:
+        return len(self.waiting) > 0 or len(self.running) > 0
+
+    def _preempt(self, seq: Sequence):
+        self.block_manager.free(seq.seq_id)
+        seq.status = SequenceStatus.WAITING
+        self.waiting.appendleft(seq)
+
+    def schedule(self) -> SchedulerOutput:
+        # Reserve the slot of the next token for every running sequence, oldest first.
+        decode_seqs: List[Sequence] = []
+        decode_slot_mapping: List[int] = []
+        preempted_seqs: List[Sequence] = []
+        candidates = deque(self.running)
+        while candidates:
+            seq = candidates.popleft()
+            while not self.block_manager.can_append_slot(seq.seq_id):
+                victim = candidates.pop() if candidates else seq
+                self._preempt(victim)
+                preempted_seqs.append(victim)
+                if victim is seq:
+                    break
+            else:
+                decode_slot_mapping.append(
+                    self.block_manager.append_slot(seq.seq_id, seq.get_last_token_id())
+                )
+                decode_seqs.append(seq)
+        self.running = decode_seqs
+
+        # Admit waiting sequences into the running batch. Nothing is admitted in a step which had to
+        # preempt, otherwise the preempted sequences would immediately be swapped back in.
+        prefill_seqs: List[Sequence] = []
+        prefill_num_cached_tokens: List[int] = []
+        prefill_slot_mapping: List[int] = []
+        num_batched_tokens = len(decode_seqs)
+        while (
+            not preempted_seqs
+            and self.waiting
+            and len(self.running) < self.max_num_seqs
+        ):
+            seq = self.waiting[0]
+            num_tokens = seq.get_len()
+            if (
+                num_batched_tokens + num_tokens > self.max_num_batched_tokens
+                and num_batched_tokens > 0
+            ):
+                break
+            if not self.block_manager.can_allocate(num_tokens):
+                break
+            self.waiting.popleft()
+            slot_mapping, num_cached_tokens = self.block_manager.allocate(
+                seq.seq_id, seq.get_token_ids()
+            )
+            prefill_slot_mapping.extend(slot_mapping)
+            seq.status = SequenceStatus.RUNNING
+            prefill_seqs.append(seq)
+            prefill_num_cached_tokens.append(num_cached_tokens)
+            self.running.append(seq)
+            num_batched_tokens += num_tokens - num_cached_tokens
+
+        return SchedulerOutput(
+            prefill_seqs,
+            prefill_num_cached_tokens,
+            prefill_slot_mapping,
+            decode_seqs,
+            decode_slot_mapping,
+            preempted_seqs,
+            self.block_manager.get_blocks_to_copy(),
+        )
+
+    def finish_seq(self, seq: Sequence, status: SequenceStatus):
+        seq.status = status
+        self.running.remove(seq)
+        self.block_manager.free(seq.seq_id)
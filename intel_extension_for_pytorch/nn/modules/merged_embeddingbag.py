@@ -1,8 +1,10 @@
 import torch
 from torch import nn
 from torch.autograd import Function
-from typing import List, Optional, NamedTuple
+from typing import List, Optional, NamedTuple, Union
 import enum
+import os
+from .tiered_embedding import _TieredEmbeddingTable
 
 
 class PoolingMode(enum.IntEnum):
@@ -33,7 +35,57 @@ class EmbeddingSpec(NamedTuple):
     include_last_offset: bool
 
 
-def merged_embeddingbag(weights, indices, offsets, pooling_mode, include_last_offset):
+def dedup_indices(indices: List[torch.Tensor]):
+    r"""
+    Deduplicate the indices of every table.
+
+    Args:
+        indices (List[Tensor]): indices for all tables.
+    Returns:
+        the unique rows of every table, and the inverse maps which give the position
+        in the unique rows of every index (with the dtype of the indices).
+    """
+    uniques, inverses = [], []
+    for index in indices:
+        unique, inverse = torch.unique(index, return_inverse=True)
+        uniques.append(unique)
+        inverses.append(inverse.to(index.dtype))
+    return uniques, inverses
+
+
+def _gather_unique_rows(weights, uniques):
+    return [w.index_select(0, u) for w, u in zip(weights, uniques)]
+
+
+def _one_row_bags(uniques, grads):
+    # Bags of one unique row each, padded with empty bags to a common batch size,
+    # so that the fused update kernels apply the reduced grad of every row once
+    batch_size = max(u.numel() for u in uniques)
+    offsets, padded_grads = [], []
+    for unique, grad in zip(uniques, grads):
+        n = unique.numel()
+        offsets.append(
+            torch.cat(
+                [
+                    torch.arange(n, dtype=unique.dtype),
+                    torch.full((batch_size - n,), n, dtype=unique.dtype),
+                ]
+            )
+        )
+        if n < batch_size:
+            grad = torch.cat([grad, grad.new_zeros(batch_size - n, grad.shape[1])])
+        padded_grads.append(grad)
+    return offsets, padded_grads
+
+
+def merged_embeddingbag(
+    weights, indices, offsets, pooling_mode, include_last_offset, dedup=False
+):
+    if dedup:
+        # index_select reduces the grads per unique row for the dense grads
+        uniques, inverses = dedup_indices(indices)
+        weights = _gather_unique_rows(weights, uniques)
+        indices = inverses
     if torch.is_grad_enabled():
         return MergedEmbeddingBagFunc.apply(
             indices, offsets, pooling_mode, include_last_offset, *weights
@@ -59,9 +111,21 @@ def merged_embeddingbag_with_cat(
 
 
 def merged_embeddingbag_sgd(
-    weights, indices, offsets, pooling_mode, include_last_offset, sgd_args
+    weights, indices, offsets, pooling_mode, include_last_offset, sgd_args, dedup=False
 ):
-    if torch.is_grad_enabled():
+    if dedup:
+        if torch.is_grad_enabled():
+            return MergedEmbeddingBagDedupUpdateFunc.apply(
+                indices,
+                offsets,
+                pooling_mode,
+                include_last_offset,
+                sgd_args,
+                *weights,
+            )
+        uniques, indices = dedup_indices(indices)
+        weights = _gather_unique_rows(weights, uniques)
+    elif torch.is_grad_enabled():
         return MergedEmbeddingBagSGDFunc.apply(
             indices,
             offsets,
@@ -76,9 +140,27 @@ def merged_embeddingbag_sgd(
 
 
 def merged_embeddingbag_adagrad(
-    weights, indices, offsets, pooling_mode, include_last_offset, adagrad_args
+    weights,
+    indices,
+    offsets,
+    pooling_mode,
+    include_last_offset,
+    adagrad_args,
+    dedup=False,
 ):
-    if torch.is_grad_enabled():
+    if dedup:
+        if torch.is_grad_enabled():
+            return MergedEmbeddingBagDedupUpdateFunc.apply(
+                indices,
+                offsets,
+                pooling_mode,
+                include_last_offset,
+                adagrad_args,
+                *weights,
+            )
+        uniques, indices = dedup_indices(indices)
+        weights = _gather_unique_rows(weights, uniques)
+    elif torch.is_grad_enabled():
         return MergedEmbeddingBagAdaGradFunc.apply(
             indices,
             offsets,
@@ -222,6 +304,82 @@ class MergedEmbeddingBagAdaGradFunc(Function):
         return tuple(output)
 
 
+class MergedEmbeddingBagDedupUpdateFunc(Function):
+    r"""
+    Lookup on the unique rows of every table gathered once, then in backward the
+    grads are reduced per unique row and the fused SGD or AdaGrad update is
+    applied once per unique row.
+    """
+
+    @staticmethod
+    def forward(
+        ctx,
+        indices,
+        offsets,
+        pooling_mode,
+        include_last_offset,
+        optimizer_args,
+        *weights,
+    ):
+        uniques, inverses = dedup_indices(indices)
+        unique_weights = _gather_unique_rows(weights, uniques)
+        output = torch.ops.torch_ipex.merged_embeddingbag_forward(
+            unique_weights, inverses, offsets, pooling_mode, include_last_offset
+        )
+        ctx.uniques = uniques
+        ctx.inverses = inverses
+        ctx.offsets = offsets
+        ctx.weights = weights
+        ctx.unique_weights = unique_weights
+        ctx.pooling_mode = pooling_mode
+        ctx.include_last_offset = include_last_offset
+        ctx.optimizer_args = optimizer_args
+        return tuple(output)
+
+    @staticmethod
+    def backward(ctx, *grad_out):
+        uniques = ctx.uniques
+        weights = ctx.weights
+        optimizer_args = ctx.optimizer_args
+        # grads reduced per unique row
+        grads = torch.ops.torch_ipex.merged_embeddingbag_backward_cpu(
+            grad_out,
+            ctx.unique_weights,
+            ctx.inverses,
+            ctx.offsets,
+            ctx.pooling_mode,
+            ctx.include_last_offset,
+        )
+        offsets, grads = _one_row_bags(uniques, grads)
+        if isinstance(optimizer_args, SGDArgs):
+            torch.ops.torch_ipex.merged_embeddingbag_backward_sgd(
+                grads,
+                weights,
+                uniques,
+                offsets,
+                PoolingMode.SUM,
+                False,
+                optimizer_args.bf16_trail,
+                optimizer_args.weight_decay,
+                optimizer_args.lr,
+            )
+        else:
+            torch.ops.torch_ipex.merged_embeddingbag_backward_adagrad(
+                grads,
+                weights,
+                uniques,
+                offsets,
+                PoolingMode.SUM,
+                False,
+                optimizer_args.hessian,
+                optimizer_args.bf16_trail,
+                optimizer_args.eps,
+                optimizer_args.lr,
+            )
+        output = [None] * (5 + len(weights))
+        return tuple(output)
+
+
 class MergedEmbeddingBag(nn.Module):
     r"""
     Merge multiple Pytorch `EmbeddingBag <https://pytorch.org/docs/stable/generated/torch.nn.EmbeddingBag.html
@@ -258,6 +416,10 @@ class MergedEmbeddingBag(nn.Module):
 
     Now `MergedEmbeddingBagWithSGD` is the only option running with an optimizer. We plan to add more optimizer support
     in the future. Visit `MergedEmbeddingBagWithSGD` for introduction of `MergedEmbeddingBagWith[Optimizer]`.
+
+    With heavy-tailed indices (e.g., click logs), set `dedup_indices` to True to gather the unique rows of a batch once
+    and, in training, to reduce the grads per unique row before the weights update. `reorder_rows_by_frequency` is an
+    offline pass renumbering the rows so that the hot rows are contiguous.
     """
     embedding_specs: List[EmbeddingSpec]
 
@@ -306,6 +468,130 @@ class MergedEmbeddingBag(nn.Module):
             if weight is None:
                 weight = torch.empty((num_embeddings, embedding_dim), dtype=dtype)
             self.weights[i] = nn.Parameter(weight)
+        # table id -> _TieredEmbeddingTable, see enable_tiered_storage
+        self._tiered_tables = {}
+        # Deduplicate the indices of every table in forward, so that the unique rows
+        # are gathered once and, in training, grads are reduced per unique row
+        # before the weights update. Profitable with heavy-tailed indices.
+        self.dedup_indices = False
+
+    def _row_states(self):
+        # Lists of per-table optimizer states with one row per embedding row
+        return []
+
+    def enable_tiered_storage(
+        self,
+        storage_dir: str,
+        cache_rows: Union[int, List[int]],
+        policy: str = "lfu",
+    ):
+        r"""
+        Move the tables larger than ``cache_rows`` (and their per-row optimizer
+        states) to memory-mapped files in ``storage_dir``, keeping only
+        ``cache_rows`` hot rows of each in DRAM. Cold rows are read from the files
+        when a batch needs them, evicting the least frequently (``"lfu"``) or
+        least recently (``"lru"``) used rows, and rows updated by the fused
+        backward are written back to the files when evicted.
+
+        To build tables larger than DRAM, the weights of the ``EmbeddingSpec``
+        can be memory-mapped tensors (e.g., created by ``torch.from_file``). Call
+        ``to_bfloat16_train`` before this function. The parameters of the tiered
+        tables are the DRAM caches, ``flush`` should be called before reading the
+        files (e.g., for checkpointing). A forward should be followed by its
+        backward before the next forward.
+
+        Args:
+            storage_dir (str): directory of the backing files, preferably on a
+                local NVMe drive.
+            cache_rows (int or List[int]): number of rows cached in DRAM, for all
+                tables or per table.
+            policy (str): eviction policy, ``"lfu"`` or ``"lru"``. Default: ``"lfu"``.
+        """
+        if isinstance(cache_rows, int):
+            cache_rows = [cache_rows] * self.n_tables
+        assert len(cache_rows) == self.n_tables, "expect cache_rows for every table"
+        os.makedirs(storage_dir, exist_ok=True)
+        for i in range(self.n_tables):
+            weight = self.weights[i]
+            if i in self._tiered_tables or weight.shape[0] <= cache_rows[i]:
+                continue
+            states = [s for s in self._row_states() if s[i].numel() > 0]
+            columns = [weight.data] + [s[i] for s in states]
+            paths = [
+                os.path.join(storage_dir, f"table{i}_{j}.bin")
+                for j in range(len(columns))
+            ]
+            table = _TieredEmbeddingTable(columns, paths, cache_rows[i], policy)
+            self.weights[i] = nn.Parameter(table.cache[0], weight.requires_grad)
+            for state, cache in zip(states, table.cache[1:]):
+                state[i] = cache
+            self._tiered_tables[i] = table
+
+    def prefetch(self, indices):
+        r"""
+        Start reading the rows of the tiered tables needed by the next batch in
+        the background, e.g., while the current batch is computed.
+
+        Args:
+            indices (List[Tensor]): the indices of the next batch for all tables.
+        """
+        for i, table in self._tiered_tables.items():
+            table.prefetch(indices[i])
+
+    def flush(self):
+        r"""
+        Write the updated rows cached in DRAM back to the files of the tiered
+        tables.
+        """
+        for table in self._tiered_tables.values():
+            table.flush()
+
+    def reorder_rows_by_frequency(self, indices_samples: List[List[torch.Tensor]]):
+        r"""
+        Offline pass renumbering the rows of every table by descending access
+        frequency in ``indices_samples``, so that the hot rows are contiguous.
+        The weights and the per-row optimizer states are permuted in place.
+
+        Args:
+            indices_samples (List[List[Tensor]]): batches of indices for all
+                tables, e.g., sampled from the training data.
+        Returns:
+            List[Tensor] the new row id of every original row for every table.
+            The indices should be renumbered by ``remaps[i][indices[i]]``, e.g.,
+            once when preprocessing the dataset.
+        """
+        assert (
+            not self._tiered_tables
+        ), "reorder_rows_by_frequency should be called before enable_tiered_storage"
+        remaps = []
+        for i in range(self.n_tables):
+            num_rows = self.weights[i].shape[0]
+            counts = torch.zeros(num_rows, dtype=torch.int64)
+            for indices in indices_samples:
+                counts += torch.bincount(indices[i].to(torch.int64), minlength=num_rows)
+            # stable, so that rows with the same count keep their order
+            perm = torch.sort(counts, descending=True, stable=True).indices
+            remap = torch.empty_like(perm)
+            remap[perm] = torch.arange(num_rows)
+            remaps.append(remap)
+            with torch.no_grad():
+                self.weights[i].copy_(self.weights[i][perm])
+                for states in self._row_states():
+                    if states[i].numel() > 0:
+                        states[i].copy_(states[i][perm])
+        return remaps
+
+    def _fetch_indices(self, indices):
+        # Make the rows of the batch resident in the caches of the tiered tables,
+        # and remap their indices to the cache rows
+        if not self._tiered_tables:
+            return indices
+        # the fused backward updates all looked-up rows
+        dirty = torch.is_grad_enabled()
+        indices = list(indices)
+        for i, table in self._tiered_tables.items():
+            indices[i] = table.fetch(indices[i], dirty)
+        return indices
 
     @classmethod
     def from_embeddingbag_list(
@@ -353,8 +639,17 @@ class MergedEmbeddingBag(nn.Module):
             List[Tensor] output shape of `(batch_size, embedding_dim)` which length = num of tables.
         """
         assert self.dense
+        if self._tiered_tables and torch.is_grad_enabled():
+            raise RuntimeError(
+                "MergedEmbeddingBag with tiered storage only supports training with fused optimizer"
+            )
         return merged_embeddingbag(
-            self.weights, indices, offsets, self.pooling_mode, self.include_last_offset
+            self.weights,
+            self._fetch_indices(indices),
+            offsets,
+            self.pooling_mode,
+            self.include_last_offset,
+            self.dedup_indices,
         )
 
 
@@ -430,10 +725,16 @@ class MergedEmbeddingBagWithSGD(MergedEmbeddingBag):
             raise ValueError("Invalid weight_decay value: {}".format(weight_decay))
         return SGDArgs(weight_decay=weight_decay, lr=lr, bf16_trail=bf16_trail)
 
+    def _row_states(self):
+        return [self.sgd_args.bf16_trail]
+
     def to_bfloat16_train(self):
         r"""
         Cast weight to bf16 and it's trail part for training
         """
+        assert (
+            not self._tiered_tables
+        ), "to_bfloat16_train should be called before enable_tiered_storage"
         trails = []
         for i in range(len(self.weights)):
             if self.weights[i].dtype == torch.float:
@@ -467,11 +768,12 @@ class MergedEmbeddingBagWithSGD(MergedEmbeddingBag):
         """
         return merged_embeddingbag_sgd(
             self.weights,
-            indices,
+            self._fetch_indices(indices),
             offsets,
             self.pooling_mode,
             self.include_last_offset,
             self.sgd_args,
+            self.dedup_indices,
         )
 
     @classmethod
@@ -535,10 +837,16 @@ class MergedEmbeddingBagWithAdaGrad(MergedEmbeddingBag):
             raise ValueError("Invalid eps value: {}".format(eps))
         return AdaGradArgs(eps=eps, lr=lr, bf16_trail=bf16_trail, hessian=hessian)
 
+    def _row_states(self):
+        return [self.adagrad_args.hessian, self.adagrad_args.bf16_trail]
+
     def to_bfloat16_train(self):
         r"""
         Cast weight to bf16 and it's trail part for training
         """
+        assert (
+            not self._tiered_tables
+        ), "to_bfloat16_train should be called before enable_tiered_storage"
         trails = []
         for i in range(len(self.weights)):
             if self.weights[i].dtype == torch.float:
@@ -572,11 +880,12 @@ class MergedEmbeddingBagWithAdaGrad(MergedEmbeddingBag):
         """
         return merged_embeddingbag_adagrad(
             self.weights,
-            indices,
+            self._fetch_indices(indices),
             offsets,
             self.pooling_mode,
             self.include_last_offset,
             self.adagrad_args,
+            self.dedup_indices,
         )
 
     @classmethod
@@ -644,7 +953,7 @@ class MergedEmbeddingBagWithCat(MergedEmbeddingBag):
         """
         return merged_embeddingbag_with_cat(
             self.weights,
-            indices,
+            self._fetch_indices(indices),
             offsets,
             dense_feature,
         )
@@ -653,36 +962,163 @@ class MergedEmbeddingBagWithCat(MergedEmbeddingBag):
 import torch.distributed as dist
 
 
+# Alignment in bytes of the idx/ofs/val payloads packed in one message, so that
+# each of them can be viewed with its own dtype
+_SPARSE_ALL2ALL_ALIGN = 8
+
+
+def _aligned_nbytes(numel, element_size):
+    nbytes = numel * element_size
+    return (
+        (nbytes + _SPARSE_ALL2ALL_ALIGN - 1)
+        // _SPARSE_ALL2ALL_ALIGN
+        * _SPARSE_ALL2ALL_ALIGN
+    )
+
+
+class _PendingSparseAll2All(object):
+    def __init__(self, work, recv_idx, recv_buf, recv_ofs):
+        self.work = work
+        self.recv = (recv_idx, recv_buf, recv_ofs)
+
+    def wait(self):
+        if self.work is not None:
+            self.work.wait()
+            self.work = None
+        return self.recv
+
+
+class _SparseAll2All(object):
+    r"""
+    Sparse all to all of the idx/val/ofs tensors produced by
+    ``mergedemb_distribute_forward_local`` and
+    ``mergedemb_distribute_backward_local``. The row counts are exchanged first,
+    then the idx, ofs and val payloads for a rank are packed in one message and
+    all ranks are exchanged by a single asynchronous ``all_to_all_single``.
+
+    The send and receive buffers are persistent per ``slot`` and only grow to the
+    high-water mark of the exchanged sizes. The received tensors are views of the
+    receive buffer of the slot, they should be consumed before the slot is used
+    again.
+    """
+
+    def __init__(self, world_size: int):
+        self.world_size = world_size
+        self.send_buffers = {}
+        self.recv_buffers = {}
+        self.pending = {}
+
+    @staticmethod
+    def _get_buffer(buffers, slot, nbytes):
+        buffer = buffers.get(slot)
+        if buffer is None or buffer.numel() < nbytes:
+            # Some headroom so that a slowly growing exchange does not reallocate
+            # at every step
+            buffer = torch.empty(nbytes + nbytes // 8, dtype=torch.uint8)
+            buffers[slot] = buffer
+        return buffer
+
+    def start(
+        self,
+        send_idx: List[torch.Tensor],
+        send_buf: List[torch.Tensor],
+        send_ofs: List[torch.Tensor],
+        slot: int = 0,
+    ):
+        r"""
+        Start the exchange and return a handle, whose ``wait()`` returns the
+        received ``(recv_idx, recv_buf, recv_ofs)``.
+        """
+        world_size = self.world_size
+        if slot in self.pending:
+            # the buffers of the slot may still be read by the previous exchange
+            self.pending.pop(slot).wait()
+        # the first thing to know is the recv tensor sizes
+        send_counts = torch.tensor([t.shape[0] for t in send_idx], dtype=torch.int64)
+        recv_counts = torch.empty_like(send_counts)
+        dist.all_to_all_single(recv_counts, send_counts)
+
+        index_type = send_idx[0].dtype
+        val_type = send_buf[0].dtype
+        emb_dim = send_buf[0].shape[1]
+        ofs_size = send_ofs[0].shape[0]
+        idx_size = send_idx[0].element_size()
+        val_size = send_buf[0].element_size()
+
+        def segments(n):
+            return (
+                _aligned_nbytes(n, idx_size),
+                _aligned_nbytes(ofs_size, 8),
+                _aligned_nbytes(n * emb_dim, val_size),
+            )
+
+        send_splits = [sum(segments(n)) for n in send_counts.tolist()]
+        recv_splits = [sum(segments(n)) for n in recv_counts.tolist()]
+        send_buffer = self._get_buffer(self.send_buffers, slot, sum(send_splits))
+        recv_buffer = self._get_buffer(self.recv_buffers, slot, sum(recv_splits))
+
+        pos = 0
+        for i in range(world_size):
+            for t, nbytes in zip(
+                (send_idx[i], send_ofs[i], send_buf[i]), segments(send_idx[i].shape[0])
+            ):
+                numel = t.numel()
+                if numel > 0:
+                    send_buffer[pos : pos + numel * t.element_size()].view(
+                        t.dtype
+                    ).copy_(t.reshape(-1))
+                pos += nbytes
+
+        recv_idx, recv_buf, recv_ofs = [], [], []
+        pos = 0
+        for n in recv_counts.tolist():
+            idx_nbytes, ofs_nbytes, val_nbytes = segments(n)
+            recv_idx.append(recv_buffer[pos : pos + n * idx_size].view(index_type))
+            pos += idx_nbytes
+            recv_ofs.append(recv_buffer[pos : pos + ofs_size * 8].view(torch.int64))
+            pos += ofs_nbytes
+            recv_buf.append(
+                recv_buffer[pos : pos + n * emb_dim * val_size]
+                .view(val_type)
+                .view(n, emb_dim)
+            )
+            pos += val_nbytes
+
+        work = dist.all_to_all_single(
+            recv_buffer[: sum(recv_splits)],
+            send_buffer[: sum(send_splits)],
+            recv_splits,
+            send_splits,
+            async_op=True,
+        )
+        handle = _PendingSparseAll2All(work, recv_idx, recv_buf, recv_ofs)
+        self.pending[slot] = handle
+        return handle
+
+
 def sparse_all2all(
     world_size: int,
     send_idx: List[torch.Tensor],
     send_buf: List[torch.Tensor],
     send_ofs: List[torch.Tensor],
 ):
-    # the first thing to know is the recv tensor sizes
-    # this requires an all to all
-    is_buffers = [torch.empty(1, dtype=torch.int64) for _ in range(world_size)]
-    for i in range(world_size):
-        is_buffers[i][0] = send_idx[i].shape[0]
-    os_buffers = [torch.empty(1, dtype=torch.int64) for _ in range(world_size)]
-    dist.all_to_all(os_buffers, is_buffers)
-    dist.barrier()
-
-    # init received buffers sizes
-    index_type = send_idx[0].dtype
-    val_type = send_buf[0].dtype
-    emb_dim = send_buf[0].shape[1]
-    ofs_size = send_ofs[0].shape[0]
-    recv_idx = [torch.zeros(os_buffers[i], dtype=index_type) for i in range(world_size)]
-    recv_buf = [
-        torch.zeros((os_buffers[i], emb_dim), dtype=val_type) for i in range(world_size)
-    ]
-    recv_ofs = [torch.zeros((ofs_size,), dtype=torch.int64) for i in range(world_size)]
-    dist.all_to_all(recv_idx, send_idx)
-    dist.all_to_all(recv_buf, send_buf)
-    dist.all_to_all(recv_ofs, send_ofs)
-    dist.barrier()
-    return recv_idx, recv_buf, recv_ofs
+    return _SparseAll2All(world_size).start(send_idx, send_buf, send_ofs).wait()
+
+
+def _pipelined_sparse_all2all(exchanger, num_groups, local, merge):
+    r"""
+    Run ``local(g)`` -> sparse all to all -> ``merge(g, recv_idx, recv_buf,
+    recv_ofs)`` for the table groups ``g``. The exchange of a group overlaps with
+    the local compute of the next group and the merge of the previous group.
+    """
+    prev = None
+    for g in range(num_groups):
+        send_idx, send_buf, send_ofs = local(g)
+        handle = exchanger.start(send_idx, send_buf, send_ofs, slot=g % 2)
+        if prev is not None:
+            merge(g - 1, *prev.wait())
+        prev = handle
+    merge(num_groups - 1, *prev.wait())
 
 
 class DistMergeEmbeddingBagFunc(Function):
@@ -697,6 +1133,8 @@ class DistMergeEmbeddingBagFunc(Function):
         world_size: int,
         include_last_offsets: bool,
         adagrad_args: AdaGradArgs,
+        exchanger: _SparseAll2All,
+        table_groups: List[List[int]],
     ):
         global_bs = offsets[0].size(0)
         if include_last_offsets:
@@ -710,23 +1148,36 @@ class DistMergeEmbeddingBagFunc(Function):
         ctx.adagrad_args = adagrad_args
         ctx.rank = rank
         ctx.world_size = world_size
-        num_emb = len(indices)
+        ctx.exchanger = exchanger
+        ctx.table_groups = table_groups
         emb_dim = weight.shape[1]
-        (
-            send_idx,
-            send_buf,
-            send_ofs,
-        ) = torch.ops.torch_ipex.mergedemb_distribute_forward_local(
-            weight, row_offset, indices, offsets, rank, world_size, include_last_offsets
-        )
-        recv_idx, recv_buf, recv_ofs = sparse_all2all(
-            world_size, send_idx, send_buf, send_ofs
-        )
-        output = torch.empty((local_bs, num_emb, emb_dim), dtype=weight.dtype)
-        torch.ops.torch_ipex.mergedemb_distribute_forward_merge(
-            output, recv_idx, recv_buf, recv_ofs, num_emb
-        )
-        return output
+
+        def local(g):
+            start, end = table_groups[g]
+            return torch.ops.torch_ipex.mergedemb_distribute_forward_local(
+                weight,
+                row_offset[start : end + 1],
+                indices[start:end],
+                offsets[start:end],
+                rank,
+                world_size,
+                include_last_offsets,
+            )
+
+        outputs = []
+
+        def merge(g, recv_idx, recv_buf, recv_ofs):
+            start, end = table_groups[g]
+            output = torch.empty((local_bs, end - start, emb_dim), dtype=weight.dtype)
+            torch.ops.torch_ipex.mergedemb_distribute_forward_merge(
+                output, recv_idx, recv_buf, recv_ofs, end - start
+            )
+            outputs.append(output)
+
+        _pipelined_sparse_all2all(exchanger, len(table_groups), local, merge)
+        if len(outputs) == 1:
+            return outputs[0]
+        return torch.cat(outputs, dim=1)
 
     @staticmethod
     def backward(ctx, grad: torch.Tensor):
@@ -736,26 +1187,35 @@ class DistMergeEmbeddingBagFunc(Function):
         rank = ctx.rank
         world_size = ctx.world_size
         include_last_offsets = ctx.include_last_offsets
-        (
-            send_idx,
-            send_buf,
-            send_ofs,
-        ) = torch.ops.torch_ipex.mergedemb_distribute_backward_local(
-            grad, row_offset, indices, offsets, rank, world_size, include_last_offsets
-        )
-        recv_idx, recv_buf, recv_ofs = sparse_all2all(
-            world_size, send_idx, send_buf, send_ofs
-        )
+        table_groups = ctx.table_groups
         weight = ctx.weight
         adagrad_args = ctx.adagrad_args
         trail = adagrad_args.bf16_trail
         hessian = adagrad_args.hessian
         lr = adagrad_args.lr
         eps = adagrad_args.eps
-        torch.ops.torch_ipex.mergedemb_distribute_backward_merge_adagrad_update(
-            recv_idx, recv_buf, recv_ofs, weight, trail[0], hessian[0], lr, eps
-        )
-        return None, None, None, None, None, None, None, None
+
+        def local(g):
+            start, end = table_groups[g]
+            return torch.ops.torch_ipex.mergedemb_distribute_backward_local(
+                grad[:, start:end].contiguous(),
+                row_offset[start : end + 1],
+                indices[start:end],
+                offsets[start:end],
+                rank,
+                world_size,
+                include_last_offsets,
+            )
+
+        # Tables do not share rows, so the update of a group does not depend on
+        # the grads of the other groups
+        def merge(g, recv_idx, recv_buf, recv_ofs):
+            torch.ops.torch_ipex.mergedemb_distribute_backward_merge_adagrad_update(
+                recv_idx, recv_buf, recv_ofs, weight, trail[0], hessian[0], lr, eps
+            )
+
+        _pipelined_sparse_all2all(ctx.exchanger, len(table_groups), local, merge)
+        return None, None, None, None, None, None, None, None, None, None
 
 
 class DistMergeEmbeddingBagWithAdaGrad(MergedEmbeddingBagWithAdaGrad):
@@ -766,6 +1226,9 @@ class DistMergeEmbeddingBagWithAdaGrad(MergedEmbeddingBagWithAdaGrad):
     Each rank will keep particia table and will only run forward/backward/update on the rows it keeped in local.
     We will also merge the result from different ranks through all to all during forward/backward.
     The returned results for forward is shape of [local BS * num tables * emb_dim]
+    The tables can be split into ``num_table_groups`` groups, then the all to all
+    of a group overlaps with the local lookup (or the local grad reduction) of the
+    next group.
     Example usage:
 
         >>> EmbLists = torch.nn.Modulist(emb1, emb2, emb3, ..., emb_m)
@@ -779,13 +1242,25 @@ class DistMergeEmbeddingBagWithAdaGrad(MergedEmbeddingBagWithAdaGrad):
         embedding_specs: List[EmbeddingSpec],
         lr: float = 0.01,
         eps: float = 1e-10,
+        num_table_groups: int = 1,
     ):
         super(MergedEmbeddingBagWithAdaGrad, self).__init__(embedding_specs)
         assert (
             self.pooling_mode == PoolingMode.SUM
         ), "only support SUM for DistMergeEmbeddingBagWithAdaGrad"
+        assert (
+            1 <= num_table_groups <= self.n_tables
+        ), "num_table_groups should be in [1, number of tables]"
         self._rank = dist.get_rank()
         self._size = dist.get_world_size()
+        # contiguous table groups [start, end) with balanced number of tables
+        bounds = [
+            i * self.n_tables // num_table_groups for i in range(num_table_groups + 1)
+        ]
+        self._table_groups = [
+            [bounds[i], bounds[i + 1]] for i in range(num_table_groups)
+        ]
+        self._exchanger = _SparseAll2All(self._size)
         # create row_offset
         self._row_offset = [0 for i in range(self.n_tables + 1)]
         for i in range(self.n_tables):
@@ -823,11 +1298,43 @@ class DistMergeEmbeddingBagWithAdaGrad(MergedEmbeddingBagWithAdaGrad):
             self._size,
             self.include_last_offset,
             self.adagrad_args,
+            self._exchanger,
+            self._table_groups,
         )
         return out
 
+    @classmethod
+    def from_embeddingbag_list(
+        cls,
+        tables: List[torch.nn.EmbeddingBag],
+        lr: float = 0.01,
+        eps: float = 1e-10,
+        num_table_groups: int = 1,
+    ):
+        embedding_specs = []
+        for emb in tables:
+            emb_shape = emb.weight.shape
+            embedding_specs.append(
+                EmbeddingSpec(
+                    num_embeddings=emb_shape[0],
+                    embedding_dim=emb_shape[1],
+                    pooling_mode=emb.mode,
+                    dtype=emb.weight.dtype,
+                    weight=emb.weight.detach(),
+                    sparse=emb.sparse,
+                    include_last_offset=emb.include_last_offset,
+                )
+            )
+        return cls(embedding_specs, lr, eps, num_table_groups)
+
+    def enable_tiered_storage(self, storage_dir, cache_rows, policy="lfu"):
+        raise NotImplementedError(
+            "DistMergeEmbeddingBagWithAdaGrad does not support tiered storage"
+        )
+
     def extra_repr(self) -> str:
         s = ""
-        s += f"world_size: {self._size}, rank_id: {self._rank}\n"
+        s += f"world_size: {self._size}, rank_id: {self._rank}, "
+        s += f"num_table_groups: {len(self._table_groups)}\n"
         s += super(DistMergeEmbeddingBagWithAdaGrad, self).extra_repr()
         return s
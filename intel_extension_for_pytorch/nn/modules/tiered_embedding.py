@@ -0,0 +1,172 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import torch
+
+# Number of rows copied at a time when a table is moved to its backing file
+_COPY_CHUNK_ROWS = 1 << 16
+
+
+def _to_backing_file(tensor, path):
+    r"""
+    Copy ``tensor`` of shape ``[num_rows, dim]`` into the file ``path`` and return
+    the tensor memory-mapped on it. The file is created sparse, so all-zero chunks
+    (e.g., the initial optimizer states) are not written.
+    """
+    num_rows, dim = tensor.shape
+    if os.path.exists(path):
+        os.remove(path)
+    backing = torch.from_file(
+        path, shared=True, size=num_rows * dim, dtype=tensor.dtype
+    ).view(num_rows, dim)
+    for start in range(0, num_rows, _COPY_CHUNK_ROWS):
+        chunk = tensor[start : start + _COPY_CHUNK_ROWS]
+        if chunk.any():
+            backing[start : start + _COPY_CHUNK_ROWS].copy_(chunk)
+    return backing
+
+
+class _TieredEmbeddingTable(object):
+    r"""
+    Rows of an embedding table (and of its per-row optimizer states) stored in
+    memory-mapped files, with the hot rows cached in fixed-size DRAM tensors.
+
+    The embedding kernels run on the cache tensors: ``fetch`` makes the rows of a
+    batch resident, evicting the least frequently (``"lfu"``) or least recently
+    (``"lru"``) used rows which are not needed by the batch, and returns the
+    indices remapped to cache slots. Rows updated by the fused backward are
+    marked dirty and written back to the files when evicted or flushed.
+    ``prefetch`` reads the missing rows of the next batch from the files in a
+    background thread, they are installed by the next ``fetch``.
+
+    Args:
+        columns (List[Tensor]): the weight and the per-row states of the table,
+            each of shape ``[num_rows, dim]``.
+        paths (List[str]): the backing file of each column.
+        cache_rows (int): number of rows cached in DRAM.
+        policy (str): eviction policy, ``"lfu"`` or ``"lru"``.
+    """
+
+    def __init__(
+        self,
+        columns: List[torch.Tensor],
+        paths: List[str],
+        cache_rows: int,
+        policy: str = "lfu",
+    ):
+        assert policy in ("lfu", "lru"), "policy should be lfu or lru"
+        self.num_rows = columns[0].shape[0]
+        self.cache_rows = cache_rows
+        self.policy = policy
+        self.backing = [_to_backing_file(c, p) for c, p in zip(columns, paths)]
+        self.cache = [
+            torch.zeros((cache_rows, c.shape[1]), dtype=c.dtype) for c in columns
+        ]
+        self.slot_of_row = torch.full((self.num_rows,), -1, dtype=torch.int64)
+        self.row_of_slot = torch.full((cache_rows,), -1, dtype=torch.int64)
+        # access count for lfu, last access step for lru
+        self.score = torch.zeros(cache_rows, dtype=torch.int64)
+        self.dirty = torch.zeros(cache_rows, dtype=torch.bool)
+        self.step = 0
+        self.staged = None
+        self.written_back = []
+
+    def _write_back(self, slots):
+        slots = slots[self.dirty[slots]]
+        if slots.numel() == 0:
+            return
+        rows = self.row_of_slot[slots]
+        for backing, cache in zip(self.backing, self.cache):
+            backing[rows] = cache[slots]
+        self.dirty[slots] = False
+        if self.staged is not None:
+            self.written_back.append(rows)
+
+    def _read_rows(self, rows):
+        if self.staged is None:
+            return [backing[rows] for backing in self.backing]
+        staged_rows, future = self.staged
+        self.staged = None
+        written_back = self.written_back
+        self.written_back = []
+        staged_data = future.result()
+        if staged_rows.numel() == 0:
+            return [backing[rows] for backing in self.backing]
+        # a staged row is stale if it was written back after it was read
+        valid = torch.ones(staged_rows.numel(), dtype=torch.bool)
+        if written_back:
+            valid = ~torch.isin(staged_rows, torch.cat(written_back))
+        pos = torch.searchsorted(staged_rows, rows)
+        pos.clamp_(max=staged_rows.numel() - 1)
+        hit = (staged_rows[pos] == rows) & valid[pos]
+        miss = ~hit
+        data = []
+        for backing, staged in zip(self.backing, staged_data):
+            out = torch.empty((rows.numel(), backing.shape[1]), dtype=backing.dtype)
+            out[hit] = staged[pos[hit]]
+            out[miss] = backing[rows[miss]]
+            data.append(out)
+        return data
+
+    def prefetch(self, indices):
+        rows = torch.unique(indices.to(torch.int64))
+        rows = rows[self.slot_of_row[rows] < 0]
+        if self.staged is not None:
+            # the previous prefetch is not consumed yet
+            self.staged[1].result()
+        self.written_back = []
+        self.staged = (
+            rows,
+            _prefetch_executor().submit(
+                lambda: [backing[rows] for backing in self.backing]
+            ),
+        )
+
+    def fetch(self, indices, dirty=False):
+        rows, inverse, counts = torch.unique(
+            indices.to(torch.int64), return_inverse=True, return_counts=True
+        )
+        if rows.numel() > self.cache_rows:
+            raise RuntimeError(
+                f"A batch needs {rows.numel()} rows of a table, but only {self.cache_rows} rows are cached"
+            )
+        self.step += 1
+        slots = self.slot_of_row[rows]
+        miss = slots < 0
+        if miss.any():
+            miss_rows = rows[miss]
+            # free slots first, then the slots with the lowest score which are not
+            # used by the batch
+            score = self.score.clone()
+            score[self.row_of_slot < 0] = -1
+            score[slots[~miss]] = torch.iinfo(torch.int64).max
+            victims = torch.topk(score, miss_rows.numel(), largest=False).indices
+            self._write_back(victims)
+            evicted = self.row_of_slot[victims]
+            self.slot_of_row[evicted[evicted >= 0]] = -1
+            for cache, data in zip(self.cache, self._read_rows(miss_rows)):
+                cache[victims] = data
+            self.row_of_slot[victims] = miss_rows
+            self.slot_of_row[miss_rows] = victims
+            self.score[victims] = 0
+            slots[miss] = victims
+        if self.policy == "lfu":
+            self.score[slots] += counts
+        else:
+            self.score[slots] = self.step
+        if dirty:
+            self.dirty[slots] = True
+        return slots[inverse].to(indices.dtype)
+
+    def flush(self):
+        self._write_back(torch.arange(self.cache_rows))
+
+
+_executor = None
+
+
+def _prefetch_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1)
+    return _executor
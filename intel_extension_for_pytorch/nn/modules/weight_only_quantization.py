@@ -212,6 +212,62 @@ class WeightOnlyQuantizedLinear(nn.Module):
         del qweight
         return qlinear
 
+    def _get_packed_state(self):
+        r"""Return the kernel-ready state of the module, with the weight packed for
+        the current ISA. It is the input of ``_from_packed_state``.
+        """
+        op_context = self._op_context
+        weight_shape = op_context.get_weight_shape()
+        bias = op_context.get_bias()
+        # Bias may be padded along with the packed weight
+        if bias is not None and bias.size(0) > weight_shape[0]:
+            bias = bias.narrow(0, 0, weight_shape[0]).contiguous()
+        return {
+            "packed_weight": op_context.get_weight(),
+            "weight_dtype": int(self.dtype),
+            "weight_shape": list(weight_shape),
+            "scales": op_context.get_scales(),
+            "zero_points": op_context.get_zero_points(),
+            "bias": bias,
+            "g_idx": op_context.get_g_idx(),
+            "group_size": self._group_size,
+            "lowp_mode": int(self._lowp_mode),
+            "act_quant_mode": int(self._act_quant_mode),
+        }
+
+    @classmethod
+    def _from_packed_state(cls, state):
+        r"""Create a weight-only quantized module from the state returned by
+        ``_get_packed_state``. The packed weight is used as is, without being
+        packed or copied again, e.g., it may be a memory-mapped tensor.
+        """
+        out_features, in_features = state["weight_shape"]
+        qlinear = cls(
+            in_features,
+            out_features,
+            state["bias"] is not None,
+            dtype=WoqWeightDtype(state["weight_dtype"]),
+        )
+        qlinear._op_context = (
+            torch.ops.ipex_prepack.weight_only_qlinear_prepack_from_packed(
+                state["packed_weight"],
+                state["weight_dtype"],
+                state["weight_shape"],
+                state["scales"],
+                state["zero_points"],
+                state["bias"],
+                state["g_idx"],
+                state["group_size"],
+                state["lowp_mode"],
+                state["act_quant_mode"],
+            )
+        )
+        qlinear.weight = qlinear._op_context.get_weight()
+        qlinear._lowp_mode = state["lowp_mode"]
+        qlinear._act_quant_mode = state["act_quant_mode"]
+        qlinear._group_size = state["group_size"]
+        return qlinear
+
     @classmethod
     def _init_cls(
         cls,
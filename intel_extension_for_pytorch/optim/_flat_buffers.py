@@ -0,0 +1,357 @@
+import torch
+import types
+from ._functional import is_master_weight, unscale_grads_and_check_inf
+
+# Optimizer states flattened along with the params, per fused step
+FLAT_STATE_KEYS = {
+    "sgd": ["momentum_buffer"],
+    "adam": ["exp_avg", "exp_avg_sq", "max_exp_avg_sq"],
+    "lamb": ["exp_avg", "exp_avg_sq"],
+}
+
+
+def _is_dense(tensor):
+    return (
+        tensor.is_contiguous()
+        or tensor.is_contiguous(memory_format=torch.channels_last)
+        or tensor.is_contiguous(memory_format=torch.channels_last_3d)
+    )
+
+
+class FlatBuffer(object):
+    r"""
+    Params of a param group with the same dtype, whose data, grads, split master
+    weight trails and optimizer states are stored in contiguous 1-D buffers. The
+    per-param tensors are views of the buffers which keep their sizes and strides,
+    so a fused step updates all of them with a single kernel call while the
+    modules and ``state_dict`` see the usual per-param tensors.
+
+    Args:
+        optimizer (torch.optim.Optimizer): the optimizer owning the params.
+        params (List[Tensor]): the params, with the same dtype and device.
+        state_keys (List[str]): the names of the per-param states to flatten.
+    """
+
+    def __init__(self, optimizer, params, state_keys):
+        self.params = params
+        self.numels = [p.numel() for p in params]
+        self.offsets = [0]
+        for numel in self.numels:
+            self.offsets.append(self.offsets[-1] + numel)
+        self.param = self._flatten([p.data for p in params])
+        for p, view in zip(params, self.views(self.param)):
+            p.data = view
+        self.grad = self._flatten(
+            [p.grad if p.grad is not None else torch.zeros_like(p) for p in params]
+        )
+        self.attach_grads()
+        self.trail = torch.Tensor()
+        self.attrs = [optimizer.params_attr.get(p) for p in params]
+        if self.attrs[0] is not None and self.attrs[0].parameter_trail is not None:
+            self.trail = self._flatten([attr.parameter_trail for attr in self.attrs])
+            for attr, view in zip(self.attrs, self.views(self.trail)):
+                attr.parameter_trail = view
+        self.states = {}
+        for key in state_keys:
+            values = [optimizer.state[p].get(key) for p in params]
+            if values[0] is not None:
+                self.set_state(optimizer, key, self._flatten(values))
+        self.step = None
+        step = optimizer.state[params[0]].get("step")
+        if isinstance(step, torch.Tensor):
+            self.set_step(optimizer, step.clone())
+
+    def views(self, flat):
+        return [
+            flat.as_strided(p.size(), p.stride(), offset)
+            for p, offset in zip(self.params, self.offsets)
+        ]
+
+    def _flatten(self, tensors):
+        flat = torch.empty(self.offsets[-1], dtype=tensors[0].dtype)
+        for view, tensor in zip(self.views(flat), tensors):
+            view.copy_(tensor)
+        return flat
+
+    def attach_grads(self):
+        for p, view in zip(self.params, self.views(self.grad)):
+            p.grad = view
+
+    def set_state(self, optimizer, key, flat):
+        self.states[key] = flat
+        for p, view in zip(self.params, self.views(flat)):
+            optimizer.state[p][key] = view
+
+    def set_step(self, optimizer, step):
+        # one step counter shared by the params of the buffer
+        self.step = step
+        for p in self.params:
+            optimizer.state[p]["step"] = step
+
+    def _is_view(self, tensors, flat):
+        ptr = flat.data_ptr()
+        size = flat.element_size()
+        return all(
+            t is not None and t.data_ptr() == ptr + offset * size
+            for t, offset in zip(tensors, self.offsets)
+        )
+
+    def is_valid(self, optimizer):
+        # the views are replaced, e.g., by load_state_dict or by an assignment of
+        # the grads
+        if not self._is_view(self.params, self.param):
+            return False
+        if not self._is_view([p.grad for p in self.params], self.grad):
+            return False
+        if self.trail.numel() > 0 and not self._is_view(
+            [attr.parameter_trail for attr in self.attrs], self.trail
+        ):
+            return False
+        states = [optimizer.state[p] for p in self.params]
+        for key, flat in self.states.items():
+            if not self._is_view([state.get(key) for state in states], flat):
+                return False
+        return self.step is None or all(
+            state.get("step") is self.step for state in states
+        )
+
+
+def _bucket_key(optimizer, p, state_keys):
+    # params which can not be flattened return None
+    if p.device.type != "cpu" or not p.requires_grad:
+        return None
+    if is_master_weight(p, optimizer.params_attr) or not _is_dense(p):
+        return None
+    if p.grad is not None and (p.grad.is_sparse or p.grad.shape != p.shape):
+        return None
+    attr = optimizer.params_attr.get(p)
+    # prepacked weights are owned by their op context, which would be left with
+    # the replaced data
+    if attr is not None and attr.op_ctx is not None:
+        return None
+    trail = attr is not None and attr.parameter_trail is not None
+    if trail and not _is_dense(attr.parameter_trail):
+        return None
+    state = optimizer.state[p]
+    # a state is either missing for all params of a bucket or present for all
+    # of them with the same dtype and layout as the param
+    layout = []
+    for key in state_keys:
+        value = state.get(key)
+        if value is not None:
+            if value.shape != p.shape or value.stride() != p.stride():
+                return None
+            layout.append((key, value.dtype))
+    step = state.get("step")
+    if isinstance(step, torch.Tensor):
+        step = step.item()
+    return (p.dtype, trail, tuple(layout), step)
+
+
+def flatten_param_groups(optimizer, state_keys, dtypes=None):
+    r"""
+    Flattens the params of each param group of ``optimizer`` into
+    :class:`FlatBuffer`, one per group of params sharing dtype, trail, states and
+    step. Params of other dtypes than ``dtypes`` or which can not be flattened,
+    e.g., master weights, are left as is. Returns the list of buffers of each
+    param group.
+    """
+    flat_buffers = []
+    for group in optimizer.param_groups:
+        buckets = {}
+        for p in group["params"]:
+            if dtypes is not None and p.dtype not in dtypes:
+                continue
+            key = _bucket_key(optimizer, p, state_keys)
+            if key is not None:
+                buckets.setdefault(key, []).append(p)
+        flat_buffers.append(
+            [
+                FlatBuffer(optimizer, params, state_keys)
+                for params in buckets.values()
+                if len(params) > 1
+            ]
+        )
+    return flat_buffers
+
+
+def _sgd_update(optimizer, group, buffer):
+    grad = buffer.grad if not group["maximize"] else -buffer.grad
+    momentum_buffer = torch.ops.torch_ipex.sgd_fused_step(
+        buffer.param,
+        grad,
+        buffer.states.get("momentum_buffer"),
+        buffer.trail,
+        group["momentum"],
+        group["lr"],
+        group["weight_decay"],
+        group["dampening"],
+        group["nesterov"],
+    )
+    if momentum_buffer is not None and "momentum_buffer" not in buffer.states:
+        buffer.set_state(optimizer, "momentum_buffer", momentum_buffer)
+
+
+def _init_states(optimizer, buffer, keys, dtype):
+    for key in keys:
+        buffer.set_state(optimizer, key, torch.zeros(buffer.param.numel(), dtype=dtype))
+
+
+def _adam_update(optimizer, group, buffer):
+    if "exp_avg" not in buffer.states:
+        keys = ["exp_avg", "exp_avg_sq"]
+        if group["amsgrad"]:
+            keys.append("max_exp_avg_sq")
+        dtype = torch.float64 if buffer.param.dtype is torch.float64 else torch.float
+        _init_states(optimizer, buffer, keys, dtype)
+        buffer.set_step(optimizer, torch.tensor(0.0))
+    grad = buffer.grad if not group["maximize"] else -buffer.grad
+    buffer.step += 1
+    beta1, beta2 = group["betas"]
+    torch.ops.torch_ipex.adam_fused_step(
+        buffer.param,
+        buffer.states["exp_avg"],
+        buffer.states["exp_avg_sq"],
+        buffer.states.get("max_exp_avg_sq", torch.Tensor()),
+        grad,
+        buffer.trail,
+        group["amsgrad"],
+        buffer.step.item(),
+        beta1,
+        beta2,
+        group["lr"],
+        group["weight_decay"],
+        group["eps"],
+    )
+
+
+def _lamb_update(optimizer, group, buffer):
+    # same computation as lamb_fused_step, with the trust ratio of each param
+    # computed on its slice of the buffers
+    if "exp_avg" not in buffer.states:
+        _init_states(optimizer, buffer, ["exp_avg", "exp_avg_sq"], torch.float)
+    step = 0
+    for p in buffer.params:
+        state = optimizer.state[p]
+        step = state["step"] = state.get("step", 0) + 1
+    beta1, beta2 = group["betas"]
+    exp_avg = buffer.states["exp_avg"]
+    exp_avg_sq = buffer.states["exp_avg_sq"]
+    exp_avg.mul_(beta1).add_(buffer.grad, alpha=1 - beta1)
+    exp_avg_sq.mul_(beta2).addcmul_(buffer.grad, buffer.grad, value=1 - beta2)
+    # the grad is overwritten by the update as in lamb_fused_step
+    update = torch.div(exp_avg_sq, 1 - beta2**step, out=buffer.grad)
+    update.sqrt_().add_(group["eps"])
+    update.reciprocal_().mul_(exp_avg).div_(1 - beta1**step)
+    if group["weight_decay"] != 0:
+        update.add_(buffer.param, alpha=group["weight_decay"])
+    updates = update.split(buffer.numels)
+    param_norms = torch.stack(torch._foreach_norm(buffer.param.split(buffer.numels)))
+    update_norms = torch.stack(torch._foreach_norm(updates))
+    ratios = torch.where(
+        (param_norms > 0) & (update_norms > 0),
+        param_norms / update_norms,
+        torch.ones_like(param_norms),
+    )
+    torch._foreach_mul_(updates, (ratios * -group["lr"]).tolist())
+    buffer.param.add_(update)
+
+
+_FLAT_UPDATES = {
+    "sgd": _sgd_update,
+    "adam": _adam_update,
+    "lamb": _lamb_update,
+}
+
+
+def _refresh_flat_buffers(optimizer):
+    if all(
+        buffer.is_valid(optimizer)
+        for buffers in optimizer._flat_buffers
+        for buffer in buffers
+    ):
+        return
+    kind = optimizer._flat_kind
+    # lamb keeps the per-tensor kernel for the split bf16 master weights
+    dtypes = [torch.float] if kind == "lamb" else None
+    optimizer._flat_buffers = flatten_param_groups(
+        optimizer, FLAT_STATE_KEYS[kind], dtypes
+    )
+    optimizer._flat_remaining_params = []
+    for group, buffers in zip(optimizer.param_groups, optimizer._flat_buffers):
+        flattened = {id(p) for buffer in buffers for p in buffer.params}
+        optimizer._flat_remaining_params.append(
+            [p for p in group["params"] if id(p) not in flattened]
+        )
+
+
+@torch.no_grad()
+def flat_step(self, closure=None, inv_scale=None, found_inf=None):
+    r"""
+    Fused step updating each :class:`FlatBuffer` with one kernel call, the params
+    which are not flattened are updated by the per-tensor fused step.
+    """
+    loss = None
+    if closure is not None:
+        with torch.enable_grad():
+            loss = closure()
+    _refresh_flat_buffers(self)
+    if unscale_grads_and_check_inf(self, inv_scale, found_inf) is None:
+        return loss
+    update = _FLAT_UPDATES[self._flat_kind]
+    for group, buffers in zip(self.param_groups, self._flat_buffers):
+        for buffer in buffers:
+            update(self, group, buffer)
+    param_groups = self.param_groups
+    self.param_groups = [
+        dict(group, params=params)
+        for group, params in zip(param_groups, self._flat_remaining_params)
+    ]
+    try:
+        self._flat_per_tensor_step()
+    finally:
+        self.param_groups = param_groups
+    return loss
+
+
+def patch_flat_buffers(optimizer, kind):
+    r"""
+    Patches the fused step of ``optimizer`` to update its params in flat buffers,
+    see :class:`FlatBuffer`. ``zero_grad`` zeroes the flat grad buffers and keeps
+    the grads of the flattened params as views, i.e., these params are updated
+    with zero grads as with ``set_to_none=False``. ``state_dict`` returns
+    standalone per-param states, the buffers are rebuilt after
+    ``load_state_dict``.
+    """
+
+    def zero_grad(self, set_to_none: bool = True):
+        for buffers in self._flat_buffers:
+            for buffer in buffers:
+                for p in buffer.params:
+                    p.grad = None
+        self._flat_original_zero_grad(set_to_none)
+        for buffers in self._flat_buffers:
+            for buffer in buffers:
+                buffer.grad.zero_()
+                buffer.attach_grads()
+
+    def state_dict(self):
+        state_dict = self._flat_original_state_dict()
+        for state in state_dict["state"].values():
+            for key, value in state.items():
+                if isinstance(value, torch.Tensor):
+                    # detach the states from the flat buffers
+                    state[key] = value.clone()
+        return state_dict
+
+    if hasattr(optimizer, "_flat_kind"):
+        return
+    optimizer._flat_kind = kind
+    optimizer._flat_buffers = []
+    optimizer._flat_per_tensor_step = optimizer.step
+    _refresh_flat_buffers(optimizer)
+    optimizer.step = types.MethodType(flat_step, optimizer)
+    optimizer._flat_original_zero_grad = optimizer.zero_grad
+    optimizer.zero_grad = types.MethodType(zero_grad, optimizer)
+    optimizer._flat_original_state_dict = optimizer.state_dict
+    optimizer.state_dict = types.MethodType(state_dict, optimizer)
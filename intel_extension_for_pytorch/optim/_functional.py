@@ -2,6 +2,7 @@ r"""Functional interface, port from torch/optim/_function.py"""
 import torch
 from torch import Tensor
 from typing import List, Optional
+import intel_extension_for_pytorch._C as core
 
 
 def is_master_weight(param, params_attr):
@@ -34,6 +35,62 @@ def get_param2(param, params_attr):
     return param2
 
 
+def _grad_holders(self):
+    # the tensors whose .grad is read by the fused steps, i.e., the bf16 params of
+    # the master weights, cached across steps
+    key = [(id(group["params"]), len(group["params"])) for group in self.param_groups]
+    if getattr(self, "_grad_holders_key", None) != key:
+        self._grad_holders = []
+        for group in self.param_groups:
+            for p in group["params"]:
+                if is_master_weight(p, self.params_attr):
+                    p = self.params_attr[p].parameter
+                self._grad_holders.append(p)
+        self._grad_holders_key = key
+    return self._grad_holders
+
+
+def unscale_grads_and_check_inf(self, inv_scale, found_inf, in_kernel=False):
+    r"""
+    Handles the ``inv_scale`` and ``found_inf`` args of the fused steps, which
+    :meth:`GradScaler.step` passes instead of calling :meth:`GradScaler.unscale_`.
+    ``found_inf`` is set to 1 if any grad of the optimizer contains inf or NaN,
+    in that case the step is skipped and ``None`` is returned. Otherwise it returns
+    the factor to pass as ``inv_scale`` to the update kernels.
+
+    With ``in_kernel``, the dense grads are only read here to look for inf and NaN:
+    they stay scaled and the sgd, adam, adagrad and lamb kernels multiply them by
+    the returned ``inv_scale`` as they load them in the update loop. The sparse and
+    complex grads, and all of them without ``in_kernel``, are unscaled in place and
+    the returned factor is 1.
+    """
+    if inv_scale is None:
+        return 1.0
+    checked = []
+    unscaled = []
+    for holder in _grad_holders(self):
+        grad = holder.grad
+        if grad is None:
+            continue
+        if grad.dtype == torch.float16:
+            raise ValueError("Attempting to unscale FP16 gradients.")
+        if grad.is_sparse:
+            unscaled.append(grad._values())
+        elif in_kernel and not torch.is_complex(grad):
+            checked.append(grad)
+        else:
+            unscaled.append(grad)
+    if len(unscaled) > 0:
+        core._amp_foreach_non_finite_check_and_unscale_(unscaled, found_inf, inv_scale)
+    if len(checked) > 0:
+        norms = torch._foreach_norm(checked, float("inf"))
+        if not torch.stack([norm.float() for norm in norms]).isfinite().all():
+            found_inf.fill_(1.0)
+    if found_inf.item() != 0:
+        return None
+    return inv_scale.item() if in_kernel else 1.0
+
+
 def _make_sparse(grad, grad_indices, values):
     size = grad.size()
     if grad_indices.numel() == 0 or values.numel() == 0:
@@ -54,7 +111,8 @@ def _single_tensor_adagrad(
     eps: float,
     has_sparse_grad: bool,
     maximize: bool,
-    fused: bool
+    fused: bool,
+    inv_scale: float
 ):
     for param, param2, grad, state_sum, step_t in zip(
         params, params2, grads, state_sums, state_steps
@@ -65,7 +123,16 @@ def _single_tensor_adagrad(
         grad = grad if not maximize else -grad
         if not (grad.is_sparse or torch.is_complex(param)):
             torch.ops.torch_ipex.adagrad_fused_step(
-                param, grad, state_sum, param2, step, lr, weight_decay, lr_decay, eps
+                param,
+                grad,
+                state_sum,
+                param2,
+                step,
+                lr,
+                weight_decay,
+                lr_decay,
+                eps,
+                inv_scale,
             )
             continue
 
@@ -119,7 +186,8 @@ def _multi_tensor_adagrad(
     eps: float,
     has_sparse_grad: bool,
     maximize: bool,
-    fused: bool
+    fused: bool,
+    inv_scale: float
 ):
     # Foreach functions will throw errors if given empty lists
     if len(params) == 0:
@@ -141,6 +209,7 @@ def _multi_tensor_adagrad(
         has_sparse_grad=has_sparse_grad,
         maximize=False,
         fused=fused,
+        inv_scale=inv_scale,
     )
     return
 
@@ -155,6 +224,7 @@ def adagrad(
     # setting these as kwargs for now as functional API is compiled by torch/distributed/optim
     has_sparse_grad: bool = None,
     foreach: bool = None,
+    inv_scale: float = 1.0,
     *,
     lr: float,
     weight_decay: float,
@@ -198,21 +268,26 @@ def adagrad(
         has_sparse_grad=has_sparse_grad,
         maximize=maximize,
         fused=fused,
+        inv_scale=inv_scale,
     )
 
 
 @torch.no_grad()
-def adagrad_step(self, closure=None):
+def adagrad_step(self, closure=None, inv_scale=None, found_inf=None):
     """Performs a single optimization step.
 
     Args:
         closure (callable, optional): A closure that reevaluates the model
             and returns the loss.
+        inv_scale, found_inf (Tensor, optional): see :func:`unscale_grads_and_check_inf`.
     """
     loss = None
     if closure is not None:
         with torch.enable_grad():
             loss = closure()
+    inv_scale_val = unscale_grads_and_check_inf(self, inv_scale, found_inf, True)
+    if inv_scale_val is None:
+        return loss
 
     for group in self.param_groups:
         params_with_grad = []
@@ -252,6 +327,7 @@ def adagrad_step(self, closure=None):
             has_sparse_grad=has_sparse_grad,
             foreach=group["foreach"],
             maximize=group["maximize"],
+            inv_scale=inv_scale_val,
             fused=self.fused,
         )
 
@@ -302,7 +378,8 @@ def _single_tensor_sgd(
     nesterov: bool,
     maximize: bool,
     has_sparse_grad: bool,
-    fused: bool
+    fused: bool,
+    inv_scale: float
 ):
     for i, param in enumerate(params):
         grad = grads[i] if not maximize else -grads[i]
@@ -317,6 +394,7 @@ def _single_tensor_sgd(
                 weight_decay,
                 dampening,
                 nesterov,
+                inv_scale,
             )
             continue
 
@@ -396,7 +474,8 @@ def _multi_tensor_sgd(
     nesterov: bool,
     maximize: bool,
     has_sparse_grad: bool,
-    fused: bool
+    fused: bool,
+    inv_scale: float
 ):
     if len(params) == 0:
         return
@@ -414,6 +493,7 @@ def _multi_tensor_sgd(
         maximize=maximize,
         has_sparse_grad=has_sparse_grad,
         fused=fused,
+        inv_scale=inv_scale,
     )
 
 
@@ -426,6 +506,7 @@ def sgd(
     # setting this as kwarg for now as functional API is compiled by torch/distributed/optim
     has_sparse_grad: bool = None,
     foreach: bool = None,
+    inv_scale: float = 1.0,
     *,
     weight_decay: float,
     momentum: float,
@@ -465,21 +546,26 @@ def sgd(
         has_sparse_grad=has_sparse_grad,
         maximize=maximize,
         fused=fused,
+        inv_scale=inv_scale,
     )
 
 
 @torch.no_grad()
-def sgd_step(self, closure=None):
+def sgd_step(self, closure=None, inv_scale=None, found_inf=None):
     """Performs a single optimization step.
 
     Args:
         closure (callable, optional): A closure that reevaluates the model
             and returns the loss.
+        inv_scale, found_inf (Tensor, optional): see :func:`unscale_grads_and_check_inf`.
     """
     loss = None
     if closure is not None:
         with torch.enable_grad():
             loss = closure()
+    inv_scale_val = unscale_grads_and_check_inf(self, inv_scale, found_inf, True)
+    if inv_scale_val is None:
+        return loss
 
     for group in self.param_groups:
         params_with_grad = []
@@ -522,6 +608,7 @@ def sgd_step(self, closure=None):
             maximize=group["maximize"],
             has_sparse_grad=has_sparse_grad,
             foreach=group["foreach"],
+            inv_scale=inv_scale_val,
             fused=self.fused,
         )
 
@@ -587,16 +674,19 @@ def lars(
 
 
 @torch.no_grad()
-def lars_step(self, closure=None):
+def lars_step(self, closure=None, inv_scale=None, found_inf=None):
     """Performs a single optimization step.
     Args:
         closure (callable, optional): A closure that reevaluates the model
             and returns the loss.
+        inv_scale, found_inf (Tensor, optional): see :func:`unscale_grads_and_check_inf`.
     """
     loss = None
     if closure is not None:
         with torch.enable_grad():
             loss = closure()
+    if unscale_grads_and_check_inf(self, inv_scale, found_inf) is None:
+        return loss
 
     for group in self.param_groups:
         params_with_grad = []
@@ -680,6 +770,7 @@ def _lamb_fused_impl(
     lr: float,
     weight_decay: float,
     eps: float,
+    inv_scale: float = 1.0,
 ):
     r"""Functional API that performs Lamb algorithm computation.
     See :class:`~torch.optim.Lamb` for details.
@@ -703,6 +794,7 @@ def _lamb_fused_impl(
             lr,
             weight_decay,
             eps,
+            inv_scale,
         )
 
 
@@ -750,16 +842,20 @@ def _lamb_impl(
 
 
 @torch.no_grad()
-def lamb_step(self, closure=None):
+def lamb_step(self, closure=None, inv_scale=None, found_inf=None):
     """Performs a single optimization step.
     Args:
         closure (callable, optional): A closure that reevaluates the model
             and returns the loss.
+        inv_scale, found_inf (Tensor, optional): see :func:`unscale_grads_and_check_inf`.
     """
     loss = None
     if closure is not None:
         with torch.enable_grad():
             loss = closure()
+    inv_scale_val = unscale_grads_and_check_inf(self, inv_scale, found_inf, True)
+    if inv_scale_val is None:
+        return loss
 
     for group in self.param_groups:
         params_with_grad = []
@@ -814,22 +910,27 @@ def lamb_step(self, closure=None):
             group["lr"],
             group["weight_decay"],
             group["eps"],
+            inv_scale_val,
         )
     return loss
 
 
 @torch.no_grad()
-def adam_step(self, closure=None):
+def adam_step(self, closure=None, inv_scale=None, found_inf=None):
     """Performs a single optimization step.
 
     Args:
         closure (callable, optional): A closure that reevaluates the model
             and returns the loss.
+        inv_scale, found_inf (Tensor, optional): see :func:`unscale_grads_and_check_inf`.
     """
     loss = None
     if closure is not None:
         with torch.enable_grad():
             loss = closure()
+    inv_scale_val = unscale_grads_and_check_inf(self, inv_scale, found_inf, True)
+    if inv_scale_val is None:
+        return loss
 
     for group in self.param_groups:
         params_with_grad = []
@@ -901,6 +1002,7 @@ def adam_step(self, closure=None):
             eps=group["eps"],
             maximize=group["maximize"],
             foreach=group["foreach"],
+            inv_scale=inv_scale_val,
         )
 
     return loss
@@ -917,6 +1019,7 @@ def adam(
     # kwonly args with defaults are not supported by functions compiled with torchscript issue #70627
     # setting this as kwarg for now as functional API is compiled by torch/distributed/optim
     foreach: bool = None,
+    inv_scale: float = 1.0,
     *,
     amsgrad: bool,
     beta1: float,
@@ -962,6 +1065,7 @@ def adam(
         weight_decay=weight_decay,
         eps=eps,
         maximize=maximize,
+        inv_scale=inv_scale,
     )
 
 
@@ -980,7 +1084,8 @@ def _single_tensor_adam(
     lr: float,
     weight_decay: float,
     eps: float,
-    maximize: bool
+    maximize: bool,
+    inv_scale: float
 ):
     for i, param in enumerate(params):
         grad = grads[i] if not maximize else -grads[i]
@@ -1010,6 +1115,7 @@ def _single_tensor_adam(
             lr,
             weight_decay,
             eps,
+            inv_scale,
         )
 
 
@@ -1028,7 +1134,8 @@ def _multi_tensor_adam(
     lr: float,
     weight_decay: float,
     eps: float,
-    maximize: bool
+    maximize: bool,
+    inv_scale: float
 ):
     if len(params) == 0:
         return
@@ -1051,6 +1158,7 @@ def _multi_tensor_adam(
         weight_decay=weight_decay,
         eps=eps,
         maximize=False,
+        inv_scale=inv_scale,
     )
 
 
@@ -1204,17 +1312,20 @@ def _multi_tensor_adamw(
 
 
 @torch.no_grad()
-def adamw_step(self, closure=None):
+def adamw_step(self, closure=None, inv_scale=None, found_inf=None):
     """Performs a single optimization step.
 
     Args:
         closure (callable, optional): A closure that reevaluates the model
             and returns the loss.
+        inv_scale, found_inf (Tensor, optional): see :func:`unscale_grads_and_check_inf`.
     """
     loss = None
     if closure is not None:
         with torch.enable_grad():
             loss = closure()
+    if unscale_grads_and_check_inf(self, inv_scale, found_inf) is None:
+        return loss
 
     for group in self.param_groups:
         # fp32 master weight and fp32 weight(some layer no need cast)
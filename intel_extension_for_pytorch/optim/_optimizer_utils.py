@@ -13,6 +13,7 @@ from ._functional import (
     adamw_step,
     lars_step,
 )
+from ._flat_buffers import patch_flat_buffers
 from ._lamb import Lamb
 from ._lars import Lars
 from ..nn import utils
@@ -40,6 +41,13 @@ OPTIMIZER_FUSED_STEP_MAPPING_CPU = {
     Lars: lars_step,
 }
 
+# Fused steps which can update the params in flat buffers
+FLAT_BUFFER_STEP_KIND_CPU = {
+    sgd_step: "sgd",
+    adam_step: "adam",
+    lamb_step: "lamb",
+}
+
 OPTIMIZER_FUSED_STEP_MAPPING_XPU = {
     torch.optim.SGD: sgd_step,
     torch.optim.AdamW: adamw_step,
@@ -358,9 +366,11 @@ def patch_state_dict(optimizer):
         )
 
 
-def optimizer_fusion(optimizer, device_type, user_explict_fuse):
+def optimizer_fusion(optimizer, device_type, user_explict_fuse, flat_buffers=False):
     r"""
     Patch "step" method to choose IPEX optimized fused update kernel.
+    With ``flat_buffers``, the params are coalesced into flat buffers updated by
+    one kernel call each, see ``FlatBuffer``.
     """
 
     if not hasattr(optimizer, "params_attr"):
@@ -382,6 +392,18 @@ def optimizer_fusion(optimizer, device_type, user_explict_fuse):
             setattr(optimizer, "_original_step", optimizer.step)  # noqa: B010
         optimizer.step = types.MethodType(step, optimizer)
         setattr(optimizer, "fused", True)  # noqa: B010
+        # the fused steps can unscale the grads for GradScaler(fused=True)
+        setattr(optimizer, "_step_supports_inv_scale", True)  # noqa: B010
+        if flat_buffers:
+            if device_type == "cpu" and step in FLAT_BUFFER_STEP_KIND_CPU:
+                patch_flat_buffers(optimizer, FLAT_BUFFER_STEP_KIND_CPU[step])
+            else:
+                msg = (
+                    "Does not support flat buffers for "
+                    + str(type(optimizer))
+                    + ", will use the per-tensor fused step"
+                )
+                warn_if_user_explicitly_set(True, msg)
     except KeyError:
         msg = (
             "Does not suport fused step for "
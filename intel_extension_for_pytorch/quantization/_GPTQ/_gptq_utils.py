@@ -18,6 +18,9 @@ def gptq_quantize(
     device=torch.device("cpu"),
     layer_wise=False,
     model_path=None,
+    calib_batch_size=1,
+    num_workers=1,
+    checkpoint_dir=None,
 ):
     """Run weight-only quantization with weight configs.
 
@@ -43,6 +46,9 @@ def gptq_quantize(
         device: set to torch.device("cpu").
         layer_wise (bool): whether to do LWQ.
         model_path (str): path to register LWQ weight hooks.
+        calib_batch_size (int): number of calibration samples run through a block at once.
+        num_workers (int): number of layers of a block quantized concurrently.
+        checkpoint_dir (str): directory to save the quantized blocks to and resume from.
     """
     assert isinstance(model, torch.nn.Module), "only support torch module"
     if layer_wise:
@@ -64,6 +70,9 @@ def gptq_quantize(
         pad_max_length,
         device,
         layer_wise=layer_wise,
+        calib_batch_size=calib_batch_size,
+        num_workers=num_workers,
+        checkpoint_dir=checkpoint_dir,
     )
     fp32_modified_model, gptq_config = gptq_quantizer.execute_quantization(
         model_path=model_path
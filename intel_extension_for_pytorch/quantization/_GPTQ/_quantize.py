@@ -17,6 +17,9 @@ def gptq(
     use_max_length=False,
     pad_max_length=2048,
     layer_wise=False,
+    calib_batch_size=1,
+    num_workers=1,
+    checkpoint_dir=None,
     # export arguments
     compression_dtype=torch.int32,
     compression_dim=1,
@@ -39,6 +42,14 @@ def gptq(
         pad_max_length (int): whether to align calibration data to a fixed length.
         device: set to torch.device("cpu").
         layer_wise (bool): whether to do LWQ.
+        calib_batch_size (int): number of calibration samples of the same length run through
+                        a transformer block at once. The block inputs must be batch first.
+        num_workers (int): number of the layers of a transformer block (q/k/v/o, gate/up/down, etc.)
+                        quantized concurrently, each on its own disjoint subset of the cores.
+                        Needs Intel OpenMP preloaded for the runtime extension of IPEX.
+        checkpoint_dir (str): directory where every quantized transformer block is saved.
+                        Running again with the same directory resumes from the last saved block.
+                        Default to None, no block is saved.
         compression_dtype: data type for compressed dtype, select from [torch.int8|16|32|64].
         compression_dim (int): 0 means output channel while 1 means input channel.
         scale_dtype: data type for scale and bias.
@@ -78,6 +89,9 @@ def gptq(
         pad_max_length,
         layer_wise,
         model_path,
+        calib_batch_size=calib_batch_size,
+        num_workers=num_workers,
+        checkpoint_dir=checkpoint_dir,
     )
     compressed_model = gptq_export(
         model,
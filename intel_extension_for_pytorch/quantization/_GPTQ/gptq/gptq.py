@@ -1,12 +1,17 @@
 from ....utils._logger import logger, WarningType
 import math
+import os
+import queue
 import random
 import re
+import tempfile
 import time
 import torch
 import torch.nn as nn
 import transformers
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
+from ....cpu.runtime import CPUPool, pin, is_runtime_ext_enabled
 from .model_utils import (
     find_layers,
     trace_gptq_target_blocks,
@@ -18,6 +23,26 @@ from .model_utils import (
 DEBUG = False
 
 
+def _get_signature(obj):
+    # Calibration samples are batched together only if their tensors have the same shapes
+    if isinstance(obj, torch.Tensor):
+        return (torch.Tensor, tuple(obj.shape), obj.dtype)
+    if isinstance(obj, (list, tuple)):
+        return (type(obj), tuple(_get_signature(value) for value in obj))
+    return repr(obj)
+
+
+def _concat(objs):
+    # objs holds the same argument of every calibration sample of a batch
+    first = objs[0]
+    if isinstance(first, torch.Tensor) and first.dim() > 0:
+        return torch.cat(objs, dim=0)
+    if isinstance(first, (list, tuple)):
+        concatenated = [_concat(list(values)) for values in zip(*objs)]
+        return tuple(concatenated) if isinstance(first, tuple) else concatenated
+    return first
+
+
 class GPTQuantizer(object):
     """Main API for GPTQ algorithm."""
 
@@ -32,6 +57,9 @@ class GPTQuantizer(object):
         device=torch.device("cpu"),
         layer_wise=False,
         cache_positional_arguments=None,
+        calib_batch_size=1,
+        num_workers=1,
+        checkpoint_dir=None,
     ):
         """
         Args:
@@ -55,6 +83,15 @@ class GPTQuantizer(object):
             pad_max_length (int): whether to align calibration data to a fixed length.
             device: set to torch.device("cpu").
             layer_wise (bool): whether to do LWQ.
+            calib_batch_size (int): number of calibration samples of the same shape concatenated
+                along dim 0 and run through a transformer block at once. The inputs of the blocks
+                must be batch first.
+            num_workers (int): number of the layers of a transformer block quantized concurrently,
+                each on its own disjoint subset of the cores. It needs the runtime extension
+                (Intel OpenMP preloaded), otherwise the layers are quantized one at a time.
+            checkpoint_dir (str): directory where every quantized transformer block is saved.
+                The blocks found there are loaded instead of being quantized again, so that an
+                interrupted quantization resumes from the last saved block.
         """
         self.model = model
         self.gptq_related_blocks = trace_gptq_target_blocks(self.model)
@@ -78,6 +115,23 @@ class GPTQuantizer(object):
         self.layer_wise = layer_wise
         self.is_ready = False
         self.cache_positional_arguments = cache_positional_arguments
+        assert calib_batch_size >= 1, "calib_batch_size must be a positive integer"
+        self.calib_batch_size = calib_batch_size
+        self.checkpoint_dir = checkpoint_dir
+        self.cpu_pools = None
+        if num_workers > 1:
+            if is_runtime_ext_enabled():
+                core_ids = CPUPool().core_ids
+                num_workers = min(num_workers, len(core_ids))
+                self.cpu_pools = [
+                    CPUPool(core_ids[i::num_workers]) for i in range(num_workers)
+                ]
+            else:
+                logger.warning(
+                    "GPTQ quantizes the layers concurrently with the runtime extension of IPEX, "
+                    + "which needs Intel OpenMP preloaded. The layers are quantized one at a time.",
+                    _type=WarningType.MissingDependency,
+                )
 
         # dataloader
         self.use_max_length = use_max_length
@@ -421,18 +475,170 @@ class GPTQuantizer(object):
         else:
             self.cache_positional_arguments[0] = outs[:]
 
+    def batch_calibration_inputs(self):
+        """Concatenate the cached inputs of consecutive samples into batches of calib_batch_size."""
+        idx = self.cache_key_arguments.pop("i")
+        self.num_calib_batches = len(self.dataloader)
+        if self.calib_batch_size > 1:
+            batches = []
+            signature = None
+            for j in range(len(self.dataloader)):
+                sample = (
+                    self.gather_single_batch_from_dict(self.cache_key_arguments, j),
+                    self.gather_single_batch_from_list(
+                        self.cache_positional_arguments, j
+                    ),
+                )
+                sample_signature = _get_signature((list(sample[0].values()), sample[1]))
+                if (
+                    batches
+                    and len(batches[-1]) < self.calib_batch_size
+                    and sample_signature == signature
+                ):
+                    batches[-1].append(j)
+                else:
+                    batches.append([j])
+                    signature = sample_signature
+            for k, v in self.cache_key_arguments.items():
+                self.cache_key_arguments[k] = [
+                    _concat([v[j] for j in batch]) for batch in batches
+                ]
+            for idx_arg, v in enumerate(self.cache_positional_arguments):
+                self.cache_positional_arguments[idx_arg] = [
+                    _concat([v[j] for j in batch]) for batch in batches
+                ]
+            self.num_calib_batches = len(batches)
+            logger.info(
+                f"{len(self.dataloader)} calibration samples are run in {len(batches)} batches."
+            )
+        self.cache_key_arguments["i"] = idx
+
+    def forward_block(self, transformer_block):
+        """Run the cached inputs of all calibration batches through a transformer block."""
+        outs = []
+        idx = self.cache_key_arguments.pop("i")
+        for j in range(self.num_calib_batches):
+            cache_keyword_batch = self.gather_single_batch_from_dict(
+                self.cache_key_arguments, j
+            )
+            cache_positional_batch = self.gather_single_batch_from_list(
+                self.cache_positional_arguments, j
+            )
+            out = transformer_block(*cache_positional_batch, **cache_keyword_batch)
+            out = self.track_hidden_states(out)
+            outs.append(out)
+        self.cache_key_arguments["i"] = idx
+        return outs
+
+    def quantize_sub_layers(self, sub_layers, gptq_for_this_block, block_idx):
+        """Run fasterquant on every layer of a block, concurrently if cpu_pools are set."""
+
+        def run(layer_name):
+            weight_config_this_layer = self.get_layer_config(
+                self.get_full_layer_name(layer_name, block_idx)
+            )
+            logger.info(f"Quantizing layer {layer_name}")
+            W = sub_layers[layer_name].weight.data.clone()
+            return gptq_for_this_block[layer_name].fasterquant(
+                W,
+                blocksize=weight_config_this_layer["block_size"],
+                percdamp=weight_config_this_layer["percdamp"],
+                groupsize=weight_config_this_layer["group_size"],
+                act_order=weight_config_this_layer["act_order"],
+            )
+
+        if self.cpu_pools is None or len(sub_layers) == 1:
+            return {layer_name: run(layer_name) for layer_name in sub_layers}
+
+        # Every worker thread takes an idle core pool, the biggest layers are started first
+        cpu_pools = queue.Queue()
+        for cpu_pool in self.cpu_pools:
+            cpu_pools.put(cpu_pool)
+
+        def run_pinned(layer_name):
+            cpu_pool = cpu_pools.get()
+            try:
+                with pin(cpu_pool):
+                    return run(layer_name)
+            finally:
+                cpu_pools.put(cpu_pool)
+
+        with ThreadPoolExecutor(max_workers=len(self.cpu_pools)) as executor:
+            futures = {
+                layer_name: executor.submit(run_pinned, layer_name)
+                for layer_name in sorted(
+                    sub_layers, key=lambda name: -sub_layers[name].weight.numel()
+                )
+            }
+            return {
+                layer_name: futures[layer_name].result() for layer_name in sub_layers
+            }
+
+    def get_block_checkpoint_path(self, block_idx):
+        return os.path.join(self.checkpoint_dir, f"gptq_block_{block_idx}.pt")
+
+    def save_block_checkpoint(self, block_idx, sub_layers, gptq_config):
+        """Save the quantized weights and the GPTQ results of a transformer block."""
+        state = {"weights": {}, "weight_config": {}, "gptq_config": {}}
+        for layer_name in sub_layers:
+            full_layer_name = self.get_full_layer_name(layer_name, block_idx)
+            state["weights"][layer_name] = sub_layers[layer_name].weight.data
+            state["weight_config"][layer_name] = dict(
+                self.get_layer_config(full_layer_name)
+            )
+            state["gptq_config"][full_layer_name] = gptq_config[full_layer_name]
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        # Write to a temporary file and rename it, so that a crash while saving never
+        # leaves a partial block to resume from
+        fd, tmp_path = tempfile.mkstemp(dir=self.checkpoint_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            torch.save(state, tmp_path)
+            os.replace(tmp_path, self.get_block_checkpoint_path(block_idx))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load_block_checkpoint(self, block_idx, transformer_block, gptq_config):
+        """Load a transformer block saved by save_block_checkpoint, returns False if not saved."""
+        if self.checkpoint_dir is None:
+            return False
+        path = self.get_block_checkpoint_path(block_idx)
+        if not os.path.isfile(path):
+            return False
+        state = torch.load(path, map_location=self.device)
+        sub_layers = find_layers(transformer_block)
+        for layer_name, weight in state["weights"].items():
+            weight_config_this_layer = self.get_layer_config(
+                self.get_full_layer_name(layer_name, block_idx)
+            )
+            if (
+                layer_name not in sub_layers
+                or weight_config_this_layer is None
+                or state["weight_config"][layer_name] != dict(weight_config_this_layer)
+            ):
+                raise ValueError(
+                    f"{path} is saved by a GPTQ run with another model or weight config, "
+                    + "please use another checkpoint_dir"
+                )
+            sub_layers[layer_name].weight.data = weight
+        gptq_config.update(state["gptq_config"])
+        logger.info(f"Resume layer {block_idx + 1} from {path}")
+        return True
+
     @torch.no_grad()
     def execute_quantization(self, means=None, stds=None, model_path=None):
         """Run quantization."""
         # Step1: prepare quantization (calibration datasets)
         logger.info("Begin ====>")
         self.pre_quantization()
+        self.batch_calibration_inputs()
 
         # Step2: run gptq quantization in a transformer block-wise manner.
         gptq_config = {}
         tblock_length = len(self.gptq_related_blocks["transformers"])
+        resuming = True
         for block_idx in range(tblock_length):
-            logger.info(f"Quantizing layer {block_idx + 1} / {tblock_length}..")
             if not self.layer_wise:
                 # if we do not apply layer-wise feature, we still place the entire block on the GPU
                 transformer_block = self.gptq_related_blocks["transformers"][
@@ -440,6 +646,17 @@ class GPTQuantizer(object):
                 ].to(self.device)
             else:
                 transformer_block = self.gptq_related_blocks["transformers"][block_idx]
+            # Blocks saved by an interrupted run are loaded, and only run to get the inputs
+            # of the next block
+            resuming = resuming and self.load_block_checkpoint(
+                block_idx, transformer_block, gptq_config
+            )
+            if resuming:
+                self.update_blockwise_hidden_states(
+                    self.forward_block(transformer_block)
+                )
+                continue
+            logger.info(f"Quantizing layer {block_idx + 1} / {tblock_length}..")
             # Step2.1: obtain all layers (Linear, Conv2d, etc) in the block which can be quantized.
             sub_layers = find_layers(transformer_block)
             sub_layers_to_quant = {}
@@ -487,33 +704,18 @@ class GPTQuantizer(object):
                 handles.append(
                     sub_layers[layer_name].register_forward_hook(add_batch(layer_name))
                 )
-            idx = self.cache_key_arguments.pop("i")
-            for j in range(len(self.dataloader)):
-                cache_keyword_batch = self.gather_single_batch_from_dict(
-                    self.cache_key_arguments, j
-                )
-                cache_positional_batch = self.gather_single_batch_from_list(
-                    self.cache_positional_arguments, j
-                )
-                out = transformer_block(*cache_positional_batch, **cache_keyword_batch)
-                out = self.track_hidden_states(out)
-            self.cache_key_arguments["i"] = idx
+            self.forward_block(transformer_block)
             for h in handles:
                 h.remove()
             # Step 2.4: everything is prepared, so start quantization!
+            quantized_sub_layers = self.quantize_sub_layers(
+                sub_layers, gptq_for_this_block, block_idx
+            )
             for layer_name in sub_layers:
                 weight_config_this_layer = self.get_layer_config(
                     self.get_full_layer_name(layer_name, block_idx)
                 )
-                logger.info(f"Quantizing layer {layer_name}")
-                W = sub_layers[layer_name].weight.data.clone()
-                scale, zp, Q = gptq_for_this_block[layer_name].fasterquant(
-                    W,
-                    blocksize=weight_config_this_layer["block_size"],
-                    percdamp=weight_config_this_layer["percdamp"],
-                    groupsize=weight_config_this_layer["group_size"],
-                    act_order=weight_config_this_layer["act_order"],
-                )
+                scale, zp, Q = quantized_sub_layers[layer_name]
                 sub_layers[layer_name].weight.data = Q
                 gptq_config[self.get_full_layer_name(layer_name, block_idx)] = {
                     "scale": scale
@@ -530,20 +732,11 @@ class GPTQuantizer(object):
                     ] = gptq_for_this_block[layer_name].perm
                 gptq_for_this_block[layer_name].free()
 
+            if self.checkpoint_dir is not None:
+                self.save_block_checkpoint(block_idx, sub_layers, gptq_config)
+
             # Step 2.5: replace output data with quantized weights
-            outs = []
-            idx = self.cache_key_arguments.pop("i")
-            for j in range(len(self.dataloader)):
-                cache_keyword_batch = self.gather_single_batch_from_dict(
-                    self.cache_key_arguments, j
-                )
-                cache_positional_batch = self.gather_single_batch_from_list(
-                    self.cache_positional_arguments, j
-                )
-                out = transformer_block(*cache_positional_batch, **cache_keyword_batch)
-                out = self.track_hidden_states(out)
-                outs.append(out)
-            self.cache_key_arguments["i"] = idx
+            outs = self.forward_block(transformer_block)
             if self.layer_wise:
                 self.gptq_related_blocks["transformers"][block_idx] = transformer_block
             else:
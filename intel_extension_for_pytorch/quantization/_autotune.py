@@ -4,11 +4,16 @@ import os
 import sys
 import copy
 import json
-from ..utils._logger import logger
+import shutil
+import tempfile
+from itertools import chain
+from ..utils._logger import logger, WarningType
 import subprocess
 import torch
 import time
 import intel_extension_for_pytorch as ipex
+from ._quantize_utils import copy_prepared_model
+from ._smooth_quant import SmoothQuantActivationObserver, SmoothQuantWeightObserver
 
 
 def autotune(
@@ -21,6 +26,9 @@ def autotune(
     sampling_sizes=None,
     accuracy_criterion=None,
     tuning_time=0,
+    backend="inc",
+    num_workers=1,
+    cores_per_worker=None,
 ):
     r"""
     Automatic accuracy-driven tuning helps users quickly find out the advanced recipe for INT8 inference.
@@ -42,6 +50,19 @@ def autotune(
         accuracy_criterion ({accuracy_criterion_type(str, 'relative' or 'absolute') : accuracy_criterion_value(float)}):
             set the maximum allowed accuracy loss, either relative or absolute. The default value is ``{'relative': 0.01}``.
         tuning_time (seconds): tuning timeout. The default value is ``0`` which means early stop.
+        backend (str): tuning driver, ``"inc"`` to tune with Intel® Neural Compressor or
+            ``"ipex"`` to use the native driver. The native driver calibrates once and caches
+            the observer statistics of every sampling size, the candidate recipes (SmoothQuant
+            alpha, sampling size, then op-wise fp32 fallback) are derived from the cache without
+            running calibration again. The layer-wise ``"auto"`` alpha is tuned as a global alpha
+            over the ``auto_alpha_args`` range, ``folding`` is not used since the inserted ``mul``
+            is fused in the backend. The default value is ``"inc"``.
+        num_workers (int): number of trials evaluated concurrently by the native driver. Trials
+            run in forked worker processes pinned to disjoint core sets, so ``eval_func`` should
+            not depend on state changed by the other trials. The default value is ``1`` which
+            evaluates the trials one by one in the current process.
+        cores_per_worker (int): number of cores of each worker of the native driver. The
+            default value is ``None`` which splits the available cores evenly.
 
     Returns:
         prepared_model (torch.nn.Module): the prepared model loaded qconfig after tuning.
@@ -54,6 +75,23 @@ def autotune(
         op_type_dict = {}
     if smoothquant_args is None:
         smoothquant_args = {}
+    if backend == "ipex":
+        return _native_autotune(
+            model,
+            calib_dataloader,
+            calib_func,
+            eval_func,
+            smoothquant_args,
+            sampling_sizes,
+            accuracy_criterion,
+            tuning_time,
+            num_workers,
+            cores_per_worker,
+        )
+    if backend != "inc":
+        raise ValueError(
+            f"autotune: backend should be 'inc' or 'ipex', but got {backend}"
+        )
 
     neural_compressor_version = "2.4.1"
     try:
@@ -177,3 +215,357 @@ def autotune(
         print(f"Failed to delete {dirname_str}. Reason: {e}")
 
     return prepared_model
+
+
+def _model_inputs(batch):
+    # dataloader with label yields (inputs, label)
+    if isinstance(batch, (tuple, list)) and len(batch) == 2:
+        return batch[0]
+    return batch
+
+
+def _run_model(model, inputs):
+    if isinstance(inputs, (tuple, list)):
+        return model(*inputs)
+    elif isinstance(inputs, dict):
+        return model(**inputs)
+    return model(inputs)
+
+
+def _smooth_quant_alphas(smoothquant_args):
+    alpha = smoothquant_args.get("alpha", 0.5)
+    if alpha == "auto":
+        auto_alpha_args = smoothquant_args.get("auto_alpha_args", {})
+        alpha_min = auto_alpha_args.get("alpha_min", 0.0)
+        alpha_max = auto_alpha_args.get("alpha_max", 1.0)
+        alpha_step = auto_alpha_args.get("alpha_step", 0.1)
+        num_alphas = int(round((alpha_max - alpha_min) / alpha_step)) + 1
+        alphas = [round(alpha_min + i * alpha_step, 6) for i in range(num_alphas)]
+        init_alpha = auto_alpha_args.get("init_alpha")
+        if init_alpha is not None:
+            # try the baseline alpha first
+            alphas = [init_alpha] + [a for a in alphas if a != init_alpha]
+        return alphas
+    if isinstance(alpha, (tuple, list)):
+        return list(alpha)
+    return [alpha]
+
+
+def _calibrate_per_sampling_size(
+    prepared_model, calib_dataloader, calib_func, sampling_sizes
+):
+    r"""
+    Calibrate ``prepared_model`` once over the largest sampling size, and copy it each
+    time the number of seen samples reaches one of ``sampling_sizes``, so that the
+    observer statistics of every sampling size are cached without running calibration
+    again.
+
+    Returns:
+        snapshots (dict): the calibrated copy of ``prepared_model`` of each sampling size.
+    """
+    sampling_sizes = sorted(set(sampling_sizes))
+    if calib_func is not None:
+        if len(sampling_sizes) > 1:
+            logger.warning(
+                "autotune: sampling_sizes is not used with calib_func, "
+                + "all sampling sizes share the calibration of calib_func",
+                _type=WarningType.NotSupported,
+            )
+        calib_func(prepared_model)
+        snapshot = copy_prepared_model(prepared_model)
+        return {size: snapshot for size in sampling_sizes}
+
+    snapshots = {}
+    pending = list(sampling_sizes)
+    batch_size = getattr(calib_dataloader, "batch_size", None) or 1
+    num_samples = 0
+    with torch.no_grad():
+        for batch in calib_dataloader:
+            _run_model(prepared_model, _model_inputs(batch))
+            num_samples += batch_size
+            while pending and num_samples >= pending[0]:
+                snapshots[pending.pop(0)] = copy_prepared_model(prepared_model)
+            if not pending:
+                break
+    if pending:
+        logger.warning(
+            f"autotune: calib_dataloader only has {num_samples} samples, "
+            + f"sampling sizes {pending} are calibrated with all of them",
+            _type=WarningType.WrongArgument,
+        )
+        snapshot = copy_prepared_model(prepared_model)
+        for size in pending:
+            snapshots[size] = snapshot
+    return snapshots
+
+
+def _quantized_ops(qconf_summary):
+    with open(qconf_summary, "r") as f:
+        quant_state_dict = json.load(f)
+    quantized_dtypes = [str(torch.quint8), str(torch.qint8)]
+    ops = []
+    for layer, layer_info in quant_state_dict.items():
+        for idx, op_info in layer_info["q_op_infos"].items():
+            if any(
+                tensor_info.get("inf_dtype") in quantized_dtypes
+                for tensor_info in op_info["input_tensor_infos"]
+            ):
+                ops.append((layer, idx, op_info["fqn"]))
+    return ops
+
+
+def _fallback_ops(qconf_summary, ops):
+    with open(qconf_summary, "r") as f:
+        quant_state_dict = json.load(f)
+    for layer, idx, _ in ops:
+        op_info = quant_state_dict[layer]["q_op_infos"][idx]
+        for tensor_info in chain(
+            op_info["input_tensor_infos"], op_info["weight_tensor_infos"]
+        ):
+            if "inf_dtype" in tensor_info:
+                tensor_info["inf_dtype"] = str(torch.float32)
+    with open(qconf_summary, "w") as f:
+        json.dump(quant_state_dict, f, indent=4)
+
+
+def _build_trial(snapshot, recipe, qconf_summary):
+    r"""
+    Derive the prepared model of ``recipe`` from the calibrated ``snapshot``: the
+    q-params are computed from the cached observer statistics with the recipe's
+    SmoothQuant alpha, and the recipe's fallback ops are set to fp32.
+    """
+    trial = copy_prepared_model(snapshot)
+    if recipe["alpha"] is not None:
+        for qstate in trial._fqn_to_auto_quant_state_map.values():
+            for observer in chain(
+                qstate.tensor_id_to_observer.values(),
+                qstate.weight_tensor_id_to_observer.values(),
+            ):
+                if isinstance(
+                    observer,
+                    (SmoothQuantActivationObserver, SmoothQuantWeightObserver),
+                ):
+                    observer.alpha = recipe["alpha"]
+    trial.save_qconf_summary(qconf_summary=qconf_summary)
+    if recipe["fallback"]:
+        _fallback_ops(qconf_summary, recipe["fallback"])
+        trial.load_qconf_summary(qconf_summary=qconf_summary)
+    return trial
+
+
+def _evaluate_trial(trial, eval_func, example_inputs):
+    converted_model = ipex.quantization.convert(trial, inplace=True)
+    with torch.no_grad():
+        try:
+            if isinstance(example_inputs, dict):
+                traced_model = torch.jit.trace(
+                    converted_model, example_kwarg_inputs=example_inputs, strict=False
+                )
+            else:
+                if isinstance(example_inputs, list):
+                    example_inputs = tuple(example_inputs)
+                traced_model = torch.jit.trace(
+                    converted_model, example_inputs, strict=False
+                )
+            converted_model = torch.jit.freeze(traced_model)
+        except Exception as e:
+            logger.warning(
+                f"autotune: failed to trace the quantized model ({e}), "
+                + "evaluating it in eager mode",
+                _type=WarningType.NotSupported,
+            )
+    return eval_func(converted_model)
+
+
+def _worker_core_sets(num_workers, cores_per_worker):
+    if num_workers == 1:
+        return [None]
+    cores = sorted(os.sched_getaffinity(0))
+    if cores_per_worker is None:
+        cores_per_worker = len(cores) // num_workers
+    if cores_per_worker < 1 or num_workers * cores_per_worker > len(cores):
+        raise ValueError(
+            f"autotune: {num_workers} workers with {cores_per_worker} cores each "
+            + f"do not fit in the {len(cores)} available cores"
+        )
+    return [
+        cores[i * cores_per_worker : (i + 1) * cores_per_worker]
+        for i in range(num_workers)
+    ]
+
+
+# Evaluator of the running trials, set before the workers are forked
+_trial_evaluator = None
+
+
+def _init_trial_worker(core_sets):
+    cores = core_sets.get()
+    os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+
+
+def _evaluate_in_worker(trial_idx):
+    return _trial_evaluator(trial_idx)
+
+
+def _run_trials(evaluator, num_trials, core_sets, should_stop):
+    r"""
+    Evaluate the trials ``0, ..., num_trials - 1`` with ``evaluator``, concurrently
+    in one worker process per core set when there are several core sets. The
+    accuracies are collected in the trial order until ``should_stop`` returns True.
+    """
+    accuracies = []
+    if len(core_sets) == 1:
+        for trial_idx in range(num_trials):
+            accuracies.append(evaluator(trial_idx))
+            if should_stop(accuracies):
+                break
+        return accuracies
+
+    global _trial_evaluator
+    _trial_evaluator = evaluator
+    ctx = torch.multiprocessing.get_context("fork")
+    worker_core_sets = ctx.SimpleQueue()
+    for cores in core_sets:
+        worker_core_sets.put(cores)
+    try:
+        with ctx.Pool(
+            len(core_sets),
+            initializer=_init_trial_worker,
+            initargs=(worker_core_sets,),
+        ) as pool:
+            # the pool is terminated on exit, dropping the trials still running
+            for accuracy in pool.imap(_evaluate_in_worker, range(num_trials)):
+                accuracies.append(accuracy)
+                if should_stop(accuracies):
+                    break
+    finally:
+        _trial_evaluator = None
+    return accuracies
+
+
+def _native_autotune(
+    model,
+    calib_dataloader,
+    calib_func,
+    eval_func,
+    smoothquant_args,
+    sampling_sizes,
+    accuracy_criterion,
+    tuning_time,
+    num_workers,
+    cores_per_worker,
+):
+    criterion, tolerable_loss = list(accuracy_criterion.items())[0]
+    if criterion not in ["relative", "absolute"]:
+        raise ValueError(
+            f"autotune: accuracy_criterion should be relative or absolute, but got {criterion}"
+        )
+    core_sets = _worker_core_sets(num_workers, cores_per_worker)
+    example_inputs = _model_inputs(next(iter(calib_dataloader)))
+
+    baseline = eval_func(model)
+    if criterion == "relative":
+        target = baseline - abs(baseline) * tolerable_loss
+    else:
+        target = baseline - tolerable_loss
+    logger.info(f"autotune: fp32 baseline accuracy {baseline}, target {target}")
+
+    if not smoothquant_args:  # static quantization
+        qconfig = ipex.quantization.default_static_qconfig_mapping
+        alphas = [None]
+    else:  # smoothquant
+        qconfig = ipex.quantization.get_smooth_quant_qconfig_mapping()
+        alphas = _smooth_quant_alphas(smoothquant_args)
+    if isinstance(example_inputs, dict):
+        prepared_model = ipex.quantization.prepare(
+            model, qconfig, example_kwarg_inputs=example_inputs, inplace=False
+        )
+    else:
+        prepared_model = ipex.quantization.prepare(
+            model, qconfig, example_inputs=example_inputs, inplace=False
+        )
+    snapshots = _calibrate_per_sampling_size(
+        prepared_model, calib_dataloader, calib_func, sampling_sizes
+    )
+
+    work_dir = tempfile.mkdtemp(prefix="ipex_autotune_")
+    start_time = time.time()
+    evaluated = []
+
+    def build(recipe, name):
+        return _build_trial(
+            snapshots[recipe["sampling_size"]],
+            recipe,
+            os.path.join(work_dir, name + ".json"),
+        )
+
+    def time_out():
+        return tuning_time > 0 and time.time() - start_time > tuning_time
+
+    def run_stage(stage, recipes):
+        def evaluator(trial_idx):
+            trial = build(recipes[trial_idx], f"{stage}_{trial_idx}")
+            return _evaluate_trial(trial, eval_func, example_inputs)
+
+        def should_stop(accuracies):
+            if tuning_time == 0 and accuracies[-1] >= target:
+                return True
+            return time_out()
+
+        accuracies = _run_trials(evaluator, len(recipes), core_sets, should_stop)
+        for recipe, accuracy in zip(recipes, accuracies):
+            logger.info(
+                f"autotune: sampling size {recipe['sampling_size']}, "
+                + f"alpha {recipe['alpha']}, "
+                + f"fallback {[op[2] for op in recipe['fallback']]}: "
+                + f"accuracy {accuracy}"
+            )
+        evaluated.extend(zip(recipes, accuracies))
+        return accuracies
+
+    def best_recipe():
+        return max(evaluated, key=lambda x: x[1])
+
+    try:
+        # stage 1: sampling sizes and SmoothQuant alphas
+        run_stage(
+            "recipe",
+            [
+                {"sampling_size": size, "alpha": alpha, "fallback": []}
+                for size in sorted(snapshots)
+                for alpha in alphas
+            ],
+        )
+        best, best_accuracy = best_recipe()
+        if best_accuracy < target and not time_out():
+            # stage 2: fallback each quantized op of the best recipe to fp32
+            qconf_summary = os.path.join(work_dir, "best.json")
+            build(best, "best")
+            ops = _quantized_ops(qconf_summary)
+            fallback_recipes = [dict(best, fallback=[op]) for op in ops]
+            accuracies = run_stage("fallback", fallback_recipes)
+            best, best_accuracy = best_recipe()
+            if best_accuracy < target and not time_out() and len(accuracies) > 1:
+                # stage 3: accumulate the fallback ops by their accuracy gain
+                order = sorted(
+                    range(len(accuracies)), key=lambda i: accuracies[i], reverse=True
+                )
+                ops = [ops[i] for i in order]
+                run_stage(
+                    "accumulated_fallback",
+                    [
+                        dict(best, fallback=ops[:num_ops])
+                        for num_ops in range(2, len(ops) + 1)
+                    ],
+                )
+                best, best_accuracy = best_recipe()
+        if best_accuracy < target:
+            logger.warning(
+                f"autotune: no recipe meets the accuracy target {target}, "
+                + f"returning the best one with accuracy {best_accuracy}",
+                _type=WarningType.NotSupported,
+            )
+        return build(best, "tuned")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -380,7 +380,13 @@ def may_quantize_deepspeed_modules(
     return module_mappings, qconfig_spec
 
 
-def convert(model, inplace=False):
+def convert(
+    model,
+    inplace=False,
+    graph_module=False,
+    example_inputs=None,
+    example_kwarg_inputs=None,
+):
     r"""
     Convert an FP32 prepared model to a model which will automatically insert fake quant
     before a quantizable module or operator.
@@ -388,6 +394,22 @@ def convert(model, inplace=False):
     Args:
         model (torch.nn.Module): The FP32 model to be convert.
         inplace: (bool): It will change the given model in-place if True. The default value is ``False``.
+        graph_module (bool): Return a ``torch.fx.GraphModule`` recorded from one
+            call of the converted model on the example inputs, following the op
+            sequence recorded at calibration. It is a proxy-free graph of the
+            quantized model, to inspect it or to cache it: it has explicit quantize
+            and dequantize nodes and the weights quantized at convert, and it runs
+            on plain tensors. The linear and conv ops are not lowered to int8 ops,
+            they still run in fp32 between the quantize and dequantize nodes, so
+            trace and freeze the model to get the int8 kernels. Like
+            ``torch.jit.trace``, it is specialized to the control flow of the
+            recorded call. Only static quantization is supported. The default
+            value is ``False``.
+        example_inputs (tuple or torch.Tensor): The example inputs of the recorded
+            call when ``graph_module`` is ``True``.
+        example_kwarg_inputs (dict): The example keyword inputs of the recorded call
+            when ``graph_module`` is ``True``. Only one of this argument or
+            ``example_inputs`` should be specified.
 
     Returns:
         torch.nn.Module
@@ -398,6 +420,18 @@ def convert(model, inplace=False):
     assert hasattr(
         model, "q_config"
     ), "Please do prepare the model before doing convert"
+    if graph_module:
+        if isinstance(model.q_config.activation(), PlaceholderObserver):
+            raise ValueError(
+                "IPEX quantization.convert: graph_module only supports static quantization."
+            )
+        if (example_inputs is None) == (example_kwarg_inputs is None):
+            raise ValueError(
+                "IPEX quantization.convert: one of example_inputs and example_kwarg_inputs "
+                "should be set with graph_module."
+            )
+        if isinstance(example_inputs, torch.Tensor):
+            example_inputs = (example_inputs,)
 
     if inplace:
         convert_model = model
@@ -481,4 +515,8 @@ def convert(model, inplace=False):
         )[1]
 
     convert_model = auto_convert(convert_model)
+    if graph_module:
+        return convert_model.convert_to_graph_module(
+            example_inputs, example_kwarg_inputs
+        )
     return convert_model
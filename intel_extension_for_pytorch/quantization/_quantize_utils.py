@@ -1,7 +1,10 @@
 import os
 import copy
+import operator
+from itertools import chain
 from typing import List, Dict, Tuple, Any, Optional
 import torch
+import torch.fx
 from torch.fx.node import map_aggregate
 from torch.ao.quantization import PlaceholderObserver
 from torch.quantization.qconfig import QConfig
@@ -453,15 +456,15 @@ def auto_prepare(
             # otherwise,  we will first get a default_recipe, and then save the default_recipe's setting.
             if not hasattr(self, "_qconf_summary"):
                 # compute scales and zero_point.
-                attach_scale_zp_values_to_model(model)
+                attach_scale_zp_values_to_model(self)
                 nodes = convert_quant_state_map_to_nodes(quant_state_map)
                 # pooling and lstm's input and output should have same scale_zp.
                 sync_pool_and_lstm_input_output_scale_zp(quant_state_map, nodes)
                 get_default_recipe(nodes)
             else:
-                if check_model_obsever_has_run(model):
+                if check_model_obsever_has_run(self):
                     # re-compute the scales and zp if user load a json file and re-do the calibration step.
-                    attach_scale_zp_values_to_model(model)
+                    attach_scale_zp_values_to_model(self)
                 else:
                     # do nothing if user just loaded a json file and not re-do the calibration step
                     pass
@@ -527,6 +530,119 @@ def copy_prepared_model(model):
     return copied_model
 
 
+def _contains_tensor(value):
+    found = False
+
+    def check(a):
+        nonlocal found
+        found = found or isinstance(a, torch.Tensor)
+        return a
+
+    map_aggregate(value, check)
+    return found
+
+
+class _ConvertGraphRecorder(object):
+    r"""
+    Records one call of a converted model into a ``torch.fx.Graph``. The dispatch
+    proxy reports every op it runs, including the quantize and dequantize ops
+    inserted by the ``AutoQuantizationState`` hooks, and every quantized leaf
+    module with its weights already quantized. Like ``torch.jit.trace``, the graph
+    is specialized to the control flow and the non-tensor values of the recorded
+    call.
+    """
+
+    def __init__(self, root: torch.nn.Module):
+        self.graph = torch.fx.Graph()
+        # qualified name -> module, parameter, buffer or constant of the graph
+        self.attrs: Dict[str, Any] = {}
+        self.names: Dict[int, str] = {}
+        for name, m in root.named_modules():
+            self.names[id(m)] = name
+        for name, t in chain(root.named_parameters(), root.named_buffers()):
+            self.names[id(t)] = name
+        # id(tensor) -> (tensor, node), the tensor is kept alive to pin its id
+        self.env: Dict[int, Tuple[torch.Tensor, torch.fx.Node]] = {}
+        self.num_constants = 0
+
+    def _get_attr(self, value, prefix):
+        name = self.names.get(id(value))
+        if name is None:
+            name = f"{prefix}{self.num_constants}"
+            self.num_constants += 1
+            self.names[id(value)] = name
+        self.attrs[name] = value
+        return name
+
+    def _node(self, value):
+        if not isinstance(value, torch.Tensor):
+            return value
+        entry = self.env.get(id(value))
+        if entry is not None and entry[0] is value:
+            return entry[1]
+        node = self.graph.get_attr(self._get_attr(value, "_tensor_constant"))
+        self.env[id(value)] = (value, node)
+        return node
+
+    def _bind(self, value, node):
+        if isinstance(value, torch.Tensor):
+            self.env[id(value)] = (value, node)
+        elif isinstance(value, (tuple, list)):
+            for i, v in enumerate(value):
+                if _contains_tensor(v):
+                    self._bind(v, self.graph.call_function(operator.getitem, (node, i)))
+        elif isinstance(value, dict):
+            for k, v in value.items():
+                if _contains_tensor(v):
+                    self._bind(v, self.graph.call_function(operator.getitem, (node, k)))
+
+    def record_inputs(self, args, kwargs):
+        for i, arg in enumerate(args):
+            self._bind(arg, self.graph.placeholder(f"input_{i}"))
+        for key, arg in kwargs.items():
+            self._bind(arg, self.graph.placeholder(key))
+
+    def record_function(self, func, args, kwargs, output):
+        name = getattr(func, "__name__", "")
+        # ops without tensor outputs are only kept for their side effects
+        if not _contains_tensor(output) and not name.endswith("_"):
+            return
+        args = map_aggregate(args, self._node)
+        kwargs = map_aggregate(kwargs, self._node)
+        if getattr(torch.Tensor, name, None) is func:
+            node = self.graph.call_method(name, args, kwargs)
+        else:
+            node = self.graph.call_function(func, args, kwargs)
+        self._bind(output, node)
+
+    def record_module(self, module, args, kwargs, weights, output):
+        args = map_aggregate(args, self._node)
+        if weights is not None:
+            weights = [
+                self.graph.get_attr(self._get_attr(w, "_quantized_weight"))
+                for w in weights
+            ]
+            module_node = self.graph.get_attr(self._get_attr(module, "_module"))
+            node = self.graph.call_function(
+                module_call_to_function_call, (module_node, args, weights)
+            )
+        else:
+            kwargs = map_aggregate(kwargs, self._node)
+            node = self.graph.call_module(
+                self._get_attr(module, "_module"), args, kwargs
+            )
+        self._bind(output, node)
+
+    def record_outputs(self, output):
+        self.graph.output(map_aggregate(output, self._node))
+
+    def graph_module(self):
+        self.graph.lint()
+        return torch.fx.GraphModule(
+            self.attrs, self.graph, class_name="QuantizedGraphModule"
+        )
+
+
 def auto_convert(
     module: torch.nn.Module,
 ) -> torch.nn.Module:
@@ -537,6 +653,8 @@ def auto_convert(
             return x
 
     global_disable_torch_function_override = False
+    # set while a call is recorded by convert_to_graph_module
+    recorder: Optional[_ConvertGraphRecorder] = None
 
     def check_add_has_scalar_tensor_input(args):
         r"""
@@ -615,12 +733,16 @@ def auto_convert(
 
                 # forward
                 output = super().__torch_function__(func, types, args, kwargs)
+                if recorder is not None:
+                    recorder.record_function(func, args, kwargs, output)
 
                 # after hooks
                 output = qstate.op_convert_after_hook(func, output)
                 qstate.mark_cur_op_complete(func)
             else:  # HookType.NONE
                 output = super().__torch_function__(func, types, args, kwargs)
+                if recorder is not None and output is not NotImplemented:
+                    recorder.record_function(func, args, kwargs, output)
 
             if output is NotImplemented:
                 with torch._C.DisableTorchFunction():
@@ -628,6 +750,8 @@ def auto_convert(
                         QuantizationConvertTensorProxy
                     )
                 assert output is not NotImplemented
+                if recorder is not None:
+                    recorder.record_function(func, args, kwargs, output)
             return output
 
         def __repr__(self):
@@ -683,25 +807,38 @@ def auto_convert(
                         # If we are in this hook, `cur_module` is a leaf module.
                         # Therefore, we do not need to override any of its
                         # children. Disabling the overrides for performance.
+                        # When recording, the overrides stay enabled for the
+                        # hooks so their quantize and dequantize ops are recorded.
                         old_global_disable_torch_function_override = (
                             global_disable_torch_function_override
                         )
-                        global_disable_torch_function_override = True
+                        global_disable_torch_function_override = recorder is None
                         is_lstm_packed_input = isinstance(
                             cur_module, torch.nn.LSTM
                         ) and isinstance(args[0], PackedSequence)
                         if is_lstm_packed_input:
+                            if recorder is not None:
+                                raise RuntimeError(
+                                    "convert_to_graph_module does not support LSTM with PackedSequence input"
+                                )
                             args = _convert_PackedSequence_to_tuple_lstm(args)
                         _, args, kwargs = qstate.op_convert_before_hook(
                             cur_module, args, kwargs, cur_module
                         )
                         if is_lstm_packed_input:
                             args = _convert_tuple_to_PackedSequence_lstm(args)
+                        global_disable_torch_function_override = True
+                        weights = None
                         if type(cur_module) in quantized_modules_has_weights:
                             weights = qstate.op_weight_convert_before_hook(cur_module)
                             output = module_call_to_function_call(self, args, weights)
                         else:
                             output = orig_module_call(self, *args, **kwargs)
+                        if recorder is not None:
+                            recorder.record_module(
+                                cur_module, args, kwargs, weights, output
+                            )
+                            global_disable_torch_function_override = False
                         # after hooks
                         if is_lstm_packed_input:
                             output = _convert_PackedSequence_to_tuple_lstm(output)
@@ -744,7 +881,11 @@ def auto_convert(
             torch.nn.Sequential.forward = _nn_sequential_patched_forward  # type: ignore[assignment]
 
             try:
+                if recorder is not None:
+                    recorder.record_inputs(new_args, new_kwargs)
                 output = super().__call__(*new_args, **new_kwargs)
+                if recorder is not None:
+                    recorder.record_outputs(output)
 
                 def unwrap_proxy(a):
                     if isinstance(a, QuantizationConvertTensorProxy):
@@ -757,6 +898,24 @@ def auto_convert(
                 torch.nn.Module.__call__ = orig_module_call
                 torch.nn.Sequential.forward = orig_nn_sequential_forward  # type: ignore[assignment]
 
+        def convert_to_graph_module(
+            self, example_inputs=None, example_kwarg_inputs=None
+        ):
+            r"""
+            Record one call of the converted model on the example inputs into a
+            ``torch.fx.GraphModule`` with explicit quantize and dequantize nodes
+            and pre-quantized weights, which runs without the dispatch proxy. The
+            recorded ops are not lowered to int8 ops.
+            """
+            nonlocal recorder
+            recorder = _ConvertGraphRecorder(self)
+            try:
+                with torch.no_grad():
+                    self(*(example_inputs or ()), **(example_kwarg_inputs or {}))
+                return recorder.graph_module()
+            finally:
+                recorder = None
+
     # If module doesn't have a configure_file attr, we can say that user didn't run save_qconf_summary method which have
     # computed the scales and zp, or didn't use the user's setting from a given json file(load_qconf_summary), we need to compute
     # the scale and zp here.
@@ -829,18 +988,15 @@ NF4_DEQUANT_TABLE = [
 def map_float_tensor_to_nf4(t, dtype=torch.uint8):
     # Map [-1, 1] to nf4
     # Assume t in [-1, 1]
-    out_uint8 = torch.empty(t.shape, dtype=dtype)
-    for i in range(len(NF4_QUANT_TABLE)):
-        out_uint8[t > NF4_QUANT_TABLE[i]] = i
-    return out_uint8
+    # The nf4 value is the last index i of NF4_QUANT_TABLE with t > NF4_QUANT_TABLE[i]
+    table = torch.tensor(NF4_QUANT_TABLE, dtype=t.dtype, device=t.device)
+    return torch.bucketize(t, table).sub_(1).clamp_(min=0).to(dtype)
 
 
 def map_nf4_tensor_to_float(t, dtype=torch.float32):
     # Map nf4 to [-1, 1]
-    out_dq = torch.empty(t.shape).to(dtype)
-    for i in range(len(NF4_DEQUANT_TABLE)):
-        out_dq[t == i] = NF4_DEQUANT_TABLE[i]
-    return out_dq
+    table = torch.tensor(NF4_DEQUANT_TABLE, dtype=dtype, device=t.device)
+    return table[t.long()]
 
 
 def is_4bit(dtype):
@@ -851,6 +1007,90 @@ def is_sym_quant(dtype):
     return dtype in (WoqWeightDtype.NF4,)
 
 
+# Weights are quantized by chunks of output channels of about this number of elements,
+# so that the temporary tensors of quantization stay a few times of a chunk
+_QUANTIZE_CHUNK_NUMEL = 1 << 22
+
+
+def _unpack_4bit(qt):
+    # [N, K / 2] uint8 holding 2 values per byte, the lower 4 bits first -> [N, K]
+    return torch.stack([qt.bitwise_and(0xF), qt.bitwise_right_shift(4)], dim=-1).view(
+        qt.size(0), qt.size(1) * 2
+    )
+
+
+def _get_qparams_per_block(t, dtype):
+    # t in shape [N, #block_k, group_size]. The input channels padded with zeros do not
+    # change the qparams since the min/max of every block are clamped by 0 anyway.
+    mins, maxs = torch.aminmax(t, dim=-1)
+    mins.clamp_(max=0)
+    maxs.clamp_(min=0)
+    eps = torch.finfo(torch.float32).eps
+    if dtype == WoqWeightDtype.NF4:
+        scales = torch.maximum(maxs, mins.abs_()).float().clamp_(min=eps)
+        return scales, None
+    qmax = 255 if dtype == WoqWeightDtype.INT8 else 15
+    scales = ((maxs - mins) / qmax).float().clamp_(min=eps)
+    zps = -torch.round(mins / scales)
+    if dtype == WoqWeightDtype.INT8:
+        zps -= 128
+    return scales, zps
+
+
+def _quantize_per_block(t, dtype, group_size, scales=None, zps=None):
+    # Quantize and pack a weight in a single sweep over chunks of output channels.
+    # qparams are found by min/max if scales is None.
+    N = t.size(0)
+    K = t.size(1)
+    Kc = (K + group_size - 1) // group_size
+    find_qparams = scales is None
+    qt = torch.empty(
+        N,
+        (K + 1) // 2 if is_4bit(dtype) else K,
+        dtype=torch.uint8 if is_4bit(dtype) else torch.int8,
+        device=t.device,
+    )
+    scales_list = []
+    zps_list = []
+    chunk_size = max(_QUANTIZE_CHUNK_NUMEL // max(Kc * group_size, 1), 1)
+    for start in range(0, N, chunk_size):
+        end = min(start + chunk_size, N)
+        t_chunk = t[start:end]
+        if Kc * group_size != K:
+            t_chunk = torch.nn.functional.pad(t_chunk, (0, Kc * group_size - K))
+        t_chunk = t_chunk.reshape(end - start, Kc, group_size)
+        if find_qparams:
+            scales_chunk, zps_chunk = _get_qparams_per_block(t_chunk, dtype)
+            scales_list.append(scales_chunk)
+            zps_list.append(zps_chunk)
+        else:
+            scales_chunk = scales[start:end, :Kc]
+            zps_chunk = None if is_sym_quant(dtype) else zps[start:end, :Kc]
+        inv_scales = 1 / scales_chunk.unsqueeze(-1)
+        if dtype == WoqWeightDtype.NF4:
+            qt_chunk = map_float_tensor_to_nf4(t_chunk * inv_scales)
+        else:
+            qmin, qmax = (-128, 127) if dtype == WoqWeightDtype.INT8 else (0, 15)
+            qt_chunk = (
+                (torch.round(t_chunk * inv_scales) + zps_chunk.unsqueeze(-1))
+                .clamp_(min=qmin, max=qmax)
+                .to(qt.dtype)
+            )
+        qt_chunk = qt_chunk.view(end - start, Kc * group_size)[:, :K]
+        if is_4bit(dtype):
+            if K % 2:
+                qt_chunk = torch.nn.functional.pad(qt_chunk, (0, 1), value=0)
+            qt[start:end] = (
+                qt_chunk[:, 1::2].bitwise_left_shift(4).bitwise_or_(qt_chunk[:, ::2])
+            )
+        else:
+            qt[start:end] = qt_chunk
+    if find_qparams:
+        scales = torch.cat(scales_list)
+        zps = None if is_sym_quant(dtype) else torch.cat(zps_list)
+    return qt, scales, zps
+
+
 def quantize_per_channel(t: torch.Tensor, dtype, scales=None, zero_points=None):
     r"""
     Quantize a weight tensor of Linear modules per channel.
@@ -869,49 +1109,18 @@ def quantize_per_channel(t: torch.Tensor, dtype, scales=None, zero_points=None):
     """
     assert t.ndim == 2
     assert dtype in (WoqWeightDtype.INT8, WoqWeightDtype.INT4, WoqWeightDtype.NF4)
-
-    def get_qparams(scales, zps):
-        if scales is not None and zps is not None:
-            return scales, zps
-        eps = torch.tensor([torch.finfo(torch.float32).eps])
-        zeros = torch.zeros(t.shape[0], dtype=t.dtype, device=t.device)
-        mins = torch.minimum(t.min(dim=1)[0], zeros)
-        maxs = torch.maximum(t.max(dim=1)[0], zeros)
-        if dtype == WoqWeightDtype.INT8:
-            scales = (maxs - mins) / 255
-            scales = torch.max(scales, eps)
-            zps = -torch.round(mins / scales)
-            zps -= 128
-        elif dtype == WoqWeightDtype.INT4:
-            scales = (maxs - mins) / 15
-            scales = torch.max(scales, eps)
-            zps = -torch.round(mins / scales)
-        else:  # NF4
-            scales = torch.maximum(torch.abs(maxs), torch.abs(mins))
-            scales = torch.max(scales, eps)
-        return scales, zps
-
-    scales, zps = get_qparams(scales, zero_points)
-    inv_scales = 1 / scales.unsqueeze(1)
-    if dtype == WoqWeightDtype.INT8:
-        qmin = -128
-        qmax = 127
-        qt = torch.clamp(
-            torch.round(t * inv_scales) + zps.unsqueeze(1), min=qmin, max=qmax
-        ).to(torch.int8)
-    elif dtype == WoqWeightDtype.INT4:
-        qmin = 0
-        qmax = 15
-        qt = torch.clamp(
-            torch.round(t * inv_scales) + zps.unsqueeze(1), min=qmin, max=qmax
-        ).to(torch.uint8)
-    else:  # NF4
-        qt = map_float_tensor_to_nf4(t * inv_scales)
-    if is_4bit(dtype):
-        if qt.size(-1) % 2:
-            qt = torch.nn.functional.pad(qt, (0, 1), value=0)
-        qt = qt[:, 1::2].bitwise_left_shift(4).bitwise_or_(qt[:, ::2])
-    return qt.contiguous(), scales, zps
+    N = t.size(0)
+    if scales is not None and zero_points is not None:
+        qt, _, _ = _quantize_per_block(
+            t,
+            dtype,
+            t.size(1),
+            scales.reshape(N, 1),
+            None if is_sym_quant(dtype) else zero_points.reshape(N, 1),
+        )
+        return qt, scales, zero_points
+    qt, scales, zps = _quantize_per_block(t, dtype, t.size(1))
+    return qt, scales.view(N), None if zps is None else zps.view(N)
 
 
 def dequantize_per_channel(
@@ -945,22 +1154,13 @@ def dequantize_per_channel(
     if dtype == WoqWeightDtype.INT8:
         return (qt.to(torch.float) - zps.unsqueeze(-1)) * scales.unsqueeze(-1)
     elif dtype == WoqWeightDtype.INT4:
-        t = torch.empty(
-            qt.shape[0], qt.shape[1] * 2, dtype=torch.uint8, device=qt.device
-        )
-        t[:, ::2] = qt.bitwise_and(0xF)
-        t[:, 1::2] = qt.bitwise_right_shift(4)
+        t = _unpack_4bit(qt)
         t = (t.to(torch.float) - zps.unsqueeze(-1)) * scales.unsqueeze(-1)
         if weight_shape is not None:
             t = t[: weight_shape[0], : weight_shape[1]].contiguous()
         return t
     else:  # NF4
-        t = torch.empty(
-            qt.shape[0], qt.shape[1] * 2, dtype=torch.uint8, device=qt.device
-        )
-        t[:, ::2] = qt.bitwise_and(0xF)
-        t[:, 1::2] = qt.bitwise_right_shift(4)
-        t = map_nf4_tensor_to_float(t)
+        t = map_nf4_tensor_to_float(_unpack_4bit(qt))
         if weight_shape is not None:
             t = t[: weight_shape[0], : weight_shape[1]].contiguous()
         t = t * scales.unsqueeze(-1)
@@ -993,109 +1193,9 @@ def quantize_per_block(
     ), f"{__name__}: Expect input has 2 dimensions but got {input.dim()}"
     assert group_size > 0, f"{__name__}: Expect group_size > 0 but got {group_size}"
     assert dtype in (WoqWeightDtype.INT8, WoqWeightDtype.INT4, WoqWeightDtype.NF4)
-    N = input.size(0)
-    K = input.size(1)
-    k_rem = K % group_size
-    has_rem = k_rem != 0
-
-    def get_qparams(scales, zps):
-        if scales is not None and zps is not None:
-            return scales, zps
-        eps = torch.tensor([torch.finfo(torch.float32).eps])
-        t_com = input[:, : K - k_rem].view(N, K // group_size, group_size)
-        mins = torch.minimum(t_com.min(dim=-1)[0], torch.tensor([0]))
-        maxs = torch.maximum(t_com.max(dim=-1)[0], torch.tensor([0]))
-        if dtype == WoqWeightDtype.INT8:
-            scales = (maxs - mins) / 255
-            scales = torch.max(scales, eps)
-            zps = -torch.round(mins / scales)
-        elif dtype == WoqWeightDtype.INT4:
-            scales = (maxs - mins) / 15
-            scales = torch.max(scales, eps)
-            zps = -torch.round(mins / scales)
-        else:  # NF4
-            scales = torch.maximum(torch.abs(maxs), torch.abs(mins))
-            scales = torch.max(scales, eps)
-        if k_rem != 0:
-            t_rem = input[:, K - k_rem :].view(N, 1, k_rem)
-            mins_rem = torch.minimum(t_rem.min(dim=-1)[0], torch.tensor([0]))
-            maxs_rem = torch.maximum(t_rem.max(dim=-1)[0], torch.tensor([0]))
-            if dtype == WoqWeightDtype.INT8:
-                scales_rem = (maxs_rem - mins_rem) / 255
-                scales_rem = torch.max(scales_rem, eps)
-                zps_rem = -torch.round(mins_rem / scales_rem)
-            elif dtype == WoqWeightDtype.INT4:
-                scales_rem = (maxs_rem - mins_rem) / 15
-                scales_rem = torch.max(scales_rem, eps)
-                zps_rem = -torch.round(mins_rem / scales_rem)
-            else:  # NF4
-                scales_rem = torch.maximum(torch.abs(maxs_rem), torch.abs(mins_rem))
-                scales_rem = torch.max(scales_rem, eps)
-            scales = torch.cat([scales, scales_rem], dim=-1)
-            if not is_sym_quant(dtype):
-                zps = torch.cat([zps, zps_rem], dim=-1)
-        if not is_4bit(dtype):
-            assert zps is not None
-            zps -= 128
-        return scales, zps
-
-    scales, zps = get_qparams(scales, zero_points)
-    Kc = (K + group_size - 1) // group_size
-    t_com = input[:, : K - k_rem].view(N, K // group_size, group_size)
-    scales_com = scales[:, : Kc - has_rem]
-    inv_scales_com = 1 / scales_com.unsqueeze(-1)
-    if not is_sym_quant(dtype):
-        zps_com = zps[:, : Kc - has_rem]
-    if dtype == WoqWeightDtype.INT8:
-        qmin = -128
-        qmax = 127
-        qt = torch.clamp(
-            torch.round(t_com * inv_scales_com) + zps_com.unsqueeze(-1),
-            min=qmin,
-            max=qmax,
-        )
-    elif dtype == WoqWeightDtype.INT4:
-        qmin = 0
-        qmax = 15
-        qt = torch.clamp(
-            torch.round(t_com * inv_scales_com) + zps_com.unsqueeze(-1),
-            min=qmin,
-            max=qmax,
-        )
-    else:  # NF4
-        qt = map_float_tensor_to_nf4(t_com * inv_scales_com)
-    qt = qt.view(N, K // group_size * group_size)
-    if k_rem != 0:
-        t_rem = input[:, K - k_rem :].view(N, 1, k_rem)
-        scales_rem = scales[:, Kc - has_rem :]
-        inv_scales_rem = 1 / scales_rem.unsqueeze(-1)
-        if not is_sym_quant(dtype):
-            zps_rem = zps[:, Kc - has_rem :]
-        if dtype == WoqWeightDtype.INT8:
-            assert zps_rem is not None
-            qt_rem = torch.clamp(
-                torch.round(t_rem * inv_scales_rem) + zps_rem.unsqueeze(-1),
-                min=qmin,
-                max=qmax,
-            )
-        elif dtype == WoqWeightDtype.INT4:
-            assert zps_rem is not None
-            qt_rem = torch.clamp(
-                torch.round(t_rem * inv_scales_rem) + zps_rem.unsqueeze(-1),
-                min=qmin,
-                max=qmax,
-            )
-        else:  # NF4
-            qt_rem = map_float_tensor_to_nf4(t_rem * inv_scales_rem)
-        qt_rem = qt_rem.view(N, k_rem)
-        qt = torch.cat([qt, qt_rem], dim=1).contiguous()
-    qt = qt.to(torch.uint8) if is_4bit(dtype) else qt.to(torch.int8)
-    qt = qt.view(N, K)
-    if is_4bit(dtype):
-        if qt.size(-1) % 2:
-            qt = torch.nn.functional.pad(qt, (0, 1), value=0)
-        qt = qt[:, 1::2].bitwise_left_shift(4).bitwise_or_(qt[:, ::2])
-    return qt.contiguous(), scales, zps
+    if scales is None or zero_points is None:
+        return _quantize_per_block(input, dtype, group_size)
+    return _quantize_per_block(input, dtype, group_size, scales, zero_points)
 
 
 def dequantize_per_block(
@@ -1128,53 +1228,19 @@ def dequantize_per_block(
         scales = scales.squeeze()
         zps = zps.squeeze()
     if is_4bit(dtype):
-        t = torch.empty(
-            qt.shape[0], qt.shape[1] * 2, dtype=torch.uint8, device=qt.device
-        )
-        t[:, ::2] = qt.bitwise_and(0xF)
-        t[:, 1::2] = qt.bitwise_right_shift(4)
-        qt = t
-    k_rem = K % group_size
-    has_rem = k_rem != 0
+        qt = _unpack_4bit(qt)
     Kc = (K + group_size - 1) // group_size
-    qt_com = qt[:, : K - k_rem].view(N, K // group_size, group_size)
-    scales_com = scales[:, : Kc - has_rem]
+    if Kc * group_size != K:
+        # The last block is padded to group_size, and the padding is dropped below
+        qt = torch.nn.functional.pad(qt, (0, Kc * group_size - K))
+    qt = qt.reshape(N, Kc, group_size)
     if dtype == WoqWeightDtype.NF4:
-        t = (
-            (map_nf4_tensor_to_float(qt_com) * scales_com.unsqueeze(-1))
-            .view(N, K - k_rem)
-            .contiguous()
-        )
+        t = map_nf4_tensor_to_float(qt) * scales[:, :Kc].unsqueeze(-1)
     else:
-        zps_com = zps[:, : Kc - has_rem]
-        t = (
-            (
-                (qt_com.to(torch.float) - zps_com.unsqueeze(-1))
-                * scales_com.unsqueeze(-1)
-            )
-            .view(N, K - k_rem)
-            .contiguous()
+        t = (qt.to(torch.float) - zps[:, :Kc].unsqueeze(-1)) * scales[:, :Kc].unsqueeze(
+            -1
         )
-    if k_rem:
-        qt_rem = qt[:, K - k_rem :].view(N, 1, k_rem)
-        scales_rem = scales[:, Kc - has_rem :]
-        if dtype == WoqWeightDtype.NF4:
-            t_rem = (
-                (map_nf4_tensor_to_float(qt_rem) * scales_rem.unsqueeze(-1))
-                .view(N, k_rem)
-                .contiguous()
-            )
-        else:
-            zps_rem = zps[:, Kc - has_rem :]
-            t_rem = (
-                (
-                    (qt_rem.to(torch.float) - zps_rem.unsqueeze(-1))
-                    * scales_rem.unsqueeze(-1)
-                )
-                .view(N, k_rem)
-                .contiguous()
-            )
-        t = torch.cat([t, t_rem], dim=1).contiguous()
+    t = t.view(N, Kc * group_size)[:, :K]
     if weight_shape is not None:
-        t = t[: weight_shape[0], : weight_shape[1]].contiguous()
-    return t
+        t = t[: weight_shape[0], : weight_shape[1]]
+    return t.contiguous()
@@ -3,6 +3,7 @@ from .optimize import _set_optimized_model_for_generation
 from .models.cpu.modules.attentions import _IPEXAttentionCPU
 from .models.cpu.modules.decoder import _IPEXDecoderLayerCPU
 from .tensor_parallel import (
+    get_tp_sharded_linears,
     shard_lm_head_weights,
     shard_mha_weights,
     shard_mlp_weights,
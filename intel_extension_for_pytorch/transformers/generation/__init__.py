@@ -2,3 +2,4 @@ from .beam_search import _beam_search
 from .greedy_search import _greedy_search
 from .sample import _sample
 from .beam_sample import _beam_sample
+from .assisted_decoding import _assisted_decoding, _get_candidate_generator
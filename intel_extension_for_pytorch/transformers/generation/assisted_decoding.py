@@ -0,0 +1,535 @@
+import torch
+import torch.distributed as dist
+from typing import Optional, Tuple, Union, List
+from transformers.generation.stopping_criteria import StoppingCriteriaList
+from transformers.generation.logits_process import LogitsProcessorList
+from transformers.generation.streamers import BaseStreamer
+from .greedy_search import GreedySearchDecoderOnlyOutput
+from .sample import SampleDecoderOnlyOutput
+import time
+
+
+def _is_ipex_optimized(model):
+    return any(hasattr(m, "_IPEXScaleDotProduct") for m in model.modules())
+
+
+def _is_indirect_access_kv_cache(past_key_values):
+    # layer_past of the IndirectAccessKVCache is (seq_info, key_cache, value_cache, beam_idx),
+    # seq_info being a dummy long tensor of shape [1, seq_len, seq_len, 1]
+    return (
+        past_key_values is not None
+        and len(past_key_values[0]) == 4
+        and past_key_values[0][0].dtype == torch.long
+    )
+
+
+def _get_past_length(past_key_values):
+    if past_key_values is None:
+        return 0
+    if hasattr(past_key_values, "get_seq_length"):
+        return past_key_values.get_seq_length()
+    return past_key_values[0][0].shape[2]
+
+
+def _crop_past_key_values(past_key_values, max_length):
+    r"""
+    Drops the cached key/value states after the first max_length tokens, i.e., the states of the
+    rejected speculative tokens.
+    """
+    if _is_indirect_access_kv_cache(past_key_values):
+        # The key/value caches are preallocated to the max positions and the kernel writes the new tokens
+        # at the offset given by the length of seq_info, so shrinking seq_info is enough: the slots of the
+        # rejected tokens are overwritten by the next forward. beam_idx keeps its identity mapping since
+        # speculative decoding does not reorder beams.
+        seq_info = torch.empty(1, max_length, max_length, 1, dtype=torch.long)
+        return tuple(
+            [(seq_info,) + tuple(layer_past[1:]) for layer_past in past_key_values]
+        )
+    if hasattr(past_key_values, "crop"):
+        past_key_values.crop(max_length)
+        return past_key_values
+    return tuple(
+        [
+            tuple([past[:, :, :max_length, :] for past in layer_past])
+            for layer_past in past_key_values
+        ]
+    )
+
+
+def _get_dummy_past_key_values(model, batch_size):
+    config = model.config
+    if hasattr(config, "n_layer"):
+        num_hidden_layers = config.n_layer
+    elif hasattr(config, "num_hidden_layers"):
+        num_hidden_layers = config.num_hidden_layers
+    elif hasattr(config, "num_layers"):
+        num_hidden_layers = config.num_layers
+    elif hasattr(config, "n_layers"):
+        num_hidden_layers = config.n_layers
+    beam_idx_tmp = torch.zeros((2048, int(batch_size)), dtype=torch.long).contiguous()
+    return tuple(
+        [
+            (
+                torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
+                torch.zeros([1, 1, 1, 1]).contiguous(),
+                torch.zeros([1, 1, 1, 1]).contiguous(),
+                beam_idx_tmp,
+            )
+            for i in range(num_hidden_layers)
+        ]
+    )
+
+
+def _forward_uncached_tokens(
+    model, input_ids, past_key_values, attention_mask, ipex_optimized
+):
+    r"""
+    Runs the tokens of input_ids which are not in past_key_values yet in a single forward and returns
+    their logits and the updated past_key_values.
+    """
+    past_length = _get_past_length(past_key_values)
+    if attention_mask is not None:
+        cur_len = input_ids.shape[-1]
+        if attention_mask.shape[-1] < cur_len:
+            attention_mask = torch.cat(
+                [
+                    attention_mask,
+                    attention_mask.new_ones(
+                        (attention_mask.shape[0], cur_len - attention_mask.shape[-1])
+                    ),
+                ],
+                dim=-1,
+            )
+        else:
+            attention_mask = attention_mask[:, :cur_len]
+    model_inputs = model.prepare_inputs_for_generation(
+        input_ids,
+        past_key_values=past_key_values,
+        attention_mask=attention_mask,
+        use_cache=True,
+    )
+    # prepare_inputs_for_generation assumes a single new token once there is a past,
+    # verification feeds the last accepted token and all speculative tokens
+    model_inputs["input_ids"] = input_ids[:, past_length:]
+    if model_inputs.get("position_ids", None) is not None:
+        if attention_mask is not None:
+            position_ids = attention_mask.long().cumsum(-1) - 1
+            position_ids.masked_fill_(attention_mask == 0, 1)
+        else:
+            position_ids = torch.arange(
+                input_ids.shape[-1], dtype=torch.long, device=input_ids.device
+            ).expand(input_ids.shape[0], -1)
+        model_inputs["position_ids"] = position_ids[:, past_length:]
+    if ipex_optimized and past_key_values is None:
+        model_inputs["past_key_values"] = _get_dummy_past_key_values(
+            model, input_ids.shape[0]
+        )
+    if ipex_optimized and hasattr(model, "trace_graph"):
+        model_inputs.pop("use_cache", None)
+        model_inputs.pop("token_type_ids", None)
+        outputs = model.trace_graph(**model_inputs)
+    else:
+        outputs = model(**model_inputs, return_dict=True)
+    if isinstance(outputs, dict):
+        return outputs.logits, outputs.past_key_values
+    return outputs[0], outputs[1]
+
+
+class _PromptLookupCandidateGenerator:
+    r"""
+    Proposes the tokens which followed the latest earlier occurrence of the trailing n-gram of the
+    sequence (prompt lookup decoding). No draft model is needed, it pays off when the output copies spans
+    of the input, e.g., summarization, document QA or code editing.
+
+    Args:
+    - num_output_tokens (int): max number of proposed tokens per step.
+    - max_matching_ngram_size (int): the longest trailing n-gram tried first. Default: 2.
+    """
+
+    def __init__(self, num_output_tokens: int = 10, max_matching_ngram_size: int = 2):
+        self.num_output_tokens = num_output_tokens
+        self.max_matching_ngram_size = max_matching_ngram_size
+
+    def get_candidates(
+        self, input_ids: torch.LongTensor
+    ) -> Tuple[torch.LongTensor, Optional[torch.FloatTensor]]:
+        tokens = input_ids[0]
+        cur_len = tokens.size(0)
+        for ngram_size in range(min(self.max_matching_ngram_size, cur_len - 1), 0, -1):
+            ngram = tokens[-ngram_size:]
+            # every n-gram but the trailing one
+            windows = tokens[:-1].unfold(0, ngram_size, 1)
+            matches = (windows == ngram).all(dim=-1).nonzero()
+            if matches.numel() == 0:
+                continue
+            start = int(matches[-1]) + ngram_size
+            candidates = tokens[start : start + self.num_output_tokens]
+            if candidates.numel() > 0:
+                return torch.cat([input_ids, candidates[None, :]], dim=-1), None
+        return input_ids, None
+
+    def update_candidate_strategy(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor, num_matches: int
+    ):
+        return
+
+
+class _DraftModelCandidateGenerator:
+    r"""
+    Proposes the continuation of a small draft model sharing the tokenizer of the target model, greedy or
+    sampled with the warped logits when the target model samples. The draft model keeps its own KV cache
+    across steps, rolled back to the accepted tokens before proposing.
+
+    Args:
+    - assistant_model (nn.Module): the draft model, optimized by ipex.llm.optimize or not.
+    - max_length (int): max total length of the sequences.
+    - attention_mask (torch.Tensor, optional): attention mask of the prompt.
+    - logits_processor (LogitsProcessorList, optional): processors applied to the draft logits.
+    - logits_warper (LogitsProcessorList, optional): warpers applied to the draft logits, draft tokens
+                                                     are sampled when it is given.
+    """
+
+    def __init__(
+        self,
+        assistant_model,
+        max_length: int,
+        attention_mask: Optional[torch.Tensor] = None,
+        logits_processor: Optional[LogitsProcessorList] = None,
+        logits_warper: Optional[LogitsProcessorList] = None,
+    ):
+        self.assistant_model = assistant_model
+        self.ipex_optimized = _is_ipex_optimized(assistant_model)
+        generation_config = assistant_model.generation_config
+        self.num_assistant_tokens = getattr(
+            generation_config, "num_assistant_tokens", 5
+        )
+        self.num_assistant_tokens_schedule = getattr(
+            generation_config, "num_assistant_tokens_schedule", "heuristic"
+        )
+        self.max_length = max_length
+        self.attention_mask = attention_mask
+        self.logits_processor = (
+            logits_processor if logits_processor is not None else LogitsProcessorList()
+        )
+        self.logits_warper = logits_warper
+        self.past_key_values = None
+
+    def get_candidates(
+        self, input_ids: torch.LongTensor
+    ) -> Tuple[torch.LongTensor, Optional[torch.FloatTensor]]:
+        cur_len = input_ids.shape[-1]
+        num_new_tokens = int(
+            min(self.num_assistant_tokens, self.max_length - cur_len - 1)
+        )
+        if num_new_tokens <= 0:
+            return input_ids, None
+        if self.past_key_values is not None:
+            # the cache holds at most the accepted tokens but the last one, which is fed again
+            self.past_key_values = _crop_past_key_values(
+                self.past_key_values,
+                min(_get_past_length(self.past_key_values), cur_len - 1),
+            )
+        candidate_ids = input_ids
+        candidate_logits = []
+        for _ in range(num_new_tokens):
+            logits, self.past_key_values = _forward_uncached_tokens(
+                self.assistant_model,
+                candidate_ids,
+                self.past_key_values,
+                self.attention_mask,
+                self.ipex_optimized,
+            )
+            next_token_scores = self.logits_processor(candidate_ids, logits[:, -1, :])
+            if self.logits_warper is not None:
+                next_token_scores = self.logits_warper(candidate_ids, next_token_scores)
+                probs = torch.nn.functional.softmax(next_token_scores, dim=-1)
+                next_tokens = torch.multinomial(probs, num_samples=1)
+            else:
+                next_tokens = torch.argmax(next_token_scores, dim=-1, keepdim=True)
+            candidate_logits.append(next_token_scores)
+            candidate_ids = torch.cat([candidate_ids, next_tokens], dim=-1)
+        if self.logits_warper is None:
+            return candidate_ids, None
+        return candidate_ids, torch.stack(candidate_logits, dim=1)
+
+    def update_candidate_strategy(
+        self, input_ids: torch.LongTensor, scores: torch.FloatTensor, num_matches: int
+    ):
+        # propose more tokens while all of them are accepted, fewer otherwise
+        if self.num_assistant_tokens_schedule in ["heuristic", "heuristic_transient"]:
+            if num_matches == int(self.num_assistant_tokens):
+                self.num_assistant_tokens += 2.0
+            else:
+                self.num_assistant_tokens = max(1.0, self.num_assistant_tokens - 1.0)
+
+
+def _get_candidate_generator(
+    self,
+    generation_config,
+    input_ids: torch.LongTensor,
+    inputs_tensor: torch.Tensor,
+    assistant_model,
+    logits_processor: LogitsProcessorList,
+    model_kwargs: dict,
+):
+    if generation_config.prompt_lookup_num_tokens is not None:
+        return _PromptLookupCandidateGenerator(
+            num_output_tokens=generation_config.prompt_lookup_num_tokens
+        )
+    return _DraftModelCandidateGenerator(
+        assistant_model,
+        max_length=generation_config.max_length,
+        attention_mask=model_kwargs.get("attention_mask", None),
+        logits_processor=logits_processor,
+        logits_warper=(
+            self._get_logits_warper(generation_config)
+            if generation_config.do_sample
+            else None
+        ),
+    )
+
+
+def _speculative_sampling(
+    candidate_input_ids, candidate_logits, candidate_length, new_logits
+):
+    r"""
+    Accepts each draft token with probability min(1, p / q), p and q being the target and draft
+    probabilities, and samples the token after the accepted ones from norm(max(0, p - q)) on a rejection,
+    or from p when all draft tokens are accepted. The output follows the distribution of the target model.
+    """
+    new_candidate_input_ids = candidate_input_ids[:, -candidate_length:]
+    q = candidate_logits.softmax(dim=-1)
+    q_i = q[:, torch.arange(candidate_length), new_candidate_input_ids].squeeze(0)
+    p = new_logits.softmax(dim=-1)
+    p_i = p[:, torch.arange(candidate_length), new_candidate_input_ids].squeeze(0)
+    probability_ratio = p_i / q_i
+    r_i = torch.rand_like(probability_ratio)
+    is_accepted = r_i <= probability_ratio
+    n_matches = int(((~is_accepted).cumsum(dim=-1) < 1).sum())
+    if n_matches < candidate_length:
+        p_prime = torch.clamp(p[:, n_matches, :] - q[:, n_matches, :], min=0)
+        p_prime.div_(p_prime.sum())
+    else:
+        p_prime = p[:, n_matches, :]
+    t = torch.multinomial(p_prime, num_samples=1)
+    if n_matches > 0:
+        valid_tokens = torch.cat((new_candidate_input_ids[:, :n_matches], t), dim=-1)
+    else:
+        valid_tokens = t
+    return valid_tokens, n_matches
+
+
+def _assisted_decoding(
+    self,
+    input_ids: torch.LongTensor,
+    assistant_model=None,
+    candidate_generator=None,
+    do_sample: bool = False,
+    logits_processor: Optional[LogitsProcessorList] = None,
+    logits_warper: Optional[LogitsProcessorList] = None,
+    stopping_criteria: Optional[StoppingCriteriaList] = None,
+    pad_token_id: Optional[int] = None,
+    eos_token_id: Optional[Union[int, List[int]]] = None,
+    output_attentions: Optional[bool] = None,
+    output_hidden_states: Optional[bool] = None,
+    output_scores: Optional[bool] = None,
+    return_dict_in_generate: Optional[bool] = None,
+    synced_gpus: Optional[bool] = False,
+    streamer: Optional["BaseStreamer"] = None,
+    **model_kwargs,
+) -> Union[GreedySearchDecoderOnlyOutput, SampleDecoderOnlyOutput, torch.LongTensor]:
+    r"""
+    Speculative decoding: each step a candidate generator (a small draft model, or n-gram lookup in the
+    prompt when generate is called with prompt_lookup_num_tokens) proposes several tokens which the target
+    model verifies in a single forward. The accepted tokens plus the token the target model produces after
+    them are appended, and the IndirectAccessKVCache is rolled back over the rejected tokens, so the output
+    matches greedy search (or follows the distribution of sampling) while taking fewer target forwards.
+    Only batch size 1 and decoder-only models are supported.
+    """
+    if input_ids.shape[0] != 1:
+        raise ValueError("Speculative decoding only supports batch size 1.")
+    if self.config.is_encoder_decoder:
+        raise ValueError("Speculative decoding only supports decoder-only models.")
+    if getattr(self.config, "lm_head_generation", False):
+        raise ValueError(
+            "Speculative decoding needs the logits of every verified token, disable lm_head_generation."
+        )
+    token_latency = (
+        self.config.token_latency if hasattr(self.config, "token_latency") else False
+    )
+
+    latency_list = []
+    if candidate_generator is None:
+        candidate_generator = _DraftModelCandidateGenerator(
+            assistant_model,
+            max_length=self.generation_config.max_length,
+            attention_mask=model_kwargs.get("attention_mask", None),
+            logits_processor=logits_processor,
+            logits_warper=logits_warper if do_sample else None,
+        )
+    logits_processor = (
+        logits_processor if logits_processor is not None else LogitsProcessorList()
+    )
+    logits_warper = (
+        logits_warper if logits_warper is not None else LogitsProcessorList()
+    )
+    stopping_criteria = (
+        stopping_criteria if stopping_criteria is not None else StoppingCriteriaList()
+    )
+    eos_token_id = (
+        eos_token_id
+        if eos_token_id is not None
+        else self.generation_config.eos_token_id
+    )
+    if isinstance(eos_token_id, int):
+        eos_token_id = [eos_token_id]
+    eos_token_id_tensor = (
+        torch.tensor(eos_token_id).to(input_ids.device)
+        if eos_token_id is not None
+        else None
+    )
+    output_scores = (
+        output_scores
+        if output_scores is not None
+        else self.generation_config.output_scores
+    )
+    return_dict_in_generate = (
+        return_dict_in_generate
+        if return_dict_in_generate is not None
+        else self.generation_config.return_dict_in_generate
+    )
+
+    # attentions and hidden states are not kept, the traced graphs do not return them
+    scores = () if (return_dict_in_generate and output_scores) else None
+    max_len = stopping_criteria.max_length
+    if max_len is None:
+        max_len = self.generation_config.max_length
+    ipex_optimized = _is_ipex_optimized(self)
+    past_key_values = model_kwargs.get("past_key_values", None)
+    attention_mask = model_kwargs.get("attention_mask", None)
+
+    this_peer_finished = False  # used by synced_gpus only
+    while True:
+        tic = time.time()
+        if synced_gpus:
+            # Under synced_gpus the `forward` call must continue until all gpus complete their sequence.
+            # The following logic allows an early break if all peers finished generating their sequence
+            this_peer_finished_flag = torch.tensor(
+                0.0 if this_peer_finished else 1.0
+            ).to(input_ids.device)
+            # send 0.0 if we finished, 1.0 otherwise
+            dist.all_reduce(this_peer_finished_flag, op=dist.ReduceOp.SUM)
+            # did all peers finish? the reduced sum will be 0.0 then
+            if this_peer_finished_flag.item() == 0.0:
+                break
+
+        cur_len = input_ids.shape[-1]
+
+        # propose the speculative tokens
+        candidate_input_ids, candidate_logits = candidate_generator.get_candidates(
+            input_ids
+        )
+        candidate_input_ids = candidate_input_ids[:, : max(max_len - 1, cur_len)]
+        candidate_length = candidate_input_ids.shape[1] - cur_len
+        if candidate_logits is not None:
+            candidate_logits = candidate_logits[:, :candidate_length]
+
+        # verify them in a single forward of the target model
+        logits, past_key_values = _forward_uncached_tokens(
+            self, candidate_input_ids, past_key_values, attention_mask, ipex_optimized
+        )
+        new_logits = logits[:, -candidate_length - 1 :].float()
+        for i in range(candidate_length + 1):
+            new_logits[:, i, :] = logits_processor(
+                candidate_input_ids[:, : cur_len + i], new_logits[:, i, :]
+            )
+            if do_sample:
+                new_logits[:, i, :] = logits_warper(
+                    candidate_input_ids[:, : cur_len + i], new_logits[:, i, :]
+                )
+
+        if synced_gpus and this_peer_finished:
+            continue  # don't waste resources running the code we don't need
+
+        # select the accepted tokens
+        if do_sample and candidate_logits is not None:
+            valid_tokens, n_matches = _speculative_sampling(
+                candidate_input_ids, candidate_logits, candidate_length, new_logits
+            )
+        else:
+            if do_sample:
+                probs = new_logits.softmax(dim=-1)
+                selected_tokens = torch.multinomial(probs[0], num_samples=1).squeeze(1)[
+                    None, :
+                ]
+            else:
+                selected_tokens = new_logits.argmax(dim=-1)
+            candidate_new_tokens = candidate_input_ids[:, cur_len:]
+            n_matches = int(
+                (
+                    (~(candidate_new_tokens == selected_tokens[:, :-1])).cumsum(dim=-1)
+                    < 1
+                ).sum()
+            )
+            valid_tokens = selected_tokens[:, : n_matches + 1]
+
+        # nothing is generated after the first eos token
+        if eos_token_id_tensor is not None:
+            is_eos = torch.isin(valid_tokens[0], eos_token_id_tensor)
+            if is_eos.any():
+                valid_tokens = valid_tokens[:, : int(is_eos.nonzero()[0]) + 1]
+        num_new_tokens = valid_tokens.shape[-1]
+
+        # update generated ids, roll the cache back to the accepted tokens
+        input_ids = torch.cat((input_ids, valid_tokens), dim=-1)
+        if streamer is not None:
+            streamer.put(valid_tokens.cpu())
+        new_cur_len = input_ids.shape[-1]
+        past_key_values = _crop_past_key_values(past_key_values, new_cur_len - 1)
+        if attention_mask is not None:
+            attention_mask = torch.cat(
+                [
+                    attention_mask,
+                    attention_mask.new_ones(
+                        (
+                            attention_mask.shape[0],
+                            new_cur_len - attention_mask.shape[-1],
+                        )
+                    ),
+                ],
+                dim=-1,
+            )
+        candidate_generator.update_candidate_strategy(input_ids, new_logits, n_matches)
+
+        if return_dict_in_generate and output_scores:
+            scores += tuple(new_logits[:, i, :] for i in range(num_new_tokens))
+
+        # the step latency is spread over the tokens it generated
+        step_latency = time.time() - tic
+        latency_list.extend([step_latency / num_new_tokens] * num_new_tokens)
+
+        # stop when the sentence is finished, or if we exceed the maximum length
+        finished = eos_token_id_tensor is not None and bool(
+            torch.isin(valid_tokens[0, -1], eos_token_id_tensor)
+        )
+        if finished or stopping_criteria(input_ids, scores):
+            if not synced_gpus:
+                break
+            else:
+                this_peer_finished = True
+
+    if streamer is not None:
+        streamer.end()
+
+    if return_dict_in_generate:
+        output_type = (
+            SampleDecoderOnlyOutput if do_sample else GreedySearchDecoderOnlyOutput
+        )
+        output_result = output_type(sequences=input_ids, scores=scores)
+    else:
+        output_result = input_ids
+
+    if token_latency:
+        return (output_result, latency_list)
+    else:
+        return output_result
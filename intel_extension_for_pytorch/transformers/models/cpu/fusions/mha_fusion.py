@@ -369,13 +369,23 @@ class _IPEXPagedAttentionCPU:
             alibi_slopes,
         )
 
+    @classmethod
+    def copy_blocks(cls, key_caches, value_caches, block_mapping):
+        # key_caches/value_caches: list of [num_blocks, block_size, num_heads, head_size]
+        # block_mapping: [num_pairs, 2], every row is a (src, dst) block pair
+        src = block_mapping[:, 0]
+        dst = block_mapping[:, 1]
+        for key_cache, value_cache in zip(key_caches, value_caches):
+            key_cache.index_copy_(0, dst, key_cache.index_select(0, src))
+            value_cache.index_copy_(0, dst, value_cache.index_select(0, src))
+
 
 class _IPEXVarlenScaledDotProductCPU(nn.Module):
     def __init__(self):
         super().__init__()
 
     @classmethod
-    def apply_functions(
+    def apply_function(
         cls,
         query,  # [total_q, num_head, head_size]
         key,  # [total_k, num_head_k, head_size]
@@ -395,62 +405,44 @@ class _IPEXVarlenScaledDotProductCPU(nn.Module):
         assert return_softmax is False, "ipex do not support return_softmax option"
         assert gen_ is None, "ipex do not support custom random generator"
         assert zero_tensors is False, "ipex varlen_fwd do not support zero tensors"
-        total_q, num_head, head_size = query.size()
-        total_k, num_head_k, _ = key.size()
-        batch_size = seqlen_q.size(0) - 1
-        seqlen_q_ = seqlen_q.clone()
-        seqlen_q_[:batch_size] = seqlen_q[1:]
-        seqlen_q = (seqlen_q_ - seqlen_q)[:batch_size]
-        seqlen_k_ = seqlen_k.clone()
-        seqlen_k_[:batch_size] = seqlen_k[1:]
-        seqlen_k = (seqlen_k_ - seqlen_k)[:batch_size]
-
-        pad_q = torch.zeros(
-            [batch_size, max_seqlen_q, num_head, head_size],
-            dtype=query.dtype,
-            device=query.device,
-        )
-        pad_k = torch.zeros(
-            [batch_size, max_seqlen_k, num_head_k, head_size],
-            dtype=key.dtype,
-            device=key.device,
-        )
-        pad_v = torch.zeros(
-            [batch_size, max_seqlen_k, num_head_k, head_size],
-            dtype=value.dtype,
-            device=value.device,
-        )
-        q_mask = torch.arange(0, max_seqlen_q, device=query.device)[None, :].repeat(
-            batch_size, 1
-        )
-        q_mask = q_mask < seqlen_q[:, None].repeat(1, q_mask.size(-1))
-        k_mask = torch.arange(0, max_seqlen_k, device=key.device)[None, :].repeat(
-            batch_size, 1
-        )
-        k_mask = k_mask < seqlen_k[:, None].repeat(1, k_mask.size(-1))
-        align_mask_seqlen = max_seqlen_k
-        attn_mask = torch.empty(
-            [batch_size, 1, 1, align_mask_seqlen],
-            dtype=query.dtype,
-            device=query.device,
-        ).fill_(float("-inf"))
-        attn_mask[:, :, :, :max_seqlen_k].masked_fill_(k_mask[:, None, None, :], 0)
-
-        pad_q[q_mask] = query
-        pad_k[k_mask] = key
-        pad_v[k_mask] = value
-
-        pad_q = pad_q.permute(0, 2, 1, 3)
-        pad_k = pad_k.permute(0, 2, 1, 3)
-        pad_v = pad_v.permute(0, 2, 1, 3)
-        out_ = torch.nn.functional.scaled_dot_product_attention(
-            pad_q,
-            pad_k,
-            pad_v,
-            attn_mask=attn_mask if not is_causal else None,
-            is_causal=is_causal,
-        )
-        out.copy_(out_.transpose(1, 2).reshape(-1, out.shape[-2], out.shape[-1]))
+        num_head = query.size(1)
+        num_head_k = key.size(1)
+        assert (
+            num_head % num_head_k == 0
+        ), "the number of query heads must be a multiple of the number of key/value heads"
+        # The sequences are attended one by one on their own tokens, so no padding (and no FLOPs on padded
+        # positions) is introduced for batches of mixed lengths.
+        cu_seqlens_q = seqlen_q.tolist()
+        cu_seqlens_k = seqlen_k.tolist()
+        for i in range(len(cu_seqlens_q) - 1):
+            q_start, q_end = cu_seqlens_q[i], cu_seqlens_q[i + 1]
+            k_start, k_end = cu_seqlens_k[i], cu_seqlens_k[i + 1]
+            if q_end == q_start:
+                continue
+            q = query[q_start:q_end].transpose(0, 1)
+            k = key[k_start:k_end].transpose(0, 1)
+            v = value[k_start:k_end].transpose(0, 1)
+            if num_head_k != num_head:
+                k = k.repeat_interleave(num_head // num_head_k, dim=0)
+                v = v.repeat_interleave(num_head // num_head_k, dim=0)
+            len_q = q_end - q_start
+            len_k = k_end - k_start
+            attn_mask = None
+            if is_causal and len_q != len_k:
+                # the queries are the last len_q tokens of the sequence (bottom-right aligned causal mask)
+                attn_mask = torch.ones(
+                    len_q, len_k, dtype=torch.bool, device=query.device
+                ).tril(len_k - len_q)
+            out_ = torch.nn.functional.scaled_dot_product_attention(
+                q,
+                k,
+                v,
+                attn_mask=attn_mask,
+                dropout_p=pdropout,
+                is_causal=is_causal and attn_mask is None,
+                scale=softmax_scale,
+            )
+            out[q_start:q_end].copy_(out_.transpose(0, 1))
 
         return out
 
@@ -471,7 +463,7 @@ class _IPEXVarlenScaledDotProductCPU(nn.Module):
         return_softmax,
         gen_,
     ):
-        self.apply_function(
+        return self.apply_function(
             query,
             key,
             value,
@@ -2,6 +2,7 @@ from torch import nn
 from ...cpu.fusions.mha_fusion import (
     _IPEXRopeCPU,
     _IPEXScaleDotProductCPU,
+    _IPEXVarlenScaledDotProductCPU,
 )
 from ...cpu.fusions.linear_fusion import (
     _IPEXConcatLinearCPU,
@@ -55,3 +56,12 @@ class _IPEXAttentionCPU(nn.Module):
         self._IPEXScaleDotProduct = _IPEXScaleDotProductCPU(
             text_max_length=self.text_max_length
         )
+        if self.model_backbone in [
+            "GPTJForCausalLM",
+            "LlamaForCausalLM",
+            "MistralForCausalLM",
+            "FalconForCausalLM",
+            "RWForCausalLM",
+        ]:
+            # attention of packed sequences (cu_seqlens) without padding
+            self._IPEXVarlenScaledDotProduct = _IPEXVarlenScaledDotProductCPU()
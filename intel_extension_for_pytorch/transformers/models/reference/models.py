@@ -1,3 +1,4 @@
+import contextlib
 import torch
 from torch.nn import CrossEntropyLoss
 from typing import Any, Optional, Tuple, Union, List
@@ -11,6 +12,7 @@ from transformers.modeling_outputs import (
 )
 
 from ....utils._logger import logger, WarningType
+from .modules.attentions import _get_varlen_metadata
 import transformers
 
 try:
@@ -41,6 +43,40 @@ num_heads)`.
 """
 
 
+@contextlib.contextmanager
+def _packed_sequences(model, cu_seqlens: Optional[torch.Tensor]):
+    r"""
+    Packed sequence (varlen) prefill: the input of the model is the flattened token stream of all the
+    sequences, of shape [1, total_tokens], and cu_seqlens (shape [batch_size + 1]) holds the cumulative
+    sequence lengths. While the context is active every optimized attention module attends each sequence
+    on its own tokens only, so a batch of mixed lengths runs without padding and dense attention masks.
+    """
+    if cu_seqlens is None:
+        yield None
+        return
+    attentions = [
+        m for m in model.modules() if hasattr(m, "_IPEXVarlenScaledDotProduct")
+    ]
+    if len(attentions) == 0:
+        raise ValueError(
+            "cu_seqlens is only supported by the GPT-J, Llama, Mistral and Falcon models optimized by "
+            "ipex.llm.optimize on CPU"
+        )
+    metadata = _get_varlen_metadata(cu_seqlens)
+    for m in attentions:
+        m.varlen_metadata = metadata
+    try:
+        yield metadata
+    finally:
+        for m in attentions:
+            m.varlen_metadata = None
+
+
+def _get_packed_last_hidden_states(hidden_states, cu_seqlens):
+    # hidden states of the last token of every packed sequence: [1, batch_size, hidden_size]
+    return hidden_states[:, cu_seqlens[1:].long() - 1, :]
+
+
 def GPTJForCausalLM_forward(
     self,
     input_ids: Optional[torch.LongTensor] = None,
@@ -55,20 +91,25 @@ def GPTJForCausalLM_forward(
     output_attentions: Optional[bool] = None,
     output_hidden_states: Optional[bool] = None,
     return_dict: Optional[bool] = False,
+    cu_seqlens: Optional[torch.Tensor] = None,
 ) -> Union[Tuple, CausalLMOutputWithPast]:
-    transformer_outputs = self.transformer(
-        input_ids,
-        past_key_values=past_key_values,
-        attention_mask=attention_mask,
-        token_type_ids=token_type_ids,
-        position_ids=position_ids,
-        head_mask=head_mask,
-        inputs_embeds=inputs_embeds,
-        use_cache=use_cache,
-        output_attentions=output_attentions,
-        output_hidden_states=output_hidden_states,
-        return_dict=False,
-    )
+    if cu_seqlens is not None:
+        # packed sequence prefill, no kv cache is produced
+        use_cache = False
+    with _packed_sequences(self, cu_seqlens):
+        transformer_outputs = self.transformer(
+            input_ids,
+            past_key_values=past_key_values,
+            attention_mask=attention_mask,
+            token_type_ids=token_type_ids,
+            position_ids=position_ids,
+            head_mask=head_mask,
+            inputs_embeds=inputs_embeds,
+            use_cache=use_cache,
+            output_attentions=output_attentions,
+            output_hidden_states=output_hidden_states,
+            return_dict=False,
+        )
     hidden_states = transformer_outputs[0]
 
     # Set device for model parallelism
@@ -80,9 +121,11 @@ def GPTJForCausalLM_forward(
         hasattr(self, "config")
         and hasattr(self.config, "lm_head_generation")
         and self.config.lm_head_generation
-        and hidden_states.size(1) != 1
     ):
-        hidden_states = hidden_states[:, -1:, :]
+        if cu_seqlens is not None:
+            hidden_states = _get_packed_last_hidden_states(hidden_states, cu_seqlens)
+        elif hidden_states.size(1) != 1:
+            hidden_states = hidden_states[:, -1:, :]
 
     # make sure sampling in fp16 works correctly and
     # compute loss in fp32 to match with mesh-tf version
@@ -117,6 +160,7 @@ def LlamaModel_forward(
     output_attentions: Optional[bool] = None,
     output_hidden_states: Optional[bool] = None,
     return_dict: Optional[bool] = None,
+    cu_seqlens: Optional[torch.Tensor] = None,
 ) -> Union[Tuple, BaseModelOutputWithPast]:
     output_attentions = (
         output_attentions
@@ -163,7 +207,10 @@ def LlamaModel_forward(
     if inputs_embeds is None:
         inputs_embeds = self.embed_tokens(input_ids)
 
-    if hasattr(self, "_prepare_decoder_attention_mask"):
+    if cu_seqlens is not None:
+        # packed sequences are attended by the varlen attention, no dense mask is needed
+        attention_mask = None
+    elif hasattr(self, "_prepare_decoder_attention_mask"):
         attention_mask = self._prepare_decoder_attention_mask(
             attention_mask,
             (batch_size, seq_length),
@@ -262,6 +309,7 @@ def LlamaForCausalLM_forward(
     output_attentions: Optional[bool] = None,
     output_hidden_states: Optional[bool] = None,
     return_dict: Optional[bool] = False,
+    cu_seqlens: Optional[torch.Tensor] = None,
 ) -> Union[Tuple, CausalLMOutputWithPast]:
     output_attentions = (
         output_attentions
@@ -275,26 +323,33 @@ def LlamaForCausalLM_forward(
     )
 
     # decoder outputs consists of (dec_features, layer_state, dec_hidden, dec_attn)
-    outputs = self.model(
-        input_ids=input_ids,
-        attention_mask=attention_mask,
-        position_ids=position_ids,
-        past_key_values=past_key_values,
-        inputs_embeds=inputs_embeds,
-        use_cache=use_cache,
-        output_attentions=output_attentions,
-        output_hidden_states=output_hidden_states,
-        return_dict=False,
-    )
+    if cu_seqlens is not None:
+        # packed sequence prefill, no kv cache is produced
+        use_cache = False
+    with _packed_sequences(self, cu_seqlens):
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=past_key_values,
+            inputs_embeds=inputs_embeds,
+            use_cache=use_cache,
+            output_attentions=output_attentions,
+            output_hidden_states=output_hidden_states,
+            return_dict=False,
+            cu_seqlens=cu_seqlens,
+        )
 
     hidden_states = outputs[0]
     if (
         hasattr(self, "config")
         and hasattr(self.config, "lm_head_generation")
         and self.config.lm_head_generation
-        and hidden_states.size(1) != 1
     ):
-        hidden_states = hidden_states[:, -1:, :]
+        if cu_seqlens is not None:
+            hidden_states = _get_packed_last_hidden_states(hidden_states, cu_seqlens)
+        elif hidden_states.size(1) != 1:
+            hidden_states = hidden_states[:, -1:, :]
 
     logits = self.lm_head(hidden_states)
 
@@ -512,41 +567,48 @@ def FalconForCausalLM_forward(
     output_attentions: Optional[bool] = None,
     output_hidden_states: Optional[bool] = None,
     return_dict: Optional[bool] = False,
+    cu_seqlens: Optional[torch.Tensor] = None,
 ) -> Union[Tuple[torch.Tensor], CausalLMOutputWithCrossAttentions]:
-    if position_ids is None:
-        transformer_outputs = self.transformer(
-            input_ids,
-            past_key_values=past_key_values,
-            attention_mask=attention_mask,
-            head_mask=head_mask,
-            inputs_embeds=inputs_embeds,
-            use_cache=use_cache,
-            output_attentions=output_attentions,
-            output_hidden_states=output_hidden_states,
-            return_dict=False,
-        )
-    else:
-        transformer_outputs = self.transformer(
-            input_ids,
-            past_key_values=past_key_values,
-            attention_mask=attention_mask,
-            position_ids=position_ids,
-            head_mask=head_mask,
-            inputs_embeds=inputs_embeds,
-            use_cache=use_cache,
-            output_attentions=output_attentions,
-            output_hidden_states=output_hidden_states,
-            return_dict=False,
-        )
+    if cu_seqlens is not None:
+        # packed sequence prefill, no kv cache is produced
+        use_cache = False
+    with _packed_sequences(self, cu_seqlens):
+        if position_ids is None:
+            transformer_outputs = self.transformer(
+                input_ids,
+                past_key_values=past_key_values,
+                attention_mask=attention_mask,
+                head_mask=head_mask,
+                inputs_embeds=inputs_embeds,
+                use_cache=use_cache,
+                output_attentions=output_attentions,
+                output_hidden_states=output_hidden_states,
+                return_dict=False,
+            )
+        else:
+            transformer_outputs = self.transformer(
+                input_ids,
+                past_key_values=past_key_values,
+                attention_mask=attention_mask,
+                position_ids=position_ids,
+                head_mask=head_mask,
+                inputs_embeds=inputs_embeds,
+                use_cache=use_cache,
+                output_attentions=output_attentions,
+                output_hidden_states=output_hidden_states,
+                return_dict=False,
+            )
     hidden_states = transformer_outputs[0]
 
     if (
         hasattr(self, "config")
         and hasattr(self.config, "lm_head_generation")
         and self.config.lm_head_generation
-        and hidden_states.size(1) != 1
     ):
-        hidden_states = hidden_states[:, -1:, :]
+        if cu_seqlens is not None:
+            hidden_states = _get_packed_last_hidden_states(hidden_states, cu_seqlens)
+        elif hidden_states.size(1) != 1:
+            hidden_states = hidden_states[:, -1:, :]
 
     lm_logits = self.lm_head(hidden_states)
 
@@ -1317,6 +1379,7 @@ def MistralModel_forward(
     output_attentions: Optional[bool] = None,
     output_hidden_states: Optional[bool] = None,
     return_dict: Optional[bool] = None,
+    cu_seqlens: Optional[torch.Tensor] = None,
 ) -> Union[Tuple, BaseModelOutputWithPast]:
     output_attentions = (
         output_attentions
@@ -1384,7 +1447,10 @@ def MistralModel_forward(
                 " call `tokenizer.padding_side  = 'left'` before tokenizing the input. "
             )
 
-    if hasattr(self, "_prepare_decoder_attention_mask"):
+    if cu_seqlens is not None:
+        # packed sequences are attended by the varlen attention, no dense mask is needed
+        attention_mask = None
+    elif hasattr(self, "_prepare_decoder_attention_mask"):
         attention_mask = self._prepare_decoder_attention_mask(
             attention_mask,
             (batch_size, seq_length),
@@ -1484,6 +1550,7 @@ def MistralForCausalLM_forward(
     output_attentions: Optional[bool] = None,
     output_hidden_states: Optional[bool] = None,
     return_dict: Optional[bool] = False,
+    cu_seqlens: Optional[torch.Tensor] = None,
 ) -> Union[Tuple, CausalLMOutputWithPast]:
     output_attentions = (
         output_attentions
@@ -1497,26 +1564,33 @@ def MistralForCausalLM_forward(
     )
 
     # decoder outputs consists of (dec_features, layer_state, dec_hidden, dec_attn)
-    outputs = self.model(
-        input_ids=input_ids,
-        attention_mask=attention_mask,
-        position_ids=position_ids,
-        past_key_values=past_key_values,
-        inputs_embeds=inputs_embeds,
-        use_cache=use_cache,
-        output_attentions=output_attentions,
-        output_hidden_states=output_hidden_states,
-        return_dict=False,
-    )
+    if cu_seqlens is not None:
+        # packed sequence prefill, no kv cache is produced
+        use_cache = False
+    with _packed_sequences(self, cu_seqlens):
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=past_key_values,
+            inputs_embeds=inputs_embeds,
+            use_cache=use_cache,
+            output_attentions=output_attentions,
+            output_hidden_states=output_hidden_states,
+            return_dict=False,
+            cu_seqlens=cu_seqlens,
+        )
 
     hidden_states = outputs[0]
     if (
         hasattr(self, "config")
         and hasattr(self.config, "lm_head_generation")
         and self.config.lm_head_generation
-        and hidden_states.size(1) != 1
     ):
-        hidden_states = hidden_states[:, -1:, :]
+        if cu_seqlens is not None:
+            hidden_states = _get_packed_last_hidden_states(hidden_states, cu_seqlens)
+        elif hidden_states.size(1) != 1:
+            hidden_states = hidden_states[:, -1:, :]
     logits = self.lm_head(hidden_states)
     logits = logits.float()
 
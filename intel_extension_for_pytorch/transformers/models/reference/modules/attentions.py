@@ -1,6 +1,6 @@
 import torch
 from torch import nn
-from typing import Optional, Tuple, Union, List
+from typing import NamedTuple, Optional, Tuple, Union, List
 import math
 from ...reference.fusions.mha_fusion import (
     _IPEXRopeRef,
@@ -26,6 +26,8 @@ def _GPTJAttention_forward(
     Tuple[torch.Tensor, Tuple[torch.Tensor]],
     Optional[Tuple[torch.Tensor, Tuple[torch.Tensor], Tuple[torch.Tensor, ...]]],
 ]:
+    if self.varlen_metadata is not None:
+        position_ids = self.varlen_metadata.position_ids
     concat_qkv = None
     if hasattr(self, "concat_qkv"):
         concat_qkv = self.concat_qkv(hidden_states)
@@ -67,11 +69,25 @@ def _GPTJAttention_forward(
             1,
             64,
         )
-        if use_cache:
+        if use_cache or self.varlen_metadata is not None:
             value = self._split_heads(
                 value, self.num_attention_heads, self.head_dim, True
             )
 
+    if self.varlen_metadata is not None:
+        attn_output = _varlen_attention(
+            self, query, key, value, 1 / self.scale_attn_value
+        )
+        attn_output = attn_output.reshape(
+            hidden_states.size(0), hidden_states.size(1), -1
+        )
+        attn_output = self.out_proj(attn_output)
+        attn_output = self.resid_dropout(attn_output)
+        outputs = (attn_output, None)
+        if output_attentions:
+            outputs += (None,)
+        return outputs
+
     if use_cache:
         (
             attn_output,
@@ -122,6 +138,57 @@ def _repeat_kv(hidden_states: torch.Tensor, n_rep: int) -> torch.Tensor:
     return hidden_states.reshape(batch, num_key_value_heads * n_rep, slen, head_dim)
 
 
+class _VarlenMetadata(NamedTuple):
+    r"""
+    Describes a packed (varlen) batch: the tokens of all the sequences are flattened into one stream of
+    shape [1, total_tokens] and the i-th sequence spans tokens [cu_seqlens[i], cu_seqlens[i + 1]).
+    """
+
+    cu_seqlens: torch.Tensor  # [batch_size + 1], int32
+    max_seqlen: int
+    position_ids: torch.Tensor  # [1, total_tokens], positions restart at 0 for every sequence
+
+
+def _get_varlen_metadata(cu_seqlens: torch.Tensor) -> _VarlenMetadata:
+    cu_seqlens = cu_seqlens.to(torch.int32)
+    seqlens = (cu_seqlens[1:] - cu_seqlens[:-1]).long()
+    position_ids = torch.arange(
+        int(cu_seqlens[-1]), dtype=torch.long, device=cu_seqlens.device
+    ) - torch.repeat_interleave(cu_seqlens[:-1].long(), seqlens)
+    return _VarlenMetadata(cu_seqlens, int(seqlens.max()), position_ids.unsqueeze(0))
+
+
+def _varlen_attention(self, query, key, value, softmax_scale):
+    # query: [1, total_tokens, num_heads, head_dim]
+    # key, value: [1, total_tokens, num_kv_heads, head_dim]
+    # out: [total_tokens, num_heads, head_dim]
+    assert hasattr(
+        self, "_IPEXVarlenScaledDotProduct"
+    ), "packed sequences (cu_seqlens) are only supported by the CPU optimized attention"
+    metadata = self.varlen_metadata
+    query = query.reshape(-1, query.size(-2), query.size(-1))
+    key = key.reshape(-1, key.size(-2), key.size(-1))
+    value = value.reshape(-1, value.size(-2), value.size(-1))
+    out = torch.empty_like(query)
+    self._IPEXVarlenScaledDotProduct.apply_function(
+        query,
+        key,
+        value,
+        out,
+        metadata.cu_seqlens,
+        metadata.cu_seqlens,
+        metadata.max_seqlen,
+        metadata.max_seqlen,
+        0.0,
+        softmax_scale,
+        False,
+        True,
+        False,
+        None,
+    )
+    return out
+
+
 def _LlamaAttention_forward(
     self,
     hidden_states: torch.Tensor,
@@ -143,6 +210,9 @@ def _LlamaAttention_forward(
     kv_seq_len = (
         q_len + past_key_value[0].size(-2) if past_key_value is not None else q_len
     )
+    if self.varlen_metadata is not None:
+        position_ids = self.varlen_metadata.position_ids
+        kv_seq_len = self.varlen_metadata.max_seqlen
 
     if concat_qkv is not None and type(concat_qkv) is not tuple:
         query, key, value = self._IPEXROPE(
@@ -180,6 +250,13 @@ def _LlamaAttention_forward(
             kv_seq_len,
         )
 
+    if self.varlen_metadata is not None:
+        attn_output = _varlen_attention(
+            self, query, key, value, 1 / math.sqrt(self.head_dim)
+        )
+        attn_output = attn_output.reshape(bsz, q_len, self.hidden_size)
+        return attn_output, None, None
+
     if use_cache:
         (attn_output, attn_weights, past_key_value) = self._IPEXScaleDotProduct(
             query,
@@ -410,13 +487,19 @@ def _FalconAttention_forward(
         batch_size, query_length, _ = fused_qkv.shape
 
     past_kv_length = 0 if layer_past is None else layer_past[0].shape[1]
+    rope_position_ids = torch.tensor(past_kv_length)
+    if self.varlen_metadata is not None:
+        assert self.rotary, "packed sequences are not supported with alibi"
+        rope_position_ids = self.varlen_metadata.position_ids
 
     if self.rotary:
         seq_len = query_length + past_kv_length
+        if self.varlen_metadata is not None:
+            seq_len = self.varlen_metadata.max_seqlen
         if self.new_decoder_architecture:
             key_layer = self._IPEXROPE(
                 key_layer,
-                torch.tensor(past_kv_length),
+                rope_position_ids,
                 num_kv_heads,
                 self.head_dim,
                 self.head_dim // 2,
@@ -425,7 +508,7 @@ def _FalconAttention_forward(
             )
             query_layer = self._IPEXROPE(
                 query_layer,
-                torch.tensor(past_kv_length),
+                rope_position_ids,
                 self.num_heads,
                 self.head_dim,
                 self.head_dim // 2,
@@ -435,7 +518,7 @@ def _FalconAttention_forward(
         else:
             query_layer, key_layer, value_layer = self._IPEXROPE(
                 fused_qkv,
-                torch.tensor(past_kv_length),
+                rope_position_ids,
                 self.num_heads,
                 self.head_dim,
                 self.head_dim // 2,
@@ -443,6 +526,18 @@ def _FalconAttention_forward(
                 seq_len,
                 3,
             )
+    if self.varlen_metadata is not None:
+        attn_output = _varlen_attention(
+            self, query_layer, key_layer, value_layer, self.inv_norm_factor
+        )
+        attn_output = attn_output.reshape(
+            batch_size, query_length, self.num_heads * self.head_dim
+        )
+        output_tensor = self.dense(attn_output)
+        if output_attentions:
+            return output_tensor, None, None
+        return output_tensor, None
+
     attention_mask_float = (
         (attention_mask * 1.0)
         .masked_fill(attention_mask.to(torch.bool), float("-1e9"))
@@ -1017,6 +1112,9 @@ def _MistralAttention_forward(
     kv_seq_len = (
         q_len + past_key_value[0].size(-2) if past_key_value is not None else q_len
     )
+    if self.varlen_metadata is not None:
+        position_ids = self.varlen_metadata.position_ids
+        kv_seq_len = self.varlen_metadata.max_seqlen
 
     if concat_qkv is not None and type(concat_qkv) is not tuple:
         query, key, value = self._IPEXROPE(
@@ -1054,6 +1152,21 @@ def _MistralAttention_forward(
             kv_seq_len,
         )
 
+    if self.varlen_metadata is not None:
+        sliding_window = (
+            getattr(self.config, "sliding_window", None)
+            if hasattr(self, "config")
+            else None
+        )
+        assert (
+            sliding_window is None or self.varlen_metadata.max_seqlen <= sliding_window
+        ), "packed sequences longer than the sliding window are not supported"
+        attn_output = _varlen_attention(
+            self, query, key, value, 1 / math.sqrt(self.head_dim)
+        )
+        attn_output = attn_output.reshape(bsz, q_len, self.hidden_size)
+        return attn_output, None, None
+
     if use_cache:
         (attn_output, attn_weights, past_key_value) = self._IPEXScaleDotProduct(
             query,
@@ -1941,6 +2054,8 @@ class _IPEXAttentionRef(nn.Module):
                 del module.q_proj, module.k_proj, module.v_proj
 
         self._IPEXScaleDotProduct = _IPEXScaleDotProductRef(module, config)
+        # set by the packed sequence (cu_seqlens) prefill of the model forward
+        self.varlen_metadata = None
 
         if (
             self.model_backbone == "FalconForCausalLM"
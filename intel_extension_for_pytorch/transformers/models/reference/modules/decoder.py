@@ -36,15 +36,24 @@ def LlamaDecoderLayer_forward(
         output_attentions=output_attentions,
         use_cache=use_cache,
     )
-    if not self.distributed:
-        hidden_states = self.mha_linear_add(hidden_states, residual)
+    if self.distributed and getattr(
+        self.self_attn.o_proj, "reduce_scatter_norm", False
+    ):
+        # the all-reduce of o_proj is split into a reduce-scatter and an
+        # all-gather around the residual add and the norm
+        hidden_states, residual = self.self_attn.o_proj.forward_norm(
+            hidden_states, residual, self.post_attention_layernorm
+        )
     else:
-        hidden_states = self.self_attn.o_proj(hidden_states)
-        hidden_states = residual + hidden_states
+        if not self.distributed:
+            hidden_states = self.mha_linear_add(hidden_states, residual)
+        else:
+            hidden_states = self.self_attn.o_proj(hidden_states)
+            hidden_states = residual + hidden_states
 
-    # Fully Connected
-    residual = hidden_states
-    hidden_states = self.post_attention_layernorm(hidden_states)
+        # Fully Connected
+        residual = hidden_states
+        hidden_states = self.post_attention_layernorm(hidden_states)
 
     mlp_gate = self.linear_silu_mul(hidden_states)
 
@@ -331,15 +340,24 @@ def BaichuanDecoder_forward(
         output_attentions=output_attentions,
         use_cache=use_cache,
     )
-    if not self.distributed:
-        hidden_states = self.mha_linear_add(hidden_states, residual)
+    if self.distributed and getattr(
+        self.self_attn.o_proj, "reduce_scatter_norm", False
+    ):
+        # the all-reduce of o_proj is split into a reduce-scatter and an
+        # all-gather around the residual add and the norm
+        hidden_states, residual = self.self_attn.o_proj.forward_norm(
+            hidden_states, residual, self.post_attention_layernorm
+        )
     else:
-        hidden_states = self.self_attn.o_proj(hidden_states)
-        hidden_states = residual + hidden_states
+        if not self.distributed:
+            hidden_states = self.mha_linear_add(hidden_states, residual)
+        else:
+            hidden_states = self.self_attn.o_proj(hidden_states)
+            hidden_states = residual + hidden_states
 
-    # Fully Connected
-    residual = hidden_states
-    hidden_states = self.post_attention_layernorm(hidden_states)
+        # Fully Connected
+        residual = hidden_states
+        hidden_states = self.post_attention_layernorm(hidden_states)
 
     mlp_gate = self.linear_silu_mul(hidden_states)
     if not self.distributed:
@@ -663,15 +681,24 @@ def MistralDecoderLayer_forward(
         output_attentions=output_attentions,
         use_cache=use_cache,
     )
-    if not self.distributed:
-        hidden_states = self.mha_linear_add(hidden_states, residual)
+    if self.distributed and getattr(
+        self.self_attn.o_proj, "reduce_scatter_norm", False
+    ):
+        # the all-reduce of o_proj is split into a reduce-scatter and an
+        # all-gather around the residual add and the norm
+        hidden_states, residual = self.self_attn.o_proj.forward_norm(
+            hidden_states, residual, self.post_attention_layernorm
+        )
     else:
-        hidden_states = self.self_attn.o_proj(hidden_states)
-        hidden_states = residual + hidden_states
+        if not self.distributed:
+            hidden_states = self.mha_linear_add(hidden_states, residual)
+        else:
+            hidden_states = self.self_attn.o_proj(hidden_states)
+            hidden_states = residual + hidden_states
 
-    # Fully Connected
-    residual = hidden_states
-    hidden_states = self.post_attention_layernorm(hidden_states)
+        # Fully Connected
+        residual = hidden_states
+        hidden_states = self.post_attention_layernorm(hidden_states)
 
     mlp_gate = self.linear_silu_mul(hidden_states)
 
@@ -738,15 +765,24 @@ def MixtralDecoderLayer_forward(
         output_attentions=output_attentions,
         use_cache=use_cache,
     )
-    if not self.distributed:
-        hidden_states = self.mha_linear_add(hidden_states, residual)
+    if self.distributed and getattr(
+        self.self_attn.o_proj, "reduce_scatter_norm", False
+    ):
+        # the all-reduce of o_proj is split into a reduce-scatter and an
+        # all-gather around the residual add and the norm
+        hidden_states, residual = self.self_attn.o_proj.forward_norm(
+            hidden_states, residual, self.post_attention_layernorm
+        )
     else:
-        hidden_states = self.self_attn.o_proj(hidden_states)
-        hidden_states = residual + hidden_states
+        if not self.distributed:
+            hidden_states = self.mha_linear_add(hidden_states, residual)
+        else:
+            hidden_states = self.self_attn.o_proj(hidden_states)
+            hidden_states = residual + hidden_states
 
-    # Fully Connected
-    residual = hidden_states
-    hidden_states = self.post_attention_layernorm(hidden_states)
+        # Fully Connected
+        residual = hidden_states
+        hidden_states = self.post_attention_layernorm(hidden_states)
 
     # hidden_states, router_logits = self.block_sparse_moe(hidden_states)
 
@@ -769,56 +805,46 @@ def MixtralDecoderLayer_forward(
         device=hidden_states.device,
     )
 
-    # One hot encode the selected experts to create an expert mask
-    # this will be used to easily index which expert is going to be sollicitated
-    expert_mask = torch.nn.functional.one_hot(
-        selected_experts, num_classes=self.block_sparse_moe.num_experts
-    ).permute(2, 1, 0)
-
-    # Loop over all available experts in the model and perform the computation on each expert
-    for expert_idx in range(self.block_sparse_moe.num_experts):
-        expert_layer = self.block_sparse_moe.experts[expert_idx]
-        idx, top_x = torch.where(expert_mask[expert_idx])
-        if expert_layer.w1.weight.dtype in [torch.qint8, torch.int8, torch.uint8]:
-            final_hidden_states = torch.ops.torch_ipex.mixtral_moe_woq(
-                hidden_states,
-                top_x,
-                idx,
-                expert_layer.w1._op_context.get_data_handle(),
-                expert_layer.w3._op_context.get_data_handle(),
-                expert_layer.w2._op_context.get_data_handle(),
-                routing_weights,
-                final_hidden_states,
-            )
-        elif hasattr(expert_layer.w1, "use_dnnl") and expert_layer.w1.use_dnnl:
-            final_hidden_states = torch.ops.torch_ipex.mixtral_moe(
-                hidden_states,
-                top_x,
-                idx,
-                expert_layer.w1._get_forward_weight(),
-                expert_layer.w1.ctx.get_data_handle(),
-                expert_layer.w3._get_forward_weight(),
-                expert_layer.w3.ctx.get_data_handle(),
-                expert_layer.w2._get_forward_weight(),
-                expert_layer.w2.ctx.get_data_handle(),
-                hasattr(expert_layer.w1, "use_dnnl") and expert_layer.w1.use_dnnl,
-                routing_weights,
-                final_hidden_states,
-            )
-        else:
-            final_hidden_states = torch.ops.torch_ipex.mixtral_moe_tpp(
-                hidden_states,
-                top_x,
-                idx,
-                expert_layer.w1.weight,
-                expert_layer.w3.weight,
-                expert_layer.w2.weight,
-                expert_layer.w1.tpp_fallback
-                if hasattr(expert_layer.w1, "tpp_fallback")
-                else True,
-                routing_weights,
-                final_hidden_states,
-            )
+    # The grouped ops sort the tokens by expert once, skip the experts which got no token
+    # and run the MLP of every other expert on its contiguous token slice
+    experts = self.block_sparse_moe.experts
+    if experts[0].w1.weight.dtype in [torch.qint8, torch.int8, torch.uint8]:
+        final_hidden_states = torch.ops.torch_ipex.mixtral_moe_woq_grouped(
+            hidden_states,
+            selected_experts,
+            routing_weights,
+            [e.w1._op_context.get_data_handle() for e in experts],
+            [e.w3._op_context.get_data_handle() for e in experts],
+            [e.w2._op_context.get_data_handle() for e in experts],
+            final_hidden_states,
+        )
+    elif hasattr(experts[0].w1, "use_dnnl") and experts[0].w1.use_dnnl:
+        final_hidden_states = torch.ops.torch_ipex.mixtral_moe_grouped(
+            hidden_states,
+            selected_experts,
+            routing_weights,
+            [e.w1._get_forward_weight() for e in experts],
+            [e.w1.ctx.get_data_handle() for e in experts],
+            [e.w3._get_forward_weight() for e in experts],
+            [e.w3.ctx.get_data_handle() for e in experts],
+            [e.w2._get_forward_weight() for e in experts],
+            [e.w2.ctx.get_data_handle() for e in experts],
+            True,
+            final_hidden_states,
+        )
+    else:
+        final_hidden_states = torch.ops.torch_ipex.mixtral_moe_tpp_grouped(
+            hidden_states,
+            selected_experts,
+            routing_weights,
+            [e.w1.weight for e in experts],
+            [e.w3.weight for e in experts],
+            [e.w2.weight for e in experts],
+            experts[0].w1.tpp_fallback
+            if hasattr(experts[0].w1, "tpp_fallback")
+            else True,
+            final_hidden_states,
+        )
     final_hidden_states = final_hidden_states.reshape(
         batch_size, sequence_length, hidden_dim
     )
@@ -11,9 +11,11 @@ import intel_extension_for_pytorch as ipex
 from ..utils.weight_only_quantization import (
     _is_woq_qconfig,
     _convert_woq_with_low_precision_checkpoint,
+    load_woq_packed_checkpoint,
 )
 
 from .tensor_parallel import (
+    get_tp_sharded_linears,
     shard_lm_head_weights,
     shard_mha_weights,
     shard_mlp_weights,
@@ -87,6 +89,34 @@ def _set_optimized_model_for_generation(
     return model
 
 
+def _trace_and_freeze(_model, sample_inputs, dtype, graph_cache_dir=None):
+    from ..cpu.graph_cache import get_graph_cache, get_graph_cache_key
+
+    graph_cache = get_graph_cache(graph_cache_dir)
+    cache_key = None
+    if graph_cache is not None:
+        cache_key = get_graph_cache_key(
+            _model, sample_inputs, dtype, extra="ipex.llm.optimize"
+        )
+        trace_model = graph_cache.load(cache_key)
+        if trace_model is not None:
+            return trace_model
+    with torch.no_grad(), torch.cpu.amp.autocast(
+        enabled=True if dtype in [torch.bfloat16, torch.half] else False,
+        dtype=dtype,
+    ):
+        trace_model = torch.jit.trace(
+            _model,
+            example_kwarg_inputs=sample_inputs,
+            strict=False,
+            check_trace=False,
+        )
+        trace_model = torch.jit.freeze(trace_model)
+    if cache_key is not None:
+        graph_cache.save(cache_key, trace_model)
+    return trace_model
+
+
 def check_transformers_for_llm_support():
     installed_pkg = {pkg.key for pkg in pkg_resources.working_set}
     min_version = "4.28.1"
@@ -115,7 +145,27 @@ def check_transformers_for_llm_support():
         )
 
 
-def model_convert_reference(_model):
+def _tensor_parallel_classes():
+    # The attention, MLP and causal LM classes sharded by ipex tensor parallel
+    import transformers
+
+    return (
+        [
+            transformers.models.llama.modeling_llama.LlamaAttention,
+            transformers.models.gptj.modeling_gptj.GPTJAttention,
+        ],
+        [
+            transformers.models.llama.modeling_llama.LlamaMLP,
+            transformers.models.gptj.modeling_gptj.GPTJMLP,
+        ],
+        [
+            transformers.models.llama.modeling_llama.LlamaForCausalLM,
+            transformers.models.gptj.modeling_gptj.GPTJForCausalLM,
+        ],
+    )
+
+
+def model_convert_reference(_model, checkpoint=None):
     import transformers
     from packaging import version
 
@@ -128,6 +178,8 @@ def model_convert_reference(_model):
         _greedy_search,
         _sample,
         _beam_sample,
+        _assisted_decoding,
+        _get_candidate_generator,
     )
 
     # model wise optimization for MHA module
@@ -199,6 +251,8 @@ def model_convert_reference(_model):
     convert_function(_model, "greedy_search", _greedy_search)
     convert_function(_model, "sample", _sample)
     convert_function(_model, "beam_sample", _beam_sample)
+    convert_function(_model, "assisted_decoding", _assisted_decoding)
+    convert_function(_model, "_get_candidate_generator", _get_candidate_generator)
     convert_function(
         _model,
         "_extract_past_from_model_output",
@@ -338,6 +392,7 @@ def model_convert_reference(_model):
         # distributed uses default False
         pass
     need_ipex_tp = False
+    tp_mha_classes, tp_mlp_classes, tp_model_classes = _tensor_parallel_classes()
     if _model.device.type == "cpu":
         from ..cpu import comm as ipex_comm
 
@@ -362,10 +417,7 @@ def model_convert_reference(_model):
         transformers.models.gpt_bigcode.modeling_gpt_bigcode.GPTBigCodeAttention,
         transformers.models.t5.modeling_t5.T5Attention,
     ]:
-        if need_ipex_tp and supported_mha_class in [
-            transformers.models.llama.modeling_llama.LlamaAttention,
-            transformers.models.gptj.modeling_gptj.GPTJAttention,
-        ]:
+        if need_ipex_tp and supported_mha_class in tp_mha_classes:
             num_heads = _model.config.num_attention_heads
             num_kv_heads = num_heads
             for name in ["num_key_value_heads"]:
@@ -380,6 +432,7 @@ def model_convert_reference(_model):
                 head_dim,
                 rank,
                 world_size,
+                checkpoint,
             )
 
         convert_class(
@@ -390,10 +443,7 @@ def model_convert_reference(_model):
             distributed=distributed,
         )
     if need_ipex_tp:
-        for supported_mlp_class in [
-            transformers.models.llama.modeling_llama.LlamaMLP,
-            transformers.models.gptj.modeling_gptj.GPTJMLP,
-        ]:
+        for supported_mlp_class in tp_mlp_classes:
             shard_mlp_weights(
                 _model,
                 supported_mlp_class,
@@ -402,11 +452,9 @@ def model_convert_reference(_model):
                 head_dim,
                 rank,
                 world_size,
+                checkpoint,
             )
-        for supported_model_class in [
-            transformers.models.llama.modeling_llama.LlamaForCausalLM,
-            transformers.models.gptj.modeling_gptj.GPTJForCausalLM,
-        ]:
+        for supported_model_class in tp_model_classes:
             if isinstance(_model, supported_model_class):
                 shard_lm_head_weights(
                     _model,
@@ -416,6 +464,7 @@ def model_convert_reference(_model):
                     head_dim,
                     rank,
                     world_size,
+                    checkpoint,
                 )
                 update_heads_info(_model, rank, world_size)
 
@@ -919,6 +968,7 @@ def model_convert_lowering(
     deployment_mode,
     is_quantization=False,
     woq=False,
+    graph_cache_dir=None,
 ):
     from .models.reference.modules.attentions import _IPEXAttentionRef
     from .models.reference.modules.decoder import _IPEXDecoderLayerRef
@@ -1025,24 +1075,89 @@ def model_convert_lowering(
                 if sample_inputs is None
                 else sample_inputs
             )
-            with torch.no_grad(), torch.cpu.amp.autocast(
-                enabled=True if dtype in [torch.bfloat16, torch.half] else False,
-                dtype=dtype,
-            ):
-                trace_model = torch.jit.trace(
-                    _model,
-                    example_kwarg_inputs=sample_inputs,
-                    strict=False,
-                    check_trace=False,
-                )
-                trace_model = torch.jit.freeze(trace_model)
-                _model = _set_optimized_model_for_generation(
-                    _model, optimized_model=trace_model
-                )
+            trace_model = _trace_and_freeze(
+                _model, sample_inputs, dtype, graph_cache_dir
+            )
+            _model = _set_optimized_model_for_generation(
+                _model, optimized_model=trace_model
+            )
 
     return _model
 
 
+def model_convert_streaming(
+    _model,
+    checkpoint,
+    device,
+    dtype,
+    sample_inputs,
+    deployment_mode,
+    graph_cache_dir=None,
+):
+    import gc
+    from .streaming import (
+        _StreamingCheckpoint,
+        _get_decoder_layers,
+        _materialize_module,
+    )
+
+    checkpoint = _StreamingCheckpoint(checkpoint)
+    layers_name, layers = _get_decoder_layers(_model)
+    _materialize_module(_model, "", checkpoint, skip=layers)
+    if layers is None:
+        _model = model_convert_reference(_model)
+        return model_convert_lowering(
+            _model,
+            device,
+            dtype,
+            sample_inputs,
+            deployment_mode,
+            graph_cache_dir=graph_cache_dir,
+        )
+
+    # Decoder layers are transplanted one at a time into the model, so that only one
+    # layer has its source weights read while it is converted and prepacked. Modules
+    # outside of the decoder layers are converted with the first layer, converting
+    # them again with the next layers is a no-op.
+    parent_name, _, list_name = layers_name.rpartition(".")
+    converted_layers = []
+    for i in range(len(layers)):
+        layer = layers[i]
+        _materialize_module(layer, f"{layers_name}.{i}.", checkpoint)
+        setattr(
+            _model.get_submodule(parent_name), list_name, torch.nn.ModuleList([layer])
+        )
+        _model = model_convert_reference(_model)
+        _model = model_convert_lowering(_model, device, dtype, None, False)
+        converted_layers.append(
+            getattr(_model.get_submodule(parent_name), list_name)[0]
+        )
+        # Release the source weights of the layer before reading the next one
+        layers[i] = torch.nn.Identity()
+        del layer
+        gc.collect()
+    setattr(
+        _model.get_submodule(parent_name),
+        list_name,
+        torch.nn.ModuleList(converted_layers),
+    )
+    unused_keys = checkpoint.remaining_keys()
+    if unused_keys:
+        logger.debug(f"Weights {unused_keys} of the checkpoint are not used.")
+
+    if deployment_mode:
+        sample_inputs = (
+            get_dummy_input(_model, return_dict=True)
+            if sample_inputs is None
+            else sample_inputs
+        )
+        trace_model = _trace_and_freeze(_model, sample_inputs, dtype, graph_cache_dir)
+        _model = _set_optimized_model_for_generation(
+            _model, optimized_model=trace_model
+        )
+    return _model
+
+
 # TODO: refine this check in other specific path
 def validate_device_avaliable(device: str):
     def error_message(device):
@@ -1073,6 +1188,8 @@ def optimize(
     low_precision_checkpoint=None,
     sample_inputs=None,
     deployment_mode=True,
+    graph_cache_dir=None,
+    checkpoint=None,
 ):
     r"""
     Apply optimizations at Python frontend to the given transformers model (nn.Module).
@@ -1110,11 +1227,30 @@ def optimize(
             Weights shape should be N by K and they are quantized to UINT4 and compressed along K, then stored as
             `torch.int32`. Zero points are also UINT4 and stored as INT32. Scales and bias are floating point values.
             Bias is optional. If bias is not in state dict, bias of the original model is used.
+            It can also be the path (str) of a checkpoint saved by
+            ``intel_extension_for_pytorch.utils.weight_only_quantization.save_woq_packed_checkpoint``,
+            whose packed weights are memory-mapped without being packed again.
             Default value is ``None``.
         sample_inputs (Tuple tensors): sample inputs used for model quantization or torchscript.
             Default value is ``None``, and for well supported model, we provide this sample inputs automaticlly.
         deployment_mode (bool): Whether to apply the optimized model for deployment of model generation.
             It means there is no need to further apply optimization like torchscirpt. Default value is ``True``.
+        graph_cache_dir (str): Directory of the on-disk cache of the TorchScript graph traced with
+            ``deployment_mode``. The frozen graph is saved on the first run and loaded instead of tracing
+            again on the next runs. It is traced again once the model structure, weights, dtype, sample
+            inputs, or IPEX/PyTorch versions change. Default value is ``None``, meaning the
+            ``IPEX_GRAPH_CACHE_DIR`` environment variable is used if set, otherwise no cache.
+        checkpoint (str or list of str): Checkpoint of the weights of ``model`` whose parameters and
+            buffers are created on the meta device, e.g., under ``ipex.OnDevice(device="meta")``.
+            It is a checkpoint file (``torch.save`` or ``.safetensors``), a list of shard files, or the
+            directory of a HuggingFace checkpoint, sharded or not. The decoder layers are read from
+            the checkpoint, converted and prepacked one at a time, and the weights of a layer are
+            released before the next one is read, so that the peak memory stays around the size of
+            the optimized model. Only the meta tensors of ``model`` are loaded from the checkpoint.
+            With tensor parallel, each rank reads only its head or block slices of the sharded linears
+            (attention, MLP and lm_head) from the checkpoint, the other weights are loaded as a whole.
+            With quantization, the whole model is loaded first and optimized as usual.
+            Default value is ``None``.
 
     Returns:
         Optimized model object for model.generate(), also workable with model.forward
@@ -1132,6 +1268,13 @@ def optimize(
         >>> optimized_model = ipex.llm.optimize(model, dtype=torch.bfloat16)
         >>> optimized_model.generate()
 
+        >>> # streaming the weights of a large model from its checkpoint.
+        >>> with ipex.OnDevice(dtype=torch.bfloat16, device="meta"):
+        >>>     model = AutoModelForCausalLM.from_config(config)
+        >>> optimized_model = ipex.llm.optimize(
+        >>>     model.eval(), dtype=torch.bfloat16, checkpoint=PATH
+        >>> )
+
     """
     if isinstance(model, torch.jit.ScriptModule):
         return model
@@ -1221,8 +1364,49 @@ def optimize(
             if _is_woq_qconfig(quantization_config):
                 is_woq = True
 
+        tp_linears = []
+        tp_checkpoint = None
+        if checkpoint is not None:
+            from ..cpu import comm as ipex_comm
+
+            if (
+                device == "cpu"
+                and not is_quantization
+                and ipex_comm.get_world_size() == 1
+            ):
+                _model = model_convert_streaming(
+                    _model,
+                    checkpoint,
+                    device,
+                    dtype,
+                    sample_inputs,
+                    deployment_mode,
+                    graph_cache_dir,
+                )
+                from .models.reference.models import output_hook
+
+                _model.register_forward_hook(output_hook, with_kwargs=True)
+                return _model
+            from .streaming import _StreamingCheckpoint, _materialize_module
+
+            checkpoint = _StreamingCheckpoint(checkpoint)
+            if (
+                device == "cpu"
+                and not is_quantization
+                and ipex_comm.get_world_size() > 1
+                and not distributed
+            ):
+                # Each rank reads only its shards of the tensor parallel linears
+                tp_linears = get_tp_sharded_linears(_model, *_tensor_parallel_classes())
+                if tp_linears:
+                    tp_checkpoint = checkpoint
+            _materialize_module(_model, "", checkpoint, skip=tp_linears)
+
         # Load low precision checkpoint (generated by GPTQ, etc.) for WOQ before any conversion
-        if device == "cpu" and is_woq and low_precision_checkpoint is not None:
+        if device == "cpu" and is_woq and isinstance(low_precision_checkpoint, str):
+            # Weights packed ahead of time are memory-mapped instead of being repacked
+            _model = load_woq_packed_checkpoint(_model, low_precision_checkpoint)
+        elif device == "cpu" and is_woq and low_precision_checkpoint is not None:
             state_dict, config = None, None
             if isinstance(low_precision_checkpoint, tuple):
                 assert (
@@ -1241,7 +1425,7 @@ def optimize(
             )
 
         # model reference conversion
-        _model = model_convert_reference(_model)
+        _model = model_convert_reference(_model, tp_checkpoint)
 
         # model quantization if needed
         if is_quantization:
@@ -1258,6 +1442,7 @@ def optimize(
                         deployment_mode,
                         is_quantization,
                         woq=is_woq,
+                        graph_cache_dir=graph_cache_dir,
                     )
                     _model = ipex_quantization_flow(
                         _model,
@@ -1271,22 +1456,12 @@ def optimize(
                         if sample_inputs is None
                         else sample_inputs
                     )
-                    with torch.no_grad(), torch.cpu.amp.autocast(
-                        enabled=True
-                        if dtype in [torch.bfloat16, torch.half]
-                        else False,
-                        dtype=dtype,
-                    ):
-                        trace_model = torch.jit.trace(
-                            _model,
-                            example_kwarg_inputs=sample_inputs,
-                            strict=False,
-                            check_trace=False,
-                        )
-                        trace_model = torch.jit.freeze(trace_model)
-                        _model = _set_optimized_model_for_generation(
-                            _model, optimized_model=trace_model
-                        )
+                    trace_model = _trace_and_freeze(
+                        _model, sample_inputs, dtype, graph_cache_dir
+                    )
+                    _model = _set_optimized_model_for_generation(
+                        _model, optimized_model=trace_model
+                    )
                     return _model
                 else:
                     print(
@@ -1315,6 +1490,7 @@ def optimize(
             deployment_mode,
             is_quantization,
             is_woq,
+            graph_cache_dir,
         )
         # do not register output hook when doing calibration in static int8
         if not (is_quantization and not is_woq and qconfig_summary_file is None):
@@ -0,0 +1,168 @@
+import json
+import os
+import torch
+import torch.nn as nn
+from ..utils._logger import logger, WarningType
+
+# Index files of HuggingFace sharded checkpoints, mapping weight names to shard files
+_CHECKPOINT_INDEX_FILES = [
+    "model.safetensors.index.json",
+    "pytorch_model.bin.index.json",
+]
+_CHECKPOINT_FILES = ["model.safetensors", "pytorch_model.bin"]
+
+
+def _resolve_checkpoint_files(checkpoint):
+    if isinstance(checkpoint, (list, tuple)):
+        return list(checkpoint)
+    assert isinstance(
+        checkpoint, str
+    ), "checkpoint should be a file, a list of files or a directory"
+    if not os.path.isdir(checkpoint):
+        return [checkpoint]
+    for index_file in _CHECKPOINT_INDEX_FILES:
+        index_path = os.path.join(checkpoint, index_file)
+        if os.path.isfile(index_path):
+            with open(index_path) as f:
+                weight_map = json.load(f)["weight_map"]
+            return [
+                os.path.join(checkpoint, shard)
+                for shard in sorted(set(weight_map.values()))
+            ]
+    for checkpoint_file in _CHECKPOINT_FILES:
+        checkpoint_path = os.path.join(checkpoint, checkpoint_file)
+        if os.path.isfile(checkpoint_path):
+            return [checkpoint_path]
+    raise ValueError(f"No checkpoint is found in {checkpoint}")
+
+
+class _StreamingCheckpoint(object):
+    r"""
+    Weights of a (sharded) checkpoint read one at a time. Safetensors shards are
+    read per weight, and the other shards are memory-mapped by torch.load, so that
+    a weight is only read from the file when it is materialized. A shard is
+    released once all its weights are taken.
+    """
+
+    def __init__(self, checkpoint):
+        self.shards = {}
+        self.key_to_shard = {}
+        for path in _resolve_checkpoint_files(checkpoint):
+            if path.endswith(".safetensors"):
+                from safetensors import safe_open
+
+                shard = safe_open(path, framework="pt", device="cpu")
+                keys = list(shard.keys())
+            else:
+                shard = torch.load(
+                    path, mmap=True, map_location="cpu", weights_only=True
+                )
+                keys = list(shard.keys())
+            self.shards[path] = [shard, set(keys)]
+            for key in keys:
+                self.key_to_shard[key] = path
+
+    def __contains__(self, key):
+        return key in self.key_to_shard
+
+    def pop(self, key):
+        shard = self.shards[self.key_to_shard[key]][0]
+        tensor = shard.get_tensor(key) if hasattr(shard, "get_tensor") else shard[key]
+        self.release(key)
+        return tensor
+
+    def read_slice(self, key, dim, start, end):
+        r"""
+        Read ``[start, end)`` of the dim ``dim`` (0 or 1) of the weight ``key``
+        only. The weight is kept in the checkpoint until it is released.
+        """
+        shard = self.shards[self.key_to_shard[key]][0]
+        if hasattr(shard, "get_slice"):
+            tensor_slice = shard.get_slice(key)
+            return tensor_slice[start:end] if dim == 0 else tensor_slice[:, start:end]
+        # copy from the memory-mapped tensor, so that only the slice is resident
+        return shard[key].narrow(dim, start, end - start).clone()
+
+    def release(self, key):
+        path = self.key_to_shard.pop(key)
+        keys = self.shards[path][1]
+        keys.discard(key)
+        if not keys:
+            del self.shards[path]
+
+    def remaining_keys(self):
+        return list(self.key_to_shard.keys())
+
+
+def _get_decoder_layers(model):
+    # The decoder stack is the ModuleList of layers holding the most weights
+    layers_name, layers, layers_numel = None, None, 0
+    for name, module in model.named_modules():
+        if isinstance(module, nn.ModuleList) and len(module) > 0:
+            numel = sum(p.numel() for p in module.parameters())
+            if numel > layers_numel:
+                layers_name, layers, layers_numel = name, module, numel
+    return layers_name, layers
+
+
+def _materialize_module(module, prefix, checkpoint, skip=None):
+    r"""
+    Replace the meta parameters and buffers of ``module`` by the weights
+    ``prefix + name`` of ``checkpoint``, cast to the dtypes of the meta tensors.
+    The submodule (or list of submodules) ``skip`` is left on meta. A tied weight
+    is materialized once, from any of its names found in the checkpoint.
+    """
+    if skip is None:
+        skip = []
+    elif isinstance(skip, nn.Module):
+        skip = [skip]
+    skip_ids = set()
+    for skip_module in skip:
+        skip_ids.update(
+            id(t) for t in list(skip_module.parameters()) + list(skip_module.buffers())
+        )
+    targets = []
+    for module_name, submodule in module.named_modules():
+        if any(submodule is skip_module for skip_module in skip):
+            continue
+        for name, tensor in list(submodule._parameters.items()) + list(
+            submodule._buffers.items()
+        ):
+            if tensor is None or not tensor.is_meta or id(tensor) in skip_ids:
+                continue
+            key = prefix + (module_name + "." if module_name else "") + name
+            targets.append((submodule, name, tensor, key))
+
+    materialized = {}
+    for _, _, tensor, key in targets:
+        if key not in checkpoint:
+            continue
+        weight = checkpoint.pop(key)
+        if id(tensor) in materialized:
+            # The checkpoint saves the tied weight more than once
+            continue
+        weight = weight.to(tensor.dtype)
+        if isinstance(tensor, nn.Parameter):
+            weight = nn.Parameter(weight, tensor.requires_grad)
+        materialized[id(tensor)] = weight
+
+    missing_keys = []
+    for submodule, name, tensor, key in targets:
+        if id(tensor) not in materialized:
+            if name in submodule._non_persistent_buffers_set:
+                # Not saved in checkpoints, and only used by the original forward
+                # of some models (e.g., the causal_mask of Llama) which is replaced
+                logger.warning(
+                    f"Non-persistent buffer {key} is left on meta device",
+                    _type=WarningType.NotSupported,
+                )
+            else:
+                missing_keys.append(key)
+        elif name in submodule._parameters:
+            submodule._parameters[name] = materialized[id(tensor)]
+        else:
+            submodule._buffers[name] = materialized[id(tensor)]
+    if missing_keys:
+        raise RuntimeError(
+            f"Weights {missing_keys} are not found in the checkpoint for streaming conversion"
+        )
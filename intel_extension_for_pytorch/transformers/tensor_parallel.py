@@ -2,6 +2,65 @@ import torch
 import torch.nn as nn
 from ..cpu import comm as ipex_comm
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Names of the linear modules sharded by tensor parallel
+_TP_MHA_LINEARS = ["q_proj", "k_proj", "v_proj", "out_proj", "o_proj"]
+_TP_MLP_LINEARS = ["gate_proj", "up_proj", "fc_in", "down_proj", "fc_out"]
+
+
+class _CheckpointWeight(object):
+    r"""
+    A weight of a meta linear which is read from the checkpoint only by the
+    slices taken with ``narrow``, cast to the dtype of the meta weight.
+    """
+
+    def __init__(self, checkpoint, key, meta_tensor):
+        if key not in checkpoint:
+            raise RuntimeError(
+                f"Weight {key} is not found in the checkpoint for sharded loading"
+            )
+        self.checkpoint = checkpoint
+        self.key = key
+        self.shape = meta_tensor.shape
+        self.dtype = meta_tensor.dtype
+
+    def narrow(self, dim, start, length):
+        return self.checkpoint.read_slice(self.key, dim, start, start + length).to(
+            self.dtype
+        )
+
+
+def get_tp_sharded_linears(model, mha_classes, mlp_classes, lm_head_model_classes):
+    r"""
+    The meta linears of ``model`` sharded by tensor parallel, whose weights can be
+    read by slices from the checkpoint on each rank. Linears tied to other
+    modules are excluded.
+    """
+    shared_ids = set()
+    seen_ids = set()
+    for _, param in model.named_parameters(remove_duplicate=False):
+        if id(param) in seen_ids:
+            shared_ids.add(id(param))
+        seen_ids.add(id(param))
+    names = []
+    for module in model.modules():
+        if isinstance(module, tuple(mha_classes)):
+            names.extend((module, n) for n in _TP_MHA_LINEARS)
+        if isinstance(module, tuple(mlp_classes)):
+            names.extend((module, n) for n in _TP_MLP_LINEARS)
+    if isinstance(model, tuple(lm_head_model_classes)):
+        names.append((model, "lm_head"))
+    linears = []
+    for module, name in names:
+        linear = module._modules.get(name)
+        if (
+            isinstance(linear, nn.Linear)
+            and linear.weight.is_meta
+            and id(linear.weight) not in shared_ids
+        ):
+            linears.append(linear)
+    return linears
 
 
 class TensorParallellLinear(nn.Module):
@@ -15,6 +74,8 @@ class TensorParallellLinear(nn.Module):
         world_size,
         shard_by_head,
         shard_by_col,
+        checkpoint=None,
+        prefix="",
     ):
         super().__init__()
         self.num_kv_heads = num_kv_heads
@@ -25,8 +86,20 @@ class TensorParallellLinear(nn.Module):
         self.shard_by_head = shard_by_head
         self.shard_by_col = shard_by_col
         self.cols_per_rank = None
+        # For a meta linear, only the shards of this rank are read from checkpoint
+        self.checkpoint = checkpoint
+        self.prefix = prefix
         self.shard_weights(linear)
 
+    def get_weight_and_bias(self, linear):
+        weight = linear.weight.data
+        bias = linear.bias.data if linear.bias is not None else None
+        if self.checkpoint is not None and weight.is_meta:
+            weight = _CheckpointWeight(self.checkpoint, self.prefix + "weight", weight)
+            if bias is not None:
+                bias = _CheckpointWeight(self.checkpoint, self.prefix + "bias", bias)
+        return weight, bias
+
     def shard_weights_by_head(
         self,
         linear,
@@ -45,6 +118,7 @@ class TensorParallellLinear(nn.Module):
         k_bias = None
         v_bias = None
         bias_data = None
+        weight_data, linear_bias = self.get_weight_and_bias(linear)
         concat_qkv = total_size > num_heads * head_dim
         kv_group_size = num_heads // num_kv_heads
         kv_head_per_rank = num_kv_heads // world_size
@@ -60,20 +134,18 @@ class TensorParallellLinear(nn.Module):
             if i < num_kv_heads % world_size:
                 kv_head_this_rank += 1
             kv_head_range.append(kv_head_range[-1] + kv_head_this_rank)
-        weight_data = linear.weight.data
         q_head_start = kv_head_range[rank] * kv_group_size
         q_head_end = (
             q_head_start
             + (kv_head_range[rank + 1] - kv_head_range[rank]) * kv_group_size
         )
+        q_start, q_end = q_head_start * head_dim, q_head_end * head_dim
         if shard_by_col:
-            q = weight_data[q_head_start * head_dim : q_head_end * head_dim]
-            if linear.bias is not None:
-                q_bias = linear.bias.data[
-                    q_head_start * head_dim : q_head_end * head_dim
-                ]
+            q = weight_data.narrow(0, q_start, q_end - q_start)
+            if linear_bias is not None:
+                q_bias = linear_bias.narrow(0, q_start, q_end - q_start)
         else:
-            q = weight_data[:, q_head_start * head_dim : q_head_end * head_dim]
+            q = weight_data.narrow(1, q_start, q_end - q_start)
         if not concat_qkv:
             return torch.nn.Parameter(q), torch.nn.Parameter(q_bias)
 
@@ -81,22 +153,20 @@ class TensorParallellLinear(nn.Module):
         k_head_end = k_head_start + (kv_head_range[rank + 1] - kv_head_range[rank])
         v_head_start = num_heads + num_kv_heads + kv_head_range[rank]
         v_head_end = v_head_start + (kv_head_range[rank + 1] - kv_head_range[rank])
+        k_start, k_len = k_head_start * head_dim, (k_head_end - k_head_start) * head_dim
+        v_start, v_len = v_head_start * head_dim, (v_head_end - v_head_start) * head_dim
         if shard_by_col:
-            k = weight_data[k_head_start * head_dim : k_head_end * head_dim]
-            v = weight_data[v_head_start * head_dim : v_head_end * head_dim]
-            if linear.bias is not None:
-                k_bias = linear.bias.data[
-                    k_head_start * head_dim : k_head_end * head_dim
-                ]
-                v_bias = linear.bias.data[
-                    v_head_start * head_dim : v_head_end * head_dim
-                ]
+            k = weight_data.narrow(0, k_start, k_len)
+            v = weight_data.narrow(0, v_start, v_len)
+            if linear_bias is not None:
+                k_bias = linear_bias.narrow(0, k_start, k_len)
+                v_bias = linear_bias.narrow(0, v_start, v_len)
                 bias_data = torch.cat([q_bias, k_bias, v_bias], dim=0)
         else:
-            k = weight_data[:, k_head_start * head_dim : k_head_end * head_dim]
-            v = weight_data[:, v_head_start * head_dim : v_head_end * head_dim]
-            if linear.bias is not None:
-                bias_data = linear.bias.data
+            k = weight_data.narrow(1, k_start, k_len)
+            v = weight_data.narrow(1, v_start, v_len)
+            if linear_bias is not None:
+                bias_data = linear_bias.narrow(0, 0, linear_bias.shape[0])
         weight_data = torch.cat([q, k, v], dim=0)
         return torch.nn.Parameter(weight_data), torch.nn.Parameter(bias_data)
 
@@ -121,17 +191,19 @@ class TensorParallellLinear(nn.Module):
                 if i < total_size % world_size:
                     cols += 1
                 cols_per_rank.append(cols_per_rank[-1] + cols)
-        weight_data = linear.weight.data
+        weight_data, linear_bias = self.get_weight_and_bias(linear)
+        start = cols_per_rank[rank]
+        length = cols_per_rank[rank + 1] - start
         if shard_by_col:
-            weight_data = weight_data[cols_per_rank[rank] : cols_per_rank[rank + 1]]
-            if linear.bias is not None:
-                bias_data = linear.bias.data[
-                    cols_per_rank[rank] : cols_per_rank[rank + 1]
-                ]
+            weight_data = weight_data.narrow(0, start, length)
+            if linear_bias is not None:
+                bias_data = linear_bias.narrow(0, start, length)
         else:
-            weight_data = weight_data[:, cols_per_rank[rank] : cols_per_rank[rank + 1]]
-            if linear.bias is not None:
-                bias_data = linear.bias.data / float(world_size)
+            weight_data = weight_data.narrow(1, start, length)
+            if linear_bias is not None:
+                bias_data = linear_bias.narrow(0, 0, linear_bias.shape[0]) / float(
+                    world_size
+                )
         return (
             torch.nn.Parameter(weight_data),
             torch.nn.Parameter(bias_data),
@@ -165,6 +237,10 @@ class TensorParallellLinear(nn.Module):
         self.linear.weight = weight
         if linear.bias is not None:
             self.linear.bias = bias
+        if self.checkpoint is not None and linear.weight.is_meta:
+            self.checkpoint.release(self.prefix + "weight")
+            if linear.bias is not None:
+                self.checkpoint.release(self.prefix + "bias")
         del linear
 
     def forward(self, input: torch.Tensor) -> torch.Tensor:
@@ -181,6 +257,8 @@ class TensorParallelColumnLinear(TensorParallellLinear):
         rank,
         world_size,
         shard_by_head=True,
+        checkpoint=None,
+        prefix="",
     ):
         super().__init__(
             linear,
@@ -191,10 +269,53 @@ class TensorParallelColumnLinear(TensorParallellLinear):
             world_size,
             shard_by_head,
             shard_by_col=True,
+            checkpoint=checkpoint,
+            prefix=prefix,
         )
 
 
+_comm_executor = None
+
+
+def _get_comm_executor():
+    global _comm_executor
+    if _comm_executor is None:
+        _comm_executor = ThreadPoolExecutor(max_workers=1)
+    return _comm_executor
+
+
+def _allreduce_add(tensor: torch.Tensor) -> torch.Tensor:
+    return ipex_comm.allreduce_add(tensor)
+
+
 class TensorParallelRowLinear(TensorParallellLinear):
+    r"""
+    Linear sharded along its input features, the partial outputs of the ranks
+    are summed by an all-reduce.
+
+    With ``allreduce_chunks > 1`` the GEMM is split into chunks along the tokens
+    (``chunk_dim="token"``) or the output features (``chunk_dim="hidden"``), and
+    the all-reduce of a chunk runs while the next chunks are computed. In eager
+    mode the all-reduces are issued by a communication thread, in a traced model
+    they are recorded as ``prim::fork`` and run on the inter-op thread pool.
+    The chunks along the tokens depend on the number of tokens, which a trace
+    would freeze, so traced models only chunk along the output features and
+    use a single all-reduce with ``chunk_dim="token"``. The defaults are read
+    from the environment variables ``TP_ALLREDUCE_CHUNKS`` and
+    ``TP_ALLREDUCE_CHUNK_DIM``.
+
+    With ``reduce_scatter_norm=True`` (or ``TP_REDUCE_SCATTER_NORM=1``), decoder
+    layers which support it call ``forward_norm`` to fuse the residual add and
+    the next norm between a reduce-scatter and an all-gather. The shards of the
+    tokens depend on the number of tokens as well, traced models use the
+    all-reduce there.
+
+    Args:
+        allreduce_chunks (int): number of chunks the all-reduce is split into.
+        chunk_dim (str): ``"token"`` or ``"hidden"``.
+        reduce_scatter_norm (bool): use ``forward_norm`` where supported.
+    """
+
     def __init__(
         self,
         linear,
@@ -204,6 +325,11 @@ class TensorParallelRowLinear(TensorParallellLinear):
         rank,
         world_size,
         shard_by_head=True,
+        checkpoint=None,
+        prefix="",
+        allreduce_chunks=None,
+        chunk_dim=None,
+        reduce_scatter_norm=None,
     ):
         super().__init__(
             linear,
@@ -214,14 +340,128 @@ class TensorParallelRowLinear(TensorParallellLinear):
             world_size,
             shard_by_head,
             shard_by_col=False,
+            checkpoint=checkpoint,
+            prefix=prefix,
+        )
+        if allreduce_chunks is None:
+            allreduce_chunks = int(os.getenv("TP_ALLREDUCE_CHUNKS", "1"))
+        if chunk_dim is None:
+            chunk_dim = os.getenv("TP_ALLREDUCE_CHUNK_DIM", "token")
+        if reduce_scatter_norm is None:
+            reduce_scatter_norm = os.getenv("TP_REDUCE_SCATTER_NORM", "0") == "1"
+        assert allreduce_chunks >= 1, "allreduce_chunks should be positive"
+        assert chunk_dim in ["token", "hidden"], "chunk_dim should be token or hidden"
+        self.allreduce_chunks = allreduce_chunks
+        self.chunk_dim = chunk_dim
+        self.reduce_scatter_norm = reduce_scatter_norm
+        self.linear_chunks = None
+        if world_size > 1 and allreduce_chunks > 1 and chunk_dim == "hidden":
+            self.split_output_features()
+
+    def split_output_features(self):
+        # one linear per chunk of the output features, so that each of them is
+        # prepacked or quantized like any other linear
+        weights = self.linear.weight.data.chunk(self.allreduce_chunks, 0)
+        biases = (
+            self.linear.bias.data.chunk(self.allreduce_chunks, 0)
+            if self.linear.bias is not None
+            else [None] * len(weights)
         )
+        self.linear_chunks = nn.ModuleList()
+        for weight, bias in zip(weights, biases):
+            linear = nn.Linear(weight.shape[1], weight.shape[0], bias=bias is not None)
+            linear.weight = torch.nn.Parameter(weight.contiguous())
+            if bias is not None:
+                linear.bias = torch.nn.Parameter(bias.contiguous())
+            self.linear_chunks.append(linear)
+        del self.linear
+
+    def start_allreduce(self, out: torch.Tensor):
+        if torch.jit.is_tracing():
+            return torch.jit._fork(_allreduce_add, out)
+        return _get_comm_executor().submit(_allreduce_add, out)
+
+    def wait_allreduce(self, handle) -> torch.Tensor:
+        if torch.jit.is_tracing():
+            return torch.jit._wait(handle)
+        return handle.result()
+
+    def forward_chunked(self, input: torch.Tensor) -> torch.Tensor:
+        x = input.reshape(-1, input.shape[-1])
+        handles = []
+        if self.linear_chunks is not None:
+            for linear in self.linear_chunks:
+                handles.append(self.start_allreduce(linear(x)))
+            dim = -1
+        else:
+            for x_chunk in x.chunk(self.allreduce_chunks, 0):
+                handles.append(self.start_allreduce(self.linear(x_chunk)))
+            dim = 0
+        out = torch.cat([self.wait_allreduce(handle) for handle in handles], dim)
+        return out.view(input.shape[:-1] + out.shape[-1:])
 
     def forward(self, input: torch.Tensor) -> torch.Tensor:
+        if self.linear_chunks is not None or (
+            self.world_size > 1
+            and self.allreduce_chunks > 1
+            and not torch.jit.is_tracing()
+            and input.numel() >= self.allreduce_chunks * input.shape[-1]
+        ):
+            return self.forward_chunked(input)
         out = self.linear(input)
         if self.world_size > 1:
             ipex_comm.allreduce_add(out)
         return out
 
+    def forward_norm(self, input, residual, norm):
+        r"""
+        Computes ``hidden = residual + self(input)`` and ``norm(hidden)`` with a
+        reduce-scatter and an all-gather in place of the all-reduce: each rank
+        adds the residual and applies the norm on its shard of the tokens only.
+
+        Args:
+            input (Tensor): the input of the linear.
+            residual (Tensor): the residual added to the output of the linear.
+            norm (Module): the norm applied on the sum, e.g., the LayerNorm or
+                RMSNorm of the next block.
+
+        Returns:
+            A tuple ``(norm(hidden), hidden)``.
+        """
+        if self.world_size == 1 or torch.jit.is_tracing():
+            hidden = residual + self(input)
+            return norm(hidden), hidden
+        if self.linear_chunks is not None:
+            x = input.reshape(-1, input.shape[-1])
+            out = torch.cat([linear(x) for linear in self.linear_chunks], -1)
+        else:
+            out = self.linear(input)
+        hidden_size = out.shape[-1]
+        out = out.reshape(-1, hidden_size)
+        residual = residual.reshape(-1, hidden_size)
+        num_tokens = out.shape[0]
+        pad = -num_tokens % self.world_size
+        if pad > 0:
+            out = torch.nn.functional.pad(out, (0, 0, 0, pad))
+            residual = torch.nn.functional.pad(residual, (0, 0, 0, pad))
+        shard = ipex_comm.reduce_scatter_add(out, self.world_size)
+        tokens_per_rank = shard.shape[0]
+        start = self.rank * tokens_per_rank
+        hidden = shard + residual[start : start + tokens_per_rank]
+        normed = norm(hidden).to(hidden.dtype)
+        # gather both results at once, the shards of the ranks are laid out
+        # one after the other in the flattened output
+        numel = tokens_per_rank * hidden_size * 2
+        gathered = ipex_comm.allgather(
+            torch.cat([normed, hidden], -1).view(1, -1),
+            [rank * numel for rank in range(self.world_size + 1)],
+            self.world_size,
+        )
+        gathered = gathered.view(-1, hidden_size * 2)[:num_tokens]
+        shape = input.shape[:-1] + (hidden_size,)
+        normed, hidden = gathered.split(hidden_size, -1)
+        return normed.reshape(shape), hidden.reshape(shape)
+
 
 class TensorParallelLMhead(TensorParallellLinear):
     def __init__(
@@ -233,6 +473,8 @@ class TensorParallelLMhead(TensorParallellLinear):
         rank,
         world_size,
         shard_by_col,
+        checkpoint=None,
+        prefix="",
     ):
         super().__init__(
             linear,
@@ -243,6 +485,8 @@ class TensorParallelLMhead(TensorParallellLinear):
             world_size,
             shard_by_head=False,
             shard_by_col=shard_by_col,
+            checkpoint=checkpoint,
+            prefix=prefix,
         )
         self.gather_result = shard_by_col
 
@@ -264,13 +508,22 @@ class TensorParallelLMhead(TensorParallellLinear):
 
 
 def shard_mha_weights(
-    model, target_m, num_heads, num_kv_heads, head_dim, rank, world_size
+    model,
+    target_m,
+    num_heads,
+    num_kv_heads,
+    head_dim,
+    rank,
+    world_size,
+    checkpoint=None,
+    prefix="",
 ):
     if world_size == 1:
         return
     for name, sub_m in model.named_children():
         if isinstance(sub_m, target_m):
             for l_name, l_sub_m in sub_m.named_children():
+                l_prefix = f"{prefix}{name}.{l_name}."
                 if l_name in ["q_proj"]:
                     TPLinear = TensorParallelColumnLinear(
                         l_sub_m,
@@ -280,6 +533,8 @@ def shard_mha_weights(
                         rank,
                         world_size,
                         shard_by_head=True,
+                        checkpoint=checkpoint,
+                        prefix=l_prefix,
                     )
                     # del sub_m.__dict__["_modules"][l_name]
                     setattr(sub_m, l_name, TPLinear.linear)
@@ -292,6 +547,8 @@ def shard_mha_weights(
                         rank,
                         world_size,
                         shard_by_head=True,
+                        checkpoint=checkpoint,
+                        prefix=l_prefix,
                     )
                     # del sub_m.__dict__["_modules"][l_name]
                     setattr(sub_m, l_name, TPLinear.linear)
@@ -304,23 +561,42 @@ def shard_mha_weights(
                         rank,
                         world_size,
                         shard_by_head=True,
+                        checkpoint=checkpoint,
+                        prefix=l_prefix,
                     )
                     # del sub_m.__dict__["_modules"][l_name]
                     setattr(sub_m, l_name, TPLinear)
 
         shard_mha_weights(
-            sub_m, target_m, num_heads, num_kv_heads, head_dim, rank, world_size
+            sub_m,
+            target_m,
+            num_heads,
+            num_kv_heads,
+            head_dim,
+            rank,
+            world_size,
+            checkpoint,
+            f"{prefix}{name}.",
         )
 
 
 def shard_mlp_weights(
-    model, target_m, num_heads, num_kv_heads, head_dim, rank, world_size
+    model,
+    target_m,
+    num_heads,
+    num_kv_heads,
+    head_dim,
+    rank,
+    world_size,
+    checkpoint=None,
+    prefix="",
 ):
     if world_size == 1:
         return
-    for _, sub_m in model.named_children():
+    for name, sub_m in model.named_children():
         if isinstance(sub_m, target_m):
             for l_name, l_sub_m in sub_m.named_children():
+                l_prefix = f"{prefix}{name}.{l_name}."
                 if l_name in ["gate_proj", "up_proj", "fc_in"]:
                     TPLinear = TensorParallelColumnLinear(
                         l_sub_m,
@@ -330,6 +606,8 @@ def shard_mlp_weights(
                         rank,
                         world_size,
                         shard_by_head=False,
+                        checkpoint=checkpoint,
+                        prefix=l_prefix,
                     )
                     setattr(sub_m, l_name, TPLinear.linear)
                 if l_name in ["down_proj", "fc_out"]:
@@ -341,15 +619,33 @@ def shard_mlp_weights(
                         rank,
                         world_size,
                         shard_by_head=False,
+                        checkpoint=checkpoint,
+                        prefix=l_prefix,
                     )
                     setattr(sub_m, l_name, TPLinear)
         shard_mlp_weights(
-            sub_m, target_m, num_heads, num_kv_heads, head_dim, rank, world_size
+            sub_m,
+            target_m,
+            num_heads,
+            num_kv_heads,
+            head_dim,
+            rank,
+            world_size,
+            checkpoint,
+            f"{prefix}{name}.",
         )
 
 
 def shard_lm_head_weights(
-    model, supported_model_class, num_heads, num_kv_heads, head_dim, rank, world_size
+    model,
+    supported_model_class,
+    num_heads,
+    num_kv_heads,
+    head_dim,
+    rank,
+    world_size,
+    checkpoint=None,
+    prefix="",
 ):
     if world_size == 1:
         return
@@ -367,6 +663,8 @@ def shard_lm_head_weights(
                 rank,
                 world_size,
                 shard_by_col=shard_by_col,
+                checkpoint=checkpoint,
+                prefix=f"{prefix}{name}.",
             )
             setattr(model, name, TPLinear)
             return
@@ -378,6 +676,8 @@ def shard_lm_head_weights(
             head_dim,
             rank,
             world_size,
+            checkpoint,
+            f"{prefix}{name}.",
         )
 
 
@@ -1,7 +1,9 @@
 import copy
 import torch
+import intel_extension_for_pytorch._C as core
 from intel_extension_for_pytorch.nn.modules import WeightOnlyQuantizedLinear
 from torch.ao.quantization import PlaceholderObserver, QConfigMapping
+from ._logger import logger, WarningType
 
 # The config describes how to load low precision checkpoint for weight only quantization.
 # Weight shape is N by K if transposed is False otherwise K by N.
@@ -27,6 +29,12 @@ LEGACY_LOWP_CHECKPOINT_CONFIG = {
 }
 
 
+# Version of the packed WOQ checkpoint format. Bump it when the layout of the
+# checkpoint or of the packed weights changes.
+WOQ_PACKED_CHECKPOINT_FORMAT = "ipex_woq_packed"
+WOQ_PACKED_CHECKPOINT_VERSION = 1
+
+
 def _is_woq_qconfig(qconfig_mapping):
     qconfig = (
         qconfig_mapping.global_qconfig
@@ -219,3 +227,86 @@ def _convert_woq_with_low_precision_checkpoint(
     else:
         model_new = model
     return _convert(model_new, "")
+
+
+def _get_woq_packed_checkpoint_tag():
+    from intel_extension_for_pytorch import __version__
+
+    # Packed weights depend on the IPEX version and the ISA they were packed for
+    return {
+        "format": WOQ_PACKED_CHECKPOINT_FORMAT,
+        "version": WOQ_PACKED_CHECKPOINT_VERSION,
+        "ipex_version": __version__,
+        "isa": core._get_current_isa_level(),
+    }
+
+
+def save_woq_packed_checkpoint(model, path):
+    r"""
+    Save the weight-only quantized linear layers of ``model`` to ``path`` with their
+    weights already packed for the current ISA, together with scales, zero points,
+    bias and g_idx. The file is tagged with the format version, IPEX version and ISA,
+    and is loaded by ``load_woq_packed_checkpoint`` with memory mapping.
+
+    Args:
+        model: model with ``WeightOnlyQuantizedLinear`` layers, e.g., converted from
+            a GPTQ checkpoint or by ``ipex.quantization.convert``
+        path (str): path of the checkpoint file
+    """
+    modules = {}
+    for name, mod in model.named_modules():
+        if isinstance(mod, WeightOnlyQuantizedLinear):
+            if type(mod) is not WeightOnlyQuantizedLinear:
+                logger.warning(
+                    f"{name} of type {type(mod).__name__} is not saved to the packed WOQ checkpoint",
+                    _type=WarningType.NotSupported,
+                )
+                continue
+            modules[name] = mod._get_packed_state()
+    assert modules, "No WeightOnlyQuantizedLinear to save in the model"
+    checkpoint = _get_woq_packed_checkpoint_tag()
+    checkpoint["modules"] = modules
+    torch.save(checkpoint, path)
+
+
+def _load_woq_packed_checkpoint(path):
+    # Tensors are mapped from the file instead of being read, so that they are
+    # backed by the page cache and shared by the processes loading the same file
+    checkpoint = torch.load(path, mmap=True, map_location="cpu", weights_only=True)
+    tag = _get_woq_packed_checkpoint_tag()
+    if not isinstance(checkpoint, dict) or checkpoint.get("format") != tag["format"]:
+        raise ValueError(f"{path} is not a packed WOQ checkpoint")
+    for key in ["version", "ipex_version", "isa"]:
+        if checkpoint.get(key) != tag[key]:
+            raise RuntimeError(
+                f"The packed WOQ checkpoint {path} was saved with {key} {checkpoint.get(key)} "
+                + f"while the current one is {tag[key]}. Please save it again from the "
+                + "low precision checkpoint in the current environment."
+            )
+    return checkpoint["modules"]
+
+
+def load_woq_packed_checkpoint(model, path, inplace=True):
+    r"""
+    Replace the linear layers of ``model`` by the weight-only quantized linear layers
+    saved by ``save_woq_packed_checkpoint``. The packed weights are memory-mapped
+    from the file and bound to the layers without being packed or copied again,
+    so the file must be kept while the model is used.
+
+    Args:
+        model: original model, with the same module names as the saved one
+        path (str): path of the checkpoint file
+        inplace: do conversion in-place or make a copy of original model
+    Return:
+        Converted model
+    """
+    modules = _load_woq_packed_checkpoint(path)
+    model_new = model if inplace else copy.deepcopy(model)
+    for name, state in modules.items():
+        parent_name, _, attr_name = name.rpartition(".")
+        parent = model_new.get_submodule(parent_name) if parent_name else model_new
+        assert isinstance(
+            getattr(parent, attr_name, None), torch.nn.Module
+        ), f"{name} of the packed WOQ checkpoint is not found in the model"
+        setattr(parent, attr_name, WeightOnlyQuantizedLinear._from_packed_state(state))
+    return model_new
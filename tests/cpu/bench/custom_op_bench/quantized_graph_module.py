@@ -0,0 +1,75 @@
+import torch
+import torch.nn as nn
+import time
+import argparse
+import intel_extension_for_pytorch as ipex
+from intel_extension_for_pytorch.quantization import prepare, convert
+
+r"""
+Latency of a static quantized model converted with convert(), which dispatches
+every op through the quantization proxy, against the torch.fx.GraphModule
+recorded by convert(graph_module=True) and that GraphModule traced and frozen.
+r"""
+
+
+class Model(nn.Module):
+    def __init__(self, channels, hidden_size, num_layers):
+        super(Model, self).__init__()
+        self.convs = nn.ModuleList(
+            [nn.Conv2d(channels, channels, 3, padding=1) for _ in range(num_layers)]
+        )
+        self.pool = nn.AdaptiveAvgPool2d(1)
+        self.linears = nn.ModuleList(
+            [nn.Linear(channels, channels) for _ in range(num_layers - 1)]
+            + [nn.Linear(channels, hidden_size)]
+        )
+
+    def forward(self, x):
+        for conv in self.convs:
+            x = torch.relu(conv(x))
+        x = torch.flatten(self.pool(x), 1)
+        for linear in self.linears:
+            x = torch.relu(linear(x))
+        return x
+
+
+def run_bench(model, x, num_iter):
+    with torch.no_grad():
+        for _ in range(10):
+            model(x)
+        start = time.time()
+        for _ in range(num_iter):
+            model(x)
+        return (time.time() - start) / num_iter
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="benchmark for the GraphModule of convert(graph_module=True)"
+    )
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--channels", type=int, default=64)
+    parser.add_argument("--image-size", type=int, default=14)
+    parser.add_argument("--hidden-size", type=int, default=256)
+    parser.add_argument("--num-layers", type=int, default=8)
+    parser.add_argument("--num-iter", type=int, default=100)
+    args = parser.parse_args()
+    model = Model(args.channels, args.hidden_size, args.num_layers).eval()
+    x = torch.rand(args.batch_size, args.channels, args.image_size, args.image_size)
+    qconfig_mapping = ipex.quantization.default_static_qconfig_mapping
+    prepared_model = prepare(model, qconfig_mapping, example_inputs=x)
+    prepared_model(x)
+    converted_model = convert(prepared_model)
+    graph_model = convert(prepared_model, graph_module=True, example_inputs=x)
+    with torch.no_grad():
+        traced_model = torch.jit.freeze(torch.jit.trace(graph_model, x))
+    for name, m in [
+        ("convert", converted_model),
+        ("convert(graph_module=True)", graph_model),
+        ("convert(graph_module=True) + trace + freeze", traced_model),
+    ]:
+        print("{}: {:.3f} ms".format(name, run_bench(m, x, args.num_iter) * 1e3))
+
+
+if __name__ == "__main__":
+    run()
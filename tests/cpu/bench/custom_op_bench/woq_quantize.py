@@ -0,0 +1,100 @@
+import torch
+import time
+import argparse
+from intel_extension_for_pytorch.quantization import (
+    quantize_per_channel,
+    quantize_per_block,
+    dequantize_per_channel,
+    dequantize_per_block,
+    WoqWeightDtype,
+)
+
+r"""
+Throughput of the weight quantization of WOQ Linear, in GB/s of fp32 weight.
+r"""
+
+a = torch.ones(256 * 1024 * 1024 // 4, dtype=torch.float)
+b = torch.ones(256 * 1024 * 1024 // 4, dtype=torch.float)
+
+WEIGHT_DTYPES = {
+    "int8": WoqWeightDtype.INT8,
+    "int4": WoqWeightDtype.INT4,
+    "nf4": WoqWeightDtype.NF4,
+}
+
+
+def cache_flush():
+    # We assume the cache size is <= 512MB here.
+    global a
+    a += b
+
+
+def run_bench(func, num_iter):
+    for _ in range(2):
+        cache_flush()
+        func()
+    elapsed = 0
+    for _ in range(num_iter):
+        cache_flush()
+        start = time.time()
+        func()
+        elapsed += time.time() - start
+    return elapsed / num_iter
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="benchmark for WOQ weight quantization"
+    )
+    parser.add_argument("--oc", type=int, default=4096)
+    parser.add_argument("--ic", type=int, default=4096)
+    parser.add_argument(
+        "--weight-dtype",
+        type=str,
+        default="all",
+        choices=["all", "int8", "int4", "nf4"],
+    )
+    parser.add_argument("--group-size", type=int, nargs="+", default=[-1, 32, 64, 128])
+    parser.add_argument("--num-iter", type=int, default=10)
+    args = parser.parse_args()
+    weight_dtypes = (
+        list(WEIGHT_DTYPES.keys())
+        if args.weight_dtype == "all"
+        else [args.weight_dtype]
+    )
+    w = torch.randn(args.oc, args.ic)
+    gbytes = w.numel() * w.element_size() / 1e9
+    print(f"Weight shape [{args.oc}, {args.ic}], {gbytes * 1e3:.1f} MB in fp32")
+    for weight_dtype in weight_dtypes:
+        dtype = WEIGHT_DTYPES[weight_dtype]
+        for group_size in args.group_size:
+            if group_size == -1:
+                qt, scales, zps = quantize_per_channel(w, dtype)
+                quantize = lambda: quantize_per_channel(w, dtype)  # noqa: E731
+                dequantize = lambda: dequantize_per_channel(  # noqa: E731
+                    qt, scales, zps, dtype, w.shape
+                )
+            else:
+                qt, scales, zps = quantize_per_block(w, dtype, group_size)
+                quantize = lambda: quantize_per_block(  # noqa: E731
+                    w, dtype, group_size
+                )
+                dequantize = lambda: dequantize_per_block(  # noqa: E731
+                    qt, scales, zps, dtype, group_size, w.shape
+                )
+            quantize_time = run_bench(quantize, args.num_iter)
+            dequantize_time = run_bench(dequantize, args.num_iter)
+            print(
+                "{} group_size={}: quantize {:.2f} GB/s ({:.2f} ms), dequantize {:.2f} GB/s ({:.2f} ms)".format(
+                    weight_dtype,
+                    group_size,
+                    gbytes / quantize_time,
+                    quantize_time * 1e3,
+                    gbytes / dequantize_time,
+                    dequantize_time * 1e3,
+                )
+            )
+
+
+if __name__ == "__main__":
+    run()
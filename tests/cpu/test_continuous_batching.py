@@ -0,0 +1,194 @@
+import unittest
+import sys
+import subprocess
+import torch
+import intel_extension_for_pytorch as ipex
+from intel_extension_for_pytorch.llm.serving import (
+    BlockManager,
+    LLMEngine,
+    SamplingParams,
+    Scheduler,
+    Sequence,
+)
+
+try:
+    import transformers
+except ImportError:
+    subprocess.check_call(
+        [sys.executable, "-m", "pip", "install", "transformers==4.38.1"]
+    )
+    import transformers
+
+from common_utils import TestCase
+
+torch.manual_seed(128)
+
+
+def _get_tiny_llama():
+    config = transformers.LlamaConfig(
+        vocab_size=128,
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=128,
+        architectures=["LlamaForCausalLM"],
+    )
+    return transformers.LlamaForCausalLM(config).eval()
+
+
+class ContinuousBatchingTester(TestCase):
+    def test_block_manager(self):
+        bm = BlockManager(
+            num_blocks=4, block_size=4, max_num_seqs=2, max_blocks_per_seq=3
+        )
+        slots, num_cached_tokens = bm.allocate(0, [1, 2, 3, 4, 5])
+        self.assertEqual(len(slots), 5)
+        self.assertEqual(num_cached_tokens, 0)
+        self.assertEqual(bm.get_num_free_blocks(), 2)
+        row = bm.seq_rows[0]
+        blocks = bm.seq_blocks[0]
+        self.assertEqual(bm.block_tables[row, :2].tolist(), blocks)
+        self.assertEqual(int(bm.context_lens[row]), 5)
+        self.assertEqual(slots[4], blocks[1] * 4)
+        # appending inside the last block does not allocate
+        for _ in range(3):
+            bm.append_slot(0)
+        self.assertEqual(bm.get_num_free_blocks(), 2)
+        self.assertEqual(int(bm.context_lens[row]), 8)
+        # crossing the block boundary allocates and updates the block table in place
+        slot = bm.append_slot(0)
+        self.assertEqual(bm.get_num_free_blocks(), 1)
+        self.assertEqual(slot, int(bm.block_tables[row, 2]) * 4)
+        self.assertFalse(bm.can_allocate(8))
+        bm.free(0)
+        self.assertEqual(bm.get_num_free_blocks(), 4)
+        self.assertTrue(bm.can_allocate(8))
+
+    def test_prefix_caching_block_manager(self):
+        bm = BlockManager(
+            num_blocks=8,
+            block_size=4,
+            max_num_seqs=4,
+            max_blocks_per_seq=4,
+            enable_prefix_caching=True,
+        )
+        prefix = list(range(8))
+        bm.allocate(0, prefix + [100, 101])
+        bm.mark_blocks_computed()
+        # the two full blocks of the common prefix are shared, not recomputed
+        slots, num_cached_tokens = bm.allocate(1, prefix + [200])
+        self.assertEqual(num_cached_tokens, 8)
+        self.assertEqual(len(slots), 1)
+        self.assertEqual(bm.seq_blocks[1][:2], bm.seq_blocks[0][:2])
+        self.assertEqual(bm.allocator.get_ref_count(bm.seq_blocks[0][0]), 2)
+        self.assertEqual(bm.get_blocks_to_copy(), [])
+        # a full hit still computes the last token, which is written into a private copy of the shared block
+        slots, num_cached_tokens = bm.allocate(2, prefix)
+        self.assertEqual(num_cached_tokens, 7)
+        shared_block = bm.seq_blocks[0][1]
+        copied_block = bm.seq_blocks[2][1]
+        self.assertNotEqual(shared_block, copied_block)
+        self.assertEqual(bm.get_blocks_to_copy(), [(shared_block, copied_block)])
+        self.assertEqual(slots, [copied_block * 4 + 3])
+        self.assertEqual(int(bm.block_tables[bm.seq_rows[2], 1]), copied_block)
+        # blocks indexed by the prefix cache stay cached after all owners are freed, and are evicted in LRU order
+        for seq_id in range(3):
+            bm.free(seq_id)
+        self.assertEqual(bm.get_num_free_blocks(), 8)
+        self.assertEqual(bm.prefix_cache.get_num_evictable_blocks(), 2)
+        _, num_cached_tokens = bm.allocate(3, prefix + [300])
+        self.assertEqual(num_cached_tokens, 8)
+
+    def test_scheduler_admission_and_preemption(self):
+        bm = BlockManager(
+            num_blocks=3, block_size=2, max_num_seqs=4, max_blocks_per_seq=3
+        )
+        scheduler = Scheduler(bm, max_num_seqs=4, max_num_batched_tokens=64)
+        seq0 = Sequence(0, [1, 2], SamplingParams())
+        seq1 = Sequence(1, [3, 4], SamplingParams())
+        seq2 = Sequence(2, [5, 6], SamplingParams())
+        for seq in [seq0, seq1, seq2]:
+            scheduler.add_sequence(seq)
+        out = scheduler.schedule()
+        self.assertEqual([s.seq_id for s in out.prefill_seqs], [0, 1, 2])
+        for seq in out.prefill_seqs:
+            seq.append_token_id(7)
+        # every running sequence needs a new block but none is free:
+        # the latest admitted sequences are preempted
+        out = scheduler.schedule()
+        self.assertEqual([s.seq_id for s in out.decode_seqs], [0])
+        self.assertEqual([s.seq_id for s in out.preempted_seqs], [2, 1])
+        self.assertEqual([s.seq_id for s in scheduler.waiting], [1, 2])
+        self.assertEqual(len(out.prefill_seqs), 0)
+
+    def _check_engine(self, engine, model, prompts, max_new_tokens):
+        params = [
+            SamplingParams(max_new_tokens=n, ignore_eos=True) for n in max_new_tokens
+        ]
+        seqs = [engine.add_request(p, sp) for p, sp in zip(prompts, params)]
+        while engine.has_unfinished_requests():
+            engine.step()
+        for prompt, n, seq in zip(prompts, max_new_tokens, seqs):
+            self.assertTrue(seq.is_finished())
+            with torch.no_grad():
+                ref = model.generate(
+                    torch.tensor([prompt]),
+                    max_new_tokens=n,
+                    min_new_tokens=n,
+                    do_sample=False,
+                    pad_token_id=0,
+                )
+            self.assertEqual(seq.output_token_ids, ref[0, len(prompt) :].tolist())
+        # all blocks are returned once every sequence finished
+        self.assertEqual(engine.block_manager.get_num_free_blocks(), engine.num_blocks)
+
+    def test_engine_greedy(self):
+        model = _get_tiny_llama()
+        engine = LLMEngine(model, num_blocks=64, block_size=4, max_num_seqs=3)
+        prompts = [[1, 5, 9, 12, 7], [3, 4], list(range(10, 27)), [8, 8, 8, 2, 6, 1]]
+        # diverging output lengths make sequences finish and new ones join the running batch
+        self._check_engine(engine, model, prompts, [3, 12, 7, 9])
+
+    def test_engine_preemption(self):
+        model = _get_tiny_llama()
+        # too few blocks for all running sequences: some of them are preempted and recomputed
+        engine = LLMEngine(model, num_blocks=10, block_size=4, max_num_seqs=4)
+        prompts = [[1, 5, 9, 12, 7, 3], [3, 4, 11], [20, 21, 22, 23, 24], [9, 2]]
+        self._check_engine(engine, model, prompts, [10, 12, 8, 14])
+
+    def test_engine_prefix_caching(self):
+        model = _get_tiny_llama()
+        engine = LLMEngine(
+            model,
+            num_blocks=64,
+            block_size=4,
+            max_num_seqs=2,
+            enable_prefix_caching=True,
+        )
+        system_prompt = list(range(30, 50))
+        prompts = [
+            system_prompt + [1, 2, 3],
+            system_prompt + [4, 5],
+            system_prompt,
+            system_prompt[:12] + [6, 7, 8, 9, 10],
+        ]
+        self._check_engine(engine, model, prompts, [6, 9, 5, 7])
+        self.assertTrue(engine.block_manager.prefix_cache.get_hit_rate() > 0)
+
+    def test_engine_bf16(self):
+        model = _get_tiny_llama().to(torch.bfloat16)
+        engine = LLMEngine(model, num_blocks=32, block_size=8, max_num_seqs=2)
+        outputs = engine.generate(
+            [[1, 2, 3], [4, 5, 6, 7, 8]],
+            SamplingParams(max_new_tokens=4, ignore_eos=True),
+        )
+        self.assertEqual([len(o) for o in outputs], [4, 4])
+
+    def test_module_exposure(self):
+        self.assertTrue(ipex.llm.serving.LLMEngine is LLMEngine)
+
+
+if __name__ == "__main__":
+    test = unittest.main()
@@ -148,6 +148,66 @@ class DistMergedEmbeddingTester(TestCase):
                         )
         dist.destroy_process_group()
 
+    def test_sparse_all2all_table_groups(self):
+        import torch.distributed as dist
+        from intel_extension_for_pytorch.nn.modules.merged_embeddingbag import (
+            _SparseAll2All,
+        )
+
+        os.environ["MASTER_ADDR"] = "127.0.0.1"
+        os.environ["MASTER_PORT"] = "29501"
+        dist.init_process_group("gloo", world_size=1, rank=0)
+        try:
+            exchanger = _SparseAll2All(1)
+            recv_ptrs = set()
+            for n, index_type, dtype in [
+                (100, torch.int64, torch.float),
+                (7, torch.int32, torch.bfloat16),
+                (0, torch.int64, torch.float),
+            ]:
+                send_idx = [torch.randint(1000, (n,)).to(index_type)]
+                send_buf = [torch.randn(n, 65).to(dtype)]
+                send_ofs = [torch.arange(5, dtype=torch.int64)]
+                recv_idx, recv_buf, recv_ofs = exchanger.start(
+                    send_idx, send_buf, send_ofs
+                ).wait()
+                self.assertEqual(recv_idx[0], send_idx[0])
+                self.assertEqual(recv_buf[0], send_buf[0])
+                self.assertEqual(recv_ofs[0], send_ofs[0])
+                recv_ptrs.add(exchanger.recv_buffers[0].data_ptr())
+            # the receive buffer is sized by the first exchange and then reused
+            self.assertEqual(len(recv_ptrs), 1)
+
+            NUM_TABLE, NUM_DIM, B = 5, 64, 64
+            indices = [
+                torch.randint(100, (B * self.multi_hot[i],)) for i in range(NUM_TABLE)
+            ]
+            offsets = [
+                torch.arange(0, B * self.multi_hot[i], self.multi_hot[i])
+                for i in range(NUM_TABLE)
+            ]
+            emb_list = EmbeddingBagList(NUM_TABLE, NUM_DIM, torch.float, mode="sum")
+            ref_m = MergedEmbAdaGrad(copy.deepcopy(emb_list), lr=1)
+            ref_out = ref_m(indices, offsets)
+            ref_out = torch.cat([o.unsqueeze(1) for o in ref_out], dim=1)
+            ref_out.backward(torch.ones_like(ref_out))
+            ref_weight = torch.cat([w.data for w in ref_m.merged_emb.weights])
+            DistEmb = ipex.nn.modules.DistMergeEmbeddingBagWithAdaGrad
+            for num_table_groups in [1, 2, NUM_TABLE]:
+                # the all to all of a table group overlaps the compute of the next
+                distributed_emb = DistEmb.from_embeddingbag_list(
+                    copy.deepcopy(emb_list.list),
+                    lr=1,
+                    eps=1e-8,
+                    num_table_groups=num_table_groups,
+                )
+                out = distributed_emb(indices, offsets)
+                self.assertEqual(ref_out, out)
+                out.backward(torch.ones_like(out))
+                self.assertEqual(distributed_emb.weights[0], ref_weight)
+        finally:
+            dist.destroy_process_group()
+
 
 if __name__ == "__main__":
     test = unittest.main()
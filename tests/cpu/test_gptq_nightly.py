@@ -124,6 +124,66 @@ class GPTQLLMTester(TestCase):
                     # the optimized model is ipex_m.trace_graph
                     model(*example_inputs)
 
+    def test_gptq_batched_resumable(self):
+        class GPTQLLMDataLoader:
+            def __init__(self):
+                self.batch_size = 1
+
+            def __iter__(self):
+                for i in range(6):
+                    yield torch.randint(1, 100, [1, 64], dtype=torch.long)
+
+        torch.manual_seed(0)
+        dataloader = GPTQLLMDataLoader()
+        curpath = os.path.abspath(os.path.dirname(__file__))
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        config.n_layer = 2
+        gptj = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+
+        def run_gptq(work_dir, **kwargs):
+            torch.manual_seed(0)
+            return ipex.quantization.gptq(
+                copy.deepcopy(gptj),
+                dataloader=dataloader,
+                wbits=4,
+                group_size=128,
+                use_max_length=True,
+                pad_max_length=64,
+                save_dir=work_dir,
+                **kwargs,
+            )
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            ref = run_gptq(work_dir)
+            # calibration samples run through the blocks in batches, the layers of a
+            # block are quantized concurrently
+            batched = run_gptq(work_dir, calib_batch_size=4, num_workers=2)
+            input = torch.randint(1, 100, [1, 64], dtype=torch.long)
+            with torch.no_grad():
+                self.assertEqual(ref(input)[0], batched(input)[0], prec=0.01)
+            ref = ref.state_dict()
+
+            checkpoint_dir = os.path.join(work_dir, "blocks")
+            saved = run_gptq(work_dir, checkpoint_dir=checkpoint_dir).state_dict()
+            self.assertEqual(
+                sorted(os.listdir(checkpoint_dir)),
+                ["gptq_block_0.pt", "gptq_block_1.pt"],
+            )
+            # interrupted after the first block: the first block is loaded, only the
+            # second one is quantized again
+            os.remove(os.path.join(checkpoint_dir, "gptq_block_1.pt"))
+            resumed = run_gptq(work_dir, checkpoint_dir=checkpoint_dir).state_dict()
+            self.assertEqual(len(os.listdir(checkpoint_dir)), 2)
+            for key in saved:
+                self.assertEqual(saved[key], resumed[key])
+                self.assertEqual(ref[key], resumed[key])
+
+            # a block saved with another config is not resumed
+            with self.assertRaises(ValueError):
+                run_gptq(work_dir, checkpoint_dir=checkpoint_dir, act_order=True)
+
 
 if __name__ == "__main__":
     test = unittest.main()
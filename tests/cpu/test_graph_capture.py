@@ -125,6 +125,121 @@ class TestGraphCapture(TestCase):
         self.assertEqual(y1, y2_bf16, prec=0.01)
         self.assertTrue(y2_bf16.dtype == torch.bfloat16)
 
+    def test_inference_graph_mode_jit_graph_cache(self):
+        model = Conv_Bn_Relu().to(memory_format=torch.channels_last).eval()
+        x = torch.randn(3, 6, 10, 10).to(memory_format=torch.channels_last)
+        y1 = model(x)
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ["IPEX_GRAPH_CACHE_DIR"] = tmp
+            try:
+                # the first run traces and saves the graph, the second one loads it
+                for num_cached_graphs in [1, 1]:
+                    ipex_model = ipex.optimize(copy.deepcopy(model), graph_mode=True)
+                    with torch.no_grad():
+                        for _ in range(3):
+                            y2 = ipex_model(x)
+                    self.assertEqual(y1, y2)
+                    self.assertEqual(len(os.listdir(tmp)), num_cached_graphs)
+                # changing the weights or the input shape traces a new graph
+                model.conv.weight.data.add_(1.0)
+                ipex_model = ipex.optimize(copy.deepcopy(model), graph_mode=True)
+                with torch.no_grad():
+                    self.assertEqual(model(x), ipex_model(x))
+                self.assertEqual(len(os.listdir(tmp)), 2)
+                cached_graphs = set(os.listdir(tmp))
+                x2 = torch.randn(1, 6, 12, 12).to(memory_format=torch.channels_last)
+                ipex_model = ipex.optimize(copy.deepcopy(model), graph_mode=True)
+                with torch.no_grad():
+                    self.assertEqual(model(x2), ipex_model(x2))
+                (new_graph,) = set(os.listdir(tmp)) - cached_graphs
+                # a corrupted graph is traced again
+                new_graph = os.path.join(tmp, new_graph)
+                with open(new_graph, "w") as f:
+                    f.write("corrupted")
+                ipex_model = ipex.optimize(copy.deepcopy(model), graph_mode=True)
+                with torch.no_grad():
+                    self.assertEqual(model(x2), ipex_model(x2))
+                    self.assertEqual(model(x2), torch.jit.load(new_graph)(x2))
+            finally:
+                del os.environ["IPEX_GRAPH_CACHE_DIR"]
+
+    def test_graph_cache_key_opaque_weights(self):
+        from intel_extension_for_pytorch.cpu.graph_cache import (
+            GraphCache,
+            get_graph_cache_key,
+        )
+
+        class MkldnnWeight(nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.register_buffer("weight", torch.randn(4, 4).to_mkldnn())
+
+            def forward(self, x):
+                return x.matmul(self.weight.to_dense())
+
+        model = MkldnnWeight().eval()
+        x = torch.randn(2, 4)
+        key = get_graph_cache_key(model, (x,), torch.float)
+        self.assertEqual(key, get_graph_cache_key(model, (x,), torch.float))
+        with tempfile.TemporaryDirectory() as tmp:
+            graph_cache = GraphCache(tmp)
+            graph_cache.save(key, torch.jit.trace(nn.Linear(4, 4), x))
+            self.assertTrue(graph_cache.load(key) is not None)
+            # changing the opaque weight misses the cache
+            model.weight = (model.weight.to_dense() + 1.0).to_mkldnn()
+            new_key = get_graph_cache_key(model, (x,), torch.float)
+            self.assertNotEqual(key, new_key)
+            self.assertTrue(graph_cache.load(new_key) is None)
+            # the models whose weights can't be read are keyed None
+            self.assertTrue(graph_cache.load(None) is None)
+
+    def test_inference_graph_mode_buckets(self):
+        model = Conv_Bn_Relu().to(memory_format=torch.channels_last).eval()
+        ipex_model = ipex.optimize(
+            model, graph_mode=True, graph_mode_buckets={0: [2, 4]}
+        )
+        graph_capture = ipex_model.forward.graph_capture
+        with torch.no_grad():
+            # batch size 1 and 2 share the graph of bucket 2, 3 is padded to 4
+            # and 5 is out of the buckets
+            for batch_size in [1, 2, 3, 4, 5, 1]:
+                x = torch.randn(batch_size, 6, 10, 10).to(
+                    memory_format=torch.channels_last
+                )
+                y = ipex_model(x)
+                self.assertEqual(y.shape, (batch_size, 3, 8, 8))
+                self.assertEqual(model(x), y)
+        self.assertEqual(len(graph_capture.graphs), 2)
+        self.assertEqual(
+            graph_capture.get_bucket_stats(), {"hit": 3, "miss": 2, "eager": 1}
+        )
+
+    def test_inference_graph_mode_buckets_unpad_dims(self):
+        class LinearSum(nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.linear = nn.Linear(6, 4)
+
+            def forward(self, x):
+                return self.linear(x), x.sum(0)
+
+        model = LinearSum().eval()
+        ipex_model = ipex.optimize(model, graph_mode=True, graph_mode_buckets={0: [4]})
+        with torch.no_grad():
+            # the output features and the padded batch size are both 4, only the
+            # batch dim of the linear output is unpadded
+            x = torch.randn(3, 6)
+            y, y_sum = ipex_model(x)
+            self.assertEqual(y.shape, (3, 4))
+            self.assertEqual(y_sum.shape, (6,))
+            ref_y, ref_y_sum = model(x)
+            self.assertEqual(ref_y, y)
+            self.assertEqual(ref_y_sum, y_sum)
+        self.assertEqual(
+            ipex_model.forward.graph_capture.get_bucket_stats(),
+            {"hit": 0, "miss": 1, "eager": 0},
+        )
+
     def test_inference_trace_graph_mode(self):
         model = Conv_Bn_Relu().to(memory_format=torch.channels_last).eval()
         x = torch.randn(3, 6, 10, 10).to(memory_format=torch.channels_last)
@@ -0,0 +1,162 @@
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from common_utils import TestCase
+from intel_extension_for_pytorch.cpu.hypertune.conf.dotdict import DotDict
+from intel_extension_for_pytorch.cpu.hypertune.objective import MultiObjective
+from intel_extension_for_pytorch.cpu.hypertune.strategy import STRATEGIES
+
+
+def make_conf(output_dir, strategy, launcher, **tuning):
+    tuning = dict(
+        dict(max_trials=100, early_stopping=0, parallel_trials=False), **tuning
+    )
+    execution_conf = DotDict(
+        {
+            "tuning": dict(tuning, strategy=strategy),
+            "hyperparams": {"launcher": launcher},
+            "output_dir": output_dir,
+        }
+    )
+    return SimpleNamespace(
+        execution_conf=execution_conf,
+        program="program.py",
+        program_args=[],
+        usr_objectives=[
+            {"name": "latency", "higher_is_better": False, "target_val": -1.0}
+        ],
+    )
+
+
+class TestHypertuneStrategy(TestCase):
+    def test_tpe_exhausts_search_space(self):
+        launcher = {
+            "hp": ["ncores_per_instance", "malloc"],
+            "ncores_per_instance": [1, 2, 3, 4],
+            "malloc": ["pt", "tc", "je"],
+        }
+
+        def evaluate(cfg, node=None):
+            malloc = launcher["malloc"].index(cfg["malloc"])
+            return [float(abs(cfg["ncores_per_instance"] - 3) + malloc)]
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+            MultiObjective, "evaluate", side_effect=evaluate
+        ):
+            strategy = STRATEGIES["tpe"](make_conf(tmp, "tpe", launcher))
+            strategy.traverse()
+        tried = [tuple(cfg.values()) for cfg, _ in strategy.tune_history]
+        # more than the random startup trials, so the estimators suggest the last ones
+        self.assertEqual(len(tried), 12)
+        self.assertEqual(len(set(tried)), 12)
+        self.assertEqual(
+            strategy.best_tune_cfg, {"ncores_per_instance": 3, "malloc": "pt"}
+        )
+
+    def test_early_stopping(self):
+        launcher = {
+            "hp": ["ncores_per_instance"],
+            "ncores_per_instance": [4, 1, 2, 3, 5, 6, 7, 8],
+        }
+
+        def evaluate(cfg, node=None):
+            # the second trial is the best one
+            return [float(cfg["ncores_per_instance"])]
+
+        for early_stopping, num_trials in [(0, 8), (3, 5), (6, 8)]:
+            with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+                MultiObjective, "evaluate", side_effect=evaluate
+            ):
+                strategy = STRATEGIES["grid"](
+                    make_conf(tmp, "grid", launcher, early_stopping=early_stopping)
+                )
+                strategy.traverse()
+            self.assertEqual(len(strategy.tune_history), num_trials)
+            self.assertEqual(strategy.best_tune_cfg, {"ncores_per_instance": 1})
+
+    def test_print_best_result(self):
+        launcher = {"hp": ["ncores_per_instance"], "ncores_per_instance": [2, 1]}
+
+        def evaluate(cfg, node=None):
+            return [float(cfg["ncores_per_instance"])]
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+            MultiObjective, "evaluate", side_effect=evaluate
+        ), mock.patch(
+            "intel_extension_for_pytorch.cpu.hypertune.strategy.strategy.click.secho"
+        ) as secho:
+            STRATEGIES["grid"](make_conf(tmp, "grid", launcher)).traverse()
+        printed = [call.args[0] for call in secho.call_args_list]
+        self.assertTrue("latency: 2.0" in printed)
+        self.assertTrue("{'ncores_per_instance': 1}" in printed)
+        self.assertEqual(printed[-1], "latency: 1.0")
+
+    def test_parallel_trials(self):
+        launcher = {
+            "hp": [
+                "use_all_nodes",
+                "ncores_per_instance",
+                "ninstances",
+                "use_logical_cores",
+                "disable_numactl",
+                "disable_iomp",
+                "malloc",
+            ],
+            "use_all_nodes": [False, True],
+            "ncores_per_instance": [1, 2, 3, 4],
+            "ninstances": [1],
+            "use_logical_cores": [False],
+            "disable_numactl": [False],
+            "disable_iomp": [False],
+            "malloc": ["tc"],
+        }
+        lock = threading.Lock()
+        running = []
+        trials = []
+
+        def evaluate(self, cfg, node=None):
+            args = self.decode_launcer_cfg(cfg, node)
+            nodes_list = None
+            if "--nodes-list" in args:
+                nodes_list = args[args.index("--nodes-list") + 1]
+            with lock:
+                trials.append((cfg["use_all_nodes"], nodes_list, list(running)))
+                running.append(nodes_list)
+            time.sleep(0.1)
+            with lock:
+                running.remove(nodes_list)
+            return [float(cfg["ncores_per_instance"])]
+
+        cpus = [SimpleNamespace(node=node) for node in [1, 1, 0, 0]]
+        with tempfile.TemporaryDirectory() as tmp, mock.patch(
+            "intel_extension_for_pytorch.cpu.hypertune.strategy.strategy.CPUPoolList",
+            return_value=SimpleNamespace(pool_all=cpus),
+        ), mock.patch.object(
+            MultiObjective, "evaluate", autospec=True, side_effect=evaluate
+        ):
+            strategy = STRATEGIES["grid"](
+                make_conf(tmp, "grid", launcher, parallel_trials=True)
+            )
+            self.assertEqual(strategy.nodes, [0, 1])
+            strategy.traverse()
+        self.assertEqual(len(strategy.tune_history), 8)
+        self.assertEqual(len(trials), 8)
+        for use_all_nodes, nodes_list, concurrent in trials:
+            if use_all_nodes:
+                # the trials using all nodes run alone
+                self.assertEqual(nodes_list, None)
+                self.assertEqual(concurrent, [])
+            else:
+                # the concurrent trials run on distinct nodes
+                self.assertTrue(nodes_list in ["0", "1"])
+                self.assertTrue(nodes_list not in concurrent)
+                self.assertTrue(None not in concurrent)
+        # the trials on single nodes overlapped
+        self.assertTrue(any(concurrent for _, _, concurrent in trials))
+
+
+if __name__ == "__main__":
+    test = unittest.main()
@@ -312,6 +312,52 @@ class TestLLMModules(TestCase):
             self.assertEqual(ipex_q, ref_q)
             self.assertEqual(ref_k, ipex_k)
 
+    def test_varlen_attention(self):
+        num_heads, num_kv_heads, head_size = 8, 2, 64
+        seqlen_q = torch.tensor([0, 5, 6, 15], dtype=torch.int32)
+        for seqlen_k, is_causal in [(seqlen_q, True), (seqlen_q, False)] + [
+            (torch.tensor([0, 7, 10, 19], dtype=torch.int32), True)
+        ]:
+            query = torch.randn(int(seqlen_q[-1]), num_heads, head_size)
+            key = torch.randn(int(seqlen_k[-1]), num_kv_heads, head_size)
+            value = torch.randn(int(seqlen_k[-1]), num_kv_heads, head_size)
+            out = torch.empty_like(query)
+            scale = 1.0 / head_size**0.5
+            ipex.llm.functional.varlen_attention(
+                query,
+                key,
+                value,
+                out,
+                seqlen_q,
+                seqlen_k,
+                9,
+                9,
+                0.0,
+                scale,
+                False,
+                is_causal,
+                False,
+                None,
+            )
+            for i in range(len(seqlen_q) - 1):
+                q = query[seqlen_q[i] : seqlen_q[i + 1]].transpose(0, 1)
+                k = key[seqlen_k[i] : seqlen_k[i + 1]].transpose(0, 1)
+                v = value[seqlen_k[i] : seqlen_k[i + 1]].transpose(0, 1)
+                k = k.repeat_interleave(num_heads // num_kv_heads, dim=0)
+                v = v.repeat_interleave(num_heads // num_kv_heads, dim=0)
+                attn = q @ k.transpose(-1, -2) * scale
+                if is_causal:
+                    # bottom-right aligned when the queries are the last tokens of the keys
+                    len_q, len_k = q.size(1), k.size(1)
+                    mask = torch.ones(len_q, len_k, dtype=torch.bool).tril(
+                        len_k - len_q
+                    )
+                    attn = attn.masked_fill(~mask, float("-inf"))
+                ref_out = attn.softmax(-1) @ v
+                self.assertEqual(
+                    out[seqlen_q[i] : seqlen_q[i + 1]], ref_out.transpose(0, 1)
+                )
+
 
 if __name__ == "__main__":
     test = unittest.main()
@@ -7,9 +7,10 @@ import os
 import copy
 import re
 import tempfile
-from intel_extension_for_pytorch.quantization import prepare, convert
+from intel_extension_for_pytorch.quantization import prepare, convert, WoqWeightDtype
 from collections import namedtuple
 import itertools
+import json
 
 try:
     import transformers
@@ -445,6 +446,323 @@ class OptimizeTransformersTester(TestCase):
                 ref_res = ref_m.generate(input_ids, **generate_kwargs)
                 self.assertEqual(ipex_res, ref_res)
 
+    def test_mixtral_grouped_moe(self):
+        num_experts, top_k, hidden_size, intermediate_size = 8, 2, 64, 96
+
+        class Expert(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.w1 = torch.nn.Linear(hidden_size, intermediate_size, bias=False)
+                self.w3 = torch.nn.Linear(hidden_size, intermediate_size, bias=False)
+                self.w2 = torch.nn.Linear(intermediate_size, hidden_size, bias=False)
+
+        experts = torch.nn.ModuleList([Expert() for _ in range(num_experts)]).eval()
+        # bf16 weights prepacked for dnnl
+        dnnl_experts = ipex.optimize(copy.deepcopy(experts), dtype=torch.bfloat16)
+        self.assertTrue(dnnl_experts[0].w1.use_dnnl)
+        # int8 WOQ weights
+        qconfig = ipex.quantization.get_weight_only_quant_qconfig_mapping(
+            weight_dtype=WoqWeightDtype.INT8
+        )
+        woq_experts = convert(prepare(copy.deepcopy(experts), qconfig, inplace=True))
+
+        def tpp_expert(hidden_states, top_x, idx, e, routing_weights, out):
+            expert = experts[e]
+            return torch.ops.torch_ipex.mixtral_moe_tpp(
+                hidden_states,
+                top_x,
+                idx,
+                expert.w1.weight,
+                expert.w3.weight,
+                expert.w2.weight,
+                True,
+                routing_weights,
+                out,
+            )
+
+        def tpp_grouped(hidden_states, selected_experts, routing_weights, out):
+            return torch.ops.torch_ipex.mixtral_moe_tpp_grouped(
+                hidden_states,
+                selected_experts,
+                routing_weights,
+                [e.w1.weight for e in experts],
+                [e.w3.weight for e in experts],
+                [e.w2.weight for e in experts],
+                True,
+                out,
+            )
+
+        def dnnl_expert(hidden_states, top_x, idx, e, routing_weights, out):
+            expert = dnnl_experts[e]
+            return torch.ops.torch_ipex.mixtral_moe(
+                hidden_states,
+                top_x,
+                idx,
+                expert.w1._get_forward_weight(),
+                expert.w1.ctx.get_data_handle(),
+                expert.w3._get_forward_weight(),
+                expert.w3.ctx.get_data_handle(),
+                expert.w2._get_forward_weight(),
+                expert.w2.ctx.get_data_handle(),
+                True,
+                routing_weights,
+                out,
+            )
+
+        def dnnl_grouped(hidden_states, selected_experts, routing_weights, out):
+            return torch.ops.torch_ipex.mixtral_moe_grouped(
+                hidden_states,
+                selected_experts,
+                routing_weights,
+                [e.w1._get_forward_weight() for e in dnnl_experts],
+                [e.w1.ctx.get_data_handle() for e in dnnl_experts],
+                [e.w3._get_forward_weight() for e in dnnl_experts],
+                [e.w3.ctx.get_data_handle() for e in dnnl_experts],
+                [e.w2._get_forward_weight() for e in dnnl_experts],
+                [e.w2.ctx.get_data_handle() for e in dnnl_experts],
+                True,
+                out,
+            )
+
+        def woq_expert(hidden_states, top_x, idx, e, routing_weights, out):
+            expert = woq_experts[e]
+            return torch.ops.torch_ipex.mixtral_moe_woq(
+                hidden_states,
+                top_x,
+                idx,
+                expert.w1._op_context.get_data_handle(),
+                expert.w3._op_context.get_data_handle(),
+                expert.w2._op_context.get_data_handle(),
+                routing_weights,
+                out,
+            )
+
+        def woq_grouped(hidden_states, selected_experts, routing_weights, out):
+            return torch.ops.torch_ipex.mixtral_moe_woq_grouped(
+                hidden_states,
+                selected_experts,
+                routing_weights,
+                [e.w1._op_context.get_data_handle() for e in woq_experts],
+                [e.w3._op_context.get_data_handle() for e in woq_experts],
+                [e.w2._op_context.get_data_handle() for e in woq_experts],
+                out,
+            )
+
+        paths = [
+            (tpp_expert, tpp_grouped, torch.float, 1e-3),
+            (dnnl_expert, dnnl_grouped, torch.bfloat16, 1e-2),
+            (woq_expert, woq_grouped, torch.float, 1e-3),
+        ]
+        # decode sizes leave most experts without tokens, the last case routes no
+        # token to the last two experts explicitly
+        for num_tokens, num_used_experts in [(1, 8), (3, 8), (37, 8), (37, 6)]:
+            scores = torch.randn(num_tokens, num_experts)
+            scores[:, num_used_experts:] = -float("inf")
+            routing_weights, selected_experts = torch.topk(
+                scores.softmax(-1), top_k, dim=-1
+            )
+            expert_mask = torch.nn.functional.one_hot(
+                selected_experts, num_classes=num_experts
+            ).permute(2, 1, 0)
+            for run_expert, run_grouped, dtype, prec in paths:
+                hidden_states = torch.randn(num_tokens, hidden_size).to(dtype)
+                weights = routing_weights.to(dtype)
+                with torch.no_grad():
+                    ref = torch.zeros(num_tokens, hidden_size, dtype=dtype)
+                    for expert_idx in range(num_experts):
+                        idx, top_x = torch.where(expert_mask[expert_idx])
+                        ref = run_expert(
+                            hidden_states, top_x, idx, expert_idx, weights, ref
+                        )
+                    out = run_grouped(
+                        hidden_states,
+                        selected_experts,
+                        weights,
+                        torch.zeros(num_tokens, hidden_size, dtype=dtype),
+                    )
+                self.assertEqual(out, ref, prec=prec)
+
+    def test_speculative_decoding(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/llama", return_dict=False
+        )
+        m = transformers.models.llama.modeling_llama.LlamaForCausalLM(config).eval()
+        ref_m = copy.deepcopy(m)
+        draft_m = transformers.models.llama.modeling_llama.LlamaForCausalLM(
+            config
+        ).eval()
+        # repeated spans give prompt lookup some matches
+        input_ids = torch.tensor([[5, 17, 42, 8, 5, 17, 42, 8, 5, 17]])
+        generate_kwargs = dict(do_sample=False, max_new_tokens=12, min_new_tokens=12)
+        with torch.no_grad():
+            ref_res = ref_m.generate(input_ids, **generate_kwargs)
+        for deployment_mode in [True, False]:
+            ipex_m = ipex.llm.optimize(
+                copy.deepcopy(m),
+                dtype=torch.float,
+                deployment_mode=deployment_mode,
+            )
+            # an identical draft accepts every token, a random one rejects most of them
+            ipex_draft_m = ipex.llm.optimize(
+                copy.deepcopy(m),
+                dtype=torch.float,
+                deployment_mode=deployment_mode,
+            )
+            assisted_kwargs = [
+                dict(prompt_lookup_num_tokens=3),
+                dict(assistant_model=ipex_draft_m),
+                dict(assistant_model=draft_m),
+            ]
+            for kwargs in assisted_kwargs:
+                with torch.no_grad():
+                    ipex_res = ipex_m.generate(input_ids, **generate_kwargs, **kwargs)
+                self.assertEqual(ipex_res, ref_res)
+            with torch.no_grad():
+                ipex_res = ipex_m.generate(
+                    input_ids,
+                    do_sample=True,
+                    temperature=0.7,
+                    max_new_tokens=12,
+                    min_new_tokens=12,
+                    assistant_model=draft_m,
+                )
+            self.assertEqual(ipex_res.shape, ref_res.shape)
+            self.assertEqual(ipex_res[:, : input_ids.shape[1]], input_ids)
+
+        # models may return position_ids without an attention_mask
+        from intel_extension_for_pytorch.transformers.generation.assisted_decoding import (
+            _forward_uncached_tokens,
+        )
+
+        prepare_inputs_for_generation = ref_m.prepare_inputs_for_generation
+
+        def prepare_inputs_with_position_ids(*args, **kwargs):
+            model_inputs = prepare_inputs_for_generation(*args, **kwargs)
+            position_ids = torch.arange(input_ids.shape[-1])
+            model_inputs["position_ids"] = position_ids.unsqueeze(0)
+            return model_inputs
+
+        ref_m.prepare_inputs_for_generation = prepare_inputs_with_position_ids
+        with torch.no_grad():
+            logits, _ = _forward_uncached_tokens(ref_m, input_ids, None, None, False)
+            self.assertEqual(logits, ref_m(input_ids).logits)
+
+    def test_graph_cache(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/llama", return_dict=False
+        )
+        m = transformers.models.llama.modeling_llama.LlamaForCausalLM(config).eval()
+        input_ids = torch.ones(10).to(torch.long).unsqueeze(0)
+        with torch.no_grad():
+            ref_res = m.generate(input_ids, max_new_tokens=4, min_new_tokens=4)
+        with tempfile.TemporaryDirectory() as tmp:
+            # the first run traces and saves the graph, the second one loads it
+            for _ in range(2):
+                ipex_m = ipex.llm.optimize(
+                    copy.deepcopy(m), dtype=torch.float, graph_cache_dir=tmp
+                )
+                self.assertEqual(len(os.listdir(tmp)), 1)
+                with torch.no_grad():
+                    ipex_res = ipex_m.generate(
+                        input_ids, max_new_tokens=4, min_new_tokens=4
+                    )
+                self.assertEqual(ipex_res, ref_res)
+            # the graph of other weights is traced again
+            m2 = copy.deepcopy(m)
+            m2.lm_head.weight.data.mul_(2.0)
+            ipex.llm.optimize(m2, dtype=torch.float, graph_cache_dir=tmp)
+            self.assertEqual(len(os.listdir(tmp)), 2)
+
+    def test_packed_sequence_prefill(self):
+        models = [
+            ("gptj", transformers.models.gptj.modeling_gptj.GPTJForCausalLM),
+            ("llama", transformers.models.llama.modeling_llama.LlamaForCausalLM),
+            (
+                "mistral",
+                transformers.models.mistral.modeling_mistral.MistralForCausalLM,
+            ),
+            ("falcon", transformers.models.falcon.modeling_falcon.FalconForCausalLM),
+        ]
+        seq_lens = [5, 1, 9, 3]
+        cu_seqlens = torch.tensor([0] + seq_lens).cumsum(0).to(torch.int32)
+        for name, model_class in models:
+            config = AutoConfig.from_pretrained(
+                f"{curpath}/hf_configs/{name}", return_dict=False
+            )
+            m = model_class(config).eval()
+            if name == "falcon":
+                with torch.no_grad():
+                    ipex.nn.utils._model_convert.replace_customized_linear_with_linear(
+                        m.eval()
+                    )
+            ref_m = copy.deepcopy(m)
+            ipex_m = ipex.llm.optimize(
+                m, dtype=torch.float, deployment_mode=False, inplace=True
+            )
+            input_ids = torch.randint(1, 100, (1, int(cu_seqlens[-1])))
+            with torch.no_grad():
+                # the batch of mixed lengths is run as one token stream, without padding
+                packed_logits = ipex_m(input_ids, cu_seqlens=cu_seqlens)[0]
+                self.assertEqual(packed_logits.size(1), int(cu_seqlens[-1]))
+                for i in range(len(seq_lens)):
+                    start, end = int(cu_seqlens[i]), int(cu_seqlens[i + 1])
+                    ref_logits = ref_m(input_ids[:, start:end], use_cache=False)[0]
+                    self.assertEqual(
+                        packed_logits[:, start:end],
+                        ref_logits,
+                        prec=1e-3,
+                        message=f"model={name}",
+                    )
+                # only the last token of every sequence goes through lm_head for generation
+                ipex_m.config.lm_head_generation = True
+                last_logits = ipex_m(input_ids, cu_seqlens=cu_seqlens)[0]
+                self.assertEqual(
+                    last_logits, packed_logits[:, cu_seqlens[1:].long() - 1]
+                )
+            for attn in ipex_m.modules():
+                if hasattr(attn, "varlen_metadata"):
+                    self.assertTrue(attn.varlen_metadata is None)
+
+    def test_streaming_checkpoint(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/llama", return_dict=False
+        )
+        m = transformers.models.llama.modeling_llama.LlamaForCausalLM(config).eval()
+        input_ids = torch.ones(10).to(torch.long).unsqueeze(0)
+        with torch.no_grad():
+            ref_res = m.generate(input_ids, max_new_tokens=4, min_new_tokens=4)
+        state_dict = m.state_dict()
+        with tempfile.TemporaryDirectory() as tmp:
+            # sharded as HuggingFace does: the decoder layers are split between 2 files
+            shard_files = [f"pytorch_model-0000{i}-of-00002.bin" for i in [1, 2]]
+            weight_map = {}
+            shards = [{}, {}]
+            for i, (key, value) in enumerate(state_dict.items()):
+                weight_map[key] = shard_files[i % 2]
+                shards[i % 2][key] = value
+            for shard, shard_file in zip(shards, shard_files):
+                torch.save(shard, os.path.join(tmp, shard_file))
+            with open(os.path.join(tmp, "pytorch_model.bin.index.json"), "w") as f:
+                json.dump({"weight_map": weight_map}, f)
+            for deployment_mode in [True, False]:
+                with ipex.OnDevice(dtype=torch.float, device="meta"):
+                    meta_m = transformers.models.llama.modeling_llama.LlamaForCausalLM(
+                        config
+                    ).eval()
+                ipex_m = ipex.llm.optimize(
+                    meta_m,
+                    dtype=torch.float,
+                    deployment_mode=deployment_mode,
+                    checkpoint=tmp,
+                )
+                self.assertTrue(not any(p.is_meta for p in ipex_m.parameters()))
+                self.assertEqual(len(ipex_m.model.layers), config.num_hidden_layers)
+                with torch.no_grad():
+                    ipex_res = ipex_m.generate(
+                        input_ids, max_new_tokens=4, min_new_tokens=4
+                    )
+                self.assertEqual(ipex_res, ref_res)
+
 
 if __name__ == "__main__":
     test = unittest.main()
@@ -5,7 +5,9 @@ import sys
 import subprocess
 import os
 import copy
+import tempfile
 from intel_extension_for_pytorch.transformers import (
+    get_tp_sharded_linears,
     shard_mha_weights,
     shard_mlp_weights,
     shard_lm_head_weights,
@@ -33,9 +35,10 @@ curpath = os.path.abspath(os.path.dirname(__file__))
 
 
 class TensorParallelTester(TestCase):
-    def _shard_model(self, model):
-        rank = ipex_comm.get_rank()
-        world_size = ipex_comm.get_world_size()
+    def _shard_model(self, model, rank=None, world_size=None, checkpoint=None):
+        if rank is None:
+            rank = ipex_comm.get_rank()
+            world_size = ipex_comm.get_world_size()
         for supported_mha_class in [
             transformers.models.llama.modeling_llama.LlamaAttention,
             transformers.models.gptj.modeling_gptj.GPTJAttention,
@@ -54,6 +57,7 @@ class TensorParallelTester(TestCase):
                 head_dim,
                 rank,
                 world_size,
+                checkpoint,
             )
         for supported_mlp_class in [
             transformers.models.llama.modeling_llama.LlamaMLP,
@@ -67,6 +71,7 @@ class TensorParallelTester(TestCase):
                 head_dim,
                 rank,
                 world_size,
+                checkpoint,
             )
         for supported_model_calss in [
             transformers.models.llama.modeling_llama.LlamaForCausalLM,
@@ -81,6 +86,7 @@ class TensorParallelTester(TestCase):
                     head_dim,
                     rank,
                     world_size,
+                    checkpoint,
                 )
                 update_heads_info(model, rank, world_size)
         return model
@@ -139,6 +145,123 @@ class TensorParallelTester(TestCase):
         self.assertTrue(tp_model.lm_head, TensorParallelLMhead)
         self.tensor_parallel_with_optimize_transformers(model)
 
+    def test_tensor_parallel_sharded_loading(self):
+        from intel_extension_for_pytorch.transformers.streaming import (
+            _StreamingCheckpoint,
+            _materialize_module,
+        )
+
+        tp_classes = (
+            [transformers.models.llama.modeling_llama.LlamaAttention],
+            [transformers.models.llama.modeling_llama.LlamaMLP],
+            [transformers.models.llama.modeling_llama.LlamaForCausalLM],
+        )
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/llama", return_dict=False
+        )
+        model = transformers.models.llama.modeling_llama.LlamaForCausalLM(config).eval()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "pytorch_model.bin")
+            torch.save(model.state_dict(), path)
+            world_size = 2
+            for rank in range(world_size):
+                ref_m = self._shard_model(copy.deepcopy(model), rank, world_size)
+                with ipex.OnDevice(dtype=torch.float, device="meta"):
+                    meta_m = transformers.models.llama.modeling_llama.LlamaForCausalLM(
+                        config
+                    ).eval()
+                tp_linears = get_tp_sharded_linears(meta_m, *tp_classes)
+                self.assertEqual(len(tp_linears), 7 * config.num_hidden_layers + 1)
+                # the rank reads only its slices of the sharded linears
+                checkpoint = _StreamingCheckpoint(path)
+                _materialize_module(meta_m, "", checkpoint, skip=tp_linears)
+                self.assertTrue(any(p.is_meta for p in meta_m.parameters()))
+                tp_m = self._shard_model(meta_m, rank, world_size, checkpoint)
+                self.assertTrue(not any(p.is_meta for p in tp_m.parameters()))
+                self.assertEqual(checkpoint.remaining_keys(), [])
+                ref_state_dict = ref_m.state_dict()
+                tp_state_dict = tp_m.state_dict()
+                self.assertEqual(sorted(ref_state_dict), sorted(tp_state_dict))
+                for key in ref_state_dict:
+                    self.assertEqual(ref_state_dict[key], tp_state_dict[key])
+
+    def test_tensor_parallel_chunked_allreduce(self):
+        if ipex_comm.get_world_size() != 1:
+            self.skipTest("the reference is computed on a single rank")
+        linear = torch.nn.Linear(256, 32)
+        # the all-reduce of a single process is the identity, so the chunked
+        # outputs are compared with the unchunked output of the shard
+        ref_m = TensorParallelRowLinear(
+            copy.deepcopy(linear), 1, 1, 64, 0, 2, shard_by_head=False
+        )
+        for chunk_dim in ["token", "hidden"]:
+            tp_m = TensorParallelRowLinear(
+                copy.deepcopy(linear),
+                1,
+                1,
+                64,
+                0,
+                2,
+                shard_by_head=False,
+                allreduce_chunks=4,
+                chunk_dim=chunk_dim,
+            )
+            self.assertEqual(tp_m.linear_chunks is not None, chunk_dim == "hidden")
+            for shape in [[2, 10, 128], [1, 1, 128]]:
+                x = torch.randn(shape)
+                with torch.no_grad():
+                    ref = ref_m(x)
+                    self.assertEqual(tp_m(x), ref)
+                    traced = torch.jit.trace(tp_m, x)
+                    self.assertEqual(traced(x), ref)
+            # the trace must not freeze the number of tokens
+            with torch.no_grad():
+                traced = torch.jit.trace(tp_m, torch.randn(1, 32, 128))
+                for shape in [[1, 1, 128], [2, 7, 128]]:
+                    x = torch.randn(shape)
+                    self.assertEqual(traced(x), ref_m(x))
+
+    def test_tensor_parallel_forward_norm_trace(self):
+        if ipex_comm.get_world_size() != 1:
+            self.skipTest("the reference is computed on a single rank")
+
+        class LinearNorm(torch.nn.Module):
+            def __init__(self, linear):
+                super().__init__()
+                self.linear = linear
+                self.norm = torch.nn.LayerNorm(32)
+
+            def forward(self, x, residual):
+                return self.linear.forward_norm(x, residual, self.norm)
+
+        linear = torch.nn.Linear(256, 32)
+        ref_m = TensorParallelRowLinear(
+            copy.deepcopy(linear), 1, 1, 64, 0, 2, shard_by_head=False
+        )
+        tp_m = LinearNorm(
+            TensorParallelRowLinear(
+                copy.deepcopy(linear),
+                1,
+                1,
+                64,
+                0,
+                2,
+                shard_by_head=False,
+                reduce_scatter_norm=True,
+            )
+        ).eval()
+        with torch.no_grad():
+            traced = torch.jit.trace(
+                tp_m, (torch.randn(1, 32, 128), torch.randn(1, 32, 32))
+            )
+            for tokens in [1, 32]:
+                x = torch.randn(1, tokens, 128)
+                residual = torch.randn(1, tokens, 32)
+                ref_hidden = residual + ref_m(x)
+                normed, hidden = traced(x, residual)
+                self.assertEqual(hidden, ref_hidden)
+                self.assertEqual(normed, tp_m.norm(ref_hidden))
+
 
 if __name__ == "__main__":
     test = unittest.main()
@@ -11,6 +11,7 @@ from bench.custom_op_bench.merged_embeddingbag import (
 )
 import intel_extension_for_pytorch as ipex
 import copy
+import tempfile
 
 
 class TestMergedEmbedding(TestCase):
@@ -230,6 +231,96 @@ class TestMergedEmbedding(TestCase):
                                 )
                             self._test_training(m, ref_m, (indices, offsets), opt=opt)
 
+    def test_dedup_and_reorder_rows(self):
+        B = 256
+        NUM_TABLE = 4
+        NUM_DIM = 64
+        # heavy-tailed indices with many duplicates
+        indices = [
+            (torch.rand(B * self.multi_hot[i]) ** 4 * 1000).to(torch.int64)
+            for i in range(NUM_TABLE)
+        ]
+        offsets = [
+            torch.arange(0, B * self.multi_hot[i], self.multi_hot[i])
+            for i in range(NUM_TABLE)
+        ]
+        for mode in ["mean", "sum"]:
+            emb_list = EmbeddingBagList(NUM_TABLE, NUM_DIM, torch.float32, mode=mode)
+            for module, kwargs in [
+                (MergedEmb, {}),
+                (MergedEmbSGD, {"lr": 0.1}),
+                (MergedEmbAdaGrad, {"lr": 0.1}),
+            ]:
+                ref_m = module(copy.deepcopy(emb_list), **kwargs).merged_emb
+                m = module(copy.deepcopy(emb_list), **kwargs).merged_emb
+                m.dedup_indices = True
+                for _ in range(2):
+                    ref_out = ref_m(indices, offsets)
+                    out = m(indices, offsets)
+                    self.assertEqual(ref_out, out)
+                    sum(o.sum() for o in ref_out).backward()
+                    sum(o.sum() for o in out).backward()
+                for i in range(NUM_TABLE):
+                    if module is MergedEmb:
+                        self.assertEqual(ref_m.weights[i].grad, m.weights[i].grad)
+                    else:
+                        self.assertEqual(ref_m.weights[i], m.weights[i])
+                with torch.no_grad():
+                    self.assertEqual(ref_m(indices, offsets), m(indices, offsets))
+
+                remaps = m.reorder_rows_by_frequency([indices])
+                for i in range(NUM_TABLE):
+                    # the most accessed row is the first one
+                    self.assertEqual(remaps[i][torch.bincount(indices[i]).argmax()], 0)
+                renumbered = [remap[index] for remap, index in zip(remaps, indices)]
+                with torch.no_grad():
+                    self.assertEqual(ref_m(indices, offsets), m(renumbered, offsets))
+
+    def test_tiered_storage(self):
+        B = 64
+        NUM_TABLE = 4
+        NUM_DIM = 128
+        steps = 6
+        batches = []
+        for _ in range(steps):
+            indices = [
+                torch.randint(1000, (B * self.multi_hot[i],)) for i in range(NUM_TABLE)
+            ]
+            offsets = [
+                torch.arange(0, B * self.multi_hot[i], self.multi_hot[i])
+                for i in range(NUM_TABLE)
+            ]
+            batches.append((indices, offsets))
+        emb_list = EmbeddingBagList(NUM_TABLE, NUM_DIM, torch.float32)
+        for module in [MergedEmbSGD, MergedEmbAdaGrad]:
+            for policy in ["lfu", "lru"]:
+                ref_m = module(copy.deepcopy(emb_list), lr=0.1).merged_emb
+                m = module(copy.deepcopy(emb_list), lr=0.1).merged_emb
+                with tempfile.TemporaryDirectory() as storage_dir:
+                    # the batches need at most 192 rows per table, rows are evicted
+                    m.enable_tiered_storage(storage_dir, cache_rows=256, policy=policy)
+                    self.assertEqual(m.weights[0].shape, (256, NUM_DIM))
+                    for step, (indices, offsets) in enumerate(batches):
+                        ref_out = ref_m(indices, offsets)
+                        out = m(indices, offsets)
+                        if step + 1 < steps:
+                            m.prefetch(batches[step + 1][0])
+                        self.assertEqual(ref_out, out)
+                        loss = sum(o.sum() for o in out)
+                        loss.backward()
+                        ref_loss = sum(o.sum() for o in ref_out)
+                        ref_loss.backward()
+                    with torch.no_grad():
+                        self.assertEqual(ref_m(*batches[0]), m(*batches[0]))
+                    m.flush()
+                    for i in range(NUM_TABLE):
+                        table = m._tiered_tables[i]
+                        self.assertEqual(table.backing[0], ref_m.weights[i])
+                        for state, backing in zip(
+                            ref_m._row_states(), table.backing[1:]
+                        ):
+                            self.assertEqual(backing, state[i])
+
 
 if __name__ == "__main__":
     test = unittest.main()
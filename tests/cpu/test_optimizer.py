@@ -464,6 +464,109 @@ class TestOptimizers(TestCase):
         scaler.update()
         assert scaler._scale != float("inf") and scaler._scale != float("nan")
 
+    def test_grad_scaling_fused_step(self):
+        M = TestModule()
+        optimizers = [
+            lambda params: torch.optim.SGD(params, lr=0.1, momentum=0.9),
+            lambda params: torch.optim.Adam(params, lr=0.01, weight_decay=0.1),
+            lambda params: torch.optim.Adagrad(params, lr=0.1),
+            lambda params: ipex.optim._lamb.Lamb(params, lr=0.01, fused=True),
+        ]
+        for make_optimizer in optimizers:
+            results = []
+            for fused in [False, True]:
+                module = copy.deepcopy(M).train()
+                ipex_module, ipex_optimizer = ipex.optimize(
+                    module, optimizer=make_optimizer(module.parameters())
+                )
+                self.assertTrue(ipex_optimizer._step_supports_inv_scale)
+                scaler = torch.cpu.amp.GradScaler(init_scale=1024.0, fused=fused)
+                for i in range(3):
+                    ipex_optimizer.zero_grad()
+                    y = ipex_module(*ipex_module.input).sum()
+                    scaler.scale(y).backward()
+                    if i == 1:
+                        # the step with a non-finite grad is skipped
+                        ipex_module.linear.bias.grad[0] = float("inf")
+                    scaler.step(ipex_optimizer)
+                    scaler.update()
+                results.append((ipex_module.state_dict(), scaler.get_scale()))
+            (ref_state, ref_scale), (fused_state, fused_scale) = results
+            self.assertEqual(ref_scale, fused_scale)
+            self.assertEqual(fused_scale, 512.0)
+            for name in ref_state:
+                self.assertEqual(ref_state[name], fused_state[name])
+
+    def test_flat_update_buffers(self):
+        M = TestModule()
+        optimizers = [
+            lambda params: torch.optim.SGD(params, lr=0.1, momentum=0.9),
+            lambda params: torch.optim.Adam(params, lr=0.01, amsgrad=True),
+            lambda params: ipex.optim._lamb.Lamb(
+                params, lr=0.01, weight_decay=0.1, fused=True
+            ),
+        ]
+        for make_optimizer, dtype in itertools.product(
+            optimizers, [torch.float, torch.bfloat16]
+        ):
+            results = []
+            for flat in [False, True]:
+                module = copy.deepcopy(M).train()
+                ipex_module, ipex_optimizer = ipex.optimize(
+                    module,
+                    dtype=dtype,
+                    optimizer=make_optimizer(module.parameters()),
+                    flat_update_buffers=flat,
+                )
+                if flat:
+                    self.assertTrue(len(ipex_optimizer._flat_buffers[0]) > 0)
+                losses = []
+                for i in range(5):
+                    # the grads of the flattened params are zeroed, not freed
+                    ipex_optimizer.zero_grad(set_to_none=False)
+                    with torch.cpu.amp.autocast(enabled=dtype is torch.bfloat16):
+                        y = ipex_module(*ipex_module.input).sum()
+                    losses.append(y.float().item())
+                    y.backward()
+                    ipex_optimizer.step()
+                    if i == 1:
+                        # the buffers are rebuilt from the loaded per-param states
+                        state_dict = ipex_optimizer.state_dict()
+                        ipex_optimizer.load_state_dict(state_dict)
+                if flat:
+                    # the prepacked linear and conv weights are not flattened
+                    prepacked = [
+                        p
+                        for p, attr in ipex_optimizer.params_attr.items()
+                        if attr.op_ctx is not None
+                    ]
+                    self.assertTrue(len(prepacked) > 0)
+                    flattened = {
+                        id(p)
+                        for buffers in ipex_optimizer._flat_buffers
+                        for buffer in buffers
+                        for p in buffer.params
+                    }
+                    self.assertTrue(all(id(p) not in flattened for p in prepacked))
+                results.append(
+                    (
+                        losses,
+                        ipex_module.state_dict(),
+                        ipex_optimizer.state_dict()["state"],
+                    )
+                )
+            ref_losses, ref_model, ref_state = results[0]
+            flat_losses, flat_model, flat_state = results[1]
+            self.assertEqual(ref_losses, flat_losses, rtol=1e-5, atol=1e-5)
+            for name in ref_model:
+                self.assertEqual(
+                    ref_model[name], flat_model[name], rtol=1e-5, atol=1e-5
+                )
+            self.assertEqual(sorted(ref_state), sorted(flat_state))
+            for idx in ref_state:
+                for key, value in ref_state[idx].items():
+                    self.assertEqual(value, flat_state[idx][key], rtol=1e-5, atol=1e-5)
+
 
 class TestFusedSteps(TestCase):
     def test_lamb_step(self):
@@ -1229,6 +1332,75 @@ class TestFusedSteps(TestCase):
         grad2 = base_grad.bfloat16()[10:20, 10:20]
         self._test_packed_add(param, grad, param2, trail, grad2)
 
+    def test_fused_steps_inv_scale(self):
+        def sgd(param, grad, trail, states, **kwargs):
+            torch.ops.torch_ipex.sgd_fused_step(
+                param, grad, states[0], trail, 0.9, 0.1, 0.01, 0.0, False, **kwargs
+            )
+
+        def adagrad(param, grad, trail, states, **kwargs):
+            torch.ops.torch_ipex.adagrad_fused_step(
+                param, grad, states[0], trail, 2, 0.1, 0.01, 0.0, 1e-10, **kwargs
+            )
+
+        def adam(param, grad, trail, states, **kwargs):
+            torch.ops.torch_ipex.adam_fused_step(
+                param,
+                states[0],
+                states[1],
+                states[2],
+                grad,
+                trail,
+                True,
+                2,
+                0.9,
+                0.999,
+                0.01,
+                0.01,
+                1e-8,
+                **kwargs
+            )
+
+        def lamb(param, grad, trail, states, **kwargs):
+            torch.ops.torch_ipex.lamb_fused_step(
+                param,
+                states[0],
+                states[1],
+                grad,
+                trail,
+                2,
+                0.9,
+                0.999,
+                0.01,
+                0.01,
+                1e-6,
+                **kwargs
+            )
+
+        param = torch.randn(31, 33)
+        grad = torch.randn(31, 33)
+        split_param, split_trail = torch.ops.torch_ipex.split_float_bfloat16(param)
+        cases = [
+            # fp32 params
+            (param, grad, torch.Tensor()),
+            # fp32 master weight with a bf16 copy
+            (param, grad.bfloat16(), param.bfloat16()),
+            # split master weight
+            (split_param, grad.bfloat16(), split_trail),
+        ]
+        for step, (param, grad, trail) in itertools.product(
+            [sgd, adagrad, adam, lamb], cases
+        ):
+            states = [torch.randn(31, 33).abs() for _ in range(3)]
+            ref = [t.clone() for t in [param, trail] + states]
+            # lamb reuses the fp32 grad as a workspace
+            step(ref[0], grad.clone(), ref[1], ref[2:])
+            # the kernels unscale the grad as they load it
+            scaled = [t.clone() for t in [param, trail] + states]
+            step(scaled[0], grad * 4, scaled[1], scaled[2:], inv_scale=0.25)
+            for ref_tensor, scaled_tensor in zip(ref, scaled):
+                self.assertEqual(ref_tensor, scaled_tensor)
+
 
 class TestPatchedMethod(TestCase):
     def test_zero_grad(self):
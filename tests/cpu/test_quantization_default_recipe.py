@@ -11,6 +11,7 @@ from torch.ao.quantization import (
 )
 import copy
 import unittest
+from unittest import mock
 import numpy
 from common_utils import TestCase
 
@@ -641,6 +642,72 @@ class TestDefaultRecipe(JitLlgaTestCase):
                     traced_model = torch.jit.freeze(traced_model)
                     y = traced_model(inputs)
 
+    def test_native_autotune(self):
+        class DemoModel(torch.nn.Module):
+            def __init__(self):
+                super(DemoModel, self).__init__()
+                self.fc1 = torch.nn.Linear(16, 16)
+                self.fc2 = torch.nn.Linear(16, 16)
+
+            def forward(self, x):
+                out = self.fc1(x)
+                out = self.fc2(out)
+                return out
+
+        class DemoCalibDataloader:
+            def __init__(self):
+                self.batch_size = 2
+                self.num_batches = 0
+
+            def __iter__(self):
+                for i in range(4):
+                    self.num_batches += 1
+                    yield torch.randn([2, 16])
+
+        m = DemoModel().eval()
+        inputs = torch.randn(4, 16)
+        with torch.no_grad():
+            ref = m(inputs)
+
+        def eval_func(model):
+            with torch.no_grad():
+                return -(model(inputs) - ref).abs().max().item()
+
+        # only the fp32 fallback of both linears meets the criterion
+        calib_dataloader = DemoCalibDataloader()
+        tuned_model = ipex.quantization.autotune(
+            copy.deepcopy(m),
+            calib_dataloader,
+            eval_func=eval_func,
+            sampling_sizes=[2, 4],
+            accuracy_criterion={"absolute": 1e-4},
+            backend="ipex",
+        )
+        # calibration runs once for all sampling sizes, plus the example inputs
+        self.assertEqual(calib_dataloader.num_batches, 3)
+        converted_model = ipex.quantization.convert(tuned_model)
+        with torch.no_grad():
+            self.assertEqual(converted_model(inputs), ref, prec=1e-4)
+
+        smoothquant_args = {"alpha": numpy.arange(0.0, 1.0, 0.1).tolist()}
+        for num_workers in [1, 2]:
+            tuned_model = ipex.quantization.autotune(
+                copy.deepcopy(m),
+                DemoCalibDataloader(),
+                eval_func=eval_func,
+                smoothquant_args=smoothquant_args,
+                sampling_sizes=[4],
+                accuracy_criterion={"absolute": 1.0},
+                backend="ipex",
+                num_workers=num_workers,
+                cores_per_worker=1,
+            )
+            converted_model = ipex.quantization.convert(tuned_model)
+            with torch.no_grad():
+                traced_model = torch.jit.trace(converted_model, inputs)
+                traced_model = torch.jit.freeze(traced_model)
+                traced_model(inputs)
+
     def test_none_example_input_for_quantization(self):
         class M(nn.Module):
             def __init__(self):
@@ -667,6 +734,56 @@ class TestDefaultRecipe(JitLlgaTestCase):
         with self.assertRaises(AssertionError):
             prepared_model = ipex.quantization.prepare(m, qconfig_mapping)
 
+    def test_convert_to_graph_module(self):
+        class M(nn.Module):
+            def __init__(self):
+                super(M, self).__init__()
+                self.conv = nn.Conv2d(3, 8, 3)
+                self.pool = nn.MaxPool2d(2, 2)
+                self.linear = nn.Linear(8 * 7 * 7, 4)
+
+            def forward(self, x, y):
+                x = self.pool(torch.relu(self.conv(x)))
+                x = torch.flatten(x, 1)
+                return self.linear(x) + y
+
+        m = M().eval()
+        x = torch.rand(2, 3, 16, 16)
+        y = torch.rand(2, 4)
+        qconfig_mapping = ipex.quantization.default_static_qconfig_mapping
+        prepared_model = prepare(m, qconfig_mapping, example_inputs=(x, y))
+        prepared_model(x, y)
+        converted_model = convert(prepared_model)
+        graph_model = convert(prepared_model, graph_module=True, example_inputs=(x, y))
+        self.assertTrue(isinstance(graph_model, torch.fx.GraphModule))
+        targets = [n.target for n in graph_model.graph.nodes]
+        self.assertTrue(torch.quantize_per_tensor in targets)
+        self.assertTrue("dequantize" in targets)
+        # the weights of the conv and the linear are quantized once, at convert
+        self.assertTrue(torch.quantize_per_channel not in targets)
+        quantized_weights = [
+            n.target
+            for n in graph_model.graph.nodes
+            if n.op == "get_attr" and n.target.startswith("_quantized_weight")
+        ]
+        self.assertEqual(len(quantized_weights), 2)
+        # no tensor of the graph is a dispatch proxy
+        for t in itertools.chain(graph_model.parameters(), graph_model.buffers()):
+            self.assertTrue(type(t) in [torch.Tensor, nn.Parameter])
+
+        with torch.no_grad():
+            x = torch.rand(2, 3, 16, 16)
+            y = torch.rand(2, 4)
+            ref = converted_model(x, y)
+            res = graph_model(x, y)
+            self.assertTrue(type(res) is torch.Tensor)
+            self.assertEqual(ref, res)
+            traced_model = torch.jit.freeze(torch.jit.trace(graph_model, (x, y)))
+            self.assertEqual(ref, traced_model(x, y), prec=0.1)
+
+        with self.assertRaises(ValueError):
+            convert(prepared_model, graph_module=True)
+
 
 class WeightOnlyQuantizationTester(TestCase):
     def test_weight_only_quantization(self):
@@ -962,6 +1079,65 @@ class WeightOnlyQuantizationTester(TestCase):
         for shape, use_bias in cases:
             test(shape, use_bias)
 
+    def test_weight_only_quantization_packed_checkpoint(self):
+        from intel_extension_for_pytorch.utils.weight_only_quantization import (
+            save_woq_packed_checkpoint,
+            load_woq_packed_checkpoint,
+        )
+
+        class M(nn.Module):
+            def __init__(self, input_channel, output_channel, has_bias):
+                super(M, self).__init__()
+                self.linear = torch.nn.Linear(input_channel, output_channel, has_bias)
+
+            def forward(self, x):
+                return self.linear(x)
+
+        def test(feature, has_bias, w_dtype, group_size):
+            m = M(feature[1], feature[2], has_bias).eval()
+            data = torch.rand(feature[0], feature[1])
+            qconfig = ipex.quantization.get_weight_only_quant_qconfig_mapping(
+                weight_dtype=w_dtype, group_size=group_size
+            )
+            prepared_model = prepare(m, qconfig, example_inputs=data, inplace=False)
+            with torch.no_grad(), tempfile.TemporaryDirectory() as work_dir:
+                woq_model = convert(prepared_model)
+                output1 = woq_model(data)
+                path = work_dir + "/woq_packed.pt"
+                save_woq_packed_checkpoint(woq_model, path)
+                loaded_model = load_woq_packed_checkpoint(
+                    M(feature[1], feature[2], has_bias).eval(), path
+                )
+                woq_linear_class = (
+                    ipex.nn.modules.weight_only_quantization.WeightOnlyQuantizedLinear
+                )
+                assert isinstance(loaded_model.linear, woq_linear_class)
+                self.assertEqual(loaded_model.linear.weight, woq_model.linear.weight)
+                output2 = loaded_model(data)
+                torch.testing.assert_close(output1, output2)
+
+                # The checkpoint of another ISA is rejected
+                checkpoint = torch.load(path)
+                checkpoint["isa"] = "unknown"
+                torch.save(checkpoint, path)
+                with self.assertRaises(RuntimeError):
+                    load_woq_packed_checkpoint(
+                        M(feature[1], feature[2], has_bias).eval(), path
+                    )
+
+        shape_list = [
+            [3, 64, 64],
+            [4, 128, 127],
+        ]
+        use_bias_list = [True, False]
+        w_dtype_list = [WoqWeightDtype.INT8, WoqWeightDtype.INT4]
+        group_size_list = [-1, 32]
+        cases = itertools.product(
+            shape_list, use_bias_list, w_dtype_list, group_size_list
+        )
+        for shape, use_bias, w_dtype, group_size in cases:
+            test(shape, use_bias, w_dtype, group_size)
+
     def test_weight_only_quantization_nf4_weight(self):
         class M(nn.Module):
             def __init__(self, input_channel, output_channel, has_bias):
@@ -1431,6 +1607,93 @@ class WeightOnlyQuantizationTester(TestCase):
         for shape, has_bias, act_quant_mode, group_size in cases:
             test(shape, has_bias, act_quant_mode, group_size)
 
+    def test_weight_only_quantization_quantize_per_block(self):
+        from intel_extension_for_pytorch.quantization import _quantize_utils
+
+        NF4_TABLE = _quantize_utils.NF4_QUANT_TABLE
+
+        def quantize_ref(w, dtype, group_size):
+            # quantize block by block, then pack 2 4-bit values into a byte
+            N, K = w.shape
+            qt, scales, zps = [], [], []
+            for k in range(0, K, group_size):
+                block = w[:, k : k + group_size]
+                mins = torch.clamp(block.min(dim=1)[0], max=0)
+                maxs = torch.clamp(block.max(dim=1)[0], min=0)
+                if dtype == WoqWeightDtype.NF4:
+                    scale = torch.clamp(torch.maximum(-mins, maxs), min=1.1920929e-07)
+                    normed = block / scale.unsqueeze(1)
+                    q = torch.zeros(block.shape, dtype=torch.uint8)
+                    for i in range(len(NF4_TABLE)):
+                        q[normed > NF4_TABLE[i]] = i
+                else:
+                    qmax = 255 if dtype == WoqWeightDtype.INT8 else 15
+                    scale = torch.clamp((maxs - mins) / qmax, min=1.1920929e-07)
+                    zp = -torch.round(mins / scale)
+                    q = torch.clamp(
+                        torch.round(block / scale.unsqueeze(1)) + zp.unsqueeze(1),
+                        0,
+                        qmax,
+                    )
+                    if dtype == WoqWeightDtype.INT8:
+                        q, zp = q - 128, zp - 128
+                    zps.append(zp)
+                qt.append(q)
+                scales.append(scale)
+            qt = torch.cat(qt, dim=1)
+            if dtype == WoqWeightDtype.INT8:
+                qt = qt.to(torch.int8)
+            else:
+                qt = torch.nn.functional.pad(qt.to(torch.uint8), (0, K % 2))
+                qt = qt[:, 1::2].bitwise_left_shift(4).bitwise_or_(qt[:, ::2])
+            zps = torch.stack(zps, dim=1) if zps else None
+            return qt, torch.stack(scales, dim=1), zps
+
+        dtypes = [WoqWeightDtype.INT8, WoqWeightDtype.INT4, WoqWeightDtype.NF4]
+        shapes = [(16, 64), (9, 127), (33, 256)]
+        group_sizes = [-1, 32, 48, 128]
+        # weights are quantized in chunks of output channels, 1 channel per chunk here
+        chunk_numel_list = [_quantize_utils._QUANTIZE_CHUNK_NUMEL, 1]
+        for dtype, shape, group_size, chunk_numel in itertools.product(
+            dtypes, shapes, group_sizes, chunk_numel_list
+        ):
+            w = torch.randn(shape)
+            K = shape[1]
+            with mock.patch.object(
+                _quantize_utils, "_QUANTIZE_CHUNK_NUMEL", chunk_numel
+            ):
+                if group_size == -1:
+                    qt, scales, zps = quantize_per_channel(w, dtype)
+                    scales = scales.unsqueeze(1)
+                    zps = zps if zps is None else zps.unsqueeze(1)
+                else:
+                    qt, scales, zps = quantize_per_block(w, dtype, group_size)
+            qt_ref, scales_ref, zps_ref = quantize_ref(
+                w, dtype, K if group_size == -1 else group_size
+            )
+            torch.testing.assert_close(scales, scales_ref, rtol=1e-6, atol=0)
+            if dtype != WoqWeightDtype.NF4:
+                self.assertEqual(zps, zps_ref)
+            # rounding at the exact half may differ with the multiplication by the
+            # inverse of scales
+            mismatch = (qt != qt_ref).float().mean().item()
+            self.assertTrue(mismatch < 1e-3)
+            if group_size == -1:
+                w_dq = dequantize_per_channel(
+                    qt, scales.squeeze(1), zps, dtype, weight_shape=shape
+                )
+            else:
+                w_dq = dequantize_per_block(
+                    qt, scales, zps, dtype, group_size, weight_shape=shape
+                )
+            self.assertEqual(w_dq.shape, w.shape)
+            if dtype != WoqWeightDtype.NF4:
+                # the error of dequantization is at most half of a step
+                step = scales.repeat_interleave(
+                    K if group_size == -1 else group_size, dim=1
+                )[:, :K]
+                self.assertTrue(((w_dq - w).abs() <= step * 0.51 + 1e-6).all())
+
     def test_compute_with_g_idx(self):
         class Mod(nn.Module):
             def __init__(self, ic, oc, has_bias):
@@ -6,6 +6,8 @@ from common_utils import TestCase
 from common_ipex_conf import runtime_thread_affinity_test_env
 import subprocess
 import os
+import asyncio
+import threading
 
 
 class SimpleNet(torch.nn.Module):
@@ -472,6 +474,66 @@ class TestMultiStreamModule(TestCase):
         self.assertEqual(y_runtime2[2].size(0), 1)
 
 
+class TestMultiStreamModulePlanCache(TestCase):
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_repeated_forward_with_cached_plan(self):
+        model = SimpleNet_tensor_dict()
+        model.eval()
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        num_streams = min(2, cpu_pool.core_ids.__len__())
+        multi_stream_model = ipex.cpu.runtime.MultiStreamModule(
+            model,
+            num_streams=num_streams,
+            cpu_pool=cpu_pool,
+            input_split_hint=ipex.cpu.runtime.MultiStreamModuleHint(x1=0, x2=0),
+            output_concat_hint=ipex.cpu.runtime.MultiStreamModuleHint(
+                (0, {"y1": 0, "y2": 0})
+            ),
+        )
+        # The first forward of a batch size builds its plan with torch.cat,
+        # the next ones write the stream outputs into preallocated buffers
+        for batch_size in [5, 5, 1, 8, 5, 1]:
+            x1 = torch.rand(batch_size, 64, 3, 3)
+            x2 = torch.rand(batch_size, 64, 3, 3)
+            y_ref = model(x1=x1, x2=x2)
+            y_runtime = multi_stream_model(x1=x1, x2=x2)
+            self.assertEqual(y_ref, y_runtime)
+        self.assertEqual(len(multi_stream_model._plans), 3)
+
+
+class TestMultiStreamModuleAutotune(TestCase):
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_autotune_stream_number(self):
+        model = SimpleNet()
+        model.eval()
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        num_cores = cpu_pool.core_ids.__len__()
+        traced_model = torch.jit.trace(model, torch.rand(num_cores, 64, 3, 3))
+        multi_stream_model = ipex.cpu.runtime.MultiStreamModule(
+            traced_model, num_streams="AUTOTUNE", cpu_pool=cpu_pool
+        )
+        # no forward has run yet
+        self.assertEqual(multi_stream_model.get_stream_number(), 1)
+        divisors = [i for i in range(1, num_cores + 1) if num_cores % i == 0]
+        # every candidate runs 1 warm-up and 3 measured forwards on the live inputs
+        for _ in range(4 * len(divisors)):
+            for batch_size in [num_cores, 1]:
+                x = torch.rand(batch_size, 64, 3, 3)
+                y = multi_stream_model(x)
+                self.assertEqual(y, model(x))
+        tuned = multi_stream_model.get_tuned_stream_numbers()
+        self.assertTrue(tuned[1] == 1)
+        self.assertTrue(tuned[1 << (num_cores - 1).bit_length()] in divisors)
+
+
 class TestModuleMultiStreamModuleHint(TestCase):
     # For the inputs format which can't be jit.trace
     def init_set_up(self):
@@ -641,6 +703,132 @@ class TestModuleMultiStreamModuleHint(TestCase):
         self.assertEqual(y_ref, y_runtime_res)
 
 
+class TestDynamicBatcher(TestCase):
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_dynamic_batcher_threads(self):
+        model = SimpleNet()
+        model.eval()
+        x = torch.rand(32, 64, 3, 3)
+        with torch.no_grad():
+            y = model(x)
+        traced_model = torch.jit.trace(model, x[:1])
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        for num_streams in [1, 2]:
+            with ipex.cpu.runtime.DynamicBatcher(
+                traced_model,
+                num_streams=num_streams,
+                cpu_pool=cpu_pool,
+                max_batch_size=8,
+                max_wait_time=0.01,
+            ) as batcher:
+                results = [None] * x.size(0)
+
+                def request(i):
+                    results[i] = batcher(x[i : i + 1])
+
+                threads = [
+                    threading.Thread(target=request, args=(i,))
+                    for i in range(x.size(0))
+                ]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+                # every caller gets the output of its own sample
+                self.assertEqual(torch.cat(results), y)
+
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_dynamic_batcher_asyncio(self):
+        model = SimpleNet_tensor_dict()
+        model.eval()
+        x1 = torch.rand(6, 64, 3, 3)
+        x2 = torch.rand(6, 64, 3, 3)
+        with torch.no_grad():
+            y1, y_dict = model(x1=x1, x2=x2)
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        batcher = ipex.cpu.runtime.DynamicBatcher(
+            model, num_streams=2, cpu_pool=cpu_pool, max_batch_size=4
+        )
+
+        async def run():
+            # requests of 1 and 2 samples, the micro-batches are split back per request
+            return await asyncio.gather(
+                batcher.submit_async(x1=x1[:1], x2=x2[:1]),
+                batcher.submit_async(x1=x1[1:3], x2=x2[1:3]),
+                batcher.submit_async(x1=x1[3:4], x2=x2[3:4]),
+                batcher.submit_async(x1=x1[4:], x2=x2[4:]),
+            )
+
+        outputs = asyncio.run(run())
+        batcher.close()
+        self.assertEqual(torch.cat([o[0] for o in outputs]), y1)
+        for key in ["y1", "y2"]:
+            self.assertEqual(torch.cat([o[1][key] for o in outputs]), y_dict[key])
+        with self.assertRaises(RuntimeError):
+            batcher.submit(x1=x1[:1], x2=x2[:1])
+
+    def _create_recording_batcher(self, max_batch_size):
+        class Double(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.batch_shapes = []
+
+            def forward(self, x):
+                self.batch_shapes.append(tuple(x.shape))
+                return x * 2
+
+        model = Double()
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        # a long wait, so that every request is queued before the first micro-batch
+        # is dispatched
+        batcher = ipex.cpu.runtime.DynamicBatcher(
+            model,
+            num_streams=1,
+            cpu_pool=cpu_pool,
+            max_batch_size=max_batch_size,
+            max_wait_time=0.5,
+        )
+        return model, batcher
+
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_dynamic_batcher_overflow(self):
+        model, batcher = self._create_recording_batcher(max_batch_size=4)
+        xs = [torch.rand(3, 8), torch.rand(3, 8), torch.rand(1, 8)]
+        with batcher:
+            futures = [batcher.submit(x) for x in xs]
+            # the second request overflows the first micro-batch and starts the next
+            for x, future in zip(xs, futures):
+                self.assertEqual(future.result(timeout=10), x * 2)
+        self.assertEqual(model.batch_shapes, [(3, 8), (4, 8)])
+
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_dynamic_batcher_signatures(self):
+        model, batcher = self._create_recording_batcher(max_batch_size=8)
+        xs = [torch.rand(1, 8), torch.rand(1, 16), torch.rand(1, 16), torch.rand(1, 8)]
+        with batcher:
+            futures = [batcher.submit(x) for x in xs]
+            # a request with another signature starts a new micro-batch
+            for x, future in zip(xs, futures):
+                self.assertEqual(future.result(timeout=10), x * 2)
+        self.assertEqual(model.batch_shapes, [(1, 8), (2, 16), (1, 8)])
+
+
 def is_numactl_available():
     numactl_available = False
     cmd = ["numactl", "-C", "0", "-m", "0", "ls"]
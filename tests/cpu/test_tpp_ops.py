@@ -1,4 +1,5 @@
 import unittest
+import copy
 import torch
 import random
 import numpy
@@ -186,6 +187,120 @@ class TPPOPsTester(TestCase):
             hf_res, tpp_res, hf_intermediate, tpp_intermediate, prec=0.01
         )
 
+    def test_tpp_adamw_state_compression(self):
+        config = transformers.BertConfig(
+            vocab_size=1000,
+            hidden_size=128,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=256,
+            max_position_embeddings=128,
+            hidden_dropout_prob=0,
+            attention_probs_dropout_prob=0,
+        )
+        model = transformers.BertForSequenceClassification(config)
+        input_ids = torch.randint(1, 1000, (8, 64))
+        labels = torch.randint(0, 2, (8,))
+
+        def train(state_compression):
+            torch.manual_seed(0)
+            optimizer = torch.optim.AdamW(model.parameters(), lr=1e-3)
+            tpp_model, tpp_optimizer = ipex.fast_bert(
+                model, optimizer=optimizer, state_compression=state_compression
+            )
+            losses = []
+            for _ in range(30):
+                tpp_optimizer.zero_grad()
+                loss = tpp_model(input_ids, labels=labels).loss
+                loss.backward()
+                tpp_optimizer.step()
+                losses.append(loss.item())
+            return losses, tpp_model, tpp_optimizer
+
+        ref_losses, _, _ = train(None)
+        for state_compression in ["bf16", "int8"]:
+            losses, tpp_model, tpp_optimizer = train(state_compression)
+            self.assertLess(losses[-1], losses[0] / 2)
+            self.assertEqual(losses[-1], ref_losses[-1], prec=0.05)
+            p = next(tpp_model.parameters())
+            state = tpp_optimizer.state[p]
+            self.assertEqual(
+                state["exp_avg"].dtype,
+                torch.bfloat16 if state_compression == "bf16" else torch.uint8,
+            )
+
+            # the compressed states round-trip through the state dict
+            loaded = ipex.cpu.tpp.optim.AdamW(
+                tpp_model.parameters(), state_compression=state_compression
+            )
+            loaded.load_state_dict(tpp_optimizer.state_dict())
+            for key, value in state.items():
+                if torch.is_tensor(value):
+                    self.assertEqual(loaded.state[p][key].dtype, value.dtype)
+                    self.assertEqual(loaded.state[p][key], value)
+
+        with self.assertRaises(ValueError):
+            ipex.cpu.tpp.optim.Lamb(model.parameters(), state_compression="int4")
+
+    def test_tpp_lamb_state_compression(self):
+        x = torch.randn(64, 32)
+        y = x @ torch.randn(32, 16)
+
+        def train(state_compression):
+            torch.manual_seed(0)
+            model = torch.nn.Linear(32, 16)
+            optimizer = ipex.cpu.tpp.optim.Lamb(
+                model.parameters(),
+                lr=1e-2,
+                weight_decay=0.01,
+                state_compression=state_compression,
+            )
+            losses = []
+            for _ in range(50):
+                optimizer.zero_grad()
+                loss = torch.nn.functional.mse_loss(model(x), y)
+                loss.backward()
+                optimizer.step()
+                losses.append(loss.item())
+            return losses, model, optimizer
+
+        ref_losses, _, _ = train(None)
+        for state_compression in ["bf16", "int8"]:
+            losses, model, optimizer = train(state_compression)
+            self.assertLess(losses[-1], losses[0] / 2)
+            self.assertEqual(losses[-1], ref_losses[-1], prec=0.05)
+            p = model.weight
+            state = optimizer.state[p]
+            self.assertEqual(
+                state["exp_avg"].dtype,
+                torch.bfloat16 if state_compression == "bf16" else torch.uint8,
+            )
+
+            # the compressed states round-trip through the state dict, and the
+            # loaded optimizer continues with the same updates
+            loaded_model = copy.deepcopy(model)
+            loaded = ipex.cpu.tpp.optim.Lamb(
+                loaded_model.parameters(),
+                lr=1e-2,
+                weight_decay=0.01,
+                state_compression=state_compression,
+            )
+            loaded.load_state_dict(optimizer.state_dict())
+            loaded_p = loaded_model.weight
+            for key, value in state.items():
+                if torch.is_tensor(value):
+                    self.assertEqual(loaded.state[loaded_p][key].dtype, value.dtype)
+                    self.assertEqual(loaded.state[loaded_p][key], value)
+                else:
+                    self.assertEqual(loaded.state[loaded_p][key], value)
+            for m, opt in [(model, optimizer), (loaded_model, loaded)]:
+                opt.zero_grad()
+                torch.nn.functional.mse_loss(m(x), y).backward()
+                # the same draws for the stochastic rounding of the bf16 moments
+                torch.manual_seed(1)
+                opt.step()
+            self.assertEqual(model.weight, loaded_model.weight)
+
 
 if __name__ == "__main__":
     test = unittest.main()